@@ -0,0 +1,84 @@
+from datetime import datetime
+from typing import Dict, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from services import analytics_services, auth_services, lot_cache_services
+from utils import async_storage_utils, snapshot_utils
+from utils.json_response import FastJSONResponse
+
+router = APIRouter(
+    tags=["analytics"],
+    responses={
+        401: {"description": "Unauthorized - Invalid or missing token"},
+        403: {"description": "Forbidden - Insufficient permissions"},
+        404: {"description": "Not Found - Resource does not exist"}
+    }
+)
+
+
+@router.get(
+    "/analytics/lots/{parking_lot_id}",
+    summary="Revenue, sessions, duration and peak occupancy of a parking lot over time",
+    response_description="Totals and one entry per hour or day"
+)
+async def get_lot_analytics(
+    parking_lot_id: str,
+    since: Optional[datetime] = Query(None, alias="from", description="Start of the range, local time"),
+    until: Optional[datetime] = Query(None, alias="to", description="End of the range, local time"),
+    bucket: Literal["hour", "day"] = Query("day", description="Size of the buckets"),
+    session_user: Dict[str, str] = Depends(auth_services.require_auth),
+):
+    """
+    Analytics of one parking lot for operations.
+
+    Logic:
+    1. Verifies if user is an admin.
+    2. Validates the lot exists and from is not after to.
+    3. Reads the hourly or daily rollups in the range, kept up to date as sessions stop
+       and payments and refunds are made, and returns them with their totals.
+    """
+    auth_services.verify_admin(session_user)
+    if lot_cache_services.get_lot(parking_lot_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parking lot not found")
+    since, until = analytics_services.to_local(since), analytics_services.to_local(until)
+    if since is not None and until is not None and since > until:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="from must not be after to"
+        )
+
+    analytics = await async_storage_utils.run(
+        analytics_services.lot_analytics, parking_lot_id, since, until, bucket
+    )
+    return FastJSONResponse(content=analytics, status_code=status.HTTP_200_OK)
+
+
+@router.post(
+    "/analytics/snapshots",
+    summary="Export the rows changed since the last snapshot to columnar files",
+    response_description="Rows written, rows deleted and files per table"
+)
+async def create_snapshot(
+    format: Optional[Literal["parquet", "feather", "pickle"]] = Query(
+        None, description="File format, parquet when pyarrow is installed"
+    ),
+    session_user: Dict[str, str] = Depends(auth_services.require_auth),
+):
+    """
+    Snapshot of every table for offline analytics, so analysts don't pull data through the API.
+
+    Logic:
+    1. Verifies if user is an admin.
+    2. Reads all tables in one consistent read transaction, in chunks, and writes the rows
+       that changed since the last snapshot to compressed files per table per day.
+    3. Returns per table how many rows were written and deleted, and the files.
+    """
+    auth_services.verify_admin(session_user)
+    try:
+        manifest = await async_storage_utils.run(
+            snapshot_utils.export_snapshot, fmt=format or snapshot_utils.DEFAULT_FORMAT
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return FastJSONResponse(content=manifest, status_code=status.HTTP_200_OK)
@@ -164,15 +164,9 @@ def register_hotel_manager(hotel_manager_data: HotelManagerCreate, authorization
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can create hotel manager accounts"
         )
-    from utils.storage_utils import load_parking_lot_data
+    from services import lot_cache_services
 
-    parking_lots = load_parking_lot_data()
-    if isinstance(parking_lots, dict):
-        lot_exists = hotel_manager_data.parking_lot_id in parking_lots
-    else:
-        lot_exists = any(lot.get("id") == hotel_manager_data.parking_lot_id for lot in parking_lots)
-
-    if not lot_exists:
+    if lot_cache_services.get_lot(hotel_manager_data.parking_lot_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Parking lot with Id {hotel_manager_data.parking_lot_id} not found",
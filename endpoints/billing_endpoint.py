@@ -1,13 +1,15 @@
 from fastapi import APIRouter, HTTPException, Header, status
 from utils.session_manager import get_session
 from utils import billing_utils
+from utils import async_storage_utils
+from utils.json_response import FastJSONResponse
 
 router = APIRouter()
 
 
 # for user billing info
 @router.get("/billing")
-def get_user_billing(Authorization: str = Header(None)):
+async def get_user_billing(Authorization: str = Header(None)):
     """
     Retrieve billing information for the authenticated user.
     
@@ -24,8 +26,9 @@ def get_user_billing(Authorization: str = Header(None)):
     username = session_user["username"]
 
     try:
-        sessions = billing_utils.get_user_session_by_username(username)
-        return billing_utils.format_billing_record(sessions)
+        sessions = await async_storage_utils.run(billing_utils.get_user_session_by_username, username)
+        billing = await async_storage_utils.run(billing_utils.format_billing_record, sessions)
+        return FastJSONResponse(content=billing)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An error occurred: {str(e)}"
@@ -34,7 +37,7 @@ def get_user_billing(Authorization: str = Header(None)):
 
 # for admin to get other users billing info
 @router.get("/billing/{username}")
-def get_user_billing_admin(username: str, Authorization: str = Header(None)):
+async def get_user_billing_admin(username: str, Authorization: str = Header(None)):
     """
     Retrieve billing information for any user (Admin only).
     username: Username of the user whose billing info to retrieve
@@ -55,8 +58,9 @@ def get_user_billing_admin(username: str, Authorization: str = Header(None)):
         )
 
     try:
-        sessions = billing_utils.get_user_session_by_username(username)
-        return billing_utils.format_billing_record(sessions)
+        sessions = await async_storage_utils.run(billing_utils.get_user_session_by_username, username)
+        billing = await async_storage_utils.run(billing_utils.format_billing_record, sessions)
+        return FastJSONResponse(content=billing)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"an error occured {str(e)}"
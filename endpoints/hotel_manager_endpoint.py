@@ -1,25 +1,37 @@
-from typing import Dict, List
+from typing import Annotated, Dict, List, Optional
 from datetime import datetime
 import logging
+import secrets
 
-from fastapi import APIRouter, Request, HTTPException, Depends, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, Response, HTTPException, Depends, Query, status
 
+from utils.json_response import FastJSONResponse
 from utils.session_manager import get_session
+from services import etag_services, lot_cache_services
 from utils.storage_utils import (
-    load_parking_lot_data,
     get_discount_by_code,
     save_new_discount_to_db,
-    load_discounts_data_from_db,
+    save_new_discounts_to_db,
+    get_discounts_by_creator,
     update_existing_discount_in_db,
+    VersionConflictError,
 )
-from models.hotel_manager_model import HotelDiscountCodeCreate, HotelDiscountCode
+from models.hotel_manager_model import HotelDiscountCodeCreate, HotelDiscountCodeBatchCreate, HotelDiscountCode
 
 logger = logging.getLogger(__name__)
 
 ROLE_HOTEL_MANAGER = "HOTEL_MANAGER"
 ROLE_ADMIN = "ADMIN"
 
+DISCOUNT_CODES_PAGE_SIZE = 100
+DISCOUNT_CODES_MAX_PAGE_SIZE = 500
+
+# Generated codes leave out look-alike characters (0/O, 1/I) since guests type them in.
+# 32^8 possible suffixes per prefix make a collision rare, the few there are get replaced.
+GENERATED_CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+GENERATED_CODE_LENGTH = 8
+GENERATED_CODE_ATTEMPTS = 5
+
 
 def require_auth(request: Request) -> Dict[str, str]:
     """Authentication dependency
@@ -80,13 +92,8 @@ def create_hotel_discount_code(
     :return: jsonresponse with created discount code details
     """
     try:
-        parking_lots = load_parking_lot_data()
         managed_lot_id = session_user["managed_parking_lot_id"]
-        if isinstance(parking_lots, dict):
-            lot_exists = managed_lot_id in parking_lots
-        else:
-            lot_exists = any(lot.get("id") == managed_lot_id for lot in parking_lots)
-        if not lot_exists:
+        if lot_cache_services.get_lot(managed_lot_id) is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Managed parking lot {managed_lot_id} not found",
@@ -148,21 +155,142 @@ def create_hotel_discount_code(
         )
 
 
+def _generate_code(prefix: str) -> str:
+    return f"{prefix}-" + "".join(secrets.choice(GENERATED_CODE_ALPHABET) for _ in range(GENERATED_CODE_LENGTH))
+
+
+@router.post(
+    "/discount-codes/batch",
+    response_model=List[HotelDiscountCode],
+    summary="Create 100% discount codes for many hotel guests at once (Hotel manager only)",
+    response_description="Created discount codes",
+    status_code=status.HTTP_201_CREATED,
+)
+def create_hotel_discount_codes_batch(
+    batch_create: HotelDiscountCodeBatchCreate, session_user: Dict[str, str] = Depends(require_hotel_manager)
+) -> List[HotelDiscountCode]:
+    """hotel managers can create the discount codes of a whole group of guests in one call,
+    the codes are generated and saved together, all of them or none. Codes that turn out to be
+    taken already are replaced and the batch is saved again
+    :param batch_create: guests or number of codes, with the stay they are valid for
+    :param session_user: authenticated hotel manager's session data
+    :return: jsonresponse with the created discount codes
+    """
+    try:
+        managed_lot_id = session_user["managed_parking_lot_id"]
+        if lot_cache_services.get_lot(managed_lot_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Managed parking lot {managed_lot_id} not found",
+            )
+        now = datetime.now()
+        timestamp = int(now.timestamp())
+        if datetime.fromisoformat(batch_create.check_in_date).date() < now.date():
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="Check-in date cannot be in the past",
+            )
+
+        guests = batch_create.guests or [None] * batch_create.count
+        codes = set()
+        while len(codes) < len(guests):
+            codes.add(_generate_code(batch_create.prefix))
+
+        created_at = f"{now.strftime('%d-%m-%Y %H:%M:%S')}{timestamp}"
+        discount_codes = [
+            {
+                "code": code,
+                "discount_type": "percentage",
+                "discount_value": 100.0,
+                "max_uses": 1,
+                "current_uses": 0,
+                "active": True,
+                "created_at": created_at,
+                "check_in_date": batch_create.check_in_date,
+                "check_out_date": batch_create.check_out_date,
+                "parking_lot_id": managed_lot_id,
+                "created_by": session_user["username"],
+                "guest_name": guest.guest_name if guest else None,
+                "notes": (guest.notes if guest else None) or batch_create.notes,
+                "is_hotel_code": 1,
+            }
+            for code, guest in zip(codes, guests)
+        ]
+
+        try:
+            for _ in range(GENERATED_CODE_ATTEMPTS):
+                taken = save_new_discounts_to_db(discount_codes)
+                if not taken:
+                    break
+                for discount_code in discount_codes:
+                    if discount_code["code"] in taken:
+                        new_code = _generate_code(batch_create.prefix)
+                        while new_code in codes:
+                            new_code = _generate_code(batch_create.prefix)
+                        codes.add(new_code)
+                        discount_code["code"] = new_code
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Could not generate unique codes with prefix '{batch_create.prefix}'",
+                )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to save hotel discount codes batch: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to save discount codes"
+            )
+        logger.info(
+            f"{len(discount_codes)} hotel discount codes created "
+            f"by {session_user['username']} for parking lot {managed_lot_id} "
+            f"(valid from {batch_create.check_in_date} to {batch_create.check_out_date})"
+        )
+        return discount_codes
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in create_hotel_discount_codes_batch: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred"
+        )
+
+
 @router.get("/discount-codes", response_model=List[HotelDiscountCode])
 def get_hotel_discount_codes(
     session_user: Dict[str, str] = Depends(require_hotel_manager),
+    request: Request = None,
+    response: Response = None,
+    limit: Annotated[
+        int, Query(ge=1, le=DISCOUNT_CODES_MAX_PAGE_SIZE, description="Codes per page")
+    ] = DISCOUNT_CODES_PAGE_SIZE,
+    after: Annotated[Optional[str], Query(description="Last code of the previous page")] = None,
 ) -> List[HotelDiscountCode]:
-    """returns all discount codes created by the authenticated hotel manager for their parking lot
+    """returns the discount codes created by the authenticated hotel manager, one page at a time
+    ordered by code. A full page sets the X-Next-After header to the code to pass as after
+    for the next one
     :param session_user: authenticated hotel manager's session data
-    :return: jsonResponse with list of discount codes created by this hotel manager
+    :param request: incoming request, answered with 304 if its If-None-Match is still current
+    :param response: outgoing response the ETag is set on
+    :param limit: number of codes per page
+    :param after: last code of the previous page
+    :return: jsonResponse with a page of discount codes created by this hotel manager
     """
     try:
-        all_discount_codes = load_discounts_data_from_db() or []
-        hotel_codes = [
-            code
-            for code in all_discount_codes
-            if code.get("created_by") == session_user["username"] and code.get("is_hotel_code")
-        ]
+        # The list is filtered per manager and paged, so those are part of the tag
+        etag = etag_services.table_etag(
+            etag_services.DISCOUNT_TABLES, session_user["username"], limit, after or ""
+        )
+        cached = etag_services.not_modified(request, etag)
+        if cached is not None:
+            return cached
+        if response is not None:
+            response.headers["ETag"] = etag
+
+        # Served by the (created_by, is_hotel_code, code) index, other managers' codes are never read
+        hotel_codes = get_discounts_by_creator(session_user["username"], after=after, limit=limit) or []
+        if response is not None and len(hotel_codes) == limit:
+            response.headers["X-Next-After"] = hotel_codes[-1]["code"]
         return hotel_codes
     except Exception as e:
         logger.error(f"Failed to load hotel discount codes: {e}")
@@ -233,13 +361,21 @@ def deactivate_hotel_discount_code(
             )
         updated_discount = existing_discount.copy()
         updated_discount["active"] = False
+        version = existing_discount.get("version")
         try:
-            update_existing_discount_in_db(code, updated_discount)
+            update_existing_discount_in_db(code, {"active": False}, version)
+        except VersionConflictError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Discount code was modified by another request, please retry",
+            )
         except Exception as e:
             logger.error(f"Failed to deactivate hotel discount code: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to deactivate discount code"
             )
+        if version is not None:
+            updated_discount["version"] = version + 1
         logger.info(f"Hotel discount code deactivated: {code} by {session_user['username']}")
         return updated_discount
     except HTTPException:
@@ -256,31 +392,20 @@ def deactivate_hotel_discount_code(
     summary="Get details of the parking lot managed by this hotel manager",
     response_description="Parking lot details",
 )
-def get_managed_parking_lot(session_user: Dict[str, str] = Depends(require_hotel_manager)) -> JSONResponse:
+def get_managed_parking_lot(session_user: Dict[str, str] = Depends(require_hotel_manager)) -> FastJSONResponse:
     """returns details of the parking lot assigned to this hotel manager
     :param session_user: authenticated hotel manager's session data
     :return: jsonResponse containing the managed parking lot details with id included
     """
     try:
-        parking_lots = load_parking_lot_data()
         managed_lot_id = session_user["managed_parking_lot_id"]
-        if isinstance(parking_lots, dict):
-            if managed_lot_id not in parking_lots:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Managed parking lot {managed_lot_id} not found",
-                )
-
-            parking_lot = parking_lots[managed_lot_id]
-            parking_lot["id"] = managed_lot_id
-        else:
-            parking_lot = next((lot for lot in parking_lots if lot.get("id") == managed_lot_id), None)
-            if not parking_lot:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Managed parking lot {managed_lot_id} not found",
-                )
-        return JSONResponse(content=parking_lot, status_code=status.HTTP_200_OK)
+        parking_lot = lot_cache_services.get_lot(managed_lot_id)
+        if parking_lot is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Managed parking lot {managed_lot_id} not found",
+            )
+        return FastJSONResponse(content=parking_lot, status_code=status.HTTP_200_OK)
     except HTTPException:
         raise
     except Exception as e:
@@ -1,14 +1,26 @@
 from datetime import datetime
 from typing import Dict
 
-from fastapi import APIRouter, Request, HTTPException, Depends, status, Header
-from fastapi.responses import JSONResponse, Response
-from models.parking_lots_model import ParkingLot, Coordinates, ParkingSessionCreate, UpdateParkingLot
+from fastapi import APIRouter, Request, HTTPException, Depends, status, Header, Query
+from fastapi.responses import Response, StreamingResponse
+from models.parking_lots_model import ParkingLot, Coordinates, ParkingSessionCreate, UpdateParkingLot, GateEventBatch
 
-from services import parking_services, auth_services
+from services import (
+    etag_services,
+    gate_event_services,
+    parking_services,
+    auth_services,
+    occupancy_services,
+    occupancy_stream_services,
+    geo_services,
+    availability_services,
+)
+from services.reservation_index_services import to_minutes
+from utils.json_response import FastJSONResponse
 from utils.storage_utils import (
     save_parking_lot_data,
     load_parking_lot_data,
+    get_parking_lot_by_id as load_parking_lot_by_id,
     save_parking_session_data,
 )
 
@@ -21,43 +33,193 @@ router = APIRouter(
     }
 )
 
+# Registered before /parking-lots/{parking_lot_id} so "nearby" is not taken for an id
+@router.get(
+    "/parking-lots/nearby",
+    summary="Find the nearest parking lots with free spaces",
+    response_description="Parking lots ordered by distance"
+)
+def get_nearby_parking_lots(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(5.0, gt=0, le=100, description="Search radius in kilometres"),
+    min_free: int = Query(1, ge=0, description="Minimum number of free spaces"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Retrieve parking lots around a location.
+
+    Logic:
+    1. Looks up lots within the radius in the in-memory spatial index.
+    2. Drops lots with fewer than min_free free spaces, using live occupancy.
+    3. Orders by distance, then by free spaces, and adds `distance_km` and `free` to each lot.
+    """
+    # Returned as a response, a plain list would go through jsonable_encoder first
+    return FastJSONResponse(content=geo_services.find_nearby_parking_lots(lat, lng, radius, min_free, limit))
+
 @router.get(
     "/parking-lots/{parking_lot_id}",
     summary="Retrieve a single parking lot by ID",
     response_description="Parking lot details"
 )
-def get_parking_lot_by_id(parking_lot_id: str):
+def get_parking_lot_by_id(parking_lot_id: str, request: Request):
     """
     Retrieve a specific parking lot.
 
     Logic:
-    1. Loads parking lot by ID.
+    1. Answers 304 if the client's If-None-Match still matches the parking lot table versions.
+    2. Loads parking lot by ID and returns it with its ETag.
     """
-    parking_lots = load_parking_lot_data()
-    lot = next((lot for lot in parking_lots if lot.get("id") == parking_lot_id),
-        None)
+    # Taken before the load, a write in between then only costs the client one extra 200
+    etag = etag_services.table_etag(etag_services.PARKING_LOT_TABLES, parking_lot_id)
+    cached = etag_services.not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    lot = load_parking_lot_by_id(parking_lot_id)
     if lot is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Parking lot does not exist"
         )
-    
-    return lot
+    return FastJSONResponse(content=lot, headers={"ETag": etag})
 
 @router.get(
     "/parking-lots/",
     summary="Retrieve all current parking lots",
     response_description="Parking lot details"
 )
-def get_parking_lots():
+def get_parking_lots(request: Request):
     """
     Retrieve all parking lots.
 
     Logic:
-    1. load parking lot data and return its contents
+    1. Answers 304 if the client's If-None-Match still matches the parking lot table versions.
+    2. load parking lot data and return its contents with its ETag
     """
+    etag = etag_services.table_etag(etag_services.PARKING_LOT_TABLES)
+    cached = etag_services.not_modified(request, etag)
+    if cached is not None:
+        return cached
+
     parking_lots = load_parking_lot_data()
-    return parking_lots
+    return FastJSONResponse(content=parking_lots, headers={"ETag": etag})
+
+@router.get(
+    "/parking-lots/occupancy/stream",
+    summary="Stream occupancy changes of all parking lots",
+    response_description="Server-Sent Events stream of occupancy updates"
+)
+def stream_parking_lots_occupancy(request: Request):
+    """
+    Stream capacity and reserved counters of every parking lot.
+
+    Logic:
+    1. Sends the current counters of all parking lots once.
+    2. Pushes an `occupancy` event whenever a session or reservation changes a lot,
+       bursts are coalesced into one event per lot.
+    """
+    def load_initial():
+        return {
+            lot.get("id"): {
+                "capacity": lot.get("capacity") or 0,
+                "reserved": lot.get("reserved") or 0,
+                "free": max(0, (lot.get("capacity") or 0) - (lot.get("reserved") or 0)),
+            }
+            for lot in load_parking_lot_data()
+        }
+
+    return StreamingResponse(
+        occupancy_stream_services.event_stream(request, None, load_initial),
+        media_type="text/event-stream",
+        headers=occupancy_stream_services.SSE_HEADERS
+    )
+
+@router.get(
+    "/parking-lots/{parking_lot_id}/availability",
+    summary="Free capacity of a parking lot per time bucket",
+    response_description="Availability calendar of the parking lot"
+)
+def get_parking_lot_availability(
+    parking_lot_id: str,
+    start_time: str = Query(..., alias="from", description="Start of the window, YYYY-MM-DDTHH:MM"),
+    end_time: str = Query(..., alias="to", description="End of the window, YYYY-MM-DDTHH:MM"),
+    granularity: int = Query(60, ge=1, le=60 * 24 * 31, description="Bucket size in minutes")
+):
+    """
+    Retrieve how many spaces are free in a parking lot over time.
+
+    Logic:
+    1. Verifies if parking lot exists and the window is valid.
+    2. Sweeps the reservations and active sessions of the lot once, in time order.
+    3. Returns per bucket the most spaces taken at any moment and what is left free.
+    """
+    occupancy = occupancy_services.get_occupancy(parking_lot_id)
+    if occupancy is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Parking lot does not exist"
+        )
+
+    try:
+        start, end = to_minutes(start_time), to_minutes(end_time)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="from and to must be in iso format: YYYY-MM-DDTHH:MM"
+        )
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="to must be after from"
+        )
+    if (end - start) / granularity > availability_services.MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"Window too large for this granularity, at most {availability_services.MAX_BUCKETS} buckets"
+        )
+
+    buckets = availability_services.get_availability(
+        parking_lot_id, occupancy["capacity"], start_time, end_time, granularity
+    )
+    return FastJSONResponse(content={
+        "parking_lot_id": parking_lot_id,
+        "capacity": occupancy["capacity"],
+        "from": start_time,
+        "to": end_time,
+        "granularity": granularity,
+        "buckets": buckets,
+    })
+
+@router.get(
+    "/parking-lots/{parking_lot_id}/occupancy/stream",
+    summary="Stream occupancy changes of a single parking lot",
+    response_description="Server-Sent Events stream of occupancy updates"
+)
+def stream_parking_lot_occupancy(parking_lot_id: str, request: Request):
+    """
+    Stream capacity and reserved counters of a specific parking lot.
+
+    Logic:
+    1. Verifies if parking lot exists.
+    2. Sends the current counters once.
+    3. Pushes an `occupancy` event whenever they change, bursts are coalesced into one event.
+    """
+    if occupancy_services.get_occupancy(parking_lot_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Parking lot does not exist"
+        )
+
+    def load_initial():
+        occupancy = occupancy_services.get_occupancy(parking_lot_id)
+        return {parking_lot_id: occupancy} if occupancy else {}
+
+    return StreamingResponse(
+        occupancy_stream_services.event_stream(request, parking_lot_id, load_initial),
+        media_type="text/event-stream",
+        headers=occupancy_stream_services.SSE_HEADERS
+    )
 
 @router.get(
     "/parking-lots/{parking_lot_id}/sessions",
@@ -74,7 +236,7 @@ def get_parking_sessions(parking_lot_id: str, session_user: Dict[str, str] = Dep
     3. If user: loads all of the user's sessions in that lot.
        If admin: loads all sessions in that lot.
     """
-    return parking_services.get_parking_sessions(parking_lot_id, session_user)
+    return FastJSONResponse(content=parking_services.get_parking_sessions(parking_lot_id, session_user))
     
 @router.post(
     "/parking-lots/",
@@ -93,7 +255,7 @@ def create_parking_lot(parking_lot: ParkingLot, session_user: Dict[str, str] = D
     auth_services.verify_admin(session_user)
     new_lot = parking_services.create_parking_lot(parking_lot, session_user)
 
-    return JSONResponse(
+    return FastJSONResponse(
         content=new_lot,
         status_code=status.HTTP_200_OK
     )
@@ -118,7 +280,7 @@ def start_parking_session(
     """
     started_session = parking_services.start_parking_session(parking_lot_id, session_data, session_user)
 
-    return JSONResponse(
+    return FastJSONResponse(
     content=started_session,
     status_code=status.HTTP_200_OK
     )
@@ -145,11 +307,41 @@ def stop_parking_session(
     """
     stopped_session = parking_services.stop_parking_session(parking_lot_id, session_data, session_user)
     
-    return JSONResponse(
+    return FastJSONResponse(
     content=stopped_session,
     status_code=status.HTTP_200_OK
     )
 
+
+@router.post(
+    "/parking-lots/gate-events",
+    summary="Apply a batch of camera entry and exit events",
+    response_description="One result per event, in the order given"
+)
+def post_gate_events(batch: GateEventBatch, session_user: Dict[str, str] = Depends(auth_services.require_auth)):
+    """
+    Apply license plate camera events for one or more lots in one go.
+
+    Logic:
+    1. Verifies if user is an admin.
+    2. Applies the events in order in a single transaction, committed once at the end:
+       entries start a session and claim a space, exits stop the open session,
+       calculate its cost and release the space.
+    3. Returns a result per event; a rejected event is rolled back on its own and does
+       not stop the rest of the batch.
+    """
+    auth_services.verify_admin(session_user)
+    results = gate_event_services.process_gate_events(batch.events, session_user)
+
+    return FastJSONResponse(
+        content={
+            "applied": sum(1 for result in results if result["status"] != "rejected"),
+            "rejected": sum(1 for result in results if result["status"] == "rejected"),
+            "results": results,
+        },
+        status_code=status.HTTP_200_OK
+    )
+
 @router.put(
     "/parking-lots/{parking_lot_id}",
     summary="Update parking lot entry data",
@@ -172,7 +364,7 @@ def update_parking_lot(
     auth_services.verify_admin(session_user)
     updated_lot = parking_services.update_parking_lot(parking_lot_id, parking_lot_data)
 
-    return JSONResponse(
+    return FastJSONResponse(
         content=updated_lot,
         status_code=status.HTTP_200_OK
     )
@@ -200,7 +392,7 @@ def update_parking_session(
     auth_services.verify_admin(session_user)
     updated_session = parking_services.update_parking_session(parking_lot_id, parking_session_id, parking_session_data)
 
-    return JSONResponse(
+    return FastJSONResponse(
         content=updated_session,
         status_code=status.HTTP_200_OK
     )
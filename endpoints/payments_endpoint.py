@@ -2,9 +2,10 @@ from typing import List, Dict, Optional
 from datetime import datetime
 import logging
 
-from fastapi import APIRouter, Request, HTTPException, Depends, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, HTTPException, Depends, Query, status
 
+from utils import async_storage_utils
+from utils.json_response import FastJSONResponse
 from utils.session_manager import get_session
 from utils.storage_utils import (
     # Updated imports for targeted DB functions
@@ -12,9 +13,12 @@ from utils.storage_utils import (
     get_payment_data_by_id, 
     save_new_payment_to_db, 
     update_existing_payment_in_db,
-    get_discount_by_code,
-    update_existing_discount_in_db,
-    get_payments_by_initiator
+    get_cached_discount,
+    claim_discount_use,
+    release_discount_use,
+    get_payments_by_initiator,
+    get_payments_created_between,
+    VersionConflictError,
 )
 from models.payments_model import PaymentCreate, PaymentUpdate
 from utils.session_calculator import (
@@ -29,7 +33,7 @@ ROLE_USER = "USER"
 ROLE_ADMIN = "ADMIN"
 
 
-def require_auth(request: Request) -> Dict[str, str]:
+async def require_auth(request: Request) -> Dict[str, str]:
     """
     Middleware-like dependency to ensure the user is authenticated.
     
@@ -79,10 +83,10 @@ router = APIRouter(
     response_model=Dict,
     status_code=status.HTTP_200_OK
 )
-def get_payment_by_id(
+async def get_payment_by_id(
     payment_id: str,
     session_user: Dict[str, str] = Depends(require_auth)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Fetch a payment by its unique transaction ID.
     
@@ -93,7 +97,7 @@ def get_payment_by_id(
     """
     try:
         # OPTIMIZATION: Load only the single payment by ID to avoid reading the whole table
-        payment = get_payment_data_by_id(payment_id)
+        payment = await async_storage_utils.run(get_payment_data_by_id, payment_id)
     except Exception as e:
         logger.error(f"Failed to load payment data: {e}")
         # The storage_utils will raise an exception if the table query fails
@@ -118,7 +122,7 @@ def get_payment_by_id(
             detail="Cannot access payments that are not your own"
         )
     
-    return JSONResponse(content=payment, status_code=status.HTTP_200_OK)
+    return FastJSONResponse(content=payment, status_code=status.HTTP_200_OK)
 
 
 @router.get(
@@ -129,25 +133,47 @@ def get_payment_by_id(
     response_model=List[Dict],
     status_code=status.HTTP_200_OK
 )
-def get_all_payments(
-    session_user: Dict[str, str] = Depends(require_auth)
-) -> JSONResponse:
+async def get_all_payments(
+    session_user: Dict[str, str] = Depends(require_auth),
+    created_from: Optional[datetime] = Query(None, description="Only payments created at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Only payments created at or before this time"),
+) -> FastJSONResponse:
     """
     Fetch all payments accessible to the current user.
     
     Logic:
     1. If ADMIN: Load and return ALL payments.
     2. If USER: Query only payments where 'initiator' matches username.
+    3. With created_from/created_to: Only payments created in that range, oldest first (indexed on created_ts).
     """
+    if created_from is not None or created_to is not None:
+        since = int(created_from.timestamp()) if created_from is not None else None
+        until = int(created_to.timestamp()) if created_to is not None else None
+        if since is not None and until is not None and since > until:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="created_from must not be after created_to"
+            )
+        initiator = None if session_user["role"] == ROLE_ADMIN else session_user["username"]
+        try:
+            payments = await async_storage_utils.run(get_payments_created_between, since, until, initiator) or []
+        except Exception as e:
+            logger.error(f"Failed to load payment data: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to load payment data"
+            )
+        return FastJSONResponse(content=payments, status_code=status.HTTP_200_OK)
+
     try:
         # Admins see all payments
         if session_user["role"] == ROLE_ADMIN:
-            payments = load_payment_data_from_db() or []
-            return JSONResponse(content=payments, status_code=status.HTTP_200_OK)
+            payments = await async_storage_utils.run(load_payment_data_from_db) or []
+            return FastJSONResponse(content=payments, status_code=status.HTTP_200_OK)
         
         # Regular users see only their own payments - Optimized DB query
-        user_payments = get_payments_by_initiator(session_user["username"]) or []
-        return JSONResponse(content=user_payments, status_code=status.HTTP_200_OK)
+        user_payments = await async_storage_utils.run(get_payments_by_initiator, session_user["username"]) or []
+        return FastJSONResponse(content=user_payments, status_code=status.HTTP_200_OK)
         
     except Exception as e:
         logger.error(f"Failed to load payment data: {e}")
@@ -164,10 +190,10 @@ def get_all_payments(
     response_description="Created payment details",
     status_code=status.HTTP_201_CREATED
 )
-def create_payment(
+async def create_payment(
     payment_create: PaymentCreate,
     session_user: Dict[str, str] = Depends(require_auth)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Create a new payment record.
     
@@ -216,7 +242,8 @@ def create_payment(
         # If a discount code is provided, we attempt to validate and apply it
         if payment_create.discount_code:
             try:
-                discount = get_discount_by_code(payment_create.discount_code)
+                # Cached, unknown codes included, so guessed codes are rejected without a query
+                discount = await async_storage_utils.run(get_cached_discount, payment_create.discount_code)
                 if not discount:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -244,15 +271,6 @@ def create_payment(
                         # Current logic: ignore check if date is bad.
                         pass
                 
-                # Check usage limits
-                max_uses = discount.get("max_uses")
-                current_uses = discount.get("current_uses", 0)
-                if max_uses is not None and current_uses >= max_uses:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Discount code has reached its usage limit"
-                    )
-                
                 # Calculate discount amount
                 discount_type = discount["discount_type"]
                 discount_value = discount["discount_value"]
@@ -265,10 +283,14 @@ def create_payment(
                 final_amount = max(0, original_amount - discount_amount)
                 discount_applied = payment_create.discount_code
                 
-                # Update discount usage count in DB
-                updated_discount = discount.copy()
-                updated_discount["current_uses"] = current_uses + 1
-                update_existing_discount_in_db(payment_create.discount_code, updated_discount)
+                # Check usage limits and count the use in one conditional update, the counter in
+                # the DB is the only one, so concurrent payments can never exceed max_uses
+                claimed = await async_storage_utils.run(claim_discount_use, payment_create.discount_code)
+                if claimed is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Discount code has reached its usage limit"
+                    )
                 
             except HTTPException:
                 raise
@@ -304,9 +326,15 @@ def create_payment(
         
         # OPTIMIZATION: Persist the single new payment directly
         try:
-            save_new_payment_to_db(payment)
+            await async_storage_utils.run(save_new_payment_to_db, payment)
         except Exception as e:
             logger.error(f"Failed to save payment: {e}")
+            # The use was claimed for this payment, which never happened
+            if discount_applied:
+                try:
+                    await async_storage_utils.run(release_discount_use, discount_applied)
+                except Exception as release_error:
+                    logger.error(f"Failed to give back a use of discount code {discount_applied}: {release_error}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to save payment"
@@ -314,7 +342,7 @@ def create_payment(
         
         logger.info(f"Payment created: {transaction_hash} by {session_user['username']}")
         
-        return JSONResponse(
+        return FastJSONResponse(
             content=payment,
             status_code=status.HTTP_201_CREATED
         )
@@ -336,11 +364,11 @@ def create_payment(
     response_description="Updated payment details",
     status_code=status.HTTP_200_OK
 )
-def update_payment(
+async def update_payment(
     payment_id: str,
     payment_update: PaymentUpdate,
     session_user: Dict[str, str] = Depends(require_auth)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Update a payment record.
     
@@ -360,7 +388,7 @@ def update_payment(
             
         # OPTIMIZATION: Load only the payment to be updated
         try:
-            payment = get_payment_data_by_id(payment_id)
+            payment = await async_storage_utils.run(get_payment_data_by_id, payment_id)
         except Exception as e:
             logger.error(f"Failed to load payment data: {e}")
             raise HTTPException(
@@ -377,13 +405,9 @@ def update_payment(
         # Apply partial update (only fields that were explicitly set)
         update_data = payment_update.model_dump(exclude_unset=True)
         
-        # Handle nested t_data update
-        if "t_data" in update_data and update_data["t_data"]:
-            if "t_data" not in payment:
-                payment["t_data"] = {}
-            # Ensure we update the dictionary in the payment object, not overwrite it
-            payment["t_data"].update(update_data["t_data"])
-            del update_data["t_data"]
+        # A t_data update only carries the fields that were set, the rest are kept
+        if not update_data.get("t_data"):
+            update_data.pop("t_data", None)
         
         # Convert session_id and parking_lot_id to strings if present
         if "session_id" in update_data:
@@ -391,12 +415,15 @@ def update_payment(
         if "parking_lot_id" in update_data:
             update_data["parking_lot_id"] = str(update_data["parking_lot_id"])
         
-        # Update other fields in the existing payment object
-        payment.update(update_data)
-        
-        # OPTIMIZATION: Persist the single updated payment directly
+        # OPTIMIZATION: Persist only the changed columns, and only if nobody updated the payment since we loaded it
+        version = payment.get("version")
         try:
-            update_existing_payment_in_db(payment_id, payment)
+            await async_storage_utils.run(update_existing_payment_in_db, payment_id, update_data, version)
+        except VersionConflictError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Payment was modified by another request, please retry"
+            )
         except Exception as e:
             logger.error(f"Failed to save payment update: {e}")
             raise HTTPException(
@@ -404,9 +431,16 @@ def update_payment(
                 detail="Failed to save payment update"
             )
         
+        # Update the loaded payment object for the response
+        if "t_data" in update_data:
+            payment["t_data"] = {**(payment.get("t_data") or {}), **update_data.pop("t_data")}
+        payment.update(update_data)
+        if version is not None:
+            payment["version"] = version + 1
+        
         logger.info(f"Payment updated: {payment_id} by {session_user['username']}")
         
-        return JSONResponse(content=payment, status_code=status.HTTP_200_OK)
+        return FastJSONResponse(content=payment, status_code=status.HTTP_200_OK)
     
     except HTTPException:
         raise
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Header, HTTPException, status
 from utils.session_manager import get_session
 from utils.storage_utils import (
     get_user_data_by_username,
-    update_existing_user_in_db
+    update_existing_user_in_db,
+    VersionConflictError,
 )
 from utils.passwords import hash_password_bcrypt
 from models.profile_model import ProfileUpdateRequest, ProfileResponse
@@ -115,7 +116,12 @@ def update_profile(
         user["hash_type"] = "bcrypt"
 
     try:
-        update_existing_user_in_db(session_user["username"], user)
+        update_existing_user_in_db(session_user["username"], user, user.get("version"))
+    except VersionConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Profile was modified by another request, please retry"
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -3,9 +3,10 @@ from datetime import datetime
 import logging
 import uuid
 
-from fastapi import APIRouter, Request, HTTPException, Depends, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, HTTPException, Depends, Query, status
 
+from utils.json_response import FastJSONResponse
+from services import etag_services
 from utils.session_manager import get_session
 from utils.storage_utils import (
     get_payment_data_by_id,
@@ -17,8 +18,11 @@ from utils.storage_utils import (
     get_discount_by_code,
     save_new_discount_to_db,
     load_discounts_data_from_db,
+    get_discounts_by_lot,
     update_existing_discount_in_db,
-    get_refunds_for_user
+    get_refunds_for_user,
+    get_refunds_created_between,
+    VersionConflictError,
 )
 from models.refunds_model import (
     RefundCreate, 
@@ -101,7 +105,7 @@ router = APIRouter(
 def create_refund(
     refund_create: RefundCreate,
     session_user: Dict[str, str] = Depends(require_admin)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Create a refund record.
     
@@ -166,7 +170,7 @@ def create_refund(
         
         logger.info(f"Refund created: {refund_id} for transaction {refund_create.original_transaction_id} by {session_user['username']}")
         
-        return JSONResponse(
+        return FastJSONResponse(
             content=refund,
             status_code=status.HTTP_201_CREATED
         )
@@ -191,7 +195,7 @@ def create_refund(
 def get_refund_by_id_endpoint(
     refund_id: str,
     session_user: Dict[str, str] = Depends(require_auth)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Retrieve a specific refund.
     
@@ -216,7 +220,7 @@ def get_refund_by_id_endpoint(
                     detail="Cannot access refunds for payments that are not your own"
                 )
         
-        return JSONResponse(content=refund, status_code=status.HTTP_200_OK)
+        return FastJSONResponse(content=refund, status_code=status.HTTP_200_OK)
     
     except HTTPException:
         raise
@@ -236,24 +240,46 @@ def get_refund_by_id_endpoint(
     response_description="List of refund objects"
 )
 def get_all_refunds(
-    session_user: Dict[str, str] = Depends(require_auth)
-) -> JSONResponse:
+    session_user: Dict[str, str] = Depends(require_auth),
+    created_from: Optional[datetime] = Query(None, description="Only refunds created at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Only refunds created at or before this time"),
+) -> FastJSONResponse:
     """
     List all accessible refunds.
     
     Logic:
     1. If ADMIN: Load and return all refunds.
     2. If USER: Join refunds with payments to return only those belonging to the user.
+    3. With created_from/created_to: Only refunds created in that range, oldest first (indexed on created_ts).
     """
+    if created_from is not None or created_to is not None:
+        since = int(created_from.timestamp()) if created_from is not None else None
+        until = int(created_to.timestamp()) if created_to is not None else None
+        if since is not None and until is not None and since > until:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="created_from must not be after created_to"
+            )
+        username = None if session_user["role"] == ROLE_ADMIN else session_user["username"]
+        try:
+            refunds = get_refunds_created_between(since, until, username) or []
+        except Exception as e:
+            logger.error(f"Failed to load refunds: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to load refunds"
+            )
+        return FastJSONResponse(content=refunds, status_code=status.HTTP_200_OK)
+
     try:
         # Admins see all refunds
         if session_user["role"] == ROLE_ADMIN:
             refunds = load_refunds_data_from_db() or []
-            return JSONResponse(content=refunds, status_code=status.HTTP_200_OK)
+            return FastJSONResponse(content=refunds, status_code=status.HTTP_200_OK)
         
         # Regular users see only refunds for their own payments using JOIN
         user_refunds = get_refunds_for_user(session_user["username"])
-        return JSONResponse(content=user_refunds, status_code=status.HTTP_200_OK)
+        return FastJSONResponse(content=user_refunds, status_code=status.HTTP_200_OK)
     
     except Exception as e:
         logger.error(f"Failed to load refunds: {e}")
@@ -273,7 +299,7 @@ def get_all_refunds(
 def get_refunds_for_transaction(
     transaction_id: str,
     session_user: Dict[str, str] = Depends(require_auth)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Get all refunds for a specific payment.
     
@@ -302,7 +328,7 @@ def get_refunds_for_transaction(
             )
         
         refunds = get_refunds_by_transaction_id(transaction_id)
-        return JSONResponse(content=refunds, status_code=status.HTTP_200_OK)
+        return FastJSONResponse(content=refunds, status_code=status.HTTP_200_OK)
     
     except HTTPException:
         raise
@@ -327,7 +353,7 @@ def get_refunds_for_transaction(
 def create_discount_code(
     discount_create: DiscountCodeCreate,
     session_user: Dict[str, str] = Depends(require_admin)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Create a new discount code.
     
@@ -373,7 +399,7 @@ def create_discount_code(
         
         logger.info(f"Discount code created: {discount_create.code} by {session_user['username']}")
         
-        return JSONResponse(
+        return FastJSONResponse(
             content=discount_code,
             status_code=status.HTTP_201_CREATED
         )
@@ -396,18 +422,30 @@ def create_discount_code(
     response_description="List of discount code objects"
 )
 def get_all_discount_codes(
-    session_user: Dict[str, str] = Depends(require_admin)
-) -> JSONResponse:
+    request: Request,
+    session_user: Dict[str, str] = Depends(require_admin),
+    parking_lot_id: Optional[str] = Query(None, description="Only the codes valid for this parking lot")
+) -> FastJSONResponse:
     """
     List all discount codes.
     
     Logic:
     1. Enforce ADMIN role.
-    2. Return all records.
+    2. Answer 304 if the client's If-None-Match still matches the discounts table version.
+    3. Return all records with their ETag.
+    4. With parking_lot_id: Only that lot's codes, read through the (parking_lot_id, is_hotel_code, code) index.
     """
     try:
-        discount_codes = load_discounts_data_from_db() or []
-        return JSONResponse(content=discount_codes, status_code=status.HTTP_200_OK)
+        etag = etag_services.table_etag(etag_services.DISCOUNT_TABLES, parking_lot_id or "")
+        cached = etag_services.not_modified(request, etag)
+        if cached is not None:
+            return cached
+
+        if parking_lot_id is not None:
+            discount_codes = get_discounts_by_lot(parking_lot_id, hotel_only=False)
+        else:
+            discount_codes = load_discounts_data_from_db() or []
+        return FastJSONResponse(content=discount_codes, status_code=status.HTTP_200_OK, headers={"ETag": etag})
     
     except Exception as e:
         logger.error(f"Failed to load discount codes: {e}")
@@ -427,7 +465,7 @@ def get_all_discount_codes(
 def get_discount_code_by_code(
     code: str,
     session_user: Dict[str, str] = Depends(require_admin)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Retrieve a specific discount code.
     """
@@ -439,7 +477,7 @@ def get_discount_code_by_code(
                 detail=f"Discount code '{code}' not found"
             )
         
-        return JSONResponse(content=discount_code, status_code=status.HTTP_200_OK)
+        return FastJSONResponse(content=discount_code, status_code=status.HTTP_200_OK)
     
     except HTTPException:
         raise
@@ -462,7 +500,7 @@ def update_discount_code(
     code: str,
     discount_update: DiscountCodeCreate,
     session_user: Dict[str, str] = Depends(require_admin)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Update discount code details.
     
@@ -480,17 +518,23 @@ def update_discount_code(
             )
         
         # Update the discount code
-        updated_discount = existing_discount.copy()
-        updated_discount.update({
+        changes = {
             "discount_type": discount_update.discount_type,
             "discount_value": discount_update.discount_value,
             "max_uses": discount_update.max_uses,
             "expires_at": discount_update.expires_at
-        })
+        }
+        updated_discount = {**existing_discount, **changes}
         
-        # Save the updated discount code
+        # Save the updated discount code, unless it changed since we read it
+        version = existing_discount.get("version")
         try:
-            update_existing_discount_in_db(code, updated_discount)
+            update_existing_discount_in_db(code, changes, version)
+        except VersionConflictError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Discount code was modified by another request, please retry"
+            )
         except Exception as e:
             logger.error(f"Failed to update discount code: {e}")
             raise HTTPException(
@@ -498,9 +542,11 @@ def update_discount_code(
                 detail="Failed to update discount code"
             )
         
+        if version is not None:
+            updated_discount["version"] = version + 1
         logger.info(f"Discount code updated: {code} by {session_user['username']}")
         
-        return JSONResponse(content=updated_discount, status_code=status.HTTP_200_OK)
+        return FastJSONResponse(content=updated_discount, status_code=status.HTTP_200_OK)
     
     except HTTPException:
         raise
@@ -522,7 +568,7 @@ def update_discount_code(
 def deactivate_discount_code(
     code: str,
     session_user: Dict[str, str] = Depends(require_admin)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Deactivate a discount code so it can no longer be used.
     """
@@ -539,9 +585,15 @@ def deactivate_discount_code(
         updated_discount = existing_discount.copy()
         updated_discount["active"] = False
         
-        # Save the updated discount code
+        # Save the updated discount code, unless it changed since we read it
+        version = existing_discount.get("version")
         try:
-            update_existing_discount_in_db(code, updated_discount)
+            update_existing_discount_in_db(code, {"active": False}, version)
+        except VersionConflictError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Discount code was modified by another request, please retry"
+            )
         except Exception as e:
             logger.error(f"Failed to deactivate discount code: {e}")
             raise HTTPException(
@@ -549,9 +601,11 @@ def deactivate_discount_code(
                 detail="Failed to deactivate discount code"
             )
         
+        if version is not None:
+            updated_discount["version"] = version + 1
         logger.info(f"Discount code deactivated: {code} by {session_user['username']}")
         
-        return JSONResponse(content=updated_discount, status_code=status.HTTP_200_OK)
+        return FastJSONResponse(content=updated_discount, status_code=status.HTTP_200_OK)
     
     except HTTPException:
         raise
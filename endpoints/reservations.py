@@ -1,15 +1,21 @@
 from fastapi import APIRouter, HTTPException, Request, status, Depends
-from fastapi.responses import JSONResponse
+from utils import async_storage_utils
+from utils.json_response import FastJSONResponse
 from typing import Dict, List, Optional, Any
 from models.reservations_model import CreateReservation, UpdateReservation
 import logging
 from utils.storage_utils import (
     load_reservation_data,
-    save_reservation_data,
-    load_parking_lot_data,
-    save_parking_lot_data,
+    save_new_reservation_to_db,
+    delete_reservation_from_db,
+    update_existing_reservation_in_db,
+    VersionConflictError,
+    allocate_id,
+    get_table_version,
 )
 from utils.session_manager import get_session
+from services.occupancy_services import reserve_space, release_space
+from services import lifecycle_services, lot_cache_services, reservation_index_services
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -20,7 +26,7 @@ ADMIN = "ADMIN"
 
 # --- Helper Functions ---
 
-def require_auth(request: Request) -> Dict[str, str]:
+async def require_auth(request: Request) -> Dict[str, str]:
     auth_token = request.headers.get("Authorization")
 
     if not auth_token:
@@ -35,28 +41,25 @@ def require_auth(request: Request) -> Dict[str, str]:
 
     return session_user
 
-def find_earliest_available_time(parking_lot_id: str, reservations: List[Dict[str, Any]]) -> Optional[str]:
-    """find the earliest end_time from all active reservations for a specific parking lot
-    (returns earliest end_time as string, none if no reservations)"""
-    active_reservations = [
-        res
-        for res in reservations
-        if res.get("parking_lot_id") == parking_lot_id
-        and res.get("status") in ["pending", "confirmed"]
-        and res.get("end_time")
-    ]
-    if not active_reservations:
-        return None
-    # parsing all end_times and finding earliest
-    earliest_time = None
-    for res in active_reservations:
-        try:
-            end_time = datetime.strptime(res["end_time"], "%Y-%m-%dT%H:%M")
-            if earliest_time is None or end_time < earliest_time:
-                earliest_time = end_time
-        except (ValueError, KeyError):
-            continue
-    return earliest_time.strftime("%Y-%m-%dT%H:%M") if earliest_time else None
+async def raise_lot_full(
+    parking_lot_id: str, capacity: int, start_time: str, end_time: str, reservation_id: Optional[str] = None
+):
+    """raise a 409 telling when a space is free again for the requested duration"""
+    # The sweep over the lot's reservations can take a while on busy lots, keep it off the event loop
+    earliest_available = await async_storage_utils.run(
+        reservation_index_services.earliest_available_time,
+        parking_lot_id,
+        capacity,
+        start_time,
+        end_time,
+        reservation_id,
+    )
+    if earliest_available is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Parking lot is currently full")
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Parking lot is full. Earliest available time is {earliest_available}",
+    )
 
 
 def find_reservation_by_id(
@@ -77,19 +80,9 @@ def find_reservation_index_by_id(
     return None
 
 
-def get_next_reservation_id(reservations_list: List[Dict[str, Any]]) -> str:
-
-    if not reservations_list:
-        return "1"
-    max_id = 0
-    for res in reservations_list:
-        try:
-            res_id_int = int(res.get("id", 0))
-            if res_id_int > max_id:
-                max_id = res_id_int
-        except (ValueError, TypeError):
-            continue
-    return str(max_id + 1)
+def holds_space(reservation: Dict[str, Any]) -> bool:
+    """Pending and confirmed reservations (and older rows without a status) hold a space in their lot."""
+    return (reservation.get("status") or "pending") in reservation_index_services.ACTIVE_STATUSES
 
 
 router = APIRouter(
@@ -116,9 +109,9 @@ router = APIRouter(
         409: {"description": "Parking lot is full"}
         }
 )
-def create_reservation(
+async def create_reservation(
     reservation_data: CreateReservation, session_user: Dict[str, str] = Depends(require_auth)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Create a reservation for a parking lot
     - **Users**: Can only create reservations for themselves.
@@ -127,15 +120,15 @@ def create_reservation(
     """
     try:
     
-        reservations = load_reservation_data()
-        parking_lots = load_parking_lot_data()
-        if parking_lots is None or reservations is None:
+        # Read before the reservations, a write landing in between then shows up as a newer version
+        reservations_version = await async_storage_utils.run(get_table_version, "reservations")
+        reservations = await async_storage_utils.run(load_reservation_data)
+        parking_lot = await async_storage_utils.run(lot_cache_services.get_lot, reservation_data.parking_lot_id)
+        if reservations is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error loading data")
     except Exception as e:
         logging.error(f"Unexpected error when loading data: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error loading data")
-    
-    parking_lot = next((lot for lot in parking_lots if lot.get("id") == reservation_data.parking_lot_id), None)
 
     if parking_lot is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parking lot not found")
@@ -144,33 +137,16 @@ def create_reservation(
             status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail="end_time must be after start_time"
         )
 
-    if parking_lot["reserved"] >= parking_lot["capacity"]:
-        earliest_available = find_earliest_available_time(reservation_data.parking_lot_id, reservations)
-        if earliest_available:
-            try:
-                requested_start = datetime.strptime(reservation_data.start_time, "%Y-%m-%dT%H:%M")
-                earliest_available_dt = datetime.strptime(earliest_available, "%Y-%m-%dT%H:%M")
-                if requested_start < earliest_available_dt:
-                    raise HTTPException(
-                        status_code=status.HTTP_409_CONFLICT,
-                        detail=f"Parking lot is full. Earliest available time is {earliest_available}",
-                    )
-            except ValueError as e:
-                logging.error(f"Error parsing datetime: {e}")
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid datetime format")
-        else:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Parking lot is currently full")
-
     if session_user.get("role") == ADMIN:
         if not reservation_data.user_id:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 content={"error": "Required field missing", "field": "user_id"},
             )
     else:
         reservation_data.user_id = session_user["username"]
 
-    rid = get_next_reservation_id(reservations)
+    rid = await async_storage_utils.run(allocate_id, "reservations")
 
     reservation_data_dict = reservation_data.model_dump()
     reservation_data_dict["id"] = rid
@@ -178,18 +154,34 @@ def create_reservation(
         datetime.now().replace(microsecond=0).isoformat(timespec="minutes").replace("+00:00", "")
     )
 
-    reservations.append(reservation_data_dict)
-
-    parking_lot["reserved"] += 1
+    # Capacity is checked against the reservations that overlap the requested window. The check
+    # and the insert into the index are atomic within this worker, reservations written by
+    # other workers reach the index through the table version checked by ensure_current()
+    # A rebuild and the capacity sweep are CPU work under the index lock, both run off the event loop
+    await async_storage_utils.run(reservation_index_services.ensure_current, lambda: reservations, reservations_version)
+    capacity = parking_lot.get("capacity") or 0
+    if not await async_storage_utils.run(reservation_index_services.book, reservation_data_dict, capacity):
+        await raise_lot_full(
+            reservation_data.parking_lot_id, capacity, reservation_data.start_time, reservation_data.end_time
+        )
+    # Keep the live counter in step, bookings for different times may add up past the capacity
+    await async_storage_utils.run(reserve_space, reservation_data.parking_lot_id, enforce_capacity=False)
 
     try:
-        save_reservation_data(reservations)
-        save_parking_lot_data(parking_lots)
+        # Only the new row is written, rewriting the loaded list would undo concurrent updates
+        await async_storage_utils.run(
+            save_new_reservation_to_db,
+            reservation_data_dict,
+            reservation_index_services.recorder(rid, reservation_data_dict),
+        )
     except Exception as e:
         logging.error(f"Error saving data: {e}")
+        reservation_index_services.remove(rid)
+        await async_storage_utils.run(release_space, reservation_data.parking_lot_id)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving data")
+    lifecycle_services.scheduler.schedule(reservation_data_dict["end_time"])
 
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_201_CREATED,
         content={"status": "Success", "reservation": reservation_data_dict},
     )
@@ -206,7 +198,7 @@ def create_reservation(
         404: {"description": "Reservation not found"}
     }
     )
-def get_reservation_by_id(reservation_id: str, session_user: Dict[str, str] = Depends(require_auth)):
+async def get_reservation_by_id(reservation_id: str, session_user: Dict[str, str] = Depends(require_auth)):
     """
     Retrieve a reservation by id
     - **Users**: Can only retrieve their own reservation
@@ -214,7 +206,7 @@ def get_reservation_by_id(reservation_id: str, session_user: Dict[str, str] = De
     - **Validation**: Looks if the user is allowed to retrieve the reservation data, checks if the reservation exists.
     """
     try:
-        reservations = load_reservation_data()
+        reservations = await async_storage_utils.run(load_reservation_data)
         if reservations is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error loading data")
     except Exception as e:
@@ -231,7 +223,7 @@ def get_reservation_by_id(reservation_id: str, session_user: Dict[str, str] = De
         ):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-        return JSONResponse(status_code=status.HTTP_200_OK, content={"reservation": reservation})
+        return FastJSONResponse(status_code=status.HTTP_200_OK, content={"reservation": reservation})
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
 
@@ -249,7 +241,7 @@ def get_reservation_by_id(reservation_id: str, session_user: Dict[str, str] = De
         404: {"description": "Parking lot or reservation not found"},
     }
     )
-def update_reservation(
+async def update_reservation(
     reservation_id: str,
     reservation_data: UpdateReservation,
     session_user: Dict[str, str] = Depends(require_auth),
@@ -268,9 +260,11 @@ def update_reservation(
         Gives an error if the reservation is not found.
     """
     try:
-        reservations = load_reservation_data()
-        parking_lots = load_parking_lot_data()
-        if parking_lots is None or reservations is None:
+        # Read before the reservations, a write landing in between then shows up as a newer version
+        reservations_version = await async_storage_utils.run(get_table_version, "reservations")
+        reservations = await async_storage_utils.run(load_reservation_data)
+        new_parking_lot = await async_storage_utils.run(lot_cache_services.get_lot, reservation_data.parking_lot_id)
+        if reservations is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error loading data")
     except Exception as e:
         logging.error(f"Unexpected error when loading data: {e}")
@@ -302,7 +296,7 @@ def update_reservation(
 
         if session_user.get("role") == ADMIN:
             if not reservation_data.user_id:
-                return JSONResponse(
+                return FastJSONResponse(
                     status_code=status.HTTP_422_UNPROCESSABLE_CONTENT   ,
                     content={"error": "Required field missing", "field": "user_id"},
                 )
@@ -313,35 +307,58 @@ def update_reservation(
         old_parking_lot_id = old_reservation.get("parking_lot_id")
         new_parking_lot_id = reservation_data.parking_lot_id
 
-        # Find new parking lot
-        new_parking_lot = next((lot for lot in parking_lots if lot.get("id") == new_parking_lot_id), None)
         if new_parking_lot is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="New parking lot not found")
 
-        if old_parking_lot_id != new_parking_lot_id:
-            # Find old parking lot
-            old_parking_lot = next((lot for lot in parking_lots if lot.get("id") == old_parking_lot_id), None)
-            
-            if old_parking_lot:
-                old_parking_lot["reserved"] = max(
-                    0, old_parking_lot["reserved"] - 1
-                )
-
-            new_parking_lot["reserved"] += 1
-
         updated_reservation_dict = reservation_data.model_dump()
         updated_reservation_dict["id"] = reservation_id
+        # Users can't send a status, leaving it out keeps the stored one instead of reviving an expired reservation
+        if reservation_data.status is None:
+            updated_reservation_dict["status"] = old_reservation.get("status")
+
+        await async_storage_utils.run(
+            reservation_index_services.ensure_current, lambda: reservations, reservations_version
+        )
+        capacity = new_parking_lot.get("capacity") or 0
+        if not await async_storage_utils.run(reservation_index_services.book, updated_reservation_dict, capacity):
+            await raise_lot_full(
+                new_parking_lot_id, capacity, reservation_data.start_time, reservation_data.end_time, reservation_id
+            )
 
-        reservations[reservation_index] = updated_reservation_dict
+        # Only a reservation that still holds a space takes it along to the new lot
+        moved_lot = old_parking_lot_id != new_parking_lot_id and holds_space(old_reservation)
+        if moved_lot:
+            await async_storage_utils.run(reserve_space, new_parking_lot_id, enforce_capacity=False)
 
+        # Only this row is written, and only if nobody changed it since it was loaded
+        version = old_reservation.get("version")
         try:
-            save_reservation_data(reservations)
-            save_parking_lot_data(parking_lots)
+            await async_storage_utils.run(
+                update_existing_reservation_in_db,
+                reservation_id,
+                updated_reservation_dict,
+                version,
+                reservation_index_services.recorder(reservation_id, updated_reservation_dict),
+            )
         except Exception as e:
+            reservation_index_services.upsert(old_reservation)
+            if moved_lot:
+                await async_storage_utils.run(release_space, new_parking_lot_id)
+            if isinstance(e, VersionConflictError):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Reservation was modified by another request, please retry",
+                )
             logging.error(f"Error saving data: {e}")
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving data")
+        if version is not None:
+            updated_reservation_dict["version"] = version + 1
+        lifecycle_services.scheduler.schedule(updated_reservation_dict["end_time"])
+
+        if moved_lot:
+            await async_storage_utils.run(release_space, old_parking_lot_id)
 
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_200_OK,
             content={"status": "Updated", "reservation": updated_reservation_dict},
         )
@@ -361,7 +378,7 @@ def update_reservation(
         404: {"description": "Reservation not found"},
     }
 )
-def delete_reservation(reservation_id: str, session_user: Dict[str, str] = Depends(require_auth)):
+async def delete_reservation(reservation_id: str, session_user: Dict[str, str] = Depends(require_auth)):
     """
     Delete a reservation by id
     - **Users**: Can only delete their own reservation.
@@ -372,9 +389,8 @@ def delete_reservation(reservation_id: str, session_user: Dict[str, str] = Depen
     - Checks if the reservation exists
     """
     try:
-        reservations = load_reservation_data()
-        parking_lots = load_parking_lot_data()
-        if parking_lots is None or reservations is None:
+        reservations = await async_storage_utils.run(load_reservation_data)
+        if reservations is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error loading data")
     except Exception as e:
         logging.error(f"Unexpected error when loading data: {e}")
@@ -393,26 +409,28 @@ def delete_reservation(reservation_id: str, session_user: Dict[str, str] = Depen
         ] == reservation_to_delete.get("user_id"):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-        del reservations[reservation_index]
-
-        # Find parking lot
-        parking_lot = next((lot for lot in parking_lots if lot.get("id") == pid), None)
-
-        if parking_lot:
-            parking_lot["reserved"] = max(0, parking_lot["reserved"] - 1)
-        else:
-            logging.warning(
-                f"Reservation {reservation_id} was deleted, but its parking lot {pid} was not found."
-            )
-
         try:
-            save_reservation_data(reservations)
-            save_parking_lot_data(parking_lots)
+            deleted = await async_storage_utils.run(
+                delete_reservation_from_db, reservation_id, reservation_index_services.recorder(reservation_id, None)
+            )
         except Exception as e:
             logging.error(f"Error saving data: {e}")
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving data")
+        reservation_index_services.remove(reservation_id)
+        if deleted is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+
+        # An expired or cancelled reservation gave its space back already, the deleted row
+        # tells since the lifecycle scheduler may have expired it after it was loaded
+        if holds_space(deleted):
+            if await async_storage_utils.run(lot_cache_services.get_lot, pid):
+                await async_storage_utils.run(release_space, pid)
+            else:
+                logging.warning(
+                    f"Reservation {reservation_id} was deleted, but its parking lot {pid} was not found."
+                )
 
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_200_OK, content={"status": "Deleted", "id": reservation_id}
         )
 
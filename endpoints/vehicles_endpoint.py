@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, Query
 from typing import Optional
 from datetime import datetime
 import uuid
@@ -13,12 +13,13 @@ from models.vehicles_model import (
 )
 from utils.storage_utils import (
     get_vehicle_data_by_user,
+    get_vehicle_by_plate,
     update_existing_vehicle_in_db,
     delete_vehicle_from_db,
-    load_vehicle_data_from_db,
     save_vehicle_data_to_db,
-    load_reservation_data_from_db,
-    load_parking_sessions_data_from_db,
+    get_reservations_by_vehicle,
+    get_vehicle_history_by_plate,
+    VersionConflictError,
 )
 from utils.session_manager import get_session
 
@@ -26,20 +27,21 @@ from utils.session_manager import get_session
 router = APIRouter(tags=["vehicles"])
 
 
-def normalize_plate(p: str) -> str:
-    """Normalize a license plate by removing dashes, converting to uppercase and stripping whitespaces."""
-    if not p:
-        return ""
-    return p.replace("-", "").upper().strip()
+def validate_before(before: Optional[str]) -> None:
+    """Rejects a pagination cursor that is not an ISO timestamp."""
+    if before is None:
+        return
+    try:
+        datetime.fromisoformat(before)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="before must be an ISO 8601 timestamp")
 
 
 def find_vehicle_by_license_plate(license_plate: str):
     """Find a vehicle by it's license plate"""
-    lid = normalize_plate(license_plate)
-    vehicles = load_vehicle_data_from_db()
-    for v in vehicles:
-        if normalize_plate(v.get("license_plate", "")) == lid:
-            return v
+    vehicle = get_vehicle_by_plate(license_plate)
+    if vehicle is not None:
+        return vehicle
     raise HTTPException(status_code=404, detail="Vehicle not found")
 
 
@@ -64,11 +66,8 @@ def create_vehicle(
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     session_user = get_session(token)
-    vehicles = load_vehicle_data_from_db()
-
-    for v in vehicles:
-        if normalize_plate(v["license_plate"]) == normalize_plate(payload.license_plate):
-            raise HTTPException(status_code=400, detail="Vehicle already exists")
+    if get_vehicle_by_plate(payload.license_plate) is not None:
+        raise HTTPException(status_code=400, detail="Vehicle already exists")
     new_vehicle = {
         "id": str(uuid.uuid4()),
         "user_id": str(session_user["username"]),
@@ -156,7 +155,13 @@ def update_vehicle(
             "year": payload.year,
         }
     )
-    update_existing_vehicle_in_db(target_vehicle["id"], target_vehicle)
+    version = target_vehicle.get("version")
+    try:
+        update_existing_vehicle_in_db(target_vehicle["id"], target_vehicle, version)
+    except VersionConflictError:
+        raise HTTPException(status_code=409, detail="Vehicle was modified by another request, please retry")
+    if version is not None:
+        target_vehicle["version"] = version + 1
     return target_vehicle
 
 
@@ -201,11 +206,15 @@ def delete_vehicle(
 )
 def get_vehicle_reservations(
     license_plate: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of reservations"),
+    before: Optional[str] = Query(None, description="Only reservations starting before this time"),
     authorization: Optional[str] = Header(None, description="Bearer token for authentication"),
 ):
     """
-    Get all reservations for a specific vehicle
+    Get the reservations for a specific vehicle, latest start time first
     :param license_plate: license plate of the vehicle
+    :param limit: optional page size
+    :param before: optional cursor, the next_before of the previous page
     :param authorization: authentication token from request header
     :return: dict containing list of reservations for the vehicle
     """
@@ -221,17 +230,16 @@ def get_vehicle_reservations(
         raise HTTPException(
             status_code=403, detail="Forbidden: cannot access another users vehicle reservations"
         )
+    validate_before(before)
     try:
-        all_reservations = load_reservation_data_from_db()
+        vehicle_reservations = get_reservations_by_vehicle(target_vehicle["id"], limit, before)
     except Exception:
         raise HTTPException(status_code=500, detail="Error loading reservation data")
 
-    vehicle_reservations = [
-        reservation
-        for reservation in all_reservations
-        if reservation.get("vehicle_id") == target_vehicle["id"]
-    ]
-    return {"reservations": vehicle_reservations}
+    next_before = None
+    if limit is not None and len(vehicle_reservations) == limit:
+        next_before = vehicle_reservations[-1].get("start_time")
+    return {"reservations": vehicle_reservations, "next_before": next_before}
 
 
 @router.get(
@@ -242,12 +250,16 @@ def get_vehicle_reservations(
 )
 def get_vehicle_history(
     license_plate: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of sessions"),
+    before: Optional[str] = Query(None, description="Only sessions stopped before this time"),
     authorization: Optional[str] = Header(None, description="Bearer token for authentication"),
 ):
     """
-    Get the parking session history for a specific vehicle
-    :param license_plate: Description
-    :param authorization: Description
+    Get the parking session history for a specific vehicle, most recently stopped first
+    :param license_plate: license plate of the vehicle
+    :param limit: optional page size
+    :param before: optional cursor, the next_before of the previous page
+    :param authorization: authentication token from request header
     :return: dict containing list of completed parking sessions with parking lot.
     """
     token = authorization
@@ -260,26 +272,13 @@ def get_vehicle_history(
         and session_user.get("role", "").upper() != "ADMIN"
     ):
         raise HTTPException(status_code=403, detail="Forbidden, cannot access another users vehicles history")
-    from utils.storage_utils import load_parking_lot_data
+    validate_before(before)
 
-    parking_lots = load_parking_lot_data()
-    completed_sessions = []
-    normalized_plate = normalize_plate(license_plate)
-    sessions = load_parking_sessions_data_from_db()
-    for session in sessions:
-        if (
-            normalize_plate(session.get("licenseplate", "")) == normalized_plate
-            and session.get("stopped") is not None
-        ):
-            lot_id = session.get("parking_lot_id")
-            lot_data = next((lot for lot in parking_lots if lot.get("id") == lot_id), {}) if lot_id else {}
-            session_with_context = {
-                "session_id": session["id"],
-                "parking_lot_id": lot_id,
-                "parking_lot_name": lot_data.get("name"),
-                "parking_lot_address": lot_data.get("address"),
-                **session,
-            }
-            completed_sessions.append(session_with_context)
-    completed_sessions.sort(key=lambda x: x.get("stopped", ""), reverse=True)
-    return {"history": completed_sessions}
+    completed_sessions = [
+        {"session_id": session["id"], **session}
+        for session in get_vehicle_history_by_plate(license_plate, limit, before)
+    ]
+    next_before = None
+    if limit is not None and len(completed_sessions) == limit:
+        next_before = completed_sessions[-1]["stopped"]
+    return {"history": completed_sessions, "next_before": next_before}
@@ -1,5 +1,8 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from endpoints.analytics_endpoint import router as analytics_router
 from endpoints.auth import router as auth_router
 from endpoints.billing_endpoint import router as billing_router
 from endpoints.parking_lots import router as parking_lots_router
@@ -9,14 +12,36 @@ from endpoints.profile_endpoint import router as profile_router
 from endpoints.hotel_manager_endpoint import router as hotel_manager_router
 from endpoints.reservations import router as reservations_router
 from endpoints.vehicles_endpoint import router as vehicle_router
+from services import lifecycle_services
+from utils import storage_utils
 from utils.storage_utils import init_db
+from utils.wal_checkpoint import CheckpointManager
+from utils.json_response import FastJSONResponse
 from dotenv import load_dotenv
 from scripts.insert_hash import start
 
 
 load_dotenv()
 init_db()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keeps the WAL from growing without bound while the server takes writes
+    checkpoints = CheckpointManager()
+    if not storage_utils.use_mock_data:
+        checkpoints.start()
+        # Expires reservations and frees spaces of abandoned sessions, in one worker at a time
+        lifecycle_services.scheduler.start()
+    yield
+    lifecycle_services.scheduler.stop()
+    checkpoints.stop()
+
+
+# Handlers returning plain values still pass jsonable_encoder, FastJSONResponse only speeds up the
+# encoding after it, so the list endpoints return a FastJSONResponse themselves. Handlers with a
+# response_model keep FastAPI's own pydantic serialisation.
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 
 # This is auth router imported from endpoints
 # folder. Prefix is the grouping of the endpoint
@@ -33,6 +58,7 @@ app.include_router(refunds_router)
 app.include_router(reservations_router)
 app.include_router(profile_router)
 app.include_router(hotel_manager_router)
+app.include_router(analytics_router)
 
 
 @app.get("/")
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -74,6 +74,67 @@ class HotelDiscountCodeCreate(BaseModel):
             return v
 
 
+class HotelGuest(BaseModel):
+    """one guest of a batch of hotel discount codes"""
+
+    guest_name: Optional[str] = Field(
+        None, max_length=100, description="Name of the guest (optional)", examples=["Jane Doe"]
+    )
+    notes: Optional[str] = Field(
+        None, max_length=500, description="Additional notes about this code", examples=["Room 204"]
+    )
+
+
+class HotelDiscountCodeBatchCreate(BaseModel):
+    """model for hotel managers to create 100% discount codes for many guests at once,
+    either one per listed guest or a number of codes without names"""
+
+    check_in_date: str = Field(
+        ..., description="Check-in date of all guests (ISO format YYYY-MM-DD)", examples=["2025-07-15"]
+    )
+    check_out_date: str = Field(
+        ..., description="Check-out date of all guests (ISO format YYYY-MM-DD)", examples=["2025-07-20"]
+    )
+    guests: Optional[List[HotelGuest]] = Field(
+        None, min_length=1, max_length=1000, description="One code is generated per guest"
+    )
+    count: Optional[int] = Field(None, ge=1, le=1000, description="Number of codes, when no guests are listed")
+    prefix: str = Field(
+        "HOTEL",
+        min_length=1,
+        max_length=20,
+        pattern=r"^[A-Za-z0-9_]+$",
+        description="Prefix of the generated codes",
+        examples=["CONF2025"],
+    )
+    notes: Optional[str] = Field(
+        None, max_length=500, description="Notes for codes whose guest has none", examples=["Conference"]
+    )
+
+    @field_validator("check_in_date", "check_out_date")
+    @classmethod
+    def validate_dates(cls, v):
+        try:
+            datetime.fromisoformat(v)
+        except ValueError:
+            raise ValueError(f"Invalid date format: {v}. Use ISO format (YYYY-MM-DD)")
+        return v
+
+    @field_validator("check_out_date")
+    @classmethod
+    def validate_checkout_after_checkin(cls, v, info):
+        if "check_in_date" in info.data:
+            if datetime.fromisoformat(v) <= datetime.fromisoformat(info.data["check_in_date"]):
+                raise ValueError("Check-out date must be after check-in date")
+        return v
+
+    @model_validator(mode="after")
+    def validate_guests_or_count(self):
+        if (self.guests is None) == (self.count is None):
+            raise ValueError("Give either a list of guests or a count")
+        return self
+
+
 class HotelDiscountCode(BaseModel):
     """complete hotel discount code model"""
 
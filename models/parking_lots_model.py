@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 class Coordinates(BaseModel):
     lat: float
@@ -49,4 +49,18 @@ class UpdateParkingSessionFinished(BaseModel):
     user: Optional[str] = None
     duration_minutes: Optional[int] = None
     cost: Optional[float] = None
-    payment_status: Optional[str] = None
\ No newline at end of file
+    payment_status: Optional[str] = None
+
+
+class GateEvent(BaseModel):
+    parking_lot_id: str
+    licenseplate: str = Field(..., min_length=1)
+    event: Literal["entry", "exit"]
+    # When the camera saw the car, the time of arrival at the server when left out
+    timestamp: Optional[datetime] = None
+    # The camera's own reference, echoed back in the result
+    event_id: Optional[str] = None
+
+
+class GateEventBatch(BaseModel):
+    events: List[GateEvent] = Field(..., min_length=1, max_length=10_000)
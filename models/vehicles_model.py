@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field, field_validator
 import re
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 
 class VehicleCreate(BaseModel):
@@ -65,9 +65,11 @@ class VehicleReservationsResponse(BaseModel):
     """Vehicle reservations list"""
 
     reservations: List[dict]
+    next_before: Optional[str] = Field(None, description="Pass as before to get the next page")
 
 
 class VehicleHistoryResponse(BaseModel):
     """Vehicle parking history"""
 
     history: List[dict]
+    next_before: Optional[str] = Field(None, description="Pass as before to get the next page")
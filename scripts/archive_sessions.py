@@ -0,0 +1,29 @@
+import argparse
+import time
+
+from utils import storage_utils
+
+
+def run(months: int, batch_size: int):
+    start = time.perf_counter()
+    moved = storage_utils.archive_parking_sessions(months, batch_size)
+    for month, sessions in moved.items():
+        print(f"{month}: {sessions:,} sessions moved to {storage_utils.session_archive_dir()}")
+    print(f"Archived {sum(moved.values()):,} sessions in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Moves old completed parking sessions to monthly archive files")
+    parser.add_argument(
+        "--months",
+        type=int,
+        default=storage_utils.SESSION_ARCHIVE_AFTER_MONTHS,
+        help="Archive sessions stopped before the start of the month this many months ago",
+    )
+    parser.add_argument("--batch-size", type=int, default=storage_utils.SESSION_ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    storage_utils.use_mock_data = False
+    run(args.months, args.batch_size)
+
+
+# python -m scripts.archive_sessions  run it monthly, e.g. from cron, to keep parking_sessions small
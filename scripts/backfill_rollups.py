@@ -0,0 +1,23 @@
+import argparse
+import time
+
+from utils import storage_utils
+
+
+def run():
+    start = time.perf_counter()
+    written = storage_utils.rebuild_lot_rollups()
+    for bucket, rows in written.items():
+        print(f"{bucket}: {rows:,} rollup rows")
+    print(f"Rebuilt the lot rollups in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(
+        description="Recomputes the hourly and daily lot rollups from all sessions, payments and refunds"
+    ).parse_args()
+    storage_utils.use_mock_data = False
+    run()
+
+
+# python -m scripts.backfill_rollups  once after upgrading, or to repair the rollups after a bulk import
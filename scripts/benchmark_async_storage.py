@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import httpx
+from fastapi import Depends, HTTPException, Request, status
+
+from endpoints.payments_endpoint import ROLE_ADMIN
+from main import app
+from utils.json_response import FastJSONResponse
+from utils.session_manager import add_session, get_session
+from utils.storage_utils import get_payment_data_by_id
+
+TOKEN = "benchmark-admin"
+PORT = 8765
+
+# The server process imports this module, it needs the session and the sync twin route too
+add_session(TOKEN, {"username": "admin", "role": ROLE_ADMIN})
+
+
+def sync_require_auth(request: Request) -> Dict[str, str]:
+    session_user = get_session(request.headers.get("Authorization"))
+    if not session_user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired session token")
+    return session_user
+
+
+@app.get("/benchmark/sync/payments/{payment_id}")
+def sync_get_payment_by_id(payment_id: str, session_user: Dict[str, str] = Depends(sync_require_auth)):
+    """GET /payments/{id} as it was before it became async: a sync handler on FastAPI's threadpool."""
+    payment = get_payment_data_by_id(payment_id)
+    if not payment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
+    return FastJSONResponse(content=payment)
+
+
+def seed(db_path: Path, rows: int):
+    env = {**os.environ, "USE_MOCK_DATA": "false", "TEST_DB_PATH": str(db_path)}
+    code = (
+        "from utils import storage_utils\n"
+        f"storage_utils.save_json_to_db('payments', [{{'transaction': str(i), 'amount': 10.0, 'initiator': 'admin',"
+        f" 't_data': {{'amount': 10.0, 'method': 'ideal'}}, 'session_id': str(i)}} for i in range({rows})])\n"
+    )
+    subprocess.run([sys.executable, "-c", code], env=env, check=True, stdout=subprocess.DEVNULL)
+    return env
+
+
+async def get(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str) -> int:
+    """One keep-alive GET. httpx costs more CPU per request than the server does, on a small box it would be
+    the client that is measured."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAuthorization: {TOKEN}\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+    await reader.readexactly(length)
+    return int(head.split(b" ", 2)[1])
+
+
+async def load(path: str, clients: int, requests_per_client: int, rows: int):
+    latencies = []
+
+    async def one_client(offset: int):
+        # Connections are opened over the first second, a burst of 500 connects gets reset on loopback
+        await asyncio.sleep(offset / clients)
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        try:
+            for i in range(requests_per_client):
+                start = time.perf_counter()
+                status_code = await get(reader, writer, path.format(id=(offset * requests_per_client + i) % rows))
+                latencies.append(time.perf_counter() - start)
+                assert status_code == 200, status_code
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_client(c) for c in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def wait_for_server():
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/")
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run(clients: int, requests_per_client: int, rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = seed(Path(tmp) / "benchmark.db", rows)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "scripts.benchmark_async_storage:app", "--port", str(PORT),
+             "--log-level", "warning", "--no-access-log"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_server()
+            results = {}
+            for name, path in (
+                ("sync handler, threadpool", "/benchmark/sync/payments/{id}"),
+                ("async handler, storage pool", "/payments/{id}"),
+            ):
+                asyncio.run(load(path, clients, 2, rows))  # warm up
+                results[name] = asyncio.run(load(path, clients, requests_per_client, rows))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"clients: {clients}, requests per client: {requests_per_client}, payments: {rows}")
+    for name, (throughput, p50, p99) in results.items():
+        print(f"{name:30} {throughput:7.0f} req/s   p50 {p50 * 1000:6.1f} ms   p99 {p99 * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of GET /payments/{id} with sync and async handlers")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+    run(args.clients, args.requests, args.rows)
+
+
+# python -m scripts.benchmark_async_storage
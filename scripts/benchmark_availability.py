@@ -0,0 +1,61 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from services import availability_services, reservation_index_services
+from services.reservation_index_services import TIME_FORMAT
+
+
+def run(capacity: int, reservations: int, days: int, granularity: int):
+    rng = random.Random(5)
+    first_day = datetime(2099, 1, 1)
+    rows = []
+    for i in range(reservations):
+        start = first_day + timedelta(minutes=15 * rng.randrange(0, days * 96))
+        end = start + timedelta(minutes=15 * rng.randrange(1, 48))
+        rows.append({
+            "id": str(i),
+            "parking_lot_id": "1",
+            "start_time": start.strftime(TIME_FORMAT),
+            "end_time": end.strftime(TIME_FORMAT),
+            "status": "confirmed",
+        })
+    reservation_index_services.ensure_loaded(rows)
+    # Keep storage out of the measurement, only the sweep is timed
+    availability_services.storage_utils.get_open_sessions_by_lot = lambda parking_lot_id: []
+
+    window = (first_day.strftime(TIME_FORMAT), (first_day + timedelta(days=days)).strftime(TIME_FORMAT))
+
+    start = time.perf_counter()
+    buckets = availability_services.get_availability("1", capacity, *window, granularity)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        availability_services.get_availability("1", capacity, *window, granularity)
+    cached = (time.perf_counter() - start) / 1000
+
+    reservation_index_services.book({**rows[0], "id": "new"}, capacity * 10)
+    start = time.perf_counter()
+    availability_services.get_availability("1", capacity, *window, granularity)
+    after_write = time.perf_counter() - start
+
+    print(f"lot:                    {capacity} spaces, {reservations} reservations over {days} days")
+    print(f"buckets:                {len(buckets)} of {granularity} min, lowest free {min(b['free'] for b in buckets)}")
+    print(f"first request:          {cold * 1000:.1f} ms")
+    print(f"cached request:         {cached * 1e6:.1f} us")
+    print(f"after a reservation:    {after_write * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark for the parking lot availability calendar")
+    parser.add_argument("--capacity", type=int, default=2_000)
+    parser.add_argument("--reservations", type=int, default=60_000)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--granularity", type=int, default=60, help="bucket size in minutes")
+    args = parser.parse_args()
+    run(args.capacity, args.reservations, args.days, args.granularity)
+
+
+# python -m scripts.benchmark_availability
@@ -0,0 +1,86 @@
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from models.parking_lots_model import GateEvent, ParkingSessionCreate
+from services import gate_event_services, lot_cache_services, parking_services
+from utils import storage_utils
+
+ADMIN = {"username": "gate-camera", "role": "ADMIN"}
+
+
+def setup(db_path: Path, lots: int, existing_sessions: int):
+    storage_utils.DB_PATH = db_path
+    storage_utils.use_mock_data = False
+    storage_utils.init_db()
+    storage_utils.save_json_to_db(
+        "parking_lots",
+        [
+            {"id": str(i), "name": f"Lot {i}", "capacity": 100_000, "reserved": 0, "tariff": 2.5, "daytariff": 20}
+            for i in range(1, lots + 1)
+        ],
+    )
+    # Finished sessions, the old per-car path loads and rewrites all of them
+    storage_utils.save_json_to_db(
+        "parking_sessions",
+        [
+            {
+                "id": str(i),
+                "parking_lot_id": str(i % lots + 1),
+                "licenseplate": f"OLD-{i}",
+                "started": "2025-01-01T08:00",
+                "stopped": "2025-01-01T10:00:00",
+            }
+            for i in range(1, existing_sessions + 1)
+        ],
+    )
+    lot_cache_services.invalidate()
+
+
+def camera_events(count: int, lots: int):
+    start = datetime(2026, 3, 1, 8, 0)
+    events = []
+    for i in range(count // 2):
+        lot = str(i % lots + 1)
+        events.append(GateEvent(event="entry", licenseplate=f"CAM-{i}", parking_lot_id=lot, timestamp=start))
+    for i in range(count // 2):
+        lot = str(i % lots + 1)
+        at = start + timedelta(minutes=30 + i % 300)
+        events.append(GateEvent(event="exit", licenseplate=f"CAM-{i}", parking_lot_id=lot, timestamp=at))
+    return events
+
+
+def run(events: int, batch_size: int, lots: int, existing_sessions: int, single_calls: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(Path(tmp) / "batch.db", lots, existing_sessions)
+        stream = camera_events(events, lots)
+        start = time.perf_counter()
+        for offset in range(0, len(stream), batch_size):
+            results = gate_event_services.process_gate_events(stream[offset : offset + batch_size], ADMIN)
+            assert all(result["status"] != "rejected" for result in results)
+        batch = time.perf_counter() - start
+
+        setup(Path(tmp) / "single.db", lots, existing_sessions)
+        start = time.perf_counter()
+        for i in range(single_calls):
+            parking_services.start_parking_session(str(i % lots + 1), ParkingSessionCreate(licenseplate=f"ONE-{i}"), ADMIN)
+        single = (time.perf_counter() - start) / single_calls
+
+    print(f"batched gate events:    {len(stream) / batch:,.0f} events/s ({batch_size} per batch)")
+    print(f"sessions/start per car: {1 / single:,.0f} events/s ({existing_sessions} sessions stored)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark for batched gate event ingestion")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--lots", type=int, default=20)
+    parser.add_argument("--existing-sessions", type=int, default=20_000)
+    parser.add_argument("--single-calls", type=int, default=20)
+    args = parser.parse_args()
+    run(args.events, args.batch_size, args.lots, args.existing_sessions, args.single_calls)
+
+
+# python -m scripts.benchmark_gate_events
@@ -0,0 +1,133 @@
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from endpoints import parking_lots as parking_lots_endpoint
+from endpoints import payments_endpoint
+from main import app
+from utils import storage_utils
+from utils.json_response import FastJSONResponse
+from utils.session_manager import add_session
+
+
+def make_payments(rows: int):
+    rng = random.Random(1)
+    return [
+        {
+            "transaction": f"{i:032x}",
+            "amount": round(rng.uniform(1, 60), 2),
+            "initiator": f"user{i % 500}",
+            "created_at": "01-01-2024 10:00:001704103200",
+            "completed": "01-01-2024 10:05:001704103500",
+            "hash": f"{rng.getrandbits(128):032x}",
+            "t_data": {"amount": 12.5, "date": "2024-01-01 10:05:00", "method": "ideal", "issuer": "ING", "bank": "ING"},
+            "session_id": str(i),
+            "parking_lot_id": str(i % 50),
+            "original_amount": None,
+            "discount_applied": None,
+            "discount_amount": None,
+        }
+        for i in range(rows)
+    ]
+
+
+def make_sessions(rows: int):
+    return [
+        {
+            "id": str(i),
+            "parking_lot_id": "1",
+            "licenseplate": f"AB-{i:06d}",
+            "started": "2024-01-01T10:00:00",
+            "stopped": "2024-01-01T12:00:00",
+            "user": f"user{i % 500}",
+            "duration_minutes": 120,
+            "cost": 5.0,
+            "payment_status": "Pending",
+        }
+        for i in range(rows)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(rows: int, repeat: int):
+    payments = make_payments(rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage_utils.DB_PATH = Path(tmp) / "benchmark.db"
+        storage_utils.use_mock_data = False
+        storage_utils.init_db()
+        storage_utils.save_json_to_db("payments", payments)
+        storage_utils.save_json_to_db("parking_sessions", make_sessions(rows))
+        add_session("benchmark-admin", {"username": "admin", "role": "ADMIN"})
+        client = TestClient(app)
+
+        def get_payments():
+            response = client.get("/payments", headers={"Authorization": "benchmark-admin"})
+            assert response.status_code == 200
+            return response.content
+
+        fast_body = get_payments()
+        fast = timed(get_payments, repeat)
+        payments_endpoint.FastJSONResponse = JSONResponse
+        try:
+            plain_body = get_payments()
+            plain = timed(get_payments, repeat)
+        finally:
+            payments_endpoint.FastJSONResponse = FastJSONResponse
+
+        # A handler returning its dict goes through jsonable_encoder before the default response class
+        def get_sessions():
+            response = client.get("/parking-lots/1/sessions", headers={"Authorization": "benchmark-admin"})
+            assert response.status_code == 200
+            return response.content
+
+        sessions_direct_body = get_sessions()
+        sessions_direct = timed(get_sessions, repeat)
+        parking_lots_endpoint.FastJSONResponse = lambda content, **kwargs: content
+        try:
+            sessions_returned_body = get_sessions()
+            sessions_returned = timed(get_sessions, repeat)
+        finally:
+            parking_lots_endpoint.FastJSONResponse = FastJSONResponse
+
+    encode_fast = timed(lambda: FastJSONResponse(payments).body, repeat)
+    encode_plain = timed(lambda: JSONResponse(payments).body, repeat)
+    encode_encoder = timed(lambda: JSONResponse(jsonable_encoder(payments)).body, repeat)
+
+    print(f"rows:                              {rows}, {len(fast_body) / 1e6:.1f} MB body")
+    print(f"byte identical:                    {fast_body == plain_body}")
+    print(f"GET /payments, JSONResponse:       {plain * 1000:.1f} ms")
+    print(f"GET /payments, FastJSONResponse:   {fast * 1000:.1f} ms")
+    print(f"sessions byte identical:           {sessions_direct_body == sessions_returned_body}")
+    print(f"GET sessions, dict returned:       {sessions_returned * 1000:.1f} ms")
+    print(f"GET sessions, FastJSONResponse:    {sessions_direct * 1000:.1f} ms")
+    print(f"encode, jsonable_encoder + json:   {encode_encoder * 1000:.1f} ms")
+    print(f"encode, JSONResponse:              {encode_plain * 1000:.1f} ms")
+    print(f"encode, FastJSONResponse:          {encode_fast * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Response encoding benchmark for large /payments and parking session listings"
+    )
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
+
+
+# python -m scripts.benchmark_json_response
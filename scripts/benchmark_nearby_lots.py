@@ -0,0 +1,61 @@
+import argparse
+import random
+import time
+
+from services.geo_services import GeoGridIndex, haversine_km
+
+# Roughly the bounding box of the Netherlands
+LAT_RANGE = (50.75, 53.55)
+LNG_RANGE = (3.35, 7.20)
+
+
+def run(lots: int, queries: int, radius: float):
+    rng = random.Random(1)
+    points = [(str(i), rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for i in range(lots)]
+
+    index = GeoGridIndex()
+    start = time.perf_counter()
+    for lot_id, lat, lng in points:
+        index.upsert(lot_id, lat, lng)
+    build = time.perf_counter() - start
+
+    centres = [(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for _ in range(queries)]
+
+    found = 0
+    start = time.perf_counter()
+    for lat, lng in centres:
+        found += len(sorted(index.query(lat, lng, radius)))
+    indexed = (time.perf_counter() - start) / queries
+
+    scan_queries = centres[: max(1, queries // 50)]
+    start = time.perf_counter()
+    for lat, lng in scan_queries:
+        sorted(
+            (haversine_km(lat, lng, p_lat, p_lng), lot_id)
+            for lot_id, p_lat, p_lng in points
+            if haversine_km(lat, lng, p_lat, p_lng) <= radius
+        )
+    scan = (time.perf_counter() - start) / len(scan_queries)
+
+    start = time.perf_counter()
+    for lot_id, lat, lng in points[:10_000]:
+        index.upsert(lot_id, lat + 0.001, lng)
+    move = (time.perf_counter() - start) / 10_000
+
+    print(f"lots indexed:          {lots} in {build * 1000:.0f} ms")
+    print(f"radius:                {radius} km, {found / queries:.1f} lots found on average")
+    print(f"indexed query:         {indexed * 1e6:.0f} us")
+    print(f"full scan query:       {scan * 1e6:.0f} us")
+    print(f"incremental update:    {move * 1e6:.1f} us per lot")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Radius search benchmark for the parking lot spatial index")
+    parser.add_argument("--lots", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--radius", type=float, default=2.0, help="search radius in km")
+    args = parser.parse_args()
+    run(args.lots, args.queries, args.radius)
+
+
+# python -m scripts.benchmark_nearby_lots
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from services.occupancy_stream_services import OccupancyBroadcaster, event_stream
+
+
+class _ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+async def _consume(stream, received, ready):
+    await stream.__anext__()  # initial snapshot
+    ready.release()
+    await stream.__anext__()
+    received[0] += 1
+    await stream.aclose()
+
+
+async def run(subscribers: int, lots: int, burst: int):
+    broadcaster = OccupancyBroadcaster(coalesce_seconds=0.05)
+    received = [0]
+    ready = asyncio.Semaphore(0)
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tasks = []
+    for i in range(subscribers):
+        lot_id = str(i % lots + 1)
+        stream = event_stream(
+            _ConnectedRequest(), lot_id, lambda: {"0": {"capacity": 0, "reserved": 0}}, broadcaster
+        )
+        tasks.append(asyncio.create_task(_consume(stream, received, ready)))
+    for _ in range(subscribers):
+        await ready.acquire()
+    idle, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Let every consumer park on its wakeup event, then measure an idle second
+    await asyncio.sleep(0.1)
+    idle_start = time.process_time()
+    await asyncio.sleep(1)
+    idle_cpu = time.process_time() - idle_start
+
+    start = time.perf_counter()
+    for reserved in range(burst):
+        for lot in range(1, lots + 1):
+            broadcaster.publish(str(lot), {"capacity": 1000, "reserved": reserved, "free": 1000 - reserved})
+    publish_elapsed = time.perf_counter() - start
+    await asyncio.wait_for(asyncio.gather(*tasks), 30)
+    delivered = time.perf_counter() - start
+
+    print(f"subscribers:                 {subscribers} across {lots} lots")
+    print(f"memory per idle subscriber:  {(idle - baseline) / subscribers:.0f} bytes")
+    print(f"CPU while idle for 1s:       {idle_cpu * 1000:.1f} ms")
+    print(f"published updates:           {burst * lots} in {publish_elapsed * 1000:.1f} ms")
+    print(f"events delivered:            {received[0]} (one per subscriber after coalescing)")
+    print(f"publish -> all delivered:    {delivered * 1000:.1f} ms (includes {broadcaster.coalesce_seconds * 1000:.0f} ms window)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fan-out benchmark for the occupancy SSE broadcaster")
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--lots", type=int, default=100)
+    parser.add_argument("--burst", type=int, default=50, help="updates per lot published back to back")
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.lots, args.burst))
+
+
+# python -m scripts.benchmark_occupancy_stream
+# Runs the real event_stream generators in-process, without sockets, so it measures
+# the broadcaster itself rather than the OS limit on open connections.
@@ -0,0 +1,76 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from services.reservation_index_services import TIME_FORMAT, LotReservationIndex, to_minutes
+
+
+def scan_earliest_end(reservations):
+    """What create_reservation used to do on every full lot: parse every end_time."""
+    earliest = None
+    for reservation in reservations:
+        end_time = datetime.strptime(reservation["end_time"], TIME_FORMAT)
+        if earliest is None or end_time < earliest:
+            earliest = end_time
+    return earliest
+
+
+def run(reservations: int, queries: int, capacity: int):
+    rng = random.Random(3)
+    first_day = datetime(2099, 1, 1)
+    rows = []
+    for i in range(reservations):
+        start = first_day + timedelta(minutes=15 * rng.randrange(0, 365 * 96))
+        end = start + timedelta(minutes=15 * rng.randrange(1, 48))
+        rows.append({"id": str(i), "start_time": start.strftime(TIME_FORMAT), "end_time": end.strftime(TIME_FORMAT)})
+
+    index = LotReservationIndex()
+    start = time.perf_counter()
+    for row in rows:
+        index.add(row["id"], to_minutes(row["start_time"]), to_minutes(row["end_time"]))
+    build = time.perf_counter() - start
+
+    windows = []
+    for _ in range(queries):
+        window_start = to_minutes(first_day.strftime(TIME_FORMAT)) + 15 * rng.randrange(0, 365 * 96)
+        windows.append((window_start, window_start + 120))
+
+    start = time.perf_counter()
+    for window_start, window_end in windows:
+        index.count_overlapping(window_start, window_end)
+    overlap = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    for window_start, window_end in windows:
+        index.peak(window_start, window_end)
+    peak = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    for window_start, window_end in windows:
+        index.earliest_free_slot(capacity, window_end - window_start, window_start)
+    earliest = (time.perf_counter() - start) / queries
+
+    scan_queries = max(1, queries // 100)
+    start = time.perf_counter()
+    for _ in range(scan_queries):
+        scan_earliest_end(rows)
+    scan = (time.perf_counter() - start) / scan_queries
+
+    print(f"reservations indexed:   {reservations} in {build * 1000:.0f} ms")
+    print(f"overlap count:          {overlap * 1e6:.1f} us")
+    print(f"peak in 2h window:      {peak * 1e6:.1f} us")
+    print(f"earliest free slot:     {earliest * 1e6:.1f} us (capacity {capacity})")
+    print(f"old end_time scan:      {scan * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark for the per-lot reservation interval index")
+    parser.add_argument("--reservations", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--capacity", type=int, default=100)
+    args = parser.parse_args()
+    run(args.reservations, args.queries, args.capacity)
+
+
+# python -m scripts.benchmark_reservation_index
@@ -0,0 +1,284 @@
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils import storage_utils
+
+# Where each table's JSON dump lives by default, and the column a dump keyed by id (an object
+# of records instead of a list) stores that key in
+IMPORTS = {
+    "parking_sessions": {"paths": "data/pdata/p*-sessions.json", "key": "id"},
+    "users": {"paths": "data/users.json", "key": "id"},
+    "vehicles": {"paths": "data/vehicles.json", "key": "id"},
+    "payments": {"paths": "data/payments.json", "key": "transaction"},
+    "reservations": {"paths": "data/reservations.json", "key": "id"},
+}
+
+BATCH_SIZE = 5_000
+CHUNK_SIZE = 1 << 20
+
+# The per-lot session files don't repeat the lot id in every session
+SESSION_FILE_LOT = re.compile(r"p(\d+)-sessions\.json$")
+
+PROGRESS_DDL = """
+    CREATE TABLE IF NOT EXISTS import_progress (
+        source TEXT PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        records INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+
+class _JsonStream:
+    """Reads a JSON file in chunks, only the records not handed out yet are kept in memory."""
+
+    def __init__(self, file, chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """The next character that is not whitespace, "" at the end of the file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of the buffer, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Most likely cut off at the end of the chunk
+                if self._fill():
+                    continue
+                raise
+            if end == len(self.buffer) and self._fill():
+                # A number at the very end of the chunk may go on in the next one
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_records(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[Optional[str], Dict]]:
+    """
+    Yields (key, record) for every record of a JSON dump without loading the file at once.
+    Takes a list of records (key is None) or an object of records keyed by id.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f, chunk_size)
+        opening = stream.peek()
+        if opening not in ("[", "{"):
+            raise ValueError(f"{path} holds neither a list nor an object of records")
+        stream.expect(opening)
+        closing = "]" if opening == "[" else "}"
+        first = True
+        while stream.peek() != closing:
+            if not first:
+                stream.expect(",")
+            first = False
+            key = None
+            if opening == "{":
+                key = stream.value()
+                stream.expect(":")
+            yield key, stream.value()
+
+
+def _progress(conn, source: str, stat) -> Tuple[int, bool]:
+    row = conn.execute(
+        "SELECT size, mtime_ns, records, done FROM import_progress WHERE source = ?", (source,)
+    ).fetchone()
+    if row is None or (row[0], row[1]) != (stat.st_size, stat.st_mtime_ns):
+        # New file, or changed since the last run: start from the top
+        return 0, False
+    return row[2], bool(row[3])
+
+
+def _save_progress(conn, source: str, table_name: str, stat, records: int, done: bool):
+    conn.execute(
+        "INSERT INTO import_progress (source, table_name, size, mtime_ns, records, done) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(source) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+        "records = excluded.records, done = excluded.done",
+        (source, table_name, stat.st_size, stat.st_mtime_ns, records, int(done)),
+    )
+
+
+def import_file(table_name: str, path: str, db_path: Optional[str] = None, batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Imports one JSON dump into a table. Records are inserted batch_size at a time, each batch in
+    its own transaction together with the number of records done so far. After a crash the next
+    run skips those records and carries on from the first batch that did not commit.
+    """
+    if db_path is not None:
+        storage_utils.DB_PATH = Path(db_path)
+    storage_utils.use_mock_data = False
+
+    file = Path(path)
+    source = str(file.resolve())
+    stat = file.stat()
+    key_col = IMPORTS[table_name]["key"]
+    lot_match = SESSION_FILE_LOT.search(file.name) if table_name == "parking_sessions" else None
+
+    start = time.perf_counter()
+    read = inserted = 0
+    conn = storage_utils.get_db_connection()
+    try:
+        conn.execute(PROGRESS_DDL)
+        conn.commit()
+        resume_at, done = _progress(conn, source, stat)
+        if done:
+            return {"file": path, "table": table_name, "read": 0, "inserted": 0, "seconds": 0.0, "skipped": True}
+
+        def flush(batch: List[Dict], finished: bool):
+            nonlocal inserted
+            # IMMEDIATE takes the write lock up front, parallel importers queue on busy_timeout
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                inserted += storage_utils.insert_json_batch(conn, table_name, batch) if batch else 0
+                _save_progress(conn, source, table_name, stat, read, finished)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        batch: List[Dict] = []
+        for key, record in iter_json_records(file):
+            read += 1
+            if read <= resume_at:
+                continue
+            if key is not None and key_col not in record:
+                record[key_col] = key
+            if lot_match and "parking_lot_id" not in record:
+                record["parking_lot_id"] = lot_match.group(1)
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush(batch, False)
+                batch = []
+        flush(batch, True)
+    finally:
+        conn.close()
+
+    return {
+        "file": path,
+        "table": table_name,
+        "read": read,
+        "inserted": inserted,
+        "seconds": time.perf_counter() - start,
+        "skipped": False,
+    }
+
+
+def _rate(rows: int, seconds: float) -> str:
+    return f"{rows / seconds:,.0f} rows/s" if seconds > 0 else "-"
+
+
+def run(
+    tables: List[str],
+    sources: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+    batch_size: int = BATCH_SIZE,
+    restart: bool = False,
+) -> Dict[str, int]:
+    """Imports the dumps of the given tables, several files at once with workers > 1. Returns rows inserted per table."""
+    sources = sources or {}
+    db_path = str(storage_utils.DB_PATH)
+    storage_utils.use_mock_data = False
+    storage_utils.init_db()
+
+    jobs = []
+    for table_name in tables:
+        pattern = sources.get(table_name, IMPORTS[table_name]["paths"])
+        files = sorted(glob.glob(pattern))
+        if not files:
+            print(f"{table_name}: no files match {pattern}")
+        jobs.extend((table_name, file) for file in files)
+
+    if restart:
+        with storage_utils.get_db_connection() as conn:
+            conn.execute(PROGRESS_DDL)
+            conn.executemany(
+                "DELETE FROM import_progress WHERE source = ?", [(str(Path(file).resolve()),) for _, file in jobs]
+            )
+            conn.commit()
+
+    start = time.perf_counter()
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(import_file, table, file, db_path, batch_size) for table, file in jobs]
+            results = [future.result() for future in futures]
+    else:
+        results = [import_file(table, file, db_path, batch_size) for table, file in jobs]
+    elapsed = time.perf_counter() - start
+
+    totals: Dict[str, int] = {}
+    for result in results:
+        totals[result["table"]] = totals.get(result["table"], 0) + result["inserted"]
+        if result["skipped"]:
+            print(f"{result['file']}: already imported")
+        else:
+            print(
+                f"{result['file']}: {result['inserted']:,} of {result['read']:,} records inserted "
+                f"in {result['seconds']:.1f}s ({_rate(result['read'], result['seconds'])})"
+            )
+    for table_name in tables:
+        storage_utils.finish_bulk_import(table_name)
+    total = sum(totals.values())
+    print(f"Imported {total:,} rows in {elapsed:.1f}s ({_rate(total, elapsed)})")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import of JSON dumps into the database")
+    parser.add_argument("tables", nargs="*", help=f"Any of {', '.join(IMPORTS)}, all of them when left out")
+    parser.add_argument(
+        "--source",
+        action="append",
+        default=[],
+        metavar="TABLE=GLOB",
+        help="Read a table from other files than the default location",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Files imported at the same time")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Records per transaction")
+    parser.add_argument("--restart", action="store_true", help="Forget earlier progress and import every file again")
+    args = parser.parse_args()
+    unknown = [table for table in args.tables if table not in IMPORTS]
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(unknown)}")
+    overrides = dict(source.split("=", 1) for source in args.source)
+    run(args.tables or list(IMPORTS), overrides, args.workers, args.batch_size, args.restart)
+
+
+# python -m scripts.bulk_import                        import every dump found under data/
+# python -m scripts.bulk_import parking_sessions --source "parking_sessions=backup/p*-sessions.json"
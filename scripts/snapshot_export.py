@@ -0,0 +1,26 @@
+import argparse
+import time
+
+from utils import snapshot_utils, storage_utils
+
+
+def run(tables, fmt: str, out_dir, chunk_rows: int):
+    start = time.perf_counter()
+    manifest = snapshot_utils.export_snapshot(tables or None, fmt, out_dir, chunk_rows)
+    for table_name, result in manifest.items():
+        print(f"{table_name}: {result['rows']:,} changed, {result['deleted']:,} deleted, {len(result['files'])} files")
+    print(f"Snapshot written in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exports the rows changed since the last snapshot for offline analytics")
+    parser.add_argument("tables", nargs="*", help="Tables to export, all of them when left out")
+    parser.add_argument("--format", choices=list(snapshot_utils.FORMATS), default=snapshot_utils.DEFAULT_FORMAT)
+    parser.add_argument("--out", default=None, help="Snapshot directory, SNAPSHOT_DIR or data/snapshots by default")
+    parser.add_argument("--chunk-rows", type=int, default=snapshot_utils.SNAPSHOT_CHUNK_ROWS)
+    args = parser.parse_args()
+    storage_utils.use_mock_data = False
+    run(args.tables, args.format, args.out, args.chunk_rows)
+
+
+# python -m scripts.snapshot_export  e.g. nightly from cron, analysts read the files instead of the API
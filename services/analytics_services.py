@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils import storage_utils
+
+
+def to_local(moment: Optional[datetime]) -> Optional[datetime]:
+    """Rollup periods are local times, an aware datetime is converted and made naive."""
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
+
+
+def _with_derived(row: Dict) -> Dict:
+    sessions = row["sessions"]
+    return {
+        **row,
+        "average_duration_minutes": round(row["duration_minutes"] / sessions, 1) if sessions else 0,
+        "revenue": round(row["payments"] - row["refunds"], 2),
+    }
+
+
+def summarize(rows: List[Dict]) -> Dict:
+    """Totals of a range of rollup buckets, the peak is the highest of any bucket."""
+    totals = {column: sum(row[column] for row in rows) for column in storage_utils.ROLLUP_SUMS}
+    totals["peak_occupancy"] = max((row["peak_occupancy"] for row in rows), default=0)
+    return _with_derived(totals)
+
+
+def lot_analytics(
+    parking_lot_id: str, since: Optional[datetime], until: Optional[datetime], bucket: str
+) -> Dict:
+    """
+    Revenue, sessions, average duration and peak occupancy of a lot per hour or day, read from
+    the precomputed rollups. Sessions count in the bucket they stopped in, payments and
+    refunds in the one they were created in; revenue is payments minus refunds.
+    """
+    rows = [_with_derived(row) for row in storage_utils.get_lot_rollups(parking_lot_id, since, until, bucket)]
+    return {
+        "parking_lot_id": parking_lot_id,
+        "bucket": bucket,
+        "from": since.isoformat() if since is not None else None,
+        "to": until.isoformat() if until is not None else None,
+        "totals": summarize(rows),
+        "buckets": rows,
+    }
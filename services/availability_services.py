@@ -0,0 +1,120 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from services import reservation_index_services
+from services.reservation_index_services import from_minutes, minutes_of, to_minutes
+from utils import storage_utils
+
+MAX_BUCKETS = 10_000
+# Active sessions hold their space up to the current minute, so cached results drift with the clock
+CACHE_TTL_SECONDS = 60.0
+CACHE_ENTRIES_PER_LOT = 32
+
+# parking_lot_id -> {(start, end, granularity): (reservation version, computed at, buckets)}
+_cache: Dict[str, Dict[Tuple[int, int, int], Tuple[Tuple[int, int], float, List[Dict]]]] = {}
+_cache_lock = threading.Lock()
+
+
+def invalidate(parking_lot_id: Optional[str] = None) -> None:
+    """Drops cached availability of one lot, or of every lot when no id is given."""
+    with _cache_lock:
+        if parking_lot_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(parking_lot_id, None)
+
+
+def _session_minute(value: str) -> Optional[int]:
+    try:
+        return minutes_of(datetime.fromisoformat(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _active_session_changes(parking_lot_id: str, start: int, end: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    Active sessions as [started, now] intervals. How long a parked car stays is unknown,
+    so it counts up to the current minute and future buckets are left to reservations.
+    Stale sessions gave their space back and don't count.
+    """
+    now = minutes_of(datetime.now())
+    active, changes = 0, []
+    for session in storage_utils.get_open_sessions_by_lot(parking_lot_id):
+        started = _session_minute(session.get("started"))
+        if started is None:
+            continue
+        session_start, session_end = started, max(started, now) + 1
+        if session_end <= start or session_start >= end:
+            continue
+        if session_start <= start:
+            active += 1
+        else:
+            changes.append((session_start, 1))
+        if session_end < end:
+            changes.append((session_end, -1))
+    changes.sort()
+    return active, changes
+
+
+def sweep(
+    capacity: int, start: int, end: int, granularity: int, active: int, changes: List[Tuple[int, int]]
+) -> List[Dict]:
+    """
+    Walks time-ordered (minute, net change) pairs once and reports, per bucket, the highest
+    number of spaces taken at any moment in it and what is left of the capacity.
+    """
+    buckets = []
+    bucket_start, peak = start, active
+    label = from_minutes(start)
+
+    def close_bucket():
+        nonlocal label
+        bucket_end = min(bucket_start + granularity, end)
+        end_label = from_minutes(bucket_end)
+        buckets.append({"start": label, "end": end_label, "occupied": peak, "free": max(0, capacity - peak)})
+        label = end_label
+        return bucket_end
+
+    for minute, delta in changes:
+        while minute >= bucket_start + granularity:
+            bucket_start = close_bucket()
+            peak = active
+        active += delta
+        # A change exactly on a bucket boundary is the state the bucket starts in
+        peak = active if minute == bucket_start else max(peak, active)
+
+    while bucket_start < end:
+        bucket_start = close_bucket()
+        peak = active
+    return buckets
+
+
+def get_availability(
+    parking_lot_id: str, capacity: int, start_time: str, end_time: str, granularity: int
+) -> List[Dict]:
+    """Free capacity per granularity-minute bucket of [start_time, end_time)."""
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    reservation_index_services.ensure_current(storage_utils.load_reservation_data)
+
+    key = (start, end, granularity)
+    version = reservation_index_services.version(parking_lot_id)
+    with _cache_lock:
+        cached = _cache.get(parking_lot_id, {}).get(key)
+    if cached is not None and cached[0] == version and time.monotonic() - cached[1] < CACHE_TTL_SECONDS:
+        return cached[2]
+
+    reserved, reservation_changes = reservation_index_services.changes_between(parking_lot_id, start, end)
+    parked, session_changes = _active_session_changes(parking_lot_id, start, end)
+    changes = dict(reservation_changes)
+    for minute, delta in session_changes:
+        changes[minute] = changes.get(minute, 0) + delta
+    buckets = sweep(capacity, start, end, granularity, reserved + parked, sorted(changes.items()))
+
+    with _cache_lock:
+        lot_cache = _cache.setdefault(parking_lot_id, {})
+        if key not in lot_cache and len(lot_cache) >= CACHE_ENTRIES_PER_LOT:
+            del lot_cache[next(iter(lot_cache))]
+        lot_cache[key] = (version, time.monotonic(), buckets)
+    return buckets
@@ -0,0 +1,37 @@
+import hashlib
+from typing import Iterable, Optional
+
+from fastapi import Request, Response, status
+
+from utils import storage_utils
+
+
+def table_etag(tables: Iterable[str], *scope: str) -> str:
+    """
+    Strong ETag for a response built only from the given tables. scope adds whatever else
+    the payload depends on, such as the resource id or the user it is filtered for.
+    Only table versions are read, so this is cheap enough to do before loading anything.
+    """
+    parts = [f"{table}={storage_utils.get_table_version(table)}" for table in tables]
+    parts.extend(str(part) for part in scope)
+    return '"' + hashlib.sha1("|".join(parts).encode()).hexdigest()[:20] + '"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so a W/ prefix on the client's copy does not matter."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified(request: Optional[Request], etag: str) -> Optional[Response]:
+    """The 304 to send if the client already holds this version, otherwise None."""
+    if request is None or not matches(request.headers.get("if-none-match"), etag):
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+# Tables behind the parking lot payloads, reserved counters included
+PARKING_LOT_TABLES = ("parking_lots", storage_utils.OCCUPANCY_VERSION_KEY)
+DISCOUNT_TABLES = ("discounts", storage_utils.DISCOUNT_USES_VERSION_KEY)
@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import Dict, List
+
+from models.parking_lots_model import GateEvent
+from services import availability_services, lot_cache_services, occupancy_services
+from utils import storage_utils
+from utils.session_calculator import calculate_price
+
+GATE_LOT_NOT_FOUND = "lot_not_found"
+
+
+def _local_time(timestamp) -> datetime:
+    """Camera times as the naive local datetimes the sessions are stored in."""
+    if timestamp is None:
+        return datetime.now().replace(microsecond=0)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp.replace(microsecond=0)
+
+
+def process_gate_events(events: List[GateEvent], session_user: Dict[str, str]) -> List[Dict]:
+    """
+    Applies a batch of camera entries and exits, in the order given, and returns a result per
+    event. The whole batch is one storage transaction instead of a sessions/start or
+    sessions/stop call per car. Entries open a session and claim a space,
+    exits stop the open session of the plate, price it with calculate_price() and release
+    the space. Events for unknown lots, plates that are already parked, full lots and exits
+    without an open session are rejected on their own.
+    """
+    lots: Dict[str, Dict] = {}
+    results: List[Dict] = [{} for _ in events]
+    pending = []
+    for index, event in enumerate(events):
+        if event.parking_lot_id not in lots:
+            lot = lot_cache_services.get_lot(event.parking_lot_id)
+            if lot is None:
+                results[index] = {"status": "rejected", "reason": GATE_LOT_NOT_FOUND}
+                continue
+            lots[event.parking_lot_id] = lot
+        pending.append(
+            (
+                index,
+                {
+                    "event": event.event,
+                    "parking_lot_id": event.parking_lot_id,
+                    "licenseplate": event.licenseplate,
+                    "time": _local_time(event.timestamp),
+                    "user": session_user.get("username"),
+                    # Ids come from the counter up front, it can't be taken inside the batch transaction
+                    "session_id": storage_utils.allocate_id("parking_sessions") if event.event == "entry" else None,
+                },
+            )
+        )
+
+    def price(parking_lot_id: str, session_id: str, session: Dict) -> float:
+        return calculate_price(lots[parking_lot_id], session_id, session)[0]
+
+    applied = storage_utils.apply_gate_events([event for _, event in pending], price) if pending else []
+
+    occupancy = {}
+    for (index, event), result in zip(pending, applied):
+        counters = result.pop("occupancy", None)
+        if counters is not None:
+            occupancy[event["parking_lot_id"]] = counters
+        results[index] = result
+    # Only the counters after the last event of each lot matter to the cache and the stream
+    for parking_lot_id, counters in occupancy.items():
+        occupancy_services.record(parking_lot_id, counters)
+        availability_services.invalidate(parking_lot_id)
+
+    for index, (event, result) in enumerate(zip(events, results)):
+        result["index"] = index
+        if event.event_id is not None:
+            result["event_id"] = event.event_id
+    return results
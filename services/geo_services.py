@@ -0,0 +1,175 @@
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from services import occupancy_services
+from utils import storage_utils
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+# Roughly 2.2 km cells: a typical "within a few km" search touches a handful of cells
+CELL_SIZE_DEGREES = 0.02
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoGridIndex:
+    """
+    Buckets points into a fixed lat/lng grid so a radius query only looks at the
+    cells overlapping the search circle. Inserts, moves and removals are O(1).
+    """
+
+    def __init__(self, cell_size_degrees: float = CELL_SIZE_DEGREES):
+        self.cell_size = cell_size_degrees
+        self._lng_cells = max(1, round(360 / cell_size_degrees))
+        self._cells: Dict[Tuple[int, int], Dict[str, Tuple[float, float]]] = {}
+        self._positions: Dict[str, Tuple[Tuple[int, int], float, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size) % self._lng_cells
+
+    def upsert(self, key: str, lat: float, lng: float) -> None:
+        cell = self._cell(lat, lng)
+        with self._lock:
+            self._remove_locked(key)
+            self._cells.setdefault(cell, {})[key] = (lat, lng)
+            self._positions[key] = (cell, lat, lng)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key: str) -> None:
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        bucket = self._cells.get(position[0])
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[position[0]]
+
+    def query(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, str]]:
+        """Returns (distance_km, key) for every point within radius_km, unsorted."""
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = max(math.cos(math.radians(min(89.9, abs(lat) + lat_span))), 1e-6)
+        lng_span = min(180.0, radius_km / (KM_PER_DEGREE_LAT * cos_lat))
+
+        min_row = math.floor(max(-90.0, lat - lat_span) / self.cell_size)
+        max_row = math.floor(min(90.0, lat + lat_span) / self.cell_size)
+        first_col = math.floor((lng - lng_span) / self.cell_size)
+        last_col = math.floor((lng + lng_span) / self.cell_size)
+        columns = {col % self._lng_cells for col in range(first_col, last_col + 1)}
+
+        matches = []
+        with self._lock:
+            for row in range(min_row, max_row + 1):
+                for col in columns:
+                    bucket = self._cells.get((row, col))
+                    if not bucket:
+                        continue
+                    for key, (point_lat, point_lng) in bucket.items():
+                        distance = haversine_km(lat, lng, point_lat, point_lng)
+                        if distance <= radius_km:
+                            matches.append((distance, key))
+        return matches
+
+
+# Parking lot index, built from storage on first use and then kept current by the
+# create/update/delete hooks in parking_services.
+_index = GeoGridIndex()
+_lots: Dict[str, Dict] = {}
+_index_lock = threading.Lock()
+_index_built = False
+
+
+def _coordinates(lot: Dict) -> Optional[Tuple[float, float]]:
+    coordinates = lot.get("coordinates") or {}
+    lat, lng = coordinates.get("lat"), coordinates.get("lng")
+    if lat is None or lng is None:
+        return None
+    return float(lat), float(lng)
+
+
+def _put(lot: Dict) -> None:
+    lot_id = str(lot.get("id"))
+    position = _coordinates(lot)
+    if position is None:
+        _index.remove(lot_id)
+        _lots.pop(lot_id, None)
+        return
+    _lots[lot_id] = lot
+    _index.upsert(lot_id, *position)
+
+
+def _ensure_index() -> None:
+    global _index_built
+    if _index_built:
+        return
+    with _index_lock:
+        if _index_built:
+            return
+        parking_lots = storage_utils.load_parking_lot_data() or []
+        for lot in parking_lots:
+            _put(lot)
+        occupancy_services.prime(parking_lots)
+        _index_built = True
+
+
+def index_parking_lot(lot: Dict) -> None:
+    """Adds or moves a lot after it was created or updated. No-op until the index is first used."""
+    if _index_built:
+        _put(lot)
+
+
+def remove_parking_lot(parking_lot_id: str) -> None:
+    _index.remove(parking_lot_id)
+    _lots.pop(parking_lot_id, None)
+
+
+def reset_index() -> None:
+    """Forgets the index so the next query rebuilds it from storage."""
+    global _index, _index_built
+    with _index_lock:
+        _index = GeoGridIndex()
+        _lots.clear()
+        _index_built = False
+
+
+def find_nearby_parking_lots(
+    lat: float, lng: float, radius_km: float, min_free: int = 1, limit: int = 20
+) -> List[Dict]:
+    """
+    Lots within radius_km that have at least min_free spaces, nearest first and,
+    at equal distance, the emptiest first.
+    """
+    _ensure_index()
+
+    results = []
+    for distance, lot_id in _index.query(lat, lng, radius_km):
+        occupancy = occupancy_services.get_occupancy(lot_id)
+        if occupancy is None or occupancy["free"] < min_free:
+            continue
+        results.append((distance, -occupancy["free"], lot_id, occupancy))
+    results.sort(key=lambda result: result[:3])
+
+    return [
+        {
+            **_lots[lot_id],
+            "capacity": occupancy["capacity"],
+            "reserved": occupancy["reserved"],
+            "free": occupancy["free"],
+            "distance_km": round(distance, 3),
+        }
+        for distance, _, lot_id, occupancy in results[:limit]
+    ]
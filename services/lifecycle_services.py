@@ -0,0 +1,156 @@
+import heapq
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from services import availability_services, occupancy_services, reservation_index_services
+from utils import storage_utils
+
+logger = logging.getLogger(__name__)
+
+# Reservations expire once their end_time passes and sessions left open for STALE_SESSION_HOURS
+# are flagged, both giving their space back. Every worker runs a scheduler, the lease lets one of
+# them sweep at a time. The others keep asking and take over within LIFECYCLE_LEASE_SECONDS of
+# the holder going away, so the lease has to outlast an interval and a sweep.
+LIFECYCLE_INTERVAL_SECONDS = float(os.getenv("LIFECYCLE_INTERVAL_SECONDS", "60"))
+LIFECYCLE_LEASE_SECONDS = float(os.getenv("LIFECYCLE_LEASE_SECONDS", "180"))
+LIFECYCLE_BATCH_SIZE = int(os.getenv("LIFECYCLE_BATCH_SIZE", "500"))
+STALE_SESSION_HOURS = float(os.getenv("STALE_SESSION_HOURS", "24"))
+# Upcoming end times held in the heap, reloaded from the database after every sweep
+DUE_HEAP_SIZE = 1000
+LEASE_NAME = "reservation_lifecycle"
+
+
+class LifecycleScheduler:
+    """
+    Background thread that sweeps at every reservation end time it knows of, and at least every
+    interval seconds. The end times sit in a heap, loaded through the partial end_time index of
+    active reservations and added to by schedule() when this worker books one, so a reservation
+    is expired right when it ends instead of up to an interval later.
+    """
+
+    def __init__(
+        self,
+        interval: float = LIFECYCLE_INTERVAL_SECONDS,
+        lease_seconds: float = LIFECYCLE_LEASE_SECONDS,
+        batch_size: int = LIFECYCLE_BATCH_SIZE,
+        stale_after_hours: float = STALE_SESSION_HOURS,
+        holder: Optional[str] = None,
+    ):
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.stale_after_hours = stale_after_hours
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._due: List[datetime] = []
+        self._due_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reservation-lifecycle", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the thread and gives the lease up, so another worker takes over without waiting for it to run out."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        storage_utils.release_lease(LEASE_NAME, self.holder)
+
+    def schedule(self, end_time: str) -> None:
+        """Adds the end time of a reservation booked by this worker, waking the thread if it is the next one due."""
+        try:
+            due = datetime.fromisoformat(end_time)
+        except (TypeError, ValueError):
+            return
+        with self._due_lock:
+            earliest = self._due[0] if self._due else None
+            heapq.heappush(self._due, due)
+        if earliest is None or due < earliest:
+            self._wake.set()
+
+    def next_due(self) -> Optional[datetime]:
+        with self._due_lock:
+            return self._due[0] if self._due else None
+
+    def sweep(self, now: Optional[datetime] = None) -> Optional[Dict[str, int]]:
+        """
+        Expires every reservation that has ended and flags every session open for longer than
+        stale_after_hours, batch_size rows per transaction. Returns how many of each, or None
+        when another worker holds the lease.
+        """
+        now = now or datetime.now()
+        if not storage_utils.acquire_lease(LEASE_NAME, self.holder, self.lease_seconds):
+            return None
+
+        expired = self._drain(lambda: storage_utils.expire_reservations(now, self.batch_size))
+        for reservation in expired:
+            reservation_index_services.remove(str(reservation["id"]))
+        stale_before = now - timedelta(hours=self.stale_after_hours)
+        flagged = self._drain(lambda: storage_utils.flag_stale_sessions(stale_before, self.batch_size, now))
+
+        for parking_lot_id in {row["parking_lot_id"] for row in expired + flagged}:
+            occupancy_services.invalidate(parking_lot_id)
+            availability_services.invalidate(parking_lot_id)
+        if expired or flagged:
+            logger.info(f"Expired {len(expired)} reservations and flagged {len(flagged)} stale sessions")
+
+        self._reload_due(now)
+        return {"expired_reservations": len(expired), "stale_sessions": len(flagged)}
+
+    def _drain(self, run_batch: Callable[[], List[Dict]]) -> List[Dict]:
+        """Runs batches until one comes back short, renewing the lease in between."""
+        done: List[Dict] = []
+        while True:
+            batch = run_batch()
+            done.extend(batch)
+            if len(batch) < self.batch_size:
+                return done
+            if not storage_utils.acquire_lease(LEASE_NAME, self.holder, self.lease_seconds):
+                return done
+
+    def _reload_due(self, now: datetime) -> None:
+        due = []
+        for end_time in storage_utils.get_upcoming_reservation_ends(now, DUE_HEAP_SIZE):
+            try:
+                due.append(datetime.fromisoformat(end_time))
+            except (TypeError, ValueError):
+                continue
+        # A sorted list is a valid heap
+        due.sort()
+        with self._due_lock:
+            self._due = due
+
+    def _seconds_to_wait(self) -> float:
+        now = datetime.now()
+        with self._due_lock:
+            # Due times already handled, or left to the worker with the lease
+            while self._due and self._due[0] <= now:
+                heapq.heappop(self._due)
+            next_due = self._due[0] if self._due else None
+        if next_due is None:
+            return self.interval
+        return min(self.interval, (next_due - now).total_seconds())
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Reservation lifecycle sweep failed: {e}", exc_info=True)
+            self._wake.clear()
+            self._wake.wait(self._seconds_to_wait())
+
+
+scheduler = LifecycleScheduler()
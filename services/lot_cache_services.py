@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services import occupancy_services
+from utils import storage_utils
+
+# How long a loaded copy is trusted before the table version is checked again. Writes made
+# by this process invalidate right away, this only bounds how long a write by another
+# worker can go unnoticed.
+VERSION_CHECK_SECONDS = 1.0
+
+# Parking lot metadata keyed by id. The reserved counter changes with every session and
+# reservation, so it is not kept here but taken from occupancy_services on every read.
+_lots: Optional[Dict[str, Dict]] = None
+_version: Optional[int] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _load_locked() -> None:
+    global _lots, _version
+    # Version first, a write landing during the load then shows up as a newer version next check
+    version = storage_utils.get_table_version("parking_lots")
+    parking_lots = storage_utils.load_parking_lot_data() or []
+    if isinstance(parking_lots, dict):
+        parking_lots = [{**lot, "id": lot_id} for lot_id, lot in parking_lots.items()]
+    occupancy_services.prime(parking_lots)
+    _lots = {}
+    for lot in parking_lots:
+        metadata = dict(lot)
+        metadata.pop("reserved", None)
+        _lots[str(lot.get("id"))] = metadata
+    _version = version
+
+
+def _fresh_lots() -> Dict[str, Dict]:
+    global _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _lots is None:
+            _load_locked()
+        elif now - _checked_at >= VERSION_CHECK_SECONDS:
+            if storage_utils.get_table_version("parking_lots") != _version:
+                _load_locked()
+        else:
+            return _lots
+        _checked_at = now
+        return _lots
+
+
+def _with_occupancy(lot: Dict) -> Dict:
+    occupancy = occupancy_services.get_occupancy(lot["id"])
+    reserved = occupancy["reserved"] if occupancy is not None else 0
+    return {**lot, "reserved": reserved}
+
+
+def get_lot(parking_lot_id: str) -> Optional[Dict]:
+    """Returns a copy of one parking lot with its live reserved counter, or None if it does not exist."""
+    lot = _fresh_lots().get(str(parking_lot_id))
+    if lot is None:
+        return None
+    return _with_occupancy(lot)
+
+
+def get_lots() -> List[Dict]:
+    """Returns copies of all parking lots with their live reserved counters."""
+    return [_with_occupancy(lot) for lot in _fresh_lots().values()]
+
+
+def version() -> Optional[int]:
+    """Table version the cached lots were loaded at, None before the first load."""
+    return _version
+
+
+def invalidate() -> None:
+    """Drops the cached lots, the next read loads them again."""
+    global _lots, _version
+    with _lock:
+        _lots = None
+        _version = None
@@ -0,0 +1,118 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from services.occupancy_stream_services import broadcaster
+from utils import storage_utils
+
+# How long cached counters are trusted before the occupancy version is checked again. Writes
+# made through this module update the cache right away, this only bounds how long a claim or
+# release by another worker or the lifecycle scheduler can go unnoticed.
+VERSION_CHECK_SECONDS = 1.0
+
+# In-process view of the parking lot counters. The storage layer is the source of
+# truth and enforces capacity in a single conditional UPDATE, this cache only saves
+# reads. It is refreshed with the counters returned by every write made through
+# this module, dropped as a whole when the shared occupancy version moves, and can be
+# dropped with invalidate() when a lot is edited elsewhere.
+_occupancy: Dict[str, Dict[str, int]] = {}
+_occupancy_lock = threading.Lock()
+_version: Optional[int] = None
+_checked_at = 0.0
+
+
+def _check_version() -> None:
+    """Drops every cached counter once some worker changed one, checked at most every VERSION_CHECK_SECONDS."""
+    global _version, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < VERSION_CHECK_SECONDS:
+        return
+    version = storage_utils.get_table_version(storage_utils.OCCUPANCY_VERSION_KEY)
+    with _occupancy_lock:
+        if _version is not None and version != _version:
+            _occupancy.clear()
+        _version, _checked_at = version, now
+
+
+def _remember(parking_lot_id: str, occupancy: Dict[str, int]) -> Dict[str, int]:
+    counters = {
+        "capacity": occupancy.get("capacity") or 0,
+        "reserved": occupancy.get("reserved") or 0,
+    }
+    with _occupancy_lock:
+        _occupancy[parking_lot_id] = counters
+    return _with_free(counters)
+
+
+def _with_free(counters: Dict[str, int]) -> Dict[str, int]:
+    return {**counters, "free": max(0, counters["capacity"] - counters["reserved"])}
+
+
+def get_occupancy(parking_lot_id: str) -> Optional[Dict[str, int]]:
+    """Returns {"capacity", "reserved", "free"} for a lot, or None if it does not exist."""
+    _check_version()
+    with _occupancy_lock:
+        cached = _occupancy.get(parking_lot_id)
+    if cached is not None:
+        return _with_free(cached)
+
+    loaded = storage_utils.get_parking_lot_occupancy(parking_lot_id)
+    if loaded is None:
+        return None
+    return _remember(parking_lot_id, loaded)
+
+
+def prime(parking_lots) -> None:
+    """Seeds the cache from already loaded lot records, keeping counters that are cached already."""
+    with _occupancy_lock:
+        for lot in parking_lots:
+            _occupancy.setdefault(
+                str(lot.get("id")),
+                {"capacity": lot.get("capacity") or 0, "reserved": lot.get("reserved") or 0},
+            )
+
+
+def reserve_space(parking_lot_id: str, enforce_capacity: bool = True) -> bool:
+    """Claims one space in a lot. Returns False if the lot is full or does not exist."""
+    occupancy = storage_utils.increment_parking_lot_reserved(parking_lot_id, enforce_capacity)
+    if occupancy is None:
+        # Whatever we had cached was evidently stale
+        invalidate(parking_lot_id)
+        return False
+    broadcaster.publish(parking_lot_id, _remember(parking_lot_id, occupancy))
+    return True
+
+
+def release_space(parking_lot_id: str) -> bool:
+    """Releases one space in a lot. Returns False if nothing was reserved or the lot does not exist."""
+    occupancy = storage_utils.decrement_parking_lot_reserved(parking_lot_id)
+    if occupancy is None:
+        invalidate(parking_lot_id)
+        return False
+    broadcaster.publish(parking_lot_id, _remember(parking_lot_id, occupancy))
+    return True
+
+
+def record(parking_lot_id: str, occupancy: Dict[str, int]) -> None:
+    """Takes counters written by someone else (e.g. a batch of gate events) into the cache and the stream."""
+    broadcaster.publish(parking_lot_id, _remember(parking_lot_id, occupancy))
+
+
+def invalidate(parking_lot_id: Optional[str] = None) -> None:
+    """Drops the cached counters of one lot, or of every lot when no id is given."""
+    global _version, _checked_at
+    with _occupancy_lock:
+        if parking_lot_id is None:
+            _occupancy.clear()
+            # The next read takes the version as it finds it, there is nothing cached to compare
+            _version, _checked_at = None, 0.0
+        else:
+            _occupancy.pop(parking_lot_id, None)
+
+
+def refresh(parking_lot_id: str) -> None:
+    """Reloads the counters of a lot after it was created or edited and notifies open streams."""
+    invalidate(parking_lot_id)
+    occupancy = get_occupancy(parking_lot_id)
+    if occupancy is not None:
+        broadcaster.publish(parking_lot_id, occupancy)
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import threading
+from itertools import chain
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+# Updates published inside this window are merged, so a burst of entries at one
+# lot reaches each subscriber as a single event carrying the latest counters.
+COALESCE_SECONDS = 0.25
+# Idle connections only get a comment line this often, to keep proxies from closing them.
+HEARTBEAT_SECONDS = 15.0
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class OccupancySubscriber:
+    """One open stream. Holds nothing but the coalesced updates it has not sent yet."""
+
+    __slots__ = ("parking_lot_id", "pending", "wakeup")
+
+    def __init__(self, parking_lot_id: Optional[str]):
+        self.parking_lot_id = parking_lot_id
+        self.pending: Dict[str, Dict] = {}
+        self.wakeup = asyncio.Event()
+
+
+class OccupancyBroadcaster:
+    """
+    Fans occupancy changes out to open SSE streams of this process.
+    publish() is thread-safe, so the sync handlers running in the threadpool can call it;
+    delivery happens on the event loop that owns the subscribers.
+    """
+
+    def __init__(self, coalesce_seconds: float = COALESCE_SECONDS):
+        self.coalesce_seconds = coalesce_seconds
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._by_lot: Dict[str, Set[OccupancySubscriber]] = {}
+        self._all_lots: Set[OccupancySubscriber] = set()
+        self._dirty: Dict[str, Dict] = {}
+        self._flush_scheduled = False
+
+    def subscribe(self, parking_lot_id: Optional[str] = None) -> OccupancySubscriber:
+        """Registers a stream for one lot, or for every lot when no id is given. Call on the event loop."""
+        subscriber = OccupancySubscriber(parking_lot_id)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            if parking_lot_id is None:
+                self._all_lots.add(subscriber)
+            else:
+                self._by_lot.setdefault(parking_lot_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: OccupancySubscriber) -> None:
+        with self._lock:
+            if subscriber.parking_lot_id is None:
+                self._all_lots.discard(subscriber)
+                return
+            lot_subscribers = self._by_lot.get(subscriber.parking_lot_id)
+            if lot_subscribers is not None:
+                lot_subscribers.discard(subscriber)
+                if not lot_subscribers:
+                    del self._by_lot[subscriber.parking_lot_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._all_lots) + sum(len(subs) for subs in self._by_lot.values())
+
+    def publish(self, parking_lot_id: str, occupancy: Dict) -> None:
+        """Queues the latest counters of a lot for delivery. Costs a dict lookup when nobody listens."""
+        with self._lock:
+            if self._loop is None or not (self._all_lots or parking_lot_id in self._by_lot):
+                return
+            self._dirty[parking_lot_id] = {"parking_lot_id": parking_lot_id, **occupancy}
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+            loop = self._loop
+
+        try:
+            loop.call_soon_threadsafe(loop.call_later, self.coalesce_seconds, self._flush)
+        except RuntimeError:
+            # The loop that owned the subscribers has been closed
+            with self._lock:
+                self._flush_scheduled = False
+                self._dirty.clear()
+
+    def _flush(self) -> None:
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._flush_scheduled = False
+            deliveries = [
+                (subscriber, lot_id, snapshot)
+                for lot_id, snapshot in dirty.items()
+                for subscriber in chain(self._by_lot.get(lot_id, ()), self._all_lots)
+            ]
+
+        for subscriber, lot_id, snapshot in deliveries:
+            subscriber.pending[lot_id] = snapshot
+            subscriber.wakeup.set()
+
+
+broadcaster = OccupancyBroadcaster()
+
+
+def format_occupancy_event(snapshot: Dict) -> str:
+    return f"event: occupancy\ndata: {json.dumps(snapshot)}\n\n"
+
+
+async def event_stream(
+    request,
+    parking_lot_id: Optional[str],
+    load_initial: Callable[[], Dict[str, Dict]],
+    occupancy_broadcaster: Optional[OccupancyBroadcaster] = None,
+) -> AsyncIterator[str]:
+    """
+    Yields SSE messages: first the current counters from load_initial(), then every
+    coalesced change until the client disconnects.
+    """
+    occupancy_broadcaster = occupancy_broadcaster or broadcaster
+    # Subscribe before taking the snapshot so no change can slip in between the two
+    subscriber = occupancy_broadcaster.subscribe(parking_lot_id)
+    try:
+        initial = await run_in_threadpool(load_initial)
+        for lot_id, occupancy in initial.items():
+            yield format_occupancy_event({"parking_lot_id": lot_id, **occupancy})
+
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+
+            subscriber.wakeup.clear()
+            pending, subscriber.pending = subscriber.pending, {}
+            for snapshot in pending.values():
+                yield format_occupancy_event(snapshot)
+    finally:
+        occupancy_broadcaster.unsubscribe(subscriber)
@@ -12,7 +12,14 @@ from models.parking_lots_model import (
     UpdateParkingSessionFinished,
 )
 from utils.session_calculator import calculate_price
-from services import auth_services
+from services import (
+    auth_services,
+    availability_services,
+    geo_services,
+    lot_cache_services,
+    occupancy_services,
+    reservation_index_services,
+)
 from utils import storage_utils
 
 # DONE: DE/INCREMENT RESERVED FIELD FOR PARKING LOTS WHEN A SESSION IS CREATED/DELETED
@@ -25,13 +32,7 @@ from utils import storage_utils
 def create_parking_lot(
     parking_lot: ParkingLot, session_user: Dict[str, str] = Depends(auth_services.require_auth)
 ):
-    parking_lots = storage_utils.load_parking_lot_data()
-
-    new_id = None
-    if parking_lots:
-        new_id = str(max(int(lot["id"]) for lot in parking_lots) + 1)
-    else:
-        new_id = "1"
+    new_id = storage_utils.allocate_id("parking_lots")
 
     parking_lot_entry = {
         "id": new_id,
@@ -39,7 +40,8 @@ def create_parking_lot(
         "location": parking_lot.location,
         "address": parking_lot.address,
         "capacity": parking_lot.capacity,
-        "reserved": parking_lot.reserved,
+        # Spaces are only ever claimed through the occupancy counter, a new lot has none
+        "reserved": 0,
         "tariff": parking_lot.tariff,
         "daytariff": parking_lot.daytariff,
         "created_at": parking_lot.created_at,
@@ -47,40 +49,38 @@ def create_parking_lot(
     }
 
     try:
-        parking_lots.append(parking_lot_entry)
-        storage_utils.save_parking_lot_data(parking_lots)
+        storage_utils.save_new_parking_lot_to_db(parking_lot_entry)
     except Exception as e:
         print(e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to save parking lot"
         )
+    lot_cache_services.invalidate()
+    occupancy_services.refresh(new_id)
+    geo_services.index_parking_lot(parking_lot_entry)
 
     return parking_lot_entry
 
 
 def update_parking_lot(parking_lot_id: str, parking_lot_update: UpdateParkingLot):
-    parking_lots = storage_utils.load_parking_lot_data()
-
-    parking_lot = next(
-        (lot for lot in parking_lots if lot.get("id") == parking_lot_id),
-        None)
-    if parking_lot is None:
-        raise HTTPException(404, "Parking lot not found")
-
     update_data = parking_lot_update.model_dump(exclude_unset=True)
-
-    if "coordinates" in update_data:
-        parking_lot["coordinates"].update(update_data["coordinates"])
-        del update_data["coordinates"]
-
-    parking_lot.update(update_data)
+    # reserved is the live occupancy counter, claims and releases keep it, a value sent here is stale
+    update_data.pop("reserved", None)
 
     try:
-        storage_utils.save_parking_lot_data(parking_lots)
+        storage_utils.update_existing_parking_lot_in_db(parking_lot_id, update_data)
+    except ValueError:
+        raise HTTPException(404, "Parking lot not found")
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update parking lot"
         )
+    parking_lot = storage_utils.get_parking_lot_by_id(parking_lot_id)
+    if parking_lot is None:
+        raise HTTPException(404, "Parking lot not found")
+    lot_cache_services.invalidate()
+    occupancy_services.refresh(parking_lot_id)
+    geo_services.index_parking_lot(parking_lot)
 
     return parking_lot
 
@@ -89,23 +89,17 @@ def update_parking_session(
     parking_lot_id: str, parking_session_id: str, parking_session_update: ParkingSessionCreate
 ):
 
-    parking_lots = storage_utils.load_parking_lot_data()
-    parking_lot = next((lot for lot in parking_lots if lot.get("id") == parking_lot_id), 
-        None)
+    parking_lot = lot_cache_services.get_lot(parking_lot_id)
     if parking_lot is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Could not find parking lot")
 
-    parking_sessions = storage_utils.load_parking_session_data()
-    parking_session = next((session for session in parking_sessions if session.get("id") == parking_session_id), 
-        None)
-    if parking_session is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Could not find parking session")
-
     update_data = parking_session_update.model_dump(exclude_unset=True)
-    parking_session.update(update_data)
 
+    # Only this session's given fields are written, the rest of the table is left alone
     try:
-        storage_utils.save_parking_session_data(parking_sessions)
+        storage_utils.update_existing_parking_session_in_db(parking_session_id, update_data)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Could not find parking session")
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update parking session"
@@ -117,28 +111,20 @@ def start_parking_session(
     session_data: ParkingSessionCreate,
     session_user: Dict[str, str] = Depends(auth_services.require_auth),
 ):
-    parking_lots = storage_utils.load_parking_lot_data()
-    parking_lot = next((lot for lot in parking_lots if lot.get("id") == parking_lot_id), 
-        None)
+    parking_lot = lot_cache_services.get_lot(parking_lot_id)
     if parking_lot is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Could not find parking lot",
         )
-    if parking_lot["reserved"] >= parking_lot["capacity"]:
+
+    # A car parks in one lot at a time, any session of the plate still open is a conflict
+    if storage_utils.get_open_session_by_plate(session_data.licenseplate) is not None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
-            detail="Parking lot is full",
+            detail="A session for this license plate already exists",
         )
 
-    parking_sessions = storage_utils.load_parking_session_data()
-    for session in parking_sessions:
-        if session.get("licenseplate") == session_data.licenseplate:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="A session for this license plate already exists",
-            )
-
     reservation = find_reservation_by_license_plate(parking_lot_id, session_data.licenseplate)
     if reservation:
         start_time = reservation.get("start_time")
@@ -150,10 +136,7 @@ def start_parking_session(
             .replace("+00:00", "")
         )
 
-    if parking_sessions:
-        new_id = str(max(int(session.get("id", 0)) for session in parking_sessions) + 1)
-    else:
-        new_id = "1"
+    new_id = storage_utils.allocate_id("parking_sessions")
 
     parking_session_entry = {
         "id": new_id,
@@ -165,19 +148,25 @@ def start_parking_session(
         # "has_reservation": reservation is not None,
     }
 
+    # Claim the space with a conditional increment so concurrent entries cannot overfill the lot
+    if not occupancy_services.reserve_space(parking_lot_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Parking lot is full",
+        )
+
     try:
-        parking_sessions.append(parking_session_entry)
-        storage_utils.save_parking_session_data(parking_sessions)
-        parking_lot["reserved"] += 1
-        storage_utils.save_parking_lot_data(parking_lots)
+        storage_utils.save_new_parking_session_to_db(parking_session_entry)
 
     except Exception as e:
+        occupancy_services.release_space(parking_lot_id)
         print(e)
         traceback.print_exc()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to save parking session",
         )
+    availability_services.invalidate(parking_lot_id)
 
     return parking_session_entry
 
@@ -188,78 +177,70 @@ def stop_parking_session(
     session_user: Dict[str, str] = Depends(auth_services.require_auth),
 ):
 
-    parking_lots = storage_utils.load_parking_lot_data()
-    parking_lot = next((lot for lot in parking_lots if lot.get("id") == parking_lot_id), 
-        None)
+    parking_lot = lot_cache_services.get_lot(parking_lot_id)
     
     if parking_lot is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Could not find parking lot")
 
-    updated_parking_session_entry = None
-    parking_sessions = storage_utils.load_parking_session_data()
     reservation = find_reservation_by_license_plate(parking_lot_id, session_data.licenseplate)
 
-    for session in parking_sessions:
-        if session["licenseplate"] == session_data.licenseplate:
-
-            if session["user"] != session_user.get("username") and session_user.get("role") != "ADMIN":
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Unauthorized - invalid or missing session token",
-                )
-
-            start_time = datetime.fromisoformat(session["started"])
-            start_time_no_ms = start_time.replace(microsecond=0)
-            stop_time = datetime.now()
-            stop_time_no_ms = stop_time.replace(microsecond=0)
-            duration = stop_time - start_time
-            # Check if duration in minutes should be rounded up or down
-            duration_minutes = int(duration.total_seconds() / 60)
-
-            updated_parking_session_entry = {
-                "licenseplate": session_data.licenseplate,
-                "started": start_time_no_ms.isoformat(),
-                "stopped": stop_time_no_ms.isoformat(),
-                "user": session["user"],
-                "parking_lot_id": parking_lot_id,
-                "duration_minutes": duration_minutes,
-                "cost": 0,
-                # Payment status should be updated through Payment endpoint (probably)
-                "payment_status": "Pending",
-            }
-
-            parking_lots = storage_utils.load_parking_lot_data()
-            parking_session_id = storage_utils.find_parking_session_id_by_plate(
-                parking_lot_id, updated_parking_session_entry.get("licenseplate")
-            )
-
-            lot = next((lot for lot in parking_lots if lot.get("id") == parking_lot_id),
-                None)
-            
-            if lot is None:
-                raise HTTPException(status_code=404, detail="Parking lot not found")
-
-            session_price = calculate_price(
-                lot, parking_session_id, updated_parking_session_entry
-            )
-            updated_parking_session_entry["cost"] = session_price[
-                0
-            ]  # calculate_price() returns tuple, index 0 is the calculated price
-            session = updated_parking_session_entry
-            lot["reserved"] = max(0, lot["reserved"] - 1)
-            break
-
-    if updated_parking_session_entry == None:
+    # Only the open session in this lot, a stopped one must not be stopped (and released) again
+    session = storage_utils.get_open_session_by_plate(session_data.licenseplate, parking_lot_id)
+    if session is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Not Found - Resource does not exist"
         )
 
+    if session["user"] != session_user.get("username") and session_user.get("role") != "ADMIN":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized - invalid or missing session token",
+        )
+
+    start_time = datetime.fromisoformat(session["started"])
+    start_time_no_ms = start_time.replace(microsecond=0)
+    stop_time = datetime.now()
+    stop_time_no_ms = stop_time.replace(microsecond=0)
+    duration = stop_time - start_time
+    # Check if duration in minutes should be rounded up or down
+    duration_minutes = int(duration.total_seconds() / 60)
+
+    updated_parking_session_entry = {
+        "licenseplate": session_data.licenseplate,
+        "started": start_time_no_ms.isoformat(),
+        "stopped": stop_time_no_ms.isoformat(),
+        "user": session["user"],
+        "parking_lot_id": parking_lot_id,
+        "duration_minutes": duration_minutes,
+        "cost": 0,
+        # Payment status should be updated through Payment endpoint (probably)
+        "payment_status": "Pending",
+    }
+
+    session_price = calculate_price(parking_lot, session.get("id"), updated_parking_session_entry)
+    updated_parking_session_entry["cost"] = session_price[
+        0
+    ]  # calculate_price() returns tuple, index 0 is the calculated price
+
     try:
-        storage_utils.save_parking_session_data(parking_sessions)
+        # Only written while the session is still open, a gate exit or another stop may have won
+        stopped = storage_utils.stop_open_parking_session(session.get("id"), updated_parking_session_entry)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update parking session"
         )
+    if not stopped:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Not Found - Resource does not exist"
+        )
+    session.update(updated_parking_session_entry)
+    updated_parking_session_entry = session
+
+    # The session went from open to stopped, its space is given back once. A session flagged
+    # stale by the lifecycle scheduler gave its space back already.
+    if not session.get("stale_at"):
+        occupancy_services.release_space(parking_lot_id)
+    availability_services.invalidate(parking_lot_id)
 
     if reservation:
         try:
@@ -277,42 +258,34 @@ def stop_parking_session(
 
 
 def delete_parking_lot(parking_lot_id: str):
-    parking_lots = storage_utils.load_parking_lot_data()
-
-    for lot in parking_lots:
-        if lot.get("id") == parking_lot_id:
-            parking_lots.remove(lot)
-            try:
-                storage_utils.save_parking_lot_data(parking_lots)
-            except Exception:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete parking lot"
-                )
-            return
-
-    if parking_lot_id not in parking_lots:
+    try:
+        deleted = storage_utils.delete_parking_lot_from_db(parking_lot_id)
+    except Exception:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Not Found - Resource does not exist"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete parking lot"
         )
-
-
-def delete_parking_session(parking_session_id: str, parking_lot_id: str):
-    parking_sessions = storage_utils.load_parking_session_data()
-    parking_session = next((session for session in parking_sessions if session.get("id") == parking_session_id), 
-        None)
-    
-    if parking_session is None:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Not Found - Resource does not exist"
         )
+    lot_cache_services.invalidate()
+    occupancy_services.invalidate(parking_lot_id)
+    geo_services.remove_parking_lot(parking_lot_id)
+    availability_services.invalidate(parking_lot_id)
+
 
-    parking_sessions.remove(parking_session)
+def delete_parking_session(parking_session_id: str, parking_lot_id: str):
     try:
-        storage_utils.save_parking_session_data(parking_sessions)
+        deleted = storage_utils.delete_parking_session_from_db(parking_session_id)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete parking session"
         )
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Not Found - Resource does not exist"
+        )
+    availability_services.invalidate(parking_lot_id)
 
 
 def get_parking_sessions(
@@ -332,21 +305,12 @@ def get_parking_sessions(
 
 def find_reservation_by_license_plate(parking_lot_id: str, license_plate: str) -> Optional[Dict]:
 
-    reservations = storage_utils.load_reservation_data()
-    vehicles = storage_utils.load_vehicle_data_from_db()
-
-    vehicle_id = None
-    for vehicle in vehicles:
-        if (
-            vehicle.get("license_plate", "").replace("-", "").upper()
-            == license_plate.replace("-", "").upper()
-        ):
-            vehicle_id = vehicle.get("id")
-            break
-
-    if not vehicle_id:
+    vehicle = storage_utils.get_vehicle_by_plate(license_plate)
+    if vehicle is None:
         return None
+    vehicle_id = vehicle.get("id")
 
+    reservations = storage_utils.load_reservation_data()
     for reservation in reservations:
         if (
             reservation.get("vehicle_id") == vehicle_id
@@ -358,12 +322,12 @@ def find_reservation_by_license_plate(parking_lot_id: str, license_plate: str) -
 
 
 def update_reservation_end_time(reservation_id: str, end_time: str):
-    reservations = storage_utils.load_reservation_data()
-
-    for reservation in reservations:
-        if reservation.get("id") == reservation_id:
-            reservation["end_time"] = end_time
-            storage_utils.save_reservation_data(reservations)
-            return
+    # Only end_time is written and the row version goes up, so updates based on an older read conflict
+    def record(table_version):
+        reservation = storage_utils.get_reservation_by_id(reservation_id)
+        reservation_index_services.record_write(reservation_id, reservation, table_version)
 
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+    try:
+        storage_utils.update_existing_reservation_in_db(reservation_id, {"end_time": end_time}, None, record)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
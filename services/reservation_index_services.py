@@ -0,0 +1,413 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import datetime, timedelta
+from heapq import merge
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils import storage_utils
+
+ACTIVE_STATUSES = ("pending", "confirmed")
+# How long the index is trusted before the reservations table version is checked again, so
+# this bounds how long a reservation written by another worker can go unnoticed
+VERSION_CHECK_SECONDS = 1.0
+TIME_FORMAT = "%Y-%m-%dT%H:%M"
+EPOCH = datetime(1970, 1, 1)
+
+# Event kinds, ends sort before starts at the same minute because intervals are [start, end)
+_END, _START = 0, 1
+
+
+def minutes_of(moment: datetime) -> int:
+    return int((moment - EPOCH).total_seconds() // 60)
+
+
+def to_minutes(value: str) -> int:
+    # fromisoformat is about ten times faster than strptime, which adds up when rebuilding the
+    # index. It takes more forms than TIME_FORMAT though, so those are turned away first.
+    if len(value) != 16 or value[10] != "T":
+        raise ValueError(f"time data {value!r} does not match format {TIME_FORMAT!r}")
+    return minutes_of(datetime.fromisoformat(value))
+
+
+def from_minutes(minutes: int) -> str:
+    # Same text as TIME_FORMAT, isoformat is just faster than strftime
+    return (EPOCH + timedelta(minutes=minutes)).isoformat(timespec="minutes")
+
+
+class LotReservationIndex:
+    """
+    Active reservations of one parking lot as [start, end) intervals in epoch minutes.
+    Starts and ends are kept in two sorted lists, so the number of reservations
+    overlapping a window is two binary searches. Peak usage and free slots are found
+    by sweeping only the start/end events that fall inside the window being asked about.
+    """
+
+    def __init__(self):
+        self._intervals: Dict[str, Tuple[int, int]] = {}
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    @classmethod
+    def from_intervals(cls, intervals: Dict[str, Tuple[int, int]]) -> "LotReservationIndex":
+        """Builds the index in one go, sorting once is much cheaper than an insort per reservation."""
+        index = cls()
+        index._intervals = intervals
+        index._starts = sorted(start for start, _ in intervals.values())
+        index._ends = sorted(end for _, end in intervals.values())
+        return index
+
+    def get(self, reservation_id: str) -> Optional[Tuple[int, int]]:
+        return self._intervals.get(reservation_id)
+
+    def add(self, reservation_id: str, start: int, end: int) -> None:
+        self.remove(reservation_id)
+        self._intervals[reservation_id] = (start, end)
+        insort(self._starts, start)
+        insort(self._ends, end)
+
+    def remove(self, reservation_id: str) -> None:
+        interval = self._intervals.pop(reservation_id, None)
+        if interval is None:
+            return
+        del self._starts[bisect_left(self._starts, interval[0])]
+        del self._ends[bisect_left(self._ends, interval[1])]
+
+    def count_overlapping(self, start: int, end: int) -> int:
+        """Reservations that share at least a minute with [start, end)."""
+        # Everything starting before the window closes, minus what ended before it opened
+        return bisect_left(self._starts, end) - bisect_right(self._ends, start)
+
+    def active_at(self, moment: int) -> int:
+        return self._active_at(moment, None)
+
+    def net_changes(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """(minute, starts minus ends) for every minute in (start, end) where that is not zero, in time order."""
+        # Counting in C and combining per distinct minute beats walking every event in Python
+        starts = Counter(self._starts[bisect_right(self._starts, start):bisect_left(self._starts, end)])
+        ends = Counter(self._ends[bisect_right(self._ends, start):bisect_left(self._ends, end)])
+        return sorted(
+            (minute, starts[minute] - ends[minute])
+            for minute in starts.keys() | ends.keys()
+            if starts[minute] != ends[minute]
+        )
+
+    def _active_at(self, moment: int, ignore: Optional[Tuple[int, int]]) -> int:
+        active = bisect_right(self._starts, moment) - bisect_right(self._ends, moment)
+        if ignore is not None and ignore[0] <= moment < ignore[1]:
+            active -= 1
+        return active
+
+    def _events_after(
+        self, moment: int, until: Optional[int], ignore: Optional[Tuple[int, int]]
+    ) -> Iterator[Tuple[int, int]]:
+        """(minute, kind) of every start and end in (moment, until), ends first on ties."""
+        starts_stop = len(self._starts) if until is None else bisect_left(self._starts, until)
+        ends_stop = len(self._ends) if until is None else bisect_left(self._ends, until)
+        starts = ((self._starts[i], _START) for i in range(bisect_right(self._starts, moment), starts_stop))
+        ends = ((self._ends[i], _END) for i in range(bisect_right(self._ends, moment), ends_stop))
+
+        skip_start = ignore is not None
+        skip_end = ignore is not None
+        for minute, kind in merge(ends, starts):
+            if kind == _START and skip_start and minute == ignore[0]:
+                skip_start = False
+                continue
+            if kind == _END and skip_end and minute == ignore[1]:
+                skip_end = False
+                continue
+            yield minute, kind
+
+    def peak(self, start: int, end: int, ignore: Optional[Tuple[int, int]] = None) -> int:
+        """Highest number of reservations held at the same time within [start, end)."""
+        active = self._active_at(start, ignore)
+        highest = active
+        for _, kind in self._events_after(start, end, ignore):
+            active += 1 if kind == _START else -1
+            highest = max(highest, active)
+        return highest
+
+    def earliest_free_slot(
+        self, capacity: int, duration: int, not_before: int, ignore: Optional[Tuple[int, int]] = None
+    ) -> Optional[int]:
+        """First minute from not_before on where fewer than capacity reservations are held for duration minutes."""
+        if capacity <= 0:
+            return None
+        active = self._active_at(not_before, ignore)
+        free_since = not_before if active < capacity else None
+        for minute, kind in self._events_after(not_before, None, ignore):
+            if free_since is not None and minute - free_since >= duration:
+                return free_since
+            if kind == _START:
+                active += 1
+                if active >= capacity:
+                    free_since = None
+            else:
+                active -= 1
+                if active < capacity and free_since is None:
+                    free_since = minute
+        return free_since
+
+
+# Built on first use and kept current by the reservation create/update/delete paths of this
+# process, which hand every write and the table version it produced to record_write(). Writes
+# by other workers and the lifecycle scheduler only show up as a table version this process
+# did not write, which makes ensure_current() rebuild the index. Reservations that already
+# ended are left out, they can't overlap anything still bookable.
+_indexes: Dict[str, LotReservationIndex] = {}
+_reservation_lots: Dict[str, str] = {}
+# Bumped on every change to a lot, so derived data such as availability can tell it is stale
+_versions: Dict[str, int] = {}
+_generation = 0
+_lock = threading.Lock()
+_loaded = False
+# Version of the reservations table the index is known to match, and when that was last checked
+_table_version: Optional[int] = None
+_checked_at = 0.0
+# Own writes that landed past _table_version while a version in between is still unaccounted
+# for: table version -> (reservation id, reservation as written or None when deleted)
+_own_writes: Dict[int, Tuple[str, Optional[Dict]]] = {}
+# Reservations book() let in that are not written yet, a rebuild must not lose them
+_pending: Dict[str, Dict] = {}
+
+
+def _interval(reservation: Dict, now: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """[start, end) of a reservation that still holds a space, None for cancelled or finished ones."""
+    if (reservation.get("status") or "pending") not in ACTIVE_STATUSES:
+        return None
+    try:
+        start, end = to_minutes(reservation["start_time"]), to_minutes(reservation["end_time"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    if start >= end or end <= (minutes_of(datetime.now()) if now is None else now):
+        return None
+    return start, end
+
+
+def _remove_locked(reservation_id: str) -> None:
+    parking_lot_id = _reservation_lots.pop(reservation_id, None)
+    if parking_lot_id is not None:
+        _indexes[parking_lot_id].remove(reservation_id)
+        _versions[parking_lot_id] = _versions.get(parking_lot_id, 0) + 1
+
+
+def _put_locked(reservation: Dict) -> None:
+    reservation_id = str(reservation.get("id"))
+    _remove_locked(reservation_id)
+    interval = _interval(reservation)
+    parking_lot_id = reservation.get("parking_lot_id")
+    if interval is None or parking_lot_id is None:
+        return
+    _indexes.setdefault(parking_lot_id, LotReservationIndex()).add(reservation_id, *interval)
+    _reservation_lots[reservation_id] = parking_lot_id
+    _versions[parking_lot_id] = _versions.get(parking_lot_id, 0) + 1
+
+
+def is_loaded() -> bool:
+    return _loaded
+
+
+def _clear_locked() -> None:
+    global _loaded, _generation
+    _indexes.clear()
+    _reservation_lots.clear()
+    _versions.clear()
+    _generation += 1
+    _loaded = False
+
+
+def _apply_locked(reservation_id: str, reservation: Optional[Dict]) -> None:
+    if reservation is None:
+        _remove_locked(reservation_id)
+    else:
+        _put_locked(reservation)
+
+
+def _advance_locked() -> None:
+    """Moves _table_version over own writes that directly follow it."""
+    global _table_version
+    while _table_version is not None and _table_version + 1 in _own_writes:
+        _table_version += 1
+        del _own_writes[_table_version]
+
+
+def _rebuild_locked(reservations: List[Dict], table_version: Optional[int]) -> None:
+    global _loaded, _table_version, _checked_at
+    _clear_locked()
+    intervals_by_lot: Dict[str, Dict[str, Tuple[int, int]]] = {}
+    now = minutes_of(datetime.now())
+    for reservation in reservations:
+        interval = _interval(reservation, now)
+        parking_lot_id = reservation.get("parking_lot_id")
+        if interval is None or parking_lot_id is None:
+            continue
+        reservation_id = str(reservation.get("id"))
+        intervals_by_lot.setdefault(parking_lot_id, {})[reservation_id] = interval
+        _reservation_lots[reservation_id] = parking_lot_id
+    for parking_lot_id, intervals in intervals_by_lot.items():
+        _indexes[parking_lot_id] = LotReservationIndex.from_intervals(intervals)
+    _loaded = True
+    _table_version, _checked_at = table_version, time.monotonic()
+
+    # Own writes newer than the loaded rows still apply, older ones are in them already
+    for own_version in sorted(_own_writes):
+        reservation_id, reservation = _own_writes[own_version]
+        if table_version is None or own_version <= table_version:
+            del _own_writes[own_version]
+        else:
+            _apply_locked(reservation_id, reservation)
+    _advance_locked()
+    # Booked but not written yet, later bookings have to count them
+    for reservation in _pending.values():
+        _put_locked(reservation)
+
+
+def ensure_loaded(reservations: List[Dict]) -> None:
+    """
+    Builds the index from a full reservation list unless that already happened. The list is
+    taken as the current table, ensure_current() rebuilds once the table version moves on.
+    """
+    if _loaded:
+        return
+    version = storage_utils.get_table_version("reservations")
+    with _lock:
+        if _loaded:
+            return
+        _rebuild_locked(reservations, version)
+
+
+def ensure_current(
+    load_reservations: Callable[[], Optional[List[Dict]]], table_version: Optional[int] = None
+) -> None:
+    """
+    Builds the index on first use and rebuilds it from load_reservations() when another
+    process wrote the reservations table since. Callers that load the reservations anyway
+    pass the table_version they read before loading them, otherwise it is read here, at most
+    every VERSION_CHECK_SECONDS. Versions only go up, so one older than what the index already
+    matches comes from a read that raced with a write of this process and is ignored.
+    """
+    global _checked_at
+    now = time.monotonic()
+    if table_version is None:
+        if _loaded and now - _checked_at < VERSION_CHECK_SECONDS:
+            return
+        # Version first, a write landing during the load then shows up as a newer version next check
+        table_version = storage_utils.get_table_version("reservations")
+    if _loaded and _table_version is not None and table_version <= _table_version:
+        _checked_at = now
+        return
+    reservations = load_reservations() or []
+    with _lock:
+        if _loaded and _table_version is not None and table_version <= _table_version:
+            # Another rebuild or own writes got past this version while loading
+            return
+        _rebuild_locked(reservations, table_version)
+
+
+def reset() -> None:
+    """Forgets everything, the next ensure_loaded() or ensure_current() rebuilds the index."""
+    global _table_version
+    with _lock:
+        _clear_locked()
+        _table_version = None
+        _own_writes.clear()
+        _pending.clear()
+
+
+def version(parking_lot_id: str) -> Tuple[int, int]:
+    """Changes whenever a reservation of the lot is added, moved or removed."""
+    return _generation, _versions.get(parking_lot_id, 0)
+
+
+def changes_between(parking_lot_id: str, start: int, end: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    Reservations held at minute start, plus the net change in held reservations at
+    every minute inside (start, end) where some start or end, in time order.
+    """
+    with _lock:
+        index = _indexes.get(parking_lot_id)
+        if index is None:
+            return 0, []
+        return index.active_at(start), index.net_changes(start, end)
+
+
+def upsert(reservation: Dict) -> None:
+    """Puts a reservation back as it is stored, e.g. after its booked change failed to save."""
+    with _lock:
+        _pending.pop(str(reservation.get("id")), None)
+        if _loaded:
+            _put_locked(reservation)
+
+
+def remove(reservation_id: str) -> None:
+    with _lock:
+        _pending.pop(reservation_id, None)
+        _remove_locked(reservation_id)
+
+
+def record_write(reservation_id: str, reservation: Optional[Dict], table_version: Optional[int]) -> None:
+    """
+    Records a committed write of this process, reservation None for a delete. table_version is
+    the version the write gave the reservations table, so ensure_current() does not mistake it
+    for a write of another worker, None with mock data.
+    """
+    with _lock:
+        _pending.pop(reservation_id, None)
+        if not _loaded:
+            return
+        if table_version is not None and _table_version is not None and table_version <= _table_version:
+            # A rebuild at or past this version loaded the row already
+            return
+        _apply_locked(reservation_id, reservation)
+        if table_version is not None and _table_version is not None:
+            _own_writes[table_version] = (reservation_id, reservation)
+            _advance_locked()
+
+
+def recorder(reservation_id: str, reservation: Optional[Dict]) -> Callable[[Optional[int]], None]:
+    """record_write() for the reservation, as the on_table_version callback of the storage writers."""
+    return lambda table_version: record_write(reservation_id, reservation, table_version)
+
+
+def book(reservation: Dict, capacity: int) -> bool:
+    """
+    Adds the reservation if fewer than capacity reservations overlap at every minute of it.
+    The check and the insert happen under one lock, so two requests can't both get the last space.
+    A reservation that is already indexed is replaced, and does not count against itself.
+    """
+    reservation_id = str(reservation.get("id"))
+    interval = _interval(reservation)
+    with _lock:
+        if interval is not None:
+            index = _indexes.setdefault(reservation.get("parking_lot_id"), LotReservationIndex())
+            ignore = index.get(reservation_id)
+            if index.peak(*interval, ignore=ignore) >= capacity:
+                return False
+        _put_locked(reservation)
+        # Held until record_write() or its undo, so a rebuild in between keeps it
+        _pending[reservation_id] = reservation
+    return True
+
+
+def count_overlapping(parking_lot_id: str, start_time: str, end_time: str) -> int:
+    with _lock:
+        index = _indexes.get(parking_lot_id)
+        return index.count_overlapping(to_minutes(start_time), to_minutes(end_time)) if index else 0
+
+
+def earliest_available_time(
+    parking_lot_id: str, capacity: int, start_time: str, end_time: str, reservation_id: Optional[str] = None
+) -> Optional[str]:
+    """Earliest start at or after start_time where a space is free for the whole requested duration."""
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    with _lock:
+        index = _indexes.get(parking_lot_id)
+        if index is None:
+            return start_time if capacity > 0 else None
+        ignore = index.get(reservation_id) if reservation_id is not None else None
+        slot = index.earliest_free_slot(capacity, end - start, start, ignore)
+    return from_minutes(slot) if slot is not None else None
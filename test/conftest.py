@@ -2,6 +2,7 @@ import pytest
 import os
 from fastapi.testclient import TestClient
 from main import app
+from services import lot_cache_services
 
 @pytest.fixture(scope="session", autouse=True)
 def mock_env():
@@ -11,6 +12,14 @@ def mock_env():
     # We don't force it here because we want to allow USE_MOCK_DATA=false too.
     yield
 
+@pytest.fixture(autouse=True)
+def fresh_lot_cache():
+    # Tests swap the storage behind the cache, a copy loaded by an earlier test would leak into the next
+    lot_cache_services.invalidate()
+    yield
+    lot_cache_services.invalidate()
+
+
 @pytest.fixture(scope="session")
 def client():
     with TestClient(app) as c:
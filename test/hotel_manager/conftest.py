@@ -205,11 +205,10 @@ def client(test_db, monkeypatch):
 
     import endpoints.hotel_manager_endpoint as hotel_routes
 
-    monkeypatch.setattr(hotel_routes, "load_parking_lot_data", storage_utils.load_parking_lot_data_from_db)
     monkeypatch.setattr(hotel_routes, "get_discount_by_code", storage_utils.get_discount_by_code)
     monkeypatch.setattr(hotel_routes, "save_new_discount_to_db", storage_utils.save_new_discount_to_db)
     monkeypatch.setattr(
-        hotel_routes, "load_discounts_data_from_db", storage_utils.load_discounts_data_from_db
+        hotel_routes, "get_discounts_by_creator", storage_utils.get_discounts_by_creator
     )
     monkeypatch.setattr(
         hotel_routes, "update_existing_discount_in_db", storage_utils.update_existing_discount_in_db
@@ -1,19 +1,21 @@
 import pytest
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Response, status
 
 from endpoints.hotel_manager_endpoint import (
     router,
     require_auth,
     require_hotel_manager,
     create_hotel_discount_code,
+    create_hotel_discount_codes_batch,
     get_hotel_discount_codes,
     get_hotel_discount_code_by_code,
     get_managed_parking_lot,
     deactivate_hotel_discount_code,
+    DISCOUNT_CODES_PAGE_SIZE,
 )
-from models.hotel_manager_model import HotelDiscountCodeCreate
+from models.hotel_manager_model import HotelDiscountCodeCreate, HotelDiscountCodeBatchCreate, HotelGuest
 
 
 class TestRequireAuthDependency:
@@ -91,7 +93,7 @@ class TestRequireHotelManagerDependency:
 class TestCreateHotelDiscountCode:
     """test create_hotel_discount_code endpoint"""
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     @patch("endpoints.hotel_manager_endpoint.get_discount_by_code")
     @patch("endpoints.hotel_manager_endpoint.save_new_discount_to_db")
     def test_create_discount_code_success_dict_format(self, mock_save, mock_get_discount, mock_load_lots):
@@ -115,7 +117,7 @@ class TestCreateHotelDiscountCode:
         assert response["created_by"] == "test_mgr"
         mock_save.assert_called_once()
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     @patch("endpoints.hotel_manager_endpoint.get_discount_by_code")
     @patch("endpoints.hotel_manager_endpoint.save_new_discount_to_db")
     def test_create_discount_code_success_list_format(self, mock_save, mock_get_discount, mock_load_lots):
@@ -133,7 +135,7 @@ class TestCreateHotelDiscountCode:
         assert response["discount_value"] == 100.0
         mock_save.assert_called_once()
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_create_discount_code_parking_lot_not_found_dict(self, mock_load_lots):
         """test parking lot not found with dict format"""
         check_in = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
@@ -148,7 +150,7 @@ class TestCreateHotelDiscountCode:
         assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
         assert "not found" in exc_info.value.detail
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_create_discount_code_parking_lot_not_found_list(self, mock_load_lots):
         """test parking lot not found with list format"""
         check_in = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
@@ -162,7 +164,7 @@ class TestCreateHotelDiscountCode:
             create_hotel_discount_code(discount_create, session_user)
         assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     @patch("endpoints.hotel_manager_endpoint.get_discount_by_code")
     def test_create_discount_code_duplicate(self, mock_get_discount, mock_load_lots):
         """test creating duplicate discount code raises 409"""
@@ -179,7 +181,7 @@ class TestCreateHotelDiscountCode:
         assert exc_info.value.status_code == status.HTTP_409_CONFLICT
         assert "already exists" in exc_info.value.detail
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     @patch("endpoints.hotel_manager_endpoint.get_discount_by_code")
     def test_create_discount_code_past_checkin(self, mock_get_discount, mock_load_lots):
         """test creating code with past checkin date raises 422"""
@@ -196,7 +198,7 @@ class TestCreateHotelDiscountCode:
         assert exc_info.value.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
         assert "past" in exc_info.value.detail.lower()
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     @patch("endpoints.hotel_manager_endpoint.get_discount_by_code")
     @patch("endpoints.hotel_manager_endpoint.save_new_discount_to_db")
     def test_create_discount_code_save_failure(self, mock_save, mock_get_discount, mock_load_lots):
@@ -215,7 +217,7 @@ class TestCreateHotelDiscountCode:
         assert exc_info.value.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
         assert "Failed to save" in exc_info.value.detail
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     @patch("endpoints.hotel_manager_endpoint.get_discount_by_code")
     @patch("endpoints.hotel_manager_endpoint.save_new_discount_to_db")
     def test_create_discount_code_correct_structure(self, mock_save, mock_get_discount, mock_load_lots):
@@ -251,44 +253,121 @@ class TestCreateHotelDiscountCode:
         assert "created_at" in saved_code
 
 
+class TestCreateHotelDiscountCodesBatch:
+    """test create_hotel_discount_codes_batch endpoint"""
+
+    def stay(self):
+        check_in = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        check_out = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+        return {"check_in_date": check_in, "check_out_date": check_out}
+
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.hotel_manager_endpoint.save_new_discounts_to_db")
+    def test_batch_for_guests(self, mock_save, mock_load_lots):
+        """test one code per guest, saved with a single call"""
+        mock_load_lots.return_value = {"1": {"name": "Test lot"}}
+        mock_save.return_value = set()
+        session_user = {"username": "test_mgr", "managed_parking_lot_id": "1"}
+        batch_create = HotelDiscountCodeBatchCreate(
+            **self.stay(),
+            guests=[HotelGuest(guest_name="Ann"), HotelGuest(guest_name="Bob", notes="VIP")],
+            prefix="CONF",
+            notes="Conference",
+        )
+        response = create_hotel_discount_codes_batch(batch_create, session_user)
+        assert [code["guest_name"] for code in response] == ["Ann", "Bob"]
+        assert [code["notes"] for code in response] == ["Conference", "VIP"]
+        assert all(code["code"].startswith("CONF-") and code["parking_lot_id"] == "1" for code in response)
+        assert len({code["code"] for code in response}) == 2
+        mock_save.assert_called_once()
+
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.hotel_manager_endpoint.save_new_discounts_to_db")
+    def test_batch_replaces_taken_codes(self, mock_save, mock_load_lots):
+        """test codes that are taken already are generated again"""
+        mock_load_lots.return_value = {"1": {"name": "Test lot"}}
+        saved = []
+
+        def save(discount_codes):
+            codes = [code["code"] for code in discount_codes]
+            saved.append(codes)
+            return {codes[0]} if len(saved) == 1 else set()
+
+        mock_save.side_effect = save
+        session_user = {"username": "test_mgr", "managed_parking_lot_id": "1"}
+        response = create_hotel_discount_codes_batch(HotelDiscountCodeBatchCreate(**self.stay(), count=3), session_user)
+        assert len(saved) == 2
+        assert saved[1][0] != saved[0][0] and saved[1][1:] == saved[0][1:]
+        assert [code["code"] for code in response] == saved[1]
+
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.hotel_manager_endpoint.save_new_discounts_to_db")
+    def test_batch_save_failure(self, mock_save, mock_load_lots):
+        """test a failing save is a 500 and nothing is returned"""
+        mock_load_lots.return_value = {"1": {"name": "Test lot"}}
+        mock_save.side_effect = Exception("Database error")
+        session_user = {"username": "test_mgr", "managed_parking_lot_id": "1"}
+        with pytest.raises(HTTPException) as exc_info:
+            create_hotel_discount_codes_batch(HotelDiscountCodeBatchCreate(**self.stay(), count=2), session_user)
+        assert exc_info.value.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    def test_batch_needs_guests_or_count(self):
+        """test the batch takes either guests or a count"""
+        with pytest.raises(ValueError):
+            HotelDiscountCodeBatchCreate(**self.stay())
+        with pytest.raises(ValueError):
+            HotelDiscountCodeBatchCreate(**self.stay(), count=2, guests=[HotelGuest(guest_name="Ann")])
+        with pytest.raises(ValueError):
+            HotelDiscountCodeBatchCreate(**self.stay(), count=1001)
+
+
 class TestGetHotelDiscountCodes:
     """test the get_hotel_discount_codes endpoint"""
 
-    @patch("endpoints.hotel_manager_endpoint.load_discounts_data_from_db")
-    def test_get_discount_codes_success(self, mock_load_discounts):
+    @patch("endpoints.hotel_manager_endpoint.get_discounts_by_creator")
+    def test_get_discount_codes_success(self, mock_get_discounts):
         """test successfully retrieving hotel managers discount codes"""
-        mock_load_discounts.return_value = [
+        mock_get_discounts.return_value = [
             {"code": "CODE-1", "created_by": "test_mgr", "is_hotel_code": True},
-            {"code": "CODE-2", "created_by": "other_mgr", "is_hotel_code": True},
             {"code": "CODE-3", "created_by": "test_mgr", "is_hotel_code": True},
-            {"code": "ADMIN-CODE", "created_by": "admin", "is_hotel_code": False},
         ]
         session_user = {"username": "test_mgr"}
         response = get_hotel_discount_codes(session_user)
         assert len(response) == 2
-        assert all(code["created_by"] == "test_mgr" for code in response)
-        assert all(code["is_hotel_code"] for code in response)
+        mock_get_discounts.assert_called_once_with("test_mgr", after=None, limit=DISCOUNT_CODES_PAGE_SIZE)
+
+    @patch("endpoints.hotel_manager_endpoint.get_discounts_by_creator")
+    def test_get_discount_codes_next_page(self, mock_get_discounts):
+        """test a full page points at the next one"""
+        mock_get_discounts.return_value = [
+            {"code": "CODE-1", "created_by": "test_mgr", "is_hotel_code": True},
+            {"code": "CODE-2", "created_by": "test_mgr", "is_hotel_code": True},
+        ]
+        response = Response()
+        get_hotel_discount_codes({"username": "test_mgr"}, response=response, limit=2, after="CODE-0")
+        assert response.headers["X-Next-After"] == "CODE-2"
+        mock_get_discounts.assert_called_once_with("test_mgr", after="CODE-0", limit=2)
 
-    @patch("endpoints.hotel_manager_endpoint.load_discounts_data_from_db")
-    def test_get_discount_codes_empty(self, mock_load_discounts):
+    @patch("endpoints.hotel_manager_endpoint.get_discounts_by_creator")
+    def test_get_discount_codes_empty(self, mock_get_discounts):
         """test retrieving when no codes exist"""
-        mock_load_discounts.return_value = []
+        mock_get_discounts.return_value = []
         session_user = {"username": "test_mgr"}
         response = get_hotel_discount_codes(session_user)
         assert response == []
 
-    @patch("endpoints.hotel_manager_endpoint.load_discounts_data_from_db")
-    def test_get_discount_codes_none_returned(self, mock_load_discounts):
+    @patch("endpoints.hotel_manager_endpoint.get_discounts_by_creator")
+    def test_get_discount_codes_none_returned(self, mock_get_discounts):
         """test when load returns none"""
-        mock_load_discounts.return_value = None
+        mock_get_discounts.return_value = None
         session_user = {"username": "test_mgr"}
         response = get_hotel_discount_codes(session_user)
         assert response == []
 
-    @patch("endpoints.hotel_manager_endpoint.load_discounts_data_from_db")
-    def test_get_discount_codes_database_error(self, mock_load_discounts):
+    @patch("endpoints.hotel_manager_endpoint.get_discounts_by_creator")
+    def test_get_discount_codes_database_error(self, mock_get_discounts):
         """test database error handling"""
-        mock_load_discounts.side_effect = Exception("Database error")
+        mock_get_discounts.side_effect = Exception("Database error")
         session_user = {"username": "test_mgr"}
         with pytest.raises(HTTPException) as exc_info:
             get_hotel_discount_codes(session_user)
@@ -408,7 +487,7 @@ class TestDeactivateHotelDiscountCode:
 class TestGetManagedParkingLot:
     """test the get_managed_parking_lot endpoint"""
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_get_managed_parking_lot_dict(self, mock_load_lots):
         """test successcully retrieving parking lot in dict format"""
         mock_load_lots.return_value = {"1": {"name": "Test Parking Lot", "capacity": 100, "tariff": 5.0}}
@@ -419,7 +498,7 @@ class TestGetManagedParkingLot:
         assert "Test Parking Lot" in content
         assert '"id":"1"' in content
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_get_managed_parking_lot_list_format(self, mock_load_lots):
         """test successfully retrieving parking lot in list format"""
         mock_load_lots.return_value = [
@@ -433,7 +512,7 @@ class TestGetManagedParkingLot:
         assert "Test Parking Lot" in content
         assert "Other Lot" not in content
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_get_managed_parking_lot_found_dict(self, mock_load_lots):
         """test parking lot not found in dict format raises 404"""
         mock_load_lots.return_value = {"2": {"name": "Other Lot"}}
@@ -443,7 +522,7 @@ class TestGetManagedParkingLot:
         assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
         assert "not found" in exc_info.value.detail
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_get_managed_parking_lot_not_found_list(self, mock_load_lots):
         """test parking lot not found in list format raises 404"""
         mock_load_lots.return_value = [{"id": "2", "name": "Other Lot"}]
@@ -452,7 +531,7 @@ class TestGetManagedParkingLot:
             get_managed_parking_lot(session_user)
         assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
 
-    @patch("endpoints.hotel_manager_endpoint.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_get_managed_parking_lot_database_error(self, mock_load_lots):
         """test database error handling"""
         mock_load_lots.side_effect = Exception("Database error")
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils import async_storage_utils, storage_utils
+
+
+def test_run_uses_the_storage_pool():
+    def which_thread(value):
+        return value, threading.current_thread().name
+
+    value, thread_name = asyncio.run(async_storage_utils.run(which_thread, 42))
+
+    assert value == 42
+    assert thread_name.startswith("storage")
+
+
+def test_exceptions_reach_the_caller():
+    def fail():
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError, match="broken"):
+        asyncio.run(async_storage_utils.run(fail))
+
+
+def test_queue_is_bounded(monkeypatch):
+    monkeypatch.setattr(async_storage_utils, "STORAGE_QUEUE_SIZE", 2)
+    running = []
+    highest = []
+    lock = threading.Lock()
+
+    def slow():
+        with lock:
+            running.append(1)
+            highest.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.pop()
+
+    async def burst():
+        await asyncio.gather(*(async_storage_utils.run(slow) for _ in range(10)))
+
+    asyncio.run(burst())
+
+    assert len(highest) == 10
+    assert max(highest) <= 2
+
+
+def test_mirrors_storage_utils(monkeypatch):
+    monkeypatch.setattr(storage_utils, "get_payment_data_by_id", lambda payment_id: {"transaction": payment_id})
+
+    payment = asyncio.run(async_storage_utils.get_payment_data_by_id("abc"))
+
+    assert payment == {"transaction": "abc"}
+    assert async_storage_utils.get_payment_data_by_id.__name__ == "<lambda>"
+
+
+def test_unknown_names_raise_attribute_error():
+    with pytest.raises(AttributeError):
+        async_storage_utils.no_such_function
+    with pytest.raises(AttributeError):
+        async_storage_utils.DB_PATH
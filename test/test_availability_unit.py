@@ -0,0 +1,141 @@
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from main import app
+from services import availability_services, reservation_index_services
+
+client = TestClient(app)
+
+
+def reservation(reservation_id, start_time, end_time):
+    return {
+        "id": reservation_id,
+        "parking_lot_id": "1",
+        "start_time": start_time,
+        "end_time": end_time,
+        "status": "confirmed",
+    }
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    active_sessions = {}
+    monkeypatch.setattr(
+        "services.availability_services.storage_utils.get_open_sessions_by_lot",
+        lambda parking_lot_id: [s for s in active_sessions.values() if not s.get("stopped")],
+    )
+    reservation_index_services.reset()
+    availability_services.invalidate()
+    yield active_sessions
+    reservation_index_services.reset()
+    availability_services.invalidate()
+
+
+def test_sweep_matches_brute_force():
+    rng = random.Random(11)
+    intervals = []
+    for _ in range(200):
+        start = rng.randrange(-50, 500)
+        intervals.append((start, start + rng.randrange(1, 80)))
+    changes = sorted(
+        [(s, 1) for s, e in intervals if 0 < s < 480] + [(e, -1) for s, e in intervals if 0 < e < 480]
+    )
+    active = sum(1 for s, e in intervals if s <= 0 < e)
+
+    buckets = availability_services.sweep(40, 0, 480, 45, active, changes)
+
+    assert len(buckets) == 11
+    for number, bucket in enumerate(buckets):
+        minutes = range(number * 45, min((number + 1) * 45, 480))
+        expected = max(sum(1 for s, e in intervals if s <= minute < e) for minute in minutes)
+        assert bucket["occupied"] == expected
+        assert bucket["free"] == max(0, 40 - expected)
+
+
+def test_sweep_interval_ending_on_bucket_boundary():
+    buckets = availability_services.sweep(2, 0, 120, 60, 1, [(60, -1)])
+
+    assert [bucket["occupied"] for bucket in buckets] == [1, 0]
+
+
+def test_availability_from_reservations(sessions):
+    reservation_index_services.ensure_loaded([
+        reservation("1", "2099-01-01T10:00", "2099-01-01T12:00"),
+        reservation("2", "2099-01-01T11:00", "2099-01-01T11:30"),
+    ])
+
+    buckets = availability_services.get_availability("1", 5, "2099-01-01T09:00", "2099-01-01T13:00", 60)
+
+    assert [bucket["start"] for bucket in buckets] == [
+        "2099-01-01T09:00", "2099-01-01T10:00", "2099-01-01T11:00", "2099-01-01T12:00"
+    ]
+    assert [bucket["free"] for bucket in buckets] == [5, 4, 3, 5]
+
+
+def test_active_sessions_hold_a_space_until_now(sessions):
+    sessions["1"] = {"id": "1", "started": "2000-01-01T10:00", "stopped": None, "parking_lot_id": "1"}
+    sessions["2"] = {"id": "2", "started": "2000-01-01T10:00", "stopped": "2000-01-01T11:00", "parking_lot_id": "1"}
+
+    past = availability_services.get_availability("1", 5, "2000-01-01T09:00", "2000-01-01T11:00", 60)
+    future = availability_services.get_availability("1", 5, "2099-01-01T09:00", "2099-01-01T11:00", 60)
+
+    assert [bucket["free"] for bucket in past] == [5, 4]
+    assert [bucket["free"] for bucket in future] == [5, 5]
+
+
+def test_cache_is_invalidated_by_reservation_writes(sessions):
+    reservation_index_services.ensure_loaded([])
+    window = ("1", 5, "2099-01-01T10:00", "2099-01-01T12:00", 60)
+
+    first = availability_services.get_availability(*window)
+    assert availability_services.get_availability(*window) is first
+
+    reservation_index_services.book(reservation("1", "2099-01-01T10:30", "2099-01-01T11:00"), 5)
+    second = availability_services.get_availability(*window)
+
+    assert second is not first
+    assert [bucket["free"] for bucket in second] == [4, 5]
+
+
+@patch("endpoints.parking_lots.occupancy_services.get_occupancy")
+def test_availability_endpoint(mock_get_occupancy, sessions):
+    mock_get_occupancy.return_value = {"capacity": 3, "reserved": 0, "free": 3}
+    reservation_index_services.ensure_loaded([reservation("1", "2099-01-01T10:00", "2099-01-02T10:00")])
+
+    response = client.get(
+        "/parking-lots/1/availability",
+        params={"from": "2099-01-01T00:00", "to": "2099-01-03T00:00", "granularity": 60 * 24},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["capacity"] == 3
+    assert [bucket["free"] for bucket in data["buckets"]] == [2, 2]
+
+
+@patch("endpoints.parking_lots.occupancy_services.get_occupancy")
+def test_availability_endpoint_validation(mock_get_occupancy):
+    mock_get_occupancy.return_value = {"capacity": 3, "reserved": 0, "free": 3}
+
+    inverted = client.get("/parking-lots/1/availability", params={"from": "2099-01-02T00:00", "to": "2099-01-01T00:00"})
+    malformed = client.get("/parking-lots/1/availability", params={"from": "tomorrow", "to": "2099-01-01T00:00"})
+    too_many = client.get(
+        "/parking-lots/1/availability",
+        params={"from": "2099-01-01T00:00", "to": "2199-01-01T00:00", "granularity": 1},
+    )
+
+    assert inverted.status_code == 422
+    assert malformed.status_code == 422
+    assert too_many.status_code == 422
+
+
+@patch("endpoints.parking_lots.occupancy_services.get_occupancy")
+def test_availability_unknown_parking_lot(mock_get_occupancy):
+    mock_get_occupancy.return_value = None
+
+    response = client.get("/parking-lots/999/availability", params={"from": "2099-01-01T00:00", "to": "2099-01-02T00:00"})
+
+    assert response.status_code == 404
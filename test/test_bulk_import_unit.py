@@ -0,0 +1,101 @@
+import json
+from contextlib import closing
+
+import pytest
+
+from scripts import bulk_import
+from utils import storage_utils
+
+
+@pytest.fixture
+def import_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "import.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    monkeypatch.setattr(storage_utils, "_id_blocks", {})
+    storage_utils.init_db()
+    yield tmp_path
+
+
+def write_sessions(path, count, first=1):
+    sessions = {
+        str(i): {"licenseplate": f"AB-{i}", "started": "2025-01-01T08:00", "stopped": "2025-01-01T09:00:00", "user": "u"}
+        for i in range(first, first + count)
+    }
+    path.write_text(json.dumps(sessions, indent=2))
+
+
+def count(table):
+    with closing(storage_utils.get_db_connection()) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_stream_parser_matches_json_load(tmp_path, chunk_size):
+    records = [{"id": str(i), "amount": i * 1.5, "nested": {"text": "é \" }"}, "n": 10**i} for i in range(20)]
+    list_file, dict_file = tmp_path / "list.json", tmp_path / "dict.json"
+    list_file.write_text(json.dumps(records))
+    dict_file.write_text(json.dumps({r["id"]: r for r in records}, indent=4))
+
+    assert [r for _, r in bulk_import.iter_json_records(list_file, chunk_size)] == records
+    assert list(bulk_import.iter_json_records(dict_file, chunk_size)) == [(r["id"], r) for r in records]
+
+
+def test_session_files_get_their_lot_id(import_db):
+    write_sessions(import_db / "p7-sessions.json", 12)
+
+    totals = bulk_import.run(
+        ["parking_sessions"], {"parking_sessions": str(import_db / "p*-sessions.json")}, batch_size=5
+    )
+
+    assert totals == {"parking_sessions": 12}
+    session = storage_utils.load_single_json_from_db("parking_sessions", "id", "3")
+    assert session["parking_lot_id"] == "7"
+    assert session["plate_norm"] == "AB3"
+    # The id counter moved past the imported sessions
+    assert storage_utils.allocate_id("parking_sessions") == "13"
+
+
+def test_failed_import_resumes_after_last_batch(import_db, monkeypatch):
+    source = import_db / "p1-sessions.json"
+    write_sessions(source, 10)
+    insert = storage_utils.insert_json_batch
+    calls = []
+
+    def crash_on_second_batch(conn, table_name, items):
+        calls.append(len(items))
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        return insert(conn, table_name, items)
+
+    monkeypatch.setattr(storage_utils, "insert_json_batch", crash_on_second_batch)
+    with pytest.raises(RuntimeError):
+        bulk_import.import_file("parking_sessions", str(source), batch_size=4)
+    assert count("parking_sessions") == 4
+
+    monkeypatch.setattr(storage_utils, "insert_json_batch", insert)
+    result = bulk_import.import_file("parking_sessions", str(source), batch_size=4)
+
+    assert result["inserted"] == 6
+    assert count("parking_sessions") == 10
+    assert bulk_import.import_file("parking_sessions", str(source))["skipped"]
+
+
+def test_parallel_import_of_several_tables(import_db):
+    write_sessions(import_db / "p1-sessions.json", 50)
+    write_sessions(import_db / "p2-sessions.json", 50, first=51)
+    (import_db / "payments.json").write_text(
+        json.dumps([{"transaction": f"t{i}", "amount": 1.0, "created_at": "1767730219", "extra": "x"} for i in range(30)])
+    )
+
+    totals = bulk_import.run(
+        ["parking_sessions", "payments"],
+        {
+            "parking_sessions": str(import_db / "p*-sessions.json"),
+            "payments": str(import_db / "payments.json"),
+        },
+        workers=2,
+        batch_size=20,
+    )
+
+    assert totals == {"parking_sessions": 100, "payments": 30}
+    assert storage_utils.get_payment_data_by_id("t1")["created_ts"] == 1767730219
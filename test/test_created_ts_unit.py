@@ -0,0 +1,124 @@
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from utils import storage_utils
+
+client = TestClient(app)
+
+MOCK_ADMIN = {"username": "adminuser", "role": "ADMIN"}
+MOCK_USER = {"username": "testuser", "role": "USER"}
+
+
+def legacy(epoch):
+    return f"{datetime.fromtimestamp(epoch).strftime('%d-%m-%Y %H:%M:%S')}{epoch}"
+
+
+def payment(transaction, epoch, initiator="testuser"):
+    return {"transaction": transaction, "amount": 1.0, "initiator": initiator, "created_at": legacy(epoch)}
+
+
+@pytest.fixture
+def timestamp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "timestamps.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    yield
+
+
+def test_parse_created_at_formats():
+    assert storage_utils.parse_created_at("06-01-2026 21:10:191767730219") == 1767730219
+    assert storage_utils.parse_created_at("1704067200") == 1704067200
+    assert storage_utils.parse_created_at(legacy(1767730219)[:19]) == 1767730219
+    assert storage_utils.parse_created_at(datetime.fromtimestamp(1767730219).isoformat()) == 1767730219
+    assert storage_utils.parse_created_at("yesterday") is None
+    assert storage_utils.parse_created_at(None) is None
+
+
+def test_created_ts_is_written_next_to_legacy_string(timestamp_db):
+    storage_utils.insert_single_json_to_db("payments", payment("txn_1", 1767730219))
+
+    stored = storage_utils.get_payment_data_by_id("txn_1")
+    assert stored["created_at"] == legacy(1767730219)
+    assert stored["created_ts"] == 1767730219
+
+
+def test_migration_backfills_old_rows(tmp_path, monkeypatch):
+    db_path = tmp_path / "old.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE refunds (refund_id TEXT PRIMARY KEY, created_at TEXT)")
+        conn.execute("INSERT INTO refunds VALUES ('r1', '06-01-2026 21:12:021767730322')")
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+
+    storage_utils.init_db()
+
+    assert storage_utils.get_refund_by_id("r1")["created_ts"] == 1767730322
+
+
+def test_range_query_uses_the_index(timestamp_db):
+    storage_utils.save_json_to_db(
+        "payments",
+        [
+            payment("late", 3000),
+            payment("early", 1000),
+            payment("middle", 2000),
+            payment("other", 2000, initiator="someone"),
+        ],
+    )
+
+    in_range = storage_utils.get_payments_created_between(1500, 3000, "testuser")
+    assert [p["transaction"] for p in in_range] == ["middle", "late"]
+    assert len(storage_utils.get_payments_created_between(until=2000)) == 3
+
+    with closing(storage_utils.get_db_connection()) as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM payments WHERE created_ts >= ? AND created_ts <= ?", (1, 2)
+        ).fetchall()
+    assert "idx_payments_created_ts" in str(plan)
+
+
+def test_mock_data_range(tmp_path, monkeypatch):
+    mock_file = tmp_path / "payments.json"
+    monkeypatch.setattr(storage_utils, "use_mock_data", True)
+    monkeypatch.setattr(storage_utils, "MOCK_PAYMENTS", mock_file)
+    storage_utils.save_data(mock_file, [payment("b", 2000), payment("a", 1000), payment("c", 3000)])
+
+    assert [p["transaction"] for p in storage_utils.get_payments_created_between(1000, 2000)] == ["a", "b"]
+
+
+@patch("endpoints.payments_endpoint.get_session")
+@patch("endpoints.payments_endpoint.get_payments_created_between")
+def test_payments_endpoint_date_filter(mock_between, mock_session):
+    mock_session.return_value = MOCK_USER
+    mock_between.return_value = [payment("txn_1", 1767730219)]
+
+    response = client.get(
+        "/payments",
+        params={"created_from": "2026-01-01T00:00:00", "created_to": "2026-02-01T00:00:00"},
+        headers={"Authorization": "valid-token"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()[0]["created_at"] == legacy(1767730219)
+    mock_between.assert_called_once_with(
+        int(datetime(2026, 1, 1).timestamp()), int(datetime(2026, 2, 1).timestamp()), "testuser"
+    )
+
+
+@patch("endpoints.refunds_endpoint.get_session")
+def test_inverted_range_is_rejected(mock_session):
+    mock_session.return_value = MOCK_ADMIN
+
+    response = client.get(
+        "/refunds",
+        params={"created_from": "2026-02-01T00:00:00", "created_to": "2026-01-01T00:00:00"},
+        headers={"Authorization": "valid-token"},
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services import etag_services
+from utils import storage_utils
+
+client = TestClient(app)
+
+PAYMENT = {
+    "amount": 50.0,
+    "session_id": 1,
+    "parking_lot_id": 1,
+    "t_data": {"amount": 50.0, "date": "2026-01-01", "method": "ideal", "issuer": "bank", "bank": "bank"},
+}
+
+
+@pytest.fixture
+def discount_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "discounts.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    storage_utils.invalidate_discount_cache()
+    storage_utils.save_new_discount_to_db(
+        {"code": "SAVE10", "discount_type": "percentage", "discount_value": 10.0, "max_uses": 2, "current_uses": 0, "active": True}
+    )
+    yield
+    storage_utils.invalidate_discount_cache()
+
+
+def lookups():
+    return patch.object(storage_utils, "get_discount_by_code", wraps=storage_utils.get_discount_by_code)
+
+
+def test_known_and_missing_codes_are_served_from_memory(discount_db):
+    with lookups() as get_discount:
+        for _ in range(3):
+            assert storage_utils.get_cached_discount("SAVE10")["discount_value"] == 10.0
+            assert storage_utils.get_cached_discount("GUESSED") is None
+
+    assert get_discount.call_count == 2
+    assert "current_uses" not in storage_utils.get_cached_discount("SAVE10")
+
+
+def test_writes_through_storage_are_seen_right_away(discount_db):
+    assert storage_utils.get_cached_discount("NEW1") is None
+    storage_utils.get_cached_discount("SAVE10")
+
+    storage_utils.save_new_discount_to_db({"code": "NEW1", "discount_type": "fixed", "discount_value": 5.0})
+    storage_utils.update_existing_discount_in_db("SAVE10", {"active": False})
+
+    assert storage_utils.get_cached_discount("NEW1")["discount_value"] == 5.0
+    assert not storage_utils.get_cached_discount("SAVE10")["active"]
+
+
+def test_writes_by_other_workers_show_up_in_the_table_version(discount_db, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DISCOUNT_CACHE_VERSION_CHECK_SECONDS", 0)
+    assert storage_utils.get_cached_discount("ELSEWHERE") is None
+    with storage_utils.get_db_connection() as conn:
+        conn.execute("INSERT INTO discounts (code, discount_type, discount_value) VALUES ('ELSEWHERE', 'fixed', 1.0)")
+        storage_utils._bump_table_version(conn, "discounts")
+        conn.commit()
+
+    assert storage_utils.get_cached_discount("ELSEWHERE") is not None
+
+
+def test_missing_codes_are_bounded(discount_db, monkeypatch):
+    monkeypatch.setattr(storage_utils, "MISSING_DISCOUNT_CACHE_SIZE", 2)
+    for code in ("A", "B", "C"):
+        storage_utils.get_cached_discount(code)
+
+    assert list(storage_utils._missing_discounts) == ["B", "C"]
+
+
+def test_claims_stop_at_max_uses_and_keep_the_cache(discount_db):
+    storage_utils.get_cached_discount("SAVE10")
+    etag = etag_services.table_etag(etag_services.DISCOUNT_TABLES)
+
+    with lookups() as get_discount:
+        assert storage_utils.claim_discount_use("SAVE10") == 1
+        assert storage_utils.claim_discount_use("SAVE10") == 2
+        assert storage_utils.claim_discount_use("SAVE10") is None
+        assert storage_utils.claim_discount_use("GUESSED") is None
+        storage_utils.get_cached_discount("SAVE10")
+
+    assert get_discount.call_count == 0
+    assert storage_utils.get_discount_by_code("SAVE10")["current_uses"] == 2
+    assert etag_services.table_etag(etag_services.DISCOUNT_TABLES) != etag
+
+
+@patch("endpoints.payments_endpoint.get_session")
+def test_checkout_with_discount(mock_session, discount_db):
+    mock_session.return_value = {"username": "driver", "role": "USER"}
+    headers = {"Authorization": "valid-token"}
+
+    responses = [client.post("/payments", json={**PAYMENT, "discount_code": "SAVE10"}, headers=headers) for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [201, 201, 400]
+    assert responses[0].json()["amount"] == 45.0
+    assert client.post("/payments", json={**PAYMENT, "discount_code": "NOPE"}, headers=headers).status_code == 404
+
+
+@patch("endpoints.payments_endpoint.save_new_payment_to_db", side_effect=RuntimeError("disk full"))
+@patch("endpoints.payments_endpoint.get_session")
+def test_failed_checkout_gives_the_use_back(mock_session, mock_save, discount_db):
+    mock_session.return_value = {"username": "driver", "role": "USER"}
+
+    response = client.post("/payments", json={**PAYMENT, "discount_code": "SAVE10"}, headers={"Authorization": "valid-token"})
+
+    assert response.status_code == 500
+    assert storage_utils.get_discount_by_code("SAVE10")["current_uses"] == 0
+    assert storage_utils.release_discount_use("SAVE10") is None
@@ -0,0 +1,132 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from endpoints.hotel_manager_endpoint import get_hotel_discount_codes
+from services import etag_services, occupancy_services
+from utils import storage_utils
+from utils.session_manager import add_session
+
+client = TestClient(app)
+
+
+def discount(code):
+    return {"code": code, "discount_type": "percentage", "discount_value": 10}
+
+
+@pytest.fixture
+def etag_db(tmp_path, monkeypatch):
+    """Temporary database with two lots and one discount code, used through the real endpoints."""
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "etag.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    storage_utils.save_json_to_db(
+        "parking_lots",
+        [
+            {"id": "1", "name": "Centrum", "capacity": 5, "reserved": 0, "tariff": 2.5},
+            {"id": "2", "name": "Station", "capacity": 10, "reserved": 3, "tariff": 1.5},
+        ],
+    )
+    storage_utils.save_json_to_db("discounts", [discount("HOTEL-1")])
+    occupancy_services.invalidate()
+    add_session("admin-token", {"username": "admin", "role": "ADMIN"})
+    yield
+    occupancy_services.invalidate()
+
+
+def test_parking_lot_is_not_modified_with_current_etag(etag_db):
+    first = client.get("/parking-lots/1")
+    etag = first.headers["ETag"]
+
+    second = client.get("/parking-lots/1", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert first.json()["name"] == "Centrum"
+    assert second.status_code == 304
+    assert second.headers["ETag"] == etag
+    assert second.content == b""
+
+
+def test_parking_lot_etags_differ_per_lot(etag_db):
+    assert client.get("/parking-lots/1").headers["ETag"] != client.get("/parking-lots/2").headers["ETag"]
+
+
+def test_parking_lots_etag_changes_on_update(etag_db):
+    etag = client.get("/parking-lots/").headers["ETag"]
+
+    storage_utils.update_single_json_in_db("parking_lots", "id", "1", {"name": "Centrum Oost"})
+    response = client.get("/parking-lots/", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["name"] == "Centrum Oost"
+
+
+def test_parking_lot_etag_changes_when_a_space_is_reserved(etag_db):
+    etag = client.get("/parking-lots/1").headers["ETag"]
+
+    occupancy_services.reserve_space("1")
+    response = client.get("/parking-lots/1", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json()["reserved"] == 1
+
+
+def test_missing_parking_lot_is_still_404(etag_db):
+    assert client.get("/parking-lots/999").status_code == 404
+
+
+def test_discount_codes_etag_changes_on_insert(etag_db):
+    headers = {"Authorization": "admin-token"}
+    first = client.get("/discount-codes", headers=headers)
+    etag = first.headers["ETag"]
+
+    assert client.get("/discount-codes", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    storage_utils.save_new_discount_to_db(discount("HOTEL-2"))
+    response = client.get("/discount-codes", headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+
+def test_hotel_discount_codes_etag_is_per_manager(etag_db):
+    add_session("manager-a", {"username": "hotel_manager", "role": "HOTEL_MANAGER", "managed_parking_lot_id": "1"})
+    add_session("manager-b", {"username": "other_manager", "role": "HOTEL_MANAGER", "managed_parking_lot_id": "2"})
+
+    response_a = client.get("/hotel-manager/discount-codes", headers={"Authorization": "manager-a"})
+    response_b = client.get("/hotel-manager/discount-codes", headers={"Authorization": "manager-b"})
+    cached = client.get(
+        "/hotel-manager/discount-codes",
+        headers={"Authorization": "manager-a", "If-None-Match": response_a.headers["ETag"]},
+    )
+
+    assert response_a.headers["ETag"] != response_b.headers["ETag"]
+    assert cached.status_code == 304
+
+
+def test_hotel_discount_codes_without_request(etag_db, monkeypatch):
+    monkeypatch.setattr(
+        "endpoints.hotel_manager_endpoint.get_discounts_by_creator",
+        lambda username, after, limit: [{**discount("HOTEL-1"), "created_by": username, "is_hotel_code": True}],
+    )
+
+    # Called directly, as the unit tests do, there is nothing to compare against
+    codes = get_hotel_discount_codes({"username": "hotel_manager", "role": "HOTEL_MANAGER"})
+
+    assert [code["code"] for code in codes] == ["HOTEL-1"]
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"xyz", "abc"', True),
+        ("*", True),
+        ('"xyz"', False),
+        (None, False),
+    ],
+)
+def test_matches(header, expected):
+    assert etag_services.matches(header, '"abc"') is expected
@@ -0,0 +1,174 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.parking_lots_model import GateEvent
+from services import gate_event_services, occupancy_services
+from utils import storage_utils
+
+client = TestClient(app)
+
+ADMIN = {"username": "gate-camera", "role": "ADMIN"}
+LOTS = [
+    {"id": "1", "name": "Centrum", "capacity": 1, "reserved": 0, "tariff": 2.0, "daytariff": 20.0},
+    {"id": "2", "name": "Station", "capacity": 10, "reserved": 0, "tariff": 3.0, "daytariff": 15.0},
+]
+
+
+@pytest.fixture
+def gate_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "gate.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    monkeypatch.setattr(storage_utils, "_id_blocks", {})
+    storage_utils.init_db()
+    storage_utils.save_json_to_db("parking_lots", [dict(lot) for lot in LOTS])
+    occupancy_services.invalidate()
+    yield
+    occupancy_services.invalidate()
+
+
+def event(kind, plate, lot="1", at="2026-03-01T09:00:00", **extra):
+    return GateEvent(event=kind, licenseplate=plate, parking_lot_id=lot, timestamp=datetime.fromisoformat(at), **extra)
+
+
+def test_entry_and_exit_in_one_batch(gate_db):
+    results = gate_event_services.process_gate_events(
+        [event("entry", "AB-12-CD"), event("exit", "ab12cd", at="2026-03-01T11:30:00")], ADMIN
+    )
+
+    assert [r["status"] for r in results] == ["started", "stopped"]
+    stopped = results[1]["session"]
+    assert stopped["id"] == results[0]["session"]["id"]
+    assert stopped["duration_minutes"] == 150
+    # 3 started hours at the hourly tariff
+    assert stopped["cost"] == 6.0
+    assert storage_utils.get_parking_lot_occupancy("1") == {"capacity": 1, "reserved": 0}
+    assert occupancy_services.get_occupancy("1")["free"] == 1
+
+
+def test_rejected_events_do_not_stop_the_batch(gate_db):
+    results = gate_event_services.process_gate_events(
+        [
+            event("entry", "AAA-111", event_id="cam-1"),
+            event("entry", "BBB-222"),
+            event("entry", "AAA-111", lot="2"),
+            event("exit", "CCC-333"),
+            event("entry", "DDD-444", lot="404"),
+            event("entry", "BBB-222", lot="2"),
+        ],
+        ADMIN,
+    )
+
+    assert [r.get("reason", r["status"]) for r in results] == [
+        "started",
+        storage_utils.GATE_LOT_FULL,
+        storage_utils.GATE_ALREADY_PARKED,
+        storage_utils.GATE_NO_OPEN_SESSION,
+        gate_event_services.GATE_LOT_NOT_FOUND,
+        "started",
+    ]
+    assert results[0]["event_id"] == "cam-1"
+    assert [r["index"] for r in results] == list(range(6))
+    assert storage_utils.get_parking_lot_occupancy("1")["reserved"] == 1
+    assert storage_utils.get_parking_lot_occupancy("2")["reserved"] == 1
+    assert len(storage_utils.load_parking_sessions_data_from_db()) == 2
+
+
+def test_exit_before_entry_time_costs_nothing(gate_db):
+    gate_event_services.process_gate_events([event("entry", "AB-12-CD")], ADMIN)
+
+    results = gate_event_services.process_gate_events([event("exit", "AB-12-CD", at="2026-03-01T08:00:00")], ADMIN)
+
+    assert results[0]["session"]["duration_minutes"] == 0
+    assert results[0]["session"]["cost"] == 0
+
+
+def test_batch_commits_as_a_whole(gate_db, monkeypatch):
+    bump = storage_utils._bump_table_version
+
+    def failing_bump(conn, table_name):
+        if table_name == "parking_sessions":
+            raise RuntimeError("write failed")
+        bump(conn, table_name)
+
+    monkeypatch.setattr(storage_utils, "_bump_table_version", failing_bump)
+
+    with pytest.raises(RuntimeError):
+        gate_event_services.process_gate_events([event("entry", "AB-12-CD"), event("entry", "XY-34-ZZ", lot="2")], ADMIN)
+
+    # The events went through, the batch did not, so none of them is left behind
+    assert storage_utils.load_parking_sessions_data_from_db() == []
+    assert storage_utils.get_parking_lot_occupancy("1")["reserved"] == 0
+    assert storage_utils.get_parking_lot_occupancy("2")["reserved"] == 0
+
+
+def test_session_stopped_at_the_gate_is_not_stopped_again(gate_db):
+    started = gate_event_services.process_gate_events([event("entry", "AB-12-CD")], ADMIN)[0]["session"]
+    gate_event_services.process_gate_events([event("exit", "AB-12-CD", at="2026-03-01T10:00:00")], ADMIN)
+
+    assert not storage_utils.stop_open_parking_session(started["id"], {"stopped": "2026-03-01T11:00:00"})
+    [session] = storage_utils.load_parking_sessions_data_from_db()
+    assert session["stopped"] == "2026-03-01T10:00:00"
+
+
+def test_mock_data_batch(tmp_path, monkeypatch):
+    lots_file, sessions_file = tmp_path / "lots.json", tmp_path / "sessions.json"
+    monkeypatch.setattr(storage_utils, "use_mock_data", True)
+    monkeypatch.setattr(storage_utils, "MOCK_PARKING_LOTS", lots_file)
+    monkeypatch.setattr(storage_utils, "MOCK_PARKING_SESSIONS", sessions_file)
+    monkeypatch.setattr(storage_utils, "MOCK_TABLE_FILES", {"parking_sessions": sessions_file})
+    monkeypatch.setattr(storage_utils, "_id_blocks", {})
+    monkeypatch.setattr(storage_utils, "_mock_counters", {})
+    storage_utils.save_data(lots_file, [dict(lot) for lot in LOTS])
+    storage_utils.save_data(sessions_file, [])
+
+    results = gate_event_services.process_gate_events(
+        [event("entry", "AB-12-CD", lot="2"), event("exit", "AB-12-CD", lot="2", at="2026-03-01T09:30:00")], ADMIN
+    )
+
+    assert [r["status"] for r in results] == ["started", "stopped"]
+    sessions = storage_utils.load_data(sessions_file)
+    assert sessions[0]["stopped"] == "2026-03-01T09:30:00"
+    assert sessions[0]["cost"] == 3.0
+    assert storage_utils.load_data(lots_file)[1]["reserved"] == 0
+
+
+@patch("services.auth_services.get_session")
+def test_endpoint_requires_admin(mock_session):
+    mock_session.return_value = {"username": "driver", "role": "USER"}
+
+    response = client.post(
+        "/parking-lots/gate-events",
+        json={"events": [{"event": "entry", "licenseplate": "AB-12-CD", "parking_lot_id": "1"}]},
+        headers={"Authorization": "valid-token"},
+    )
+
+    assert response.status_code == 403
+
+
+@patch("services.auth_services.get_session")
+@patch("endpoints.parking_lots.gate_event_services.process_gate_events")
+def test_endpoint_counts_results(mock_process, mock_session):
+    mock_session.return_value = ADMIN
+    mock_process.return_value = [
+        {"index": 0, "status": "started"},
+        {"index": 1, "status": "rejected", "reason": "lot_full"},
+    ]
+
+    response = client.post(
+        "/parking-lots/gate-events",
+        json={
+            "events": [
+                {"event": "entry", "licenseplate": "AB-12-CD", "parking_lot_id": "1"},
+                {"event": "entry", "licenseplate": "EF-34-GH", "parking_lot_id": "1"},
+            ]
+        },
+        headers={"Authorization": "valid-token"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["applied"] == 1
+    assert response.json()["rejected"] == 1
@@ -0,0 +1,117 @@
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services import geo_services, occupancy_services
+from services.geo_services import GeoGridIndex, haversine_km
+
+client = TestClient(app)
+
+
+def make_lot(lot_id, lat, lng, capacity=10, reserved=0):
+    return {
+        "id": lot_id,
+        "name": f"Lot {lot_id}",
+        "capacity": capacity,
+        "reserved": reserved,
+        "coordinates": {"lat": lat, "lng": lng},
+    }
+
+
+@pytest.fixture
+def nearby_lots(monkeypatch):
+    lots = [
+        make_lot("1", 51.9225, 4.4792, capacity=10, reserved=2),   # Rotterdam centre
+        make_lot("2", 51.9244, 4.4777, capacity=10, reserved=10),  # full, ~250 m away
+        make_lot("3", 51.9300, 4.4900, capacity=50, reserved=0),   # ~1.1 km away
+        make_lot("4", 52.3676, 4.9041, capacity=100, reserved=0),  # Amsterdam
+    ]
+    monkeypatch.setattr("services.geo_services.storage_utils.load_parking_lot_data", lambda: lots)
+    geo_services.reset_index()
+    occupancy_services.invalidate()
+    yield lots
+    geo_services.reset_index()
+    occupancy_services.invalidate()
+
+
+def test_haversine_known_distance():
+    # One degree along a meridian is 1/360 of the Earth's circumference
+    assert haversine_km(51.0, 4.0, 52.0, 4.0) == pytest.approx(111.195, abs=0.001)
+    assert haversine_km(51.0, 4.0, 51.0, 4.0) == 0
+
+
+def test_grid_query_matches_brute_force():
+    rng = random.Random(42)
+    index = GeoGridIndex()
+    points = {}
+    for i in range(2000):
+        lat, lng = rng.uniform(51.5, 52.5), rng.uniform(4.0, 5.0)
+        points[str(i)] = (lat, lng)
+        index.upsert(str(i), lat, lng)
+
+    for _ in range(20):
+        lat, lng, radius = rng.uniform(51.5, 52.5), rng.uniform(4.0, 5.0), rng.uniform(0.5, 15)
+        expected = {key for key, (p_lat, p_lng) in points.items() if haversine_km(lat, lng, p_lat, p_lng) <= radius}
+        assert {key for _, key in index.query(lat, lng, radius)} == expected
+
+
+def test_grid_move_and_remove():
+    index = GeoGridIndex()
+    index.upsert("1", 51.92, 4.47)
+    index.upsert("1", 52.37, 4.90)
+
+    assert index.query(51.92, 4.47, 1) == []
+    assert [key for _, key in index.query(52.37, 4.90, 1)] == ["1"]
+
+    index.remove("1")
+    assert len(index) == 0
+    assert index.query(52.37, 4.90, 1) == []
+
+
+def test_grid_query_across_antimeridian():
+    index = GeoGridIndex()
+    index.upsert("east", 0.0, 179.99)
+    index.upsert("west", 0.0, -179.99)
+
+    assert {key for _, key in index.query(0.0, 179.999, 5)} == {"east", "west"}
+
+
+def test_nearby_orders_by_distance_and_skips_full_lots(nearby_lots):
+    results = geo_services.find_nearby_parking_lots(51.9225, 4.4792, 5)
+
+    assert [lot["id"] for lot in results] == ["1", "3"]
+    assert results[0]["distance_km"] == 0
+    assert results[0]["free"] == 8
+    assert results[1]["distance_km"] == pytest.approx(1.13, abs=0.05)
+
+
+def test_nearby_min_free(nearby_lots):
+    results = geo_services.find_nearby_parking_lots(51.9225, 4.4792, 5, min_free=20)
+    assert [lot["id"] for lot in results] == ["3"]
+
+    results = geo_services.find_nearby_parking_lots(51.9225, 4.4792, 5, min_free=0)
+    assert [lot["id"] for lot in results] == ["1", "2", "3"]
+
+
+def test_nearby_follows_index_updates(nearby_lots):
+    geo_services.find_nearby_parking_lots(51.9225, 4.4792, 5)
+
+    geo_services.index_parking_lot(make_lot("4", 51.9226, 4.4793, capacity=100))
+    geo_services.remove_parking_lot("3")
+    results = geo_services.find_nearby_parking_lots(51.9225, 4.4792, 5)
+
+    assert [lot["id"] for lot in results] == ["1", "4"]
+
+
+def test_nearby_endpoint(nearby_lots):
+    response = client.get("/parking-lots/nearby", params={"lat": 52.3676, "lng": 4.9041, "radius": 2})
+
+    assert response.status_code == 200
+    assert [lot["id"] for lot in response.json()] == ["4"]
+
+
+def test_nearby_endpoint_validates_coordinates():
+    response = client.get("/parking-lots/nearby", params={"lat": 95, "lng": 4.9})
+    assert response.status_code == 422
@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import pytest
+
+from utils import group_commit, storage_utils
+
+
+@pytest.fixture
+def group_db(tmp_path, monkeypatch):
+    """Temporary database with group commit switched on and a writer of its own."""
+    db_path = tmp_path / "group.db"
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    monkeypatch.setattr(storage_utils, "use_group_commit", True)
+    monkeypatch.setattr(storage_utils, "GROUP_COMMIT_MAX_DELAY_MS", 20)
+    monkeypatch.setattr(group_commit, "_writer", None)
+    storage_utils.init_db()
+    yield db_path
+
+
+def payment(transaction):
+    return {"transaction": transaction, "amount": 1.0, "initiator": "testuser"}
+
+
+def count_payments():
+    with closing(storage_utils.get_db_connection()) as conn:
+        return conn.execute("SELECT COUNT(*) FROM payments").fetchone()[0]
+
+
+def test_concurrent_writes_share_commits(group_db):
+    start = threading.Barrier(20)
+
+    def write(n):
+        start.wait()
+        storage_utils.insert_single_json_to_db("payments", payment(str(n)))
+
+    writers = [threading.Thread(target=write, args=(n,)) for n in range(20)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    stats = storage_utils.get_group_commit_stats()
+    assert count_payments() == 20
+    assert stats["operations"] == 20
+    assert stats["batches"] < 20
+    assert stats["largest_batch"] > 1
+
+
+def test_failed_write_does_not_take_the_batch_down(tmp_path):
+    db_path = tmp_path / "writer.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE items (id TEXT PRIMARY KEY)")
+    writer = group_commit.GroupCommitWriter(lambda: sqlite3.connect(db_path), max_delay=0.05)
+
+    def insert(item_id):
+        return lambda conn: conn.execute("INSERT INTO items VALUES (?)", (item_id,)).rowcount
+
+    futures = [writer.submit(insert("1")), writer.submit(insert("1")), writer.submit(insert("2"))]
+
+    assert futures[0].result() == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[1].result()
+    assert futures[2].result() == 1
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT id FROM items ORDER BY id").fetchall() == [("1",), ("2",)]
+    assert writer.stats()["failed_operations"] == 1
+    assert writer.stats()["batch_sizes"] == {3: 1}
+
+
+def test_lone_write_waits_at_most_the_delay(group_db):
+    start = time.perf_counter()
+    storage_utils.insert_single_json_to_db("payments", payment("1"))
+
+    assert time.perf_counter() - start < 1
+    assert count_payments() == 1
+
+
+def test_update_of_missing_row_still_raises(group_db):
+    storage_utils.insert_single_json_to_db("payments", payment("1"))
+    storage_utils.update_single_json_in_db("payments", "transaction", "1", {**payment("1"), "amount": 5.0})
+
+    with pytest.raises(ValueError):
+        storage_utils.update_single_json_in_db("payments", "transaction", "missing", payment("missing"))
+    assert storage_utils.get_payment_data_by_id("1")["amount"] == 5.0
+
+
+def test_occupancy_counters_through_the_writer(group_db):
+    storage_utils.insert_single_json_to_db("parking_lots", {"id": "1", "name": "Centrum", "capacity": 1, "reserved": 0})
+
+    assert storage_utils.increment_parking_lot_reserved("1") == {"capacity": 1, "reserved": 1}
+    assert storage_utils.increment_parking_lot_reserved("1") is None
+    assert storage_utils.decrement_parking_lot_reserved("1") == {"capacity": 1, "reserved": 0}
+
+
+def test_stats_before_first_use(monkeypatch):
+    monkeypatch.setattr(group_commit, "_writer", None)
+
+    assert storage_utils.get_group_commit_stats() is None
@@ -0,0 +1,87 @@
+import sqlite3
+
+import pytest
+
+from utils import storage_utils
+
+
+@pytest.fixture
+def discount_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "discounts.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    codes = [
+        {"code": f"HOTEL-{i:03d}", "created_by": "mgr", "parking_lot_id": "1", "is_hotel_code": True}
+        for i in range(5)
+    ]
+    codes.append({"code": "OTHER-001", "created_by": "someone", "parking_lot_id": "1", "is_hotel_code": True})
+    codes.append({"code": "PLAIN-001", "created_by": "mgr", "parking_lot_id": "1", "is_hotel_code": False})
+    for code in codes:
+        storage_utils.save_new_discount_to_db(code)
+    yield tmp_path
+
+
+def test_pages_by_creator(discount_db):
+    first = storage_utils.get_discounts_by_creator("mgr", limit=3)
+    second = storage_utils.get_discounts_by_creator("mgr", after=first[-1]["code"], limit=3)
+
+    assert [d["code"] for d in first] == ["HOTEL-000", "HOTEL-001", "HOTEL-002"]
+    assert [d["code"] for d in second] == ["HOTEL-003", "HOTEL-004"]
+    assert len(storage_utils.get_discounts_by_creator("mgr", hotel_only=False)) == 6
+
+
+def test_pages_by_lot(discount_db):
+    assert len(storage_utils.get_discounts_by_lot("1")) == 6
+    assert [d["code"] for d in storage_utils.get_discounts_by_lot("1", hotel_only=False, after="HOTEL-004")] == [
+        "OTHER-001",
+        "PLAIN-001",
+    ]
+    assert storage_utils.get_discounts_by_lot("2") == []
+
+
+def test_listings_use_the_indexes(discount_db):
+    with storage_utils.get_db_connection() as conn:
+        by_creator = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM discounts WHERE created_by = ? AND is_hotel_code = 1 "
+            "AND code > ? ORDER BY code LIMIT ?",
+            ("mgr", "", 10),
+        ).fetchall()
+        by_lot = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM discounts WHERE parking_lot_id = ? AND is_hotel_code = 1 "
+            "ORDER BY code LIMIT ?",
+            ("1", 10),
+        ).fetchall()
+
+    assert "idx_discounts_created_by_hotel_code" in str(by_creator)
+    assert "idx_discounts_lot_hotel_code" in str(by_lot)
+    assert "TEMP B-TREE" not in str(by_creator) + str(by_lot)
+
+
+def test_batch_is_saved_whole_or_not_at_all(discount_db):
+    batch = [{"code": f"CONF-{i:04d}", "created_by": "mgr", "parking_lot_id": "1", "is_hotel_code": 1} for i in range(1000)]
+
+    assert storage_utils.save_new_discounts_to_db(batch) == set()
+    assert len(storage_utils.get_discounts_by_creator("mgr", limit=2000)) == 1005
+
+    clashing = [{"code": "CONF-0999"}, {"code": "HOTEL-001"}, {"code": "NEW-0001"}]
+    assert storage_utils.save_new_discounts_to_db(clashing) == {"CONF-0999", "HOTEL-001"}
+    assert storage_utils.get_discount_by_code("NEW-0001") is None
+
+
+def test_migrates_an_old_discounts_table(tmp_path, monkeypatch):
+    db_path = tmp_path / "old.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE discounts (code TEXT PRIMARY KEY, discount_type TEXT, discount_value REAL)")
+        conn.execute("INSERT INTO discounts (code) VALUES ('OLD-1')")
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+
+    storage_utils.init_db()
+
+    with storage_utils.get_db_connection() as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(discounts)")}
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(discounts)")}
+        old = conn.execute("SELECT is_hotel_code FROM discounts WHERE code = 'OLD-1'").fetchone()
+    assert set(storage_utils.HOTEL_DISCOUNT_COLUMNS) <= columns
+    assert {"idx_discounts_created_by_hotel_code", "idx_discounts_lot_hotel_code"} <= indexes
+    assert old[0] == 0
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from utils import storage_utils
+
+
+@pytest.fixture
+def sequence_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "sequences.db"
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    monkeypatch.setattr(storage_utils, "_id_blocks", {})
+    storage_utils.init_db()
+    yield db_path
+
+
+def lot(lot_id):
+    return {"id": lot_id, "name": f"Lot {lot_id}", "capacity": 10, "reserved": 0}
+
+
+def test_ids_continue_after_existing_rows(sequence_db):
+    storage_utils.save_json_to_db("parking_lots", [lot("7"), lot("41"), lot("garage-north")])
+
+    assert storage_utils.allocate_id("parking_lots") == "42"
+    assert storage_utils.allocate_id("parking_lots") == "43"
+
+
+def test_empty_table_starts_at_1(sequence_db):
+    assert storage_utils.allocate_id("reservations") == "1"
+
+
+def test_workers_take_separate_blocks(sequence_db, monkeypatch):
+    monkeypatch.setattr(storage_utils, "ID_BLOCK_SIZE", 10)
+    first_worker = [storage_utils.allocate_id("parking_sessions") for _ in range(3)]
+
+    # Another process has no block yet and reserves the next one from the counter
+    monkeypatch.setattr(storage_utils, "_id_blocks", {})
+    second_worker = [storage_utils.allocate_id("parking_sessions") for _ in range(3)]
+
+    assert first_worker == ["1", "2", "3"]
+    assert second_worker == ["11", "12", "13"]
+
+
+def test_concurrent_allocations_are_unique(sequence_db, monkeypatch):
+    monkeypatch.setattr(storage_utils, "ID_BLOCK_SIZE", 4)
+    ids = []
+    start = threading.Barrier(8)
+
+    def allocate():
+        start.wait()
+        for _ in range(25):
+            ids.append(storage_utils.allocate_id("reservations"))
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 200
+
+
+def test_bulk_save_moves_the_counter(sequence_db):
+    assert storage_utils.allocate_id("parking_lots") == "1"
+
+    storage_utils.save_json_to_db("parking_lots", [lot("1"), lot("500")])
+
+    assert storage_utils.allocate_id("parking_lots") == "501"
+
+
+def test_mock_data_ids(tmp_path, monkeypatch):
+    mock_file = tmp_path / "lots.json"
+    monkeypatch.setattr(storage_utils, "use_mock_data", True)
+    monkeypatch.setattr(storage_utils, "MOCK_TABLE_FILES", {"parking_lots": mock_file})
+    monkeypatch.setattr(storage_utils, "_id_blocks", {})
+    monkeypatch.setattr(storage_utils, "_mock_counters", {})
+    storage_utils.save_data(mock_file, [lot("3"), lot("9")])
+
+    assert [storage_utils.allocate_id("parking_lots") for _ in range(2)] == ["10", "11"]
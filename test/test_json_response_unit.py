@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models.payments_model import PaymentUpdate
+from utils.json_response import FastJSONResponse
+
+PAYMENT = {
+    "transaction": "abc123",
+    "amount": 12.5,
+    "initiator": "testuser",
+    "t_data": {"amount": 1e-05, "date": "2024-01-01", "method": "ideal", "issuer": "ING", "bank": None},
+    "session_id": "1",
+    "discount_amount": 1e16,
+    "completed": True,
+    "note": "Café – €5 \"quoted\" \n",
+    "tags": ["a", 1, 2.0, None],
+}
+
+
+@pytest.mark.parametrize("content", [PAYMENT, [PAYMENT] * 3, [], {}, None, "text", 3, {1: "int key"}])
+def test_primitive_payloads_are_byte_identical(content):
+    assert FastJSONResponse(content).body == JSONResponse(content).body
+
+
+def test_other_payloads_go_through_jsonable_encoder():
+    content = {"created_at": datetime(2024, 1, 1, 10, 0), "update": PaymentUpdate(amount=5.0)}
+
+    assert FastJSONResponse(content).body == JSONResponse(jsonable_encoder(content)).body
+
+
+def test_nan_is_rejected_like_json_response():
+    with pytest.raises(ValueError):
+        FastJSONResponse({"amount": float("nan")})
+
+
+def test_status_and_headers_are_kept():
+    response = FastJSONResponse(content=[PAYMENT], status_code=201, headers={"ETag": '"v1"'})
+
+    assert response.status_code == 201
+    assert response.headers["ETag"] == '"v1"'
+    assert response.media_type == "application/json"
@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from models.parking_lots_model import UpdateParkingLot
+from services import lot_cache_services, occupancy_services, parking_services
+from utils import storage_utils
+
+
+@pytest.fixture
+def lot_db(tmp_path, monkeypatch):
+    """Temporary database with two lots, used through the real storage functions."""
+    db_path = tmp_path / "lots.db"
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    storage_utils.save_json_to_db(
+        "parking_lots",
+        [
+            {"id": "1", "name": "Centrum", "capacity": 5, "reserved": 0, "tariff": 2.5},
+            {"id": "2", "name": "Station", "capacity": 10, "reserved": 3, "tariff": 1.5},
+        ],
+    )
+    loads = []
+    load = storage_utils.load_parking_lot_data
+
+    def counting_load():
+        loads.append(1)
+        return load()
+
+    monkeypatch.setattr(storage_utils, "load_parking_lot_data", counting_load)
+    occupancy_services.invalidate()
+    yield loads
+    occupancy_services.invalidate()
+
+
+def test_lots_are_loaded_once(lot_db):
+    assert lot_cache_services.get_lot("1")["name"] == "Centrum"
+    assert lot_cache_services.get_lot("2")["name"] == "Station"
+    assert lot_cache_services.get_lot("999") is None
+    assert [lot["id"] for lot in lot_cache_services.get_lots()] == ["1", "2"]
+
+    assert len(lot_db) == 1
+
+
+def test_reserved_counter_is_read_live(lot_db):
+    assert lot_cache_services.get_lot("2")["reserved"] == 3
+
+    occupancy_services.reserve_space("2")
+
+    assert lot_cache_services.get_lot("2")["reserved"] == 4
+    assert len(lot_db) == 1
+
+
+def test_returned_lot_is_a_copy(lot_db):
+    lot_cache_services.get_lot("1")["name"] = "Changed"
+
+    assert lot_cache_services.get_lot("1")["name"] == "Centrum"
+
+
+def test_update_parking_lot_invalidates(lot_db):
+    lot_cache_services.get_lot("1")
+
+    parking_services.update_parking_lot("1", UpdateParkingLot(name="Centrum Oost"))
+
+    assert lot_cache_services.get_lot("1")["name"] == "Centrum Oost"
+
+
+def test_write_by_another_worker_is_noticed(lot_db, monkeypatch):
+    monkeypatch.setattr(lot_cache_services, "VERSION_CHECK_SECONDS", 0)
+    lot_cache_services.get_lot("1")
+    version = lot_cache_services.version()
+
+    # Another process writes through the same storage helpers, this one gets no invalidate() call
+    storage_utils.update_single_json_in_db("parking_lots", "id", "1", {"name": "Centrum Noord"})
+
+    assert lot_cache_services.get_lot("1")["name"] == "Centrum Noord"
+    assert lot_cache_services.version() > version
+    assert len(lot_db) == 2
+
+
+def test_unchanged_version_keeps_the_copy(lot_db, monkeypatch):
+    monkeypatch.setattr(lot_cache_services, "VERSION_CHECK_SECONDS", 0)
+    for _ in range(5):
+        lot_cache_services.get_lot("1")
+
+    assert len(lot_db) == 1
+
+
+def test_table_version_survives_databases_without_the_table(tmp_path, monkeypatch):
+    db_path = tmp_path / "bare.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE parking_lots (id TEXT PRIMARY KEY, name TEXT)")
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+
+    assert storage_utils.get_table_version("parking_lots") == 0
+    storage_utils.insert_single_json_to_db("parking_lots", {"id": "1", "name": "Centrum"})
+    assert storage_utils.get_table_version("parking_lots") == 1
@@ -0,0 +1,153 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.parking_lots_model import GateEvent
+from services import gate_event_services, lot_cache_services, occupancy_services
+from utils import storage_utils
+
+client = TestClient(app)
+
+ADMIN = {"username": "operations", "role": "ADMIN"}
+
+
+@pytest.fixture
+def rollup_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "rollups.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    monkeypatch.setattr(storage_utils, "_id_blocks", {})
+    storage_utils.init_db()
+    storage_utils.save_json_to_db(
+        "parking_lots",
+        [{"id": "1", "name": "Centrum", "capacity": 10, "reserved": 0, "tariff": 2.0, "daytariff": 20.0}],
+    )
+    lot_cache_services.invalidate()
+    occupancy_services.invalidate()
+    yield
+    lot_cache_services.invalidate()
+    occupancy_services.invalidate()
+
+
+def gate(kind, plate, at):
+    return GateEvent(event=kind, licenseplate=plate, parking_lot_id="1", timestamp=datetime.fromisoformat(at))
+
+
+def test_writes_update_the_rollups(rollup_db):
+    gate_event_services.process_gate_events(
+        [gate("entry", "AA-11", "2026-03-01T09:00"), gate("exit", "AA-11", "2026-03-01T10:30")], ADMIN
+    )
+    storage_utils.save_new_payment_to_db(
+        {"transaction": "t1", "amount": 6.0, "parking_lot_id": "1", "created_at": "01-03-2026 10:35:00"}
+    )
+    storage_utils.save_new_refund_to_db(
+        {"refund_id": "r1", "original_transaction_id": "t1", "amount": 2.0, "created_at": "02-03-2026 08:00:00"}
+    )
+
+    days = storage_utils.get_lot_rollups("1", datetime(2026, 3, 1), datetime(2026, 3, 2, 23))
+    assert [(d["period"], d["sessions"], d["duration_minutes"], d["payments"], d["refunds"]) for d in days] == [
+        ("2026-03-01", 1, 90, 6.0, 0.0),
+        ("2026-03-02", 0, 0, 0.0, 2.0),
+    ]
+    hours = storage_utils.get_lot_rollups("1", datetime(2026, 3, 1, 10), datetime(2026, 3, 1, 10, 59), "hour")
+    assert [(h["period"], h["sessions"], h["payments"]) for h in hours] == [("2026-03-01T10", 1, 6.0)]
+
+
+def test_started_sessions_raise_the_peak(rollup_db):
+    gate_event_services.process_gate_events(
+        [gate("entry", "AA-11", "2026-03-01T09:00"), gate("entry", "BB-22", "2026-03-01T09:10")], ADMIN
+    )
+    storage_utils.save_new_parking_session_to_db(
+        {"id": "900", "parking_lot_id": "1", "licenseplate": "CC-33", "started": "2026-03-01T09:20", "stopped": None}
+    )
+    gate_event_services.process_gate_events([gate("exit", "AA-11", "2026-03-01T09:30")], ADMIN)
+    # Spaces held for reservations are not cars on the lot
+    storage_utils.increment_parking_lot_reserved("1")
+    storage_utils.increment_parking_lot_reserved("1")
+
+    hours = storage_utils.get_lot_rollups("1", datetime(2026, 3, 1, 9), datetime(2026, 3, 1, 9, 59), "hour")
+    assert hours[0]["peak_occupancy"] == 3
+    assert storage_utils.get_lot_rollups("1", datetime.now(), datetime.now()) == []
+
+
+def test_session_is_counted_once_when_stopped(rollup_db):
+    storage_utils.save_new_parking_session_to_db(
+        {"id": "900", "parking_lot_id": "1", "licenseplate": "CC-33", "started": "2026-03-01T09:00", "stopped": None}
+    )
+    stop = {"stopped": "2026-03-01T10:00:00", "duration_minutes": 60, "cost": 2.0}
+
+    assert storage_utils.stop_open_parking_session("900", stop)
+    assert not storage_utils.stop_open_parking_session("900", stop)
+
+    day = storage_utils.get_lot_rollups("1", datetime(2026, 3, 1), datetime(2026, 3, 1))[0]
+    assert (day["sessions"], day["duration_minutes"]) == (1, 60)
+
+
+def test_backfill_replays_occupancy(rollup_db):
+    storage_utils.save_json_to_db(
+        "parking_sessions",
+        [
+            {"id": "1", "parking_lot_id": "1", "started": "2026-03-01T08:10", "stopped": "2026-03-01T11:20:00", "duration_minutes": 190},
+            {"id": "2", "parking_lot_id": "1", "started": "2026-03-01T08:30", "stopped": "2026-03-01T09:00:00", "duration_minutes": 30},
+            {"id": "3", "parking_lot_id": "1", "started": "2026-03-01T12:00", "stopped": None},
+        ],
+    )
+
+    assert storage_utils.rebuild_lot_rollups() == {"hour": 5, "day": 1}
+
+    hours = storage_utils.get_lot_rollups("1", bucket="hour")
+    # 10:00 had no movement at all, the car of session 1 was still parked
+    assert [(h["period"], h["peak_occupancy"], h["sessions"]) for h in hours] == [
+        ("2026-03-01T08", 2, 0),
+        ("2026-03-01T09", 1, 1),
+        ("2026-03-01T10", 1, 0),
+        ("2026-03-01T11", 1, 1),
+        ("2026-03-01T12", 1, 0),
+    ]
+    day = storage_utils.get_lot_rollups("1")[0]
+    assert (day["sessions"], day["duration_minutes"], day["peak_occupancy"]) == (2, 220, 2)
+
+
+@patch("services.auth_services.get_session")
+def test_analytics_endpoint(mock_session, rollup_db):
+    mock_session.return_value = ADMIN
+    gate_event_services.process_gate_events(
+        [
+            gate("entry", "AA-11", "2026-03-01T09:00"),
+            gate("entry", "BB-22", "2026-03-01T09:00"),
+            gate("exit", "AA-11", "2026-03-01T10:00"),
+            gate("exit", "BB-22", "2026-03-02T10:00"),
+        ],
+        ADMIN,
+    )
+
+    response = client.get(
+        "/analytics/lots/1",
+        params={"from": "2026-03-01T00:00:00", "to": "2026-03-31T00:00:00", "bucket": "day"},
+        headers={"Authorization": "valid-token"},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [b["period"] for b in body["buckets"]] == ["2026-03-01", "2026-03-02"]
+    assert body["totals"]["sessions"] == 2
+    assert body["totals"]["average_duration_minutes"] == 780.0
+
+    inverted = client.get(
+        "/analytics/lots/1",
+        params={"from": "2026-03-31T00:00:00", "to": "2026-03-01T00:00:00"},
+        headers={"Authorization": "valid-token"},
+    )
+    assert inverted.status_code == 422
+    assert client.get("/analytics/lots/404", headers={"Authorization": "valid-token"}).status_code == 404
+
+
+@patch("services.auth_services.get_session")
+def test_analytics_endpoint_requires_admin(mock_session):
+    mock_session.return_value = {"username": "driver", "role": "USER"}
+
+    response = client.get("/analytics/lots/1", headers={"Authorization": "valid-token"})
+
+    assert response.status_code == 403
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import threading
+
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from main import app
+from services.occupancy_stream_services import OccupancyBroadcaster, event_stream
+
+client = TestClient(app)
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def parse_event(message):
+    event_line, data_line = message.strip().split("\n")
+    assert event_line == "event: occupancy"
+    return json.loads(data_line[len("data: "):])
+
+
+def test_burst_is_coalesced_into_one_update():
+    async def scenario():
+        broadcaster = OccupancyBroadcaster(coalesce_seconds=0.01)
+        subscriber = broadcaster.subscribe("1")
+        for reserved in range(1, 51):
+            broadcaster.publish("1", {"capacity": 100, "reserved": reserved, "free": 100 - reserved})
+        await asyncio.wait_for(subscriber.wakeup.wait(), 1)
+        return subscriber.pending
+
+    pending = asyncio.run(scenario())
+
+    assert list(pending) == ["1"]
+    assert pending["1"]["reserved"] == 50
+
+
+def test_updates_only_reach_interested_subscribers():
+    async def scenario():
+        broadcaster = OccupancyBroadcaster(coalesce_seconds=0.01)
+        lot_one = broadcaster.subscribe("1")
+        lot_two = broadcaster.subscribe("2")
+        every_lot = broadcaster.subscribe()
+        broadcaster.publish("1", {"capacity": 10, "reserved": 1, "free": 9})
+        await asyncio.wait_for(every_lot.wakeup.wait(), 1)
+        return lot_one, lot_two, every_lot
+
+    lot_one, lot_two, every_lot = asyncio.run(scenario())
+
+    assert "1" in lot_one.pending
+    assert not lot_two.wakeup.is_set()
+    assert "1" in every_lot.pending
+
+
+def test_publish_from_worker_thread():
+    async def scenario():
+        broadcaster = OccupancyBroadcaster(coalesce_seconds=0.01)
+        subscriber = broadcaster.subscribe("1")
+        worker = threading.Thread(
+            target=broadcaster.publish, args=("1", {"capacity": 10, "reserved": 3, "free": 7})
+        )
+        worker.start()
+        worker.join()
+        await asyncio.wait_for(subscriber.wakeup.wait(), 1)
+        return subscriber.pending
+
+    assert asyncio.run(scenario())["1"]["free"] == 7
+
+
+def test_publish_without_subscribers_is_noop():
+    broadcaster = OccupancyBroadcaster()
+    broadcaster.publish("1", {"capacity": 10, "reserved": 3, "free": 7})
+    assert broadcaster.subscriber_count() == 0
+
+
+def test_event_stream_sends_snapshot_then_changes():
+    async def scenario():
+        broadcaster = OccupancyBroadcaster(coalesce_seconds=0.01)
+        stream = event_stream(
+            FakeRequest(), "1", lambda: {"1": {"capacity": 10, "reserved": 0, "free": 10}}, broadcaster
+        )
+        first = await stream.__anext__()
+        broadcaster.publish("1", {"capacity": 10, "reserved": 1, "free": 9})
+        broadcaster.publish("1", {"capacity": 10, "reserved": 2, "free": 8})
+        second = await asyncio.wait_for(stream.__anext__(), 1)
+        subscribed = broadcaster.subscriber_count()
+        await stream.aclose()
+        return first, second, subscribed, broadcaster.subscriber_count()
+
+    first, second, subscribed, after_close = asyncio.run(scenario())
+
+    assert parse_event(first) == {"parking_lot_id": "1", "capacity": 10, "reserved": 0, "free": 10}
+    assert parse_event(second)["reserved"] == 2
+    assert subscribed == 1
+    assert after_close == 0
+
+
+@patch("endpoints.parking_lots.occupancy_services.get_occupancy")
+def test_stream_unknown_parking_lot(mock_get_occupancy):
+    mock_get_occupancy.return_value = None
+
+    response = client.get("/parking-lots/999999/occupancy/stream")
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Parking lot does not exist"
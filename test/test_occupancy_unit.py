@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+
+import pytest
+
+from services import occupancy_services
+from utils import storage_utils
+
+
+@pytest.fixture
+def occupancy_db(tmp_path, monkeypatch):
+    """Temporary database with a single lot of capacity 5, used through the real storage functions."""
+    db_path = tmp_path / "occupancy.db"
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO parking_lots (id, name, capacity, reserved) VALUES ('1', 'TEST', 5, 0)"
+        )
+        conn.commit()
+    occupancy_services.invalidate()
+    yield db_path
+    occupancy_services.invalidate()
+
+
+def read_reserved(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT reserved FROM parking_lots WHERE id = '1'").fetchone()[0]
+
+
+def test_reserve_space_stops_at_capacity(occupancy_db):
+    results = [occupancy_services.reserve_space("1") for _ in range(7)]
+
+    assert results == [True] * 5 + [False] * 2
+    assert read_reserved(occupancy_db) == 5
+    assert occupancy_services.get_occupancy("1") == {"capacity": 5, "reserved": 5, "free": 0}
+
+
+def test_reserve_space_without_capacity_check(occupancy_db):
+    for _ in range(5):
+        occupancy_services.reserve_space("1")
+
+    assert occupancy_services.reserve_space("1", enforce_capacity=False)
+    assert read_reserved(occupancy_db) == 6
+
+
+def test_release_space_never_goes_negative(occupancy_db):
+    occupancy_services.reserve_space("1")
+
+    assert occupancy_services.release_space("1")
+    assert not occupancy_services.release_space("1")
+    assert read_reserved(occupancy_db) == 0
+
+
+def test_unknown_lot(occupancy_db):
+    assert not occupancy_services.reserve_space("999")
+    assert not occupancy_services.release_space("999")
+    assert occupancy_services.get_occupancy("999") is None
+
+
+def test_concurrent_reservations_do_not_overfill(occupancy_db):
+    results = []
+    results_lock = threading.Lock()
+
+    def worker():
+        claimed = occupancy_services.reserve_space("1")
+        with results_lock:
+            results.append(claimed)
+
+    threads = [threading.Thread(target=worker) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    assert read_reserved(occupancy_db) == 5
+
+
+def test_get_occupancy_is_served_from_cache(occupancy_db, monkeypatch):
+    occupancy_services.reserve_space("1")
+    load_occupancy = storage_utils.get_parking_lot_occupancy
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached occupancy should not hit storage")
+
+    monkeypatch.setattr(storage_utils, "get_parking_lot_occupancy", fail)
+    assert occupancy_services.get_occupancy("1")["reserved"] == 1
+
+    monkeypatch.setattr(storage_utils, "get_parking_lot_occupancy", load_occupancy)
+    occupancy_services.invalidate("1")
+    assert occupancy_services.get_occupancy("1")["reserved"] == 1
+
+
+def test_counters_changed_by_another_worker_show_up(occupancy_db, monkeypatch):
+    monkeypatch.setattr(occupancy_services, "VERSION_CHECK_SECONDS", 0)
+    occupancy_services.reserve_space("1")
+    assert occupancy_services.get_occupancy("1")["reserved"] == 1
+
+    # Written straight through storage, as another worker or the lifecycle scheduler would
+    storage_utils.increment_parking_lot_reserved("1")
+
+    assert occupancy_services.get_occupancy("1") == {"capacity": 5, "reserved": 2, "free": 3}
+
+
+def test_editing_a_lot_keeps_spaces_claimed_in_the_meantime(occupancy_db):
+    stale = storage_utils.get_parking_lot_by_id("1")
+    occupancy_services.reserve_space("1")
+
+    storage_utils.update_existing_parking_lot_in_db("1", {"name": "RENAMED", "reserved": stale["reserved"]})
+    storage_utils.save_new_parking_lot_to_db({"id": "2", "name": "OTHER", "capacity": 3, "reserved": 0})
+    assert storage_utils.delete_parking_lot_from_db("2")
+    assert not storage_utils.delete_parking_lot_from_db("2")
+
+    assert read_reserved(occupancy_db) == 1
+    assert storage_utils.get_parking_lot_by_id("1")["name"] == "RENAMED"
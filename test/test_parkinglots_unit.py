@@ -4,24 +4,45 @@ from models.parking_lots_model import ParkingLot, Coordinates, UpdateParkingLot,
 from models.reservations_model import CreateReservation
 from uuid import uuid4
 from datetime import datetime
+from fastapi import HTTPException
+
+def patch_lot_storage(monkeypatch, storage):
+    def test_save_new(lot):
+        storage.append(lot)
+
+    def test_update(lot_id, changes):
+        for lot in storage:
+            if lot["id"] == lot_id:
+                for key, value in changes.items():
+                    if isinstance(value, dict):
+                        lot[key].update(value)
+                    else:
+                        lot[key] = value
+                return
+        raise ValueError("Parking lot not found")
+
+    def test_get(lot_id):
+        return next((lot for lot in storage if lot["id"] == lot_id), None)
+
+    def test_delete(lot_id):
+        remaining = [lot for lot in storage if lot["id"] != lot_id]
+        deleted = len(remaining) < len(storage)
+        storage[:] = remaining
+        return deleted
+
+    def test_save_all(data):
+        raise AssertionError("the whole parking_lots table must not be rewritten")
+
+    monkeypatch.setattr("services.parking_services.storage_utils.save_new_parking_lot_to_db", test_save_new)
+    monkeypatch.setattr("services.parking_services.storage_utils.update_existing_parking_lot_in_db", test_update)
+    monkeypatch.setattr("services.parking_services.storage_utils.get_parking_lot_by_id", test_get)
+    monkeypatch.setattr("services.parking_services.storage_utils.delete_parking_lot_from_db", test_delete)
+    monkeypatch.setattr("services.parking_services.storage_utils.save_parking_lot_data", test_save_all)
+
 
 def test_create_parking_lot(monkeypatch):
     storage = []
-    def test_save(data):
-        storage.clear()
-        storage.extend(data)
-    
-    def test_load():
-        return storage.copy()
-
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.save_parking_lot_data",
-        test_save
-    )
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.load_parking_lot_data",
-        test_load
-    )
+    patch_lot_storage(monkeypatch, storage)
 
     dummy_lot = ParkingLot(
         name = "TEST",
@@ -56,21 +77,7 @@ def test_create_parking_lot(monkeypatch):
 
 def test_update_parking_lot_one_field(monkeypatch):
     storage = []
-    def test_save(data):
-        storage.clear()
-        storage.extend(data)
-    
-    def test_load():
-        return storage.copy()
-
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.save_parking_lot_data",
-        test_save
-    )
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.load_parking_lot_data",
-        test_load
-    )
+    patch_lot_storage(monkeypatch, storage)
 
     dummy_lot = ParkingLot(
         name = "TEST",
@@ -113,21 +120,7 @@ def test_update_parking_lot_one_field(monkeypatch):
 
 def test_update_parking_lot_all_fields(monkeypatch):
     storage = []
-    def test_save(data):
-        storage.clear()
-        storage.extend(data)
-    
-    def test_load():
-        return storage.copy()
-    
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.save_parking_lot_data",
-        test_save
-    )
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.load_parking_lot_data",
-        test_load
-    )
+    patch_lot_storage(monkeypatch, storage)
 
     dummy_lot = ParkingLot(
         name = "TEST",
@@ -172,7 +165,8 @@ def test_update_parking_lot_all_fields(monkeypatch):
     assert updated_lot["location"] == "UPDATED_TEST_LOCATION"
     assert updated_lot["address"] == "UPDATED_TEST_ADDRESS"
     assert updated_lot["capacity"] == 20
-    assert updated_lot["reserved"] == 10
+    # reserved is the occupancy counter, the update leaves it alone
+    assert updated_lot["reserved"] == 0
     assert updated_lot["tariff"] == 5.50
     assert updated_lot["daytariff"] == 30.00
     assert updated_lot["created_at"] == "2024-12-12"
@@ -181,21 +175,7 @@ def test_update_parking_lot_all_fields(monkeypatch):
 
 def test_delete_parking_lot(monkeypatch):
     storage = []
-    def test_save(data):
-        storage.clear()
-        storage.extend(data)
-    
-    def test_load():
-        return storage.copy()
-
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.save_parking_lot_data",
-        test_save
-    )
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.load_parking_lot_data",
-        test_load
-    )
+    patch_lot_storage(monkeypatch, storage)
 
     dummy_lot = ParkingLot(
         name = "TEST",
@@ -235,17 +215,25 @@ def test_start_parking_session(monkeypatch):
     def test_load_lots():
         return lot_storage.copy()
 
-    def test_load_sessions():
-        return session_storage.copy()
+    def test_open_session_by_plate(license_plate, parking_lot_id=None):
+        return next(
+            (s for s in session_storage if s["licenseplate"] == license_plate and s["stopped"] is None), None
+        )
 
-    def test_save_session(data):
-        session_storage.clear()
-        session_storage.extend(data)
+    def test_save_session(session):
+        session_storage.append(session)
     
     def test_save_lots(data):
         lot_storage.clear()
         lot_storage.extend(data)
 
+    def test_increment_reserved(parking_lot_id, enforce_capacity=True):
+        lot = next(lot for lot in lot_storage if lot["id"] == parking_lot_id)
+        if enforce_capacity and lot["reserved"] >= lot["capacity"]:
+            return None
+        lot["reserved"] += 1
+        return {"capacity": lot["capacity"], "reserved": lot["reserved"]}
+
     def test_load_reservations():
         return [{
             "id": "res-1",
@@ -293,12 +281,12 @@ def test_start_parking_session(monkeypatch):
     )
 
     monkeypatch.setattr(
-        "services.parking_services.storage_utils.load_parking_session_data",
-        test_load_sessions
+        "services.parking_services.storage_utils.get_open_session_by_plate",
+        test_open_session_by_plate
     )
 
     monkeypatch.setattr(
-        "services.parking_services.storage_utils.save_parking_session_data",
+        "services.parking_services.storage_utils.save_new_parking_session_to_db",
         test_save_session
     )
     
@@ -312,6 +300,11 @@ def test_start_parking_session(monkeypatch):
         test_load_reservations
     )
 
+    monkeypatch.setattr(
+        "services.occupancy_services.storage_utils.increment_parking_lot_reserved",
+        test_increment_reserved
+    )
+
     monkeypatch.setattr(
         "services.parking_services.find_reservation_by_license_plate",
         test_find_reservation_by_license_plate
@@ -326,6 +319,12 @@ def test_start_parking_session(monkeypatch):
     assert session_storage[0]["licenseplate"] == "TEST-PLATE"
     assert lot_storage[0]["reserved"] == 1
 
+    # The car is still parked, a second start is refused
+    with pytest.raises(HTTPException) as exc:
+        parking_services.start_parking_session(lot_id, session_data, session_user)
+    assert exc.value.status_code == 409
+    assert len(session_storage) == 1
+
 def test_stop_parking_session(monkeypatch):
     session_user = {
         "username": "testuser",
@@ -336,16 +335,27 @@ def test_stop_parking_session(monkeypatch):
     session_id = "999999"
     lot_storage = []
     session_storage = []
+    released = []
 
     def test_load_lots():
         return lot_storage.copy()
 
-    def test_load_sessions():
-        return session_storage.copy()
+    def test_open_session_by_plate(license_plate, parking_lot_id=None):
+        for session in session_storage:
+            if (
+                session["licenseplate"] == license_plate
+                and session["parking_lot_id"] == parking_lot_id
+                and session["stopped"] is None
+            ):
+                return dict(session)
+        return None
     
-    def test_save_sessions(data):
-        session_storage.clear()
-        session_storage.extend(data)
+    def test_stop_session(session_id, changes):
+        for session in session_storage:
+            if session["id"] == session_id and session["stopped"] is None:
+                session.update(changes)
+                return True
+        return False
     
     def test_save_lots(data):
         lot_storage.clear()
@@ -372,19 +382,25 @@ def test_stop_parking_session(monkeypatch):
     def test_update_reservation_end_time(reservation_id, end_time):
         return None
 
+    def test_decrement_reserved(parking_lot_id):
+        released.append(parking_lot_id)
+        lot = next(lot for lot in lot_storage if lot["id"] == parking_lot_id)
+        lot["reserved"] = max(0, lot["reserved"] - 1)
+        return {"capacity": lot["capacity"], "reserved": lot["reserved"]}
+
     monkeypatch.setattr(
         "services.parking_services.storage_utils.load_parking_lot_data",
         test_load_lots
     )
 
     monkeypatch.setattr(
-        "services.parking_services.storage_utils.load_parking_session_data",
-        test_load_sessions
+        "services.parking_services.storage_utils.get_open_session_by_plate",
+        test_open_session_by_plate
     )
 
     monkeypatch.setattr(
-        "services.parking_services.storage_utils.save_parking_session_data",
-        test_save_sessions
+        "services.parking_services.storage_utils.stop_open_parking_session",
+        test_stop_session
     )
     
     monkeypatch.setattr(
@@ -412,6 +428,11 @@ def test_stop_parking_session(monkeypatch):
         test_update_reservation_end_time
     )
 
+    monkeypatch.setattr(
+        "services.occupancy_services.storage_utils.decrement_parking_lot_reserved",
+        test_decrement_reserved
+    )
+
     lot_storage.append({
         "id": lot_id,
         **ParkingLot(
@@ -450,6 +471,14 @@ def test_stop_parking_session(monkeypatch):
     assert "cost" in result
     assert result["payment_status"] == "Pending"
     assert "duration_minutes" in result
+    assert lot_storage[0]["reserved"] == 0
+    assert session_storage[0]["stopped"] == result["stopped"]
+
+    # The session is stopped already, stopping it again must not give its space back twice
+    with pytest.raises(HTTPException) as exc:
+        parking_services.stop_parking_session(lot_id, session_data, session_user)
+    assert exc.value.status_code == 404
+    assert released == [lot_id]
 
 def test_update_parking_session(monkeypatch):
     lot_storage = []
@@ -461,12 +490,12 @@ def test_update_parking_session(monkeypatch):
     def test_load_lots():
         return lot_storage.copy()
     
-    def test_load_sessions():
-        return session_storage.copy()
-    
-    def test_save_sessions(data):
-        session_storage.clear()
-        session_storage.extend(data)
+    def test_update_session(session_id, changes):
+        for session in session_storage:
+            if session["id"] == session_id:
+                session.update(changes)
+                return
+        raise ValueError("Parking session not found")
     
     lot_storage.append({
         "id": lot_id,
@@ -500,13 +529,8 @@ def test_update_parking_session(monkeypatch):
     )
 
     monkeypatch.setattr(
-        "services.parking_services.storage_utils.load_parking_session_data",
-        test_load_sessions
-    )
-
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.save_parking_session_data",
-        test_save_sessions
+        "services.parking_services.storage_utils.update_existing_parking_session_in_db",
+        test_update_session
     )
 
     updated_session = ParkingSessionCreate(
@@ -521,12 +545,11 @@ def test_delete_parking_session(monkeypatch):
     session_id = "999999"
     lot_id = "999999"
 
-    def test_load_sessions():
-        return session_storage.copy()
-    
-    def test_save_sessions(data):
-        session_storage.clear()
-        session_storage.extend(data)
+    def test_delete_session(session_id):
+        remaining = [session for session in session_storage if session["id"] != session_id]
+        deleted = len(remaining) < len(session_storage)
+        session_storage[:] = remaining
+        return deleted
 
     session_storage.append({
         "id": session_id,
@@ -537,14 +560,13 @@ def test_delete_parking_session(monkeypatch):
     })
 
     monkeypatch.setattr(
-        "services.parking_services.storage_utils.load_parking_session_data",
-        test_load_sessions
-    )
-
-    monkeypatch.setattr(
-        "services.parking_services.storage_utils.save_parking_session_data",
-        test_save_sessions
+        "services.parking_services.storage_utils.delete_parking_session_from_db",
+        test_delete_session
     )
 
     parking_services.delete_parking_session(session_id, lot_id)
-    assert not any(session.get("id") == session_id for session in session_storage)
\ No newline at end of file
+    assert not any(session.get("id") == session_id for session in session_storage)
+
+    with pytest.raises(HTTPException) as exc:
+        parking_services.delete_parking_session(session_id, lot_id)
+    assert exc.value.status_code == 404
\ No newline at end of file
@@ -0,0 +1,170 @@
+import sqlite3
+
+import pytest
+
+from utils import storage_utils
+
+
+def vehicle(vehicle_id, license_plate, user_id="testuser"):
+    return {"id": vehicle_id, "user_id": user_id, "license_plate": license_plate, "make": "Toyota"}
+
+
+@pytest.fixture
+def plate_db(tmp_path, monkeypatch):
+    """Temporary database used through the real storage functions."""
+    db_path = tmp_path / "plates.db"
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    yield db_path
+
+
+def test_plate_norm_is_filled_on_insert_and_update(plate_db):
+    storage_utils.save_new_vehicle_to_db(vehicle("1", "ab-12-cd"))
+
+    with sqlite3.connect(plate_db) as conn:
+        assert conn.execute("SELECT plate_norm FROM vehicles WHERE id = '1'").fetchone()[0] == "AB12CD"
+
+    storage_utils.update_existing_vehicle_in_db("1", vehicle("1", "XY-99-ZZ"))
+
+    assert storage_utils.get_vehicle_by_plate("xy99zz")["id"] == "1"
+    assert storage_utils.get_vehicle_by_plate("AB-12-CD") is None
+
+
+def test_duplicate_plate_is_rejected_in_any_spelling(plate_db):
+    storage_utils.save_new_vehicle_to_db(vehicle("1", "AB-12-CD"))
+
+    with pytest.raises(ValueError):
+        storage_utils.save_new_vehicle_to_db(vehicle("2", " ab12cd"))
+    # The unique index holds even when the lookup is skipped
+    with pytest.raises(sqlite3.IntegrityError):
+        storage_utils.insert_single_json_to_db("vehicles", vehicle("2", "AB12-CD"))
+
+
+def test_get_vehicle_data_by_id_falls_back_to_plate(plate_db):
+    storage_utils.save_new_vehicle_to_db(vehicle("1", "AB-12-CD"))
+
+    assert storage_utils.get_vehicle_data_by_id("1")["license_plate"] == "AB-12-CD"
+    assert storage_utils.get_vehicle_data_by_id("ab-12-cd")["id"] == "1"
+    assert storage_utils.get_vehicle_data_by_id("unknown") is None
+
+
+def test_sessions_by_plate(plate_db):
+    storage_utils.save_json_to_db(
+        "parking_sessions",
+        [
+            {"id": "1", "parking_lot_id": "1", "licenseplate": "AB-12-CD", "started": "2024-01-01T10:00"},
+            {"id": "2", "parking_lot_id": "1", "licenseplate": "ab12cd", "started": "2024-01-02T10:00"},
+            {"id": "3", "parking_lot_id": "1", "licenseplate": "XY-99-ZZ", "started": "2024-01-03T10:00"},
+        ],
+    )
+
+    sessions = storage_utils.get_parking_sessions_by_plate("AB12CD")
+
+    assert sorted(session["id"] for session in sessions) == ["1", "2"]
+
+
+def test_vehicle_history_joins_lot_and_pages(plate_db):
+    with sqlite3.connect(plate_db) as conn:
+        conn.execute("INSERT INTO parking_lots (id, name, address) VALUES ('1', 'Centrum', 'Wijnhaven 1')")
+        conn.commit()
+    def session(session_id, parking_lot_id, licenseplate, stopped):
+        return {
+            "id": session_id,
+            "parking_lot_id": parking_lot_id,
+            "licenseplate": licenseplate,
+            "started": "2024-01-01T09:00:00",
+            "stopped": stopped,
+        }
+
+    storage_utils.save_json_to_db(
+        "parking_sessions",
+        [session(str(day), "1", "AB-12-CD", f"2024-01-{day:02d}T12:00:00") for day in range(1, 6)]
+        + [session("6", "1", "AB-12-CD", None), session("7", "2", "ab12cd", "2024-01-07T11:00:00")],
+    )
+
+    first_page = storage_utils.get_vehicle_history_by_plate("AB12CD", limit=3)
+    second_page = storage_utils.get_vehicle_history_by_plate("AB12CD", limit=3, before=first_page[-1]["stopped"])
+
+    assert [s["id"] for s in first_page] == ["7", "5", "4"]
+    assert [s["id"] for s in second_page] == ["3", "2", "1"]
+    assert first_page[0]["parking_lot_name"] is None
+    assert first_page[1]["parking_lot_name"] == "Centrum"
+    assert first_page[1]["parking_lot_address"] == "Wijnhaven 1"
+    assert "plate_norm" not in first_page[0]
+
+
+def test_reservations_by_vehicle_pages(plate_db):
+    storage_utils.save_json_to_db(
+        "reservations",
+        [
+            {"id": str(day), "vehicle_id": "v1", "parking_lot_id": "1", "start_time": f"2024-01-{day:02d}T10:00"}
+            for day in range(1, 6)
+        ]
+        + [{"id": "6", "vehicle_id": "v2", "parking_lot_id": "1", "start_time": "2024-01-03T10:00"}],
+    )
+
+    first_page = storage_utils.get_reservations_by_vehicle("v1", limit=2)
+    rest = storage_utils.get_reservations_by_vehicle("v1", before=first_page[-1]["start_time"])
+
+    assert [r["id"] for r in first_page] == ["5", "4"]
+    assert [r["id"] for r in rest] == ["3", "2", "1"]
+
+
+def test_open_session_by_plate(plate_db):
+    storage_utils.save_json_to_db(
+        "parking_sessions",
+        [
+            {"id": "1", "parking_lot_id": "1", "licenseplate": "AB-12-CD", "started": "2024-01-01T10:00",
+             "stopped": "2024-01-01T12:00"},
+            {"id": "2", "parking_lot_id": "2", "licenseplate": "ab12cd", "started": "2024-01-02T10:00"},
+        ],
+    )
+
+    assert storage_utils.get_open_session_by_plate("AB12CD")["id"] == "2"
+    assert storage_utils.get_open_session_by_plate("AB-12-CD", "2")["id"] == "2"
+    assert storage_utils.get_open_session_by_plate("AB-12-CD", "1") is None
+
+    with sqlite3.connect(plate_db) as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM parking_sessions WHERE plate_norm = 'AB12CD' AND stopped IS NULL"
+        ).fetchall()
+    assert "idx_parking_sessions_plate_norm_stopped" in str(plan)
+
+
+def test_history_query_uses_plate_index(plate_db):
+    with sqlite3.connect(plate_db) as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM parking_sessions WHERE plate_norm = 'AB12CD' "
+            "AND stopped IS NOT NULL ORDER BY stopped DESC"
+        ).fetchall()
+    assert "idx_parking_sessions_plate_norm_stopped" in str(plan)
+    assert "TEMP B-TREE" not in str(plan)
+
+
+def test_migration_backfills_existing_rows(tmp_path, monkeypatch):
+    db_path = tmp_path / "old.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE vehicles (id TEXT PRIMARY KEY, user_id TEXT NOT NULL, license_plate TEXT NOT NULL)")
+        conn.execute("CREATE TABLE parking_sessions (id TEXT PRIMARY KEY, licenseplate TEXT, stopped TEXT)")
+        conn.execute("INSERT INTO vehicles VALUES ('1', 'testuser', 'ab-12-cd')")
+        conn.execute("INSERT INTO parking_sessions VALUES ('1', 'ab-12-cd', NULL), ('2', NULL, NULL)")
+        conn.commit()
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+
+    storage_utils.init_db()
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT plate_norm FROM vehicles").fetchall() == [("AB12CD",)]
+        assert conn.execute("SELECT plate_norm FROM parking_sessions ORDER BY id").fetchall() == [("AB12CD",), (None,)]
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM vehicles WHERE plate_norm = 'AB12CD'").fetchall()
+    assert "idx_vehicles_plate_norm" in str(plan)
+
+
+def test_mock_data_lookup(monkeypatch):
+    monkeypatch.setattr(storage_utils, "use_mock_data", True)
+    monkeypatch.setattr(storage_utils, "load_vehicle_data", lambda: [vehicle("1", "AB-12-CD")])
+
+    assert storage_utils.get_vehicle_by_plate("ab12cd")["id"] == "1"
+    assert storage_utils.get_vehicle_by_plate("") is None
@@ -0,0 +1,204 @@
+import random
+
+import pytest
+
+from services import reservation_index_services
+from services.reservation_index_services import LotReservationIndex, from_minutes, to_minutes
+
+
+def brute_peak(intervals, start, end):
+    return max(
+        sum(1 for s, e in intervals if s <= minute < e) for minute in range(start, end)
+    )
+
+
+def brute_earliest(intervals, capacity, duration, not_before):
+    candidate = not_before
+    while True:
+        if brute_peak(intervals, candidate, candidate + duration) < capacity:
+            return candidate
+        candidate += 1
+
+
+def reservation(reservation_id, start_time, end_time, parking_lot_id="1", status="confirmed"):
+    return {
+        "id": reservation_id,
+        "parking_lot_id": parking_lot_id,
+        "start_time": start_time,
+        "end_time": end_time,
+        "status": status,
+    }
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    reservation_index_services.reset()
+    yield
+    reservation_index_services.reset()
+
+
+def test_minutes_round_trip():
+    assert from_minutes(to_minutes("2025-12-06T10:00")) == "2025-12-06T10:00"
+    assert to_minutes("2099-12-06T11:00") - to_minutes("2099-12-06T10:00") == 60
+
+
+def test_queries_match_brute_force():
+    rng = random.Random(7)
+    index = LotReservationIndex()
+    intervals = {}
+    for i in range(120):
+        start = rng.randrange(0, 600)
+        intervals[str(i)] = (start, start + rng.randrange(1, 120))
+        index.add(str(i), *intervals[str(i)])
+    for i in range(0, 120, 3):
+        index.remove(str(i))
+        del intervals[str(i)]
+
+    values = list(intervals.values())
+    for _ in range(50):
+        start = rng.randrange(0, 700)
+        end = start + rng.randrange(1, 90)
+        overlapping = sum(1 for s, e in values if s < end and e > start)
+        assert index.count_overlapping(start, end) == overlapping
+        assert index.peak(start, end) == brute_peak(values, start, end)
+
+        capacity, duration = rng.randrange(1, 10), rng.randrange(1, 90)
+        assert index.earliest_free_slot(capacity, duration, start) == brute_earliest(values, capacity, duration, start)
+
+
+def test_intervals_are_half_open():
+    index = LotReservationIndex()
+    index.add("1", 10, 20)
+
+    assert index.count_overlapping(20, 30) == 0
+    assert index.count_overlapping(0, 10) == 0
+    assert index.peak(19, 21) == 1
+    assert index.earliest_free_slot(1, 10, 5) == 20
+
+
+def test_ignore_does_not_count_against_itself():
+    index = LotReservationIndex()
+    index.add("1", 10, 20)
+    index.add("2", 15, 25)
+
+    assert index.peak(10, 25) == 2
+    assert index.peak(10, 25, ignore=(10, 20)) == 1
+    assert index.earliest_free_slot(2, 10, 10, ignore=(10, 20)) == 10
+
+
+def test_book_respects_capacity():
+    reservation_index_services.ensure_loaded([reservation("1", "2099-12-06T10:00", "2099-12-06T12:00")])
+
+    assert not reservation_index_services.book(reservation("2", "2099-12-06T11:00", "2099-12-06T13:00"), 1)
+    assert reservation_index_services.book(reservation("2", "2099-12-06T12:00", "2099-12-06T13:00"), 1)
+    assert reservation_index_services.book(reservation("3", "2099-12-06T11:00", "2099-12-06T13:00"), 2)
+    assert reservation_index_services.count_overlapping("1", "2099-12-06T11:30", "2099-12-06T12:30") == 3
+
+
+def test_book_moves_existing_reservation():
+    reservation_index_services.ensure_loaded([
+        reservation("1", "2099-12-06T10:00", "2099-12-06T12:00"),
+        reservation("2", "2099-12-06T12:00", "2099-12-06T14:00"),
+    ])
+
+    # Shifting a reservation inside its own old window doesn't clash with itself
+    assert reservation_index_services.book(reservation("1", "2099-12-06T09:00", "2099-12-06T11:00"), 1)
+    assert not reservation_index_services.book(reservation("1", "2099-12-06T11:00", "2099-12-06T13:00"), 1)
+    assert reservation_index_services.book(reservation("1", "2099-12-06T11:00", "2099-12-06T13:00", "2"), 1)
+    assert reservation_index_services.count_overlapping("1", "2099-12-06T09:00", "2099-12-06T12:00") == 0
+
+
+def test_inactive_reservations_are_ignored():
+    reservation_index_services.ensure_loaded([
+        reservation("1", "2099-12-06T10:00", "2099-12-06T12:00", status="cancelled"),
+    ])
+    assert reservation_index_services.count_overlapping("1", "2099-12-06T10:00", "2099-12-06T12:00") == 0
+
+    reservation_index_services.upsert(reservation("2", "2099-12-06T10:00", "2099-12-06T12:00"))
+    reservation_index_services.upsert(reservation("2", "2099-12-06T10:00", "2099-12-06T12:00", status="cancelled"))
+    assert reservation_index_services.count_overlapping("1", "2099-12-06T10:00", "2099-12-06T12:00") == 0
+
+
+def test_earliest_available_time():
+    reservation_index_services.ensure_loaded([
+        reservation("1", "2099-12-06T10:00", "2099-12-06T12:00"),
+        reservation("2", "2099-12-06T12:30", "2099-12-06T15:00"),
+    ])
+
+    # The 30 minute gap is too short for a one hour booking
+    assert reservation_index_services.earliest_available_time(
+        "1", 1, "2099-12-06T11:00", "2099-12-06T12:00"
+    ) == "2099-12-06T15:00"
+    assert reservation_index_services.earliest_available_time(
+        "1", 1, "2099-12-06T11:00", "2099-12-06T11:30"
+    ) == "2099-12-06T12:00"
+
+
+def test_finished_reservations_hold_no_space():
+    reservation_index_services.ensure_loaded([reservation("1", "2025-12-06T10:00", "2025-12-06T12:00")])
+
+    assert reservation_index_services.count_overlapping("1", "2025-12-06T10:00", "2025-12-06T12:00") == 0
+    assert reservation_index_services.book(reservation("2", "2025-12-06T10:00", "2025-12-06T12:00"), 0)
+
+
+def test_rebuilds_when_another_worker_writes(monkeypatch):
+    table_version = [1]
+    stored = [reservation("1", "2099-12-06T10:00", "2099-12-06T12:00")]
+    monkeypatch.setattr(reservation_index_services, "VERSION_CHECK_SECONDS", 0)
+    monkeypatch.setattr(
+        reservation_index_services.storage_utils, "get_table_version", lambda table_name: table_version[0]
+    )
+
+    reservation_index_services.ensure_current(lambda: list(stored))
+    assert not reservation_index_services.book(reservation("2", "2099-12-06T11:00", "2099-12-06T13:00"), 1)
+
+    # Another worker cancels the reservation, only the table version tells this one
+    stored[0] = reservation("1", "2099-12-06T10:00", "2099-12-06T12:00", status="cancelled")
+    reservation_index_services.ensure_current(lambda: list(stored))
+    assert reservation_index_services.count_overlapping("1", "2099-12-06T10:00", "2099-12-06T12:00") == 1
+
+    table_version[0] = 2
+    reservation_index_services.ensure_current(lambda: list(stored))
+    assert reservation_index_services.count_overlapping("1", "2099-12-06T10:00", "2099-12-06T12:00") == 0
+    assert reservation_index_services.book(reservation("2", "2099-12-06T11:00", "2099-12-06T13:00"), 1)
+
+
+def test_own_writes_do_not_cost_a_rebuild():
+    loads = []
+    stored = [reservation("1", "2099-12-06T10:00", "2099-12-06T12:00")]
+
+    def load():
+        loads.append(1)
+        return list(stored)
+
+    reservation_index_services.ensure_current(load, 1)
+    booked = reservation("2", "2099-12-06T12:00", "2099-12-06T13:00")
+    assert reservation_index_services.book(booked, 1)
+    reservation_index_services.record_write("2", booked, 2)
+    reservation_index_services.ensure_current(load, 2)
+    assert len(loads) == 1
+
+    # Another worker wrote version 3, this process version 4: rebuilding from the rows read at
+    # version 3 keeps the own write that is not in them
+    reservation_index_services.record_write("1", None, 4)
+    reservation_index_services.ensure_current(load, 3)
+    assert len(loads) == 2
+    assert reservation_index_services.count_overlapping("1", "2099-12-06T10:00", "2099-12-06T12:00") == 0
+    assert reservation_index_services.count_overlapping("1", "2099-12-06T12:00", "2099-12-06T13:00") == 0
+    reservation_index_services.ensure_current(load, 4)
+    assert len(loads) == 2
+
+
+def test_bookings_not_written_yet_survive_a_rebuild():
+    stored = [reservation("1", "2099-12-06T10:00", "2099-12-06T12:00")]
+    reservation_index_services.ensure_current(lambda: list(stored), 1)
+    assert reservation_index_services.book(reservation("2", "2099-12-06T12:00", "2099-12-06T13:00"), 1)
+
+    # Another worker writes before the booking is saved
+    reservation_index_services.ensure_current(lambda: list(stored), 2)
+    assert not reservation_index_services.book(reservation("3", "2099-12-06T12:00", "2099-12-06T13:00"), 1)
+
+    # Once its save failed the booking no longer holds the space
+    reservation_index_services.remove("2")
+    reservation_index_services.ensure_current(lambda: list(stored), 3)
+    assert reservation_index_services.book(reservation("3", "2099-12-06T12:00", "2099-12-06T13:00"), 1)
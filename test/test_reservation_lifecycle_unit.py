@@ -0,0 +1,223 @@
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.parking_lots_model import GateEvent
+from services import (
+    gate_event_services,
+    lifecycle_services,
+    lot_cache_services,
+    occupancy_services,
+    reservation_index_services,
+)
+from utils import storage_utils
+
+client = TestClient(app)
+
+NOW = datetime(2026, 3, 2, 12, 0, 30)
+ADMIN = {"username": "operations", "role": "ADMIN"}
+
+
+@pytest.fixture
+def lifecycle_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "lifecycle.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    monkeypatch.setattr(storage_utils, "_id_blocks", {})
+    storage_utils.init_db()
+    storage_utils.save_json_to_db(
+        "parking_lots",
+        [{"id": "1", "name": "Centrum", "capacity": 10, "reserved": 5, "tariff": 2.0, "daytariff": 20.0}],
+    )
+    storage_utils.save_json_to_db(
+        "reservations",
+        [
+            {"id": "1", "parking_lot_id": "1", "start_time": "2026-03-02T09:00", "end_time": "2026-03-02T11:00", "status": "pending"},
+            {"id": "2", "parking_lot_id": "1", "start_time": "2026-03-02T10:00", "end_time": "2026-03-02T12:00", "status": "confirmed"},
+            {"id": "3", "parking_lot_id": "1", "start_time": "2026-03-02T10:00", "end_time": "2026-03-02T11:00", "status": "cancelled"},
+            {"id": "4", "parking_lot_id": "1", "start_time": "2026-03-02T12:00", "end_time": "2026-03-02T14:00", "status": "pending"},
+        ],
+    )
+    storage_utils.save_json_to_db(
+        "parking_sessions",
+        [
+            {"id": "1", "parking_lot_id": "1", "licenseplate": "AA-11", "started": "2026-02-28T08:00", "stopped": None},
+            {"id": "2", "parking_lot_id": "1", "licenseplate": "BB-22", "started": "2026-03-02T08:00", "stopped": None},
+            {"id": "3", "parking_lot_id": "1", "licenseplate": "CC-33", "started": "2026-02-20T08:00", "stopped": "2026-02-20T09:00"},
+        ],
+    )
+    lot_cache_services.invalidate()
+    occupancy_services.invalidate()
+    reservation_index_services.reset()
+    yield
+    lot_cache_services.invalidate()
+    occupancy_services.invalidate()
+    reservation_index_services.reset()
+
+
+def reserved():
+    return storage_utils.get_parking_lot_occupancy("1")["reserved"]
+
+
+def statuses():
+    return {r["id"]: r["status"] for r in storage_utils.load_reservation_data_from_db()}
+
+
+def test_sweep_expires_reservations_and_frees_stale_sessions(lifecycle_db):
+    scheduler = lifecycle_services.LifecycleScheduler(holder="worker-a", batch_size=1, stale_after_hours=24)
+
+    assert scheduler.sweep(NOW) == {"expired_reservations": 2, "stale_sessions": 1}
+
+    assert statuses() == {"1": "expired", "2": "expired", "3": "cancelled", "4": "pending"}
+    assert reserved() == 2
+    sessions = {s["id"]: s for s in storage_utils.load_parking_sessions_data_from_db()}
+    assert sessions["1"]["stale_at"] and not sessions["2"]["stale_at"]
+    assert scheduler.next_due() == datetime(2026, 3, 2, 14, 0)
+    assert scheduler.sweep(NOW) == {"expired_reservations": 0, "stale_sessions": 0}
+
+
+def test_stale_session_does_not_release_twice(lifecycle_db):
+    lifecycle_services.LifecycleScheduler(holder="worker-a").sweep(NOW)
+    before = reserved()
+
+    gate_event_services.process_gate_events(
+        [GateEvent(event="exit", licenseplate="AA-11", parking_lot_id="1", timestamp=NOW)], ADMIN
+    )
+
+    assert reserved() == before
+
+
+@patch("endpoints.reservations.get_session", return_value=ADMIN)
+def test_deleting_an_expired_reservation_does_not_release_twice(mock_session, lifecycle_db):
+    lifecycle_services.LifecycleScheduler(holder="worker-a").sweep(NOW)
+    before = reserved()
+
+    response = client.delete("/reservations/1", headers={"Authorization": "token"})
+
+    assert response.status_code == 200
+    assert reserved() == before
+
+
+@patch("endpoints.reservations.get_session", return_value=ADMIN)
+def test_update_without_status_keeps_a_reservation_expired(mock_session, lifecycle_db):
+    lifecycle_services.LifecycleScheduler(holder="worker-a").sweep(NOW)
+
+    response = client.put(
+        "/reservations/1",
+        json={
+            "user_id": "operations",
+            "vehicle_id": "5312672b-bba0-497d-97d7-032c3c28b51c",
+            "start_time": "2026-03-02T09:00",
+            "end_time": "2026-03-02T11:30",
+            "parking_lot_id": "1",
+        },
+        headers={"Authorization": "token"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["reservation"]["status"] == "expired"
+    assert statuses()["1"] == "expired"
+
+
+@patch("endpoints.reservations.get_session", return_value=ADMIN)
+def test_writes_from_a_stale_read_leave_other_rows_alone(mock_session, lifecycle_db):
+    stale = storage_utils.load_reservation_data()
+    lifecycle_services.LifecycleScheduler(holder="worker-a").sweep(NOW)
+    before = reserved()
+
+    with patch("endpoints.reservations.load_reservation_data", return_value=stale):
+        created = client.post(
+            "/reservations/",
+            json={
+                "user_id": "operations",
+                "vehicle_id": "5312672b-bba0-497d-97d7-032c3c28b51c",
+                "start_time": "2099-03-02T09:00",
+                "end_time": "2099-03-02T11:00",
+                "parking_lot_id": "1",
+            },
+            headers={"Authorization": "token"},
+        )
+        deleted = client.delete("/reservations/2", headers={"Authorization": "token"})
+
+    assert created.status_code == 201 and deleted.status_code == 200
+    # The rows expired after the read stay expired, and the expired one deleted is not released again
+    assert statuses() == {"1": "expired", "3": "cancelled", "4": "pending", created.json()["reservation"]["id"]: "pending"}
+    assert reserved() == before + 1
+
+
+def test_mock_data_expires_the_same_reservations(lifecycle_db, tmp_path, monkeypatch):
+    storage_utils.insert_single_json_to_db(
+        "reservations", {"id": "5", "parking_lot_id": "1", "start_time": "2026-03-02T09:00", "end_time": None, "status": "pending"}
+    )
+    lots_file, reservations_file = tmp_path / "lots.json", tmp_path / "reservations.json"
+    lots_file.write_text(json.dumps(storage_utils.load_parking_lot_data_from_db()))
+    reservations_file.write_text(json.dumps(storage_utils.load_reservation_data_from_db()))
+
+    expired = sorted(r["id"] for r in storage_utils.expire_reservations(NOW, 10))
+    monkeypatch.setattr(storage_utils, "use_mock_data", True)
+    monkeypatch.setattr(storage_utils, "MOCK_PARKING_LOTS", str(lots_file))
+    monkeypatch.setattr(storage_utils, "MOCK_RESERVATIONS", str(reservations_file))
+
+    assert sorted(r["id"] for r in storage_utils.expire_reservations(NOW, 10)) == expired == ["1", "2"]
+
+
+def test_one_worker_holds_the_lease(lifecycle_db):
+    first = lifecycle_services.LifecycleScheduler(holder="worker-a")
+    second = lifecycle_services.LifecycleScheduler(holder="worker-b")
+
+    assert first.sweep(NOW) is not None
+    assert second.sweep(NOW) is None
+    assert first.sweep(NOW) is not None
+
+    first.stop()
+    assert second.sweep(NOW) is not None
+    assert first.sweep(NOW) is None
+
+
+def test_lease_that_ran_out_is_taken_over(lifecycle_db):
+    assert storage_utils.acquire_lease("job", "worker-a", -1)
+    assert storage_utils.acquire_lease("job", "worker-b", 60)
+    assert not storage_utils.acquire_lease("job", "worker-a", 60)
+
+
+def test_schedule_moves_the_next_wake_up_forward(lifecycle_db):
+    scheduler = lifecycle_services.LifecycleScheduler(holder="worker-a")
+    scheduler.sweep(NOW)
+
+    scheduler.schedule("2026-03-02T13:00")
+
+    assert scheduler.next_due() == datetime(2026, 3, 2, 13, 0)
+    assert scheduler._wake.is_set()
+
+
+def test_sweeps_walk_the_partial_indexes(lifecycle_db):
+    with storage_utils.get_db_connection() as conn:
+        reservations = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM reservations WHERE "
+            f"{storage_utils.ACTIVE_RESERVATION_SQL} AND end_time <= ? ORDER BY end_time LIMIT ?",
+            ("2026-03-02T12:00", 10),
+        ).fetchall()
+        sessions = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM parking_sessions WHERE stopped IS NULL AND stale_at IS NULL "
+            "AND started <= ? ORDER BY started LIMIT ?",
+            ("2026-03-01T12:00", 10),
+        ).fetchall()
+
+    assert "idx_reservations_active_end" in str(reservations)
+    assert "idx_parking_sessions_open_started" in str(sessions)
+
+
+def test_open_sessions_of_a_lot_leave_out_stale_ones(lifecycle_db):
+    lifecycle_services.LifecycleScheduler(holder="worker-a").sweep(NOW)
+
+    assert [s["id"] for s in storage_utils.get_open_sessions_by_lot("1")] == ["2"]
+    with storage_utils.get_db_connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM parking_sessions "
+            "WHERE parking_lot_id = ? AND stopped IS NULL AND stale_at IS NULL",
+            ("1",),
+        ).fetchall()
+    assert "idx_parking_sessions_lot_stopped" in str(plan)
@@ -1,7 +1,9 @@
 from fastapi.testclient import TestClient
 from main import app
 from unittest.mock import patch
+from services import reservation_index_services
 import copy
+import pytest
 
 client = TestClient(app)
 
@@ -45,21 +47,37 @@ MOCK_VEHICLE = {
 
 MOCK_PARKING_LOT = [{"id": "1", "name": "TEST", "capacity": 300, "reserved": 109}]
 
+# Reservations only hold a space until they end, so capacity checks need one in the future
+MOCK_UPCOMING_RESERVATION = {
+    **MOCK_RESERVATION,
+    "start_time": "2099-12-06T10:00",
+    "end_time": "2099-12-07T12:00",
+}
+
+# The single space is taken by MOCK_UPCOMING_RESERVATION
 MOCK_PARKING_LOT_FULL = [
     {
         "id": "1",
         "name": "TEST",
-        "capacity": 100,
-        "reserved": 100,
+        "capacity": 1,
+        "reserved": 1,
     }
 ]
 
 
+@pytest.fixture(autouse=True)
+def fresh_reservation_index():
+    # The availability index is process wide, rebuild it from each test's mocked reservations
+    reservation_index_services.reset()
+    yield
+    reservation_index_services.reset()
+
+
 
 class TestCreateReservations:
 
     @patch("endpoints.reservations.get_session")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_missing_auth(self, mock_load_parking_data, mock_get_session):
         """
         Test when missing authorization.
@@ -101,13 +119,13 @@ class TestCreateReservations:
         assert response_data["detail"] == "Error loading data"
 
     @patch("endpoints.reservations.get_session")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_unable_to_load_parking_lot_data_create(self, mock_load_parking_lot_data, mock_get_session):
         """
-        Test unable to load parking lot data when creating a reservation.
+        Test no parking lot data when creating a reservation.
 
         Validation:
-        When parking lot data loading goes wrong return 500 code with detail error loading data.
+        When parking lot data loading returns nothing the lot does not exist, return 404 code.
         """
         mock_get_session.return_value = MOCK_USER
         mock_load_parking_lot_data.return_value = None
@@ -117,9 +135,9 @@ class TestCreateReservations:
             json=MOCK_RESERVATION,
             headers={"Authorization": "valid_token"},
         )
-        assert response.status_code == 500
+        assert response.status_code == 404
         response_data = response.json()
-        assert response_data["detail"] == "Error loading data"
+        assert response_data["detail"] == "Parking lot not found"
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
@@ -144,7 +162,7 @@ class TestCreateReservations:
         mock_load_reservation_data.assert_called_once()
 
     @patch("endpoints.reservations.get_session")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_load_parking_lot_data_exception_create(
         self, mock_load_parking_lot_data, mock_get_session
     ):
@@ -167,14 +185,14 @@ class TestCreateReservations:
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("endpoints.reservations.save_new_reservation_to_db")
+    @patch("endpoints.reservations.reserve_space")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_create_reservation_success(
         self,
         mock_load_parking_data,
-        mock_save_parking_data,
-        mock_save_reservation_data,
+        mock_reserve_space,
+        mock_save_new_reservation,
         load_reservation_data,
         mock_get_session,
     ):
@@ -185,7 +203,7 @@ class TestCreateReservations:
         mock_get_session.return_value = MOCK_USER
         load_reservation_data.return_value = []
         mock_load_parking_data.return_value = copy.deepcopy(MOCK_PARKING_LOT)
-        mock_save_parking_data.return_value = []
+        mock_reserve_space.return_value = True
 
         response = client.post(
             "/reservations/",
@@ -197,10 +215,7 @@ class TestCreateReservations:
         response_data = response.json()
         assert response_data["status"] == "Success"
 
-        saved_parking_lots = mock_save_parking_data.call_args[0][0]
-        updated_lot = next((lot for lot in saved_parking_lots if lot["id"] == "1"), None)
-        assert updated_lot is not None
-        assert updated_lot["reserved"] == 110
+        mock_reserve_space.assert_called_once_with("1", enforce_capacity=False)
         
         reservation = response_data["reservation"]
         assert "id" in reservation
@@ -209,19 +224,19 @@ class TestCreateReservations:
         assert "end_time" in reservation
         assert "parking_lot_id" in reservation
         assert "created_at" in reservation
-        mock_save_reservation_data.assert_called_once()
+        mock_save_new_reservation.assert_called_once()
         mock_load_parking_data.assert_called_once()
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("endpoints.reservations.save_new_reservation_to_db")
+    @patch("endpoints.reservations.reserve_space")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_create_reservation_success_admin(
         self,
         mock_load_parking_data,
-        mock_save_parking_data,
-        mock_save_reservation_data,
+        mock_reserve_space,
+        mock_save_new_reservation,
         load_reservation_data,
         mock_get_session,
     ):
@@ -232,7 +247,7 @@ class TestCreateReservations:
         mock_get_session.return_value = MOCK_ADMIN
         load_reservation_data.return_value = []
         mock_load_parking_data.return_value = copy.deepcopy(MOCK_PARKING_LOT)
-        mock_save_parking_data.return_value = []
+        mock_reserve_space.return_value = True
     
         response = client.post(
             "/reservations/",
@@ -243,10 +258,7 @@ class TestCreateReservations:
         response_data = response.json()
         assert response_data["status"] == "Success"
 
-        saved_parking_lots = mock_save_parking_data.call_args[0][0]
-        updated_lot = next((lot for lot in saved_parking_lots if lot["id"] == "1"), None)
-        assert updated_lot is not None
-        assert updated_lot["reserved"] == 110
+        mock_reserve_space.assert_called_once_with("1", enforce_capacity=False)
 
         reservation = response_data["reservation"]
         assert "id" in reservation
@@ -256,12 +268,12 @@ class TestCreateReservations:
         assert "end_time" in reservation
         assert "parking_lot_id" in reservation
         assert "created_at" in reservation
-        mock_save_reservation_data.assert_called_once()
+        mock_save_new_reservation.assert_called_once()
         mock_load_parking_data.assert_called_once()
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_create_reservation_admin_without_user_id(
         self, mock_load_parking_data, load_reservation_data, mock_get_session
     ):
@@ -285,14 +297,14 @@ class TestCreateReservations:
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
+    @patch("endpoints.reservations.save_new_reservation_to_db")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.reservations.reserve_space")
     def test_create_reservation_parking_lot_full(
         self,
-        mock_save_parking_data,
+        mock_reserve_space,
         mock_load_parking_data,
-        mock_save_reservation_data,
+        mock_save_new_reservation,
         load_reservation_data,
         mock_get_session,
     ):
@@ -300,38 +312,41 @@ class TestCreateReservations:
         Try to create a reservation when the parking lot is full.
 
         Validation: Reservation shouldn't be able to be created since the parking lot is full
+        during the requested time
         """
         mock_get_session.return_value = MOCK_USER
-        load_reservation_data.return_value = []
+        load_reservation_data.return_value = [MOCK_UPCOMING_RESERVATION]
         mock_load_parking_data.return_value = copy.deepcopy(MOCK_PARKING_LOT_FULL)
 
-        mock_save_parking_data.return_value = []
-
         response = client.post(
             "/reservations/",
-            json=MOCK_RESERVATION,
+            json=MOCK_UPCOMING_RESERVATION,
             headers={"Authorization": "valid_token"},
         )
         assert response.status_code == 409
 
         response_data = response.json()
-        assert response_data["detail"] == "Parking lot is currently full"
+        assert response_data["detail"] == f"Parking lot is full. Earliest available time is {MOCK_UPCOMING_RESERVATION['end_time']}"
 
-        mock_save_reservation_data.assert_not_called()
+        mock_reserve_space.assert_not_called()
+        mock_save_new_reservation.assert_not_called()
         mock_load_parking_data.assert_called_once()
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
+    @patch("endpoints.reservations.save_new_reservation_to_db")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.reservations.reserve_space")
+    @patch("endpoints.reservations.allocate_id")
     def test_get_reservation_id_with_no_existing_reservations(
-        self, mock_save_parking_lot_data,mock_load_parking_lot_data, mock_save_reservation_data, mock_load_reservation_data, mock_get_session
+        self, mock_allocate_id, mock_reserve_space,mock_load_parking_lot_data, mock_save_new_reservation, mock_load_reservation_data, mock_get_session
     ):
         #Load reservation data is set to an empty array, so that it doesnt have any reservations
         mock_get_session.return_value = MOCK_USER
         mock_load_reservation_data.return_value = []
         mock_load_parking_lot_data.return_value = copy.deepcopy(MOCK_PARKING_LOT)
+        mock_reserve_space.return_value = True
+        mock_allocate_id.return_value = "1"
 
         response = client.post(
             "/reservations/",
@@ -341,9 +356,10 @@ class TestCreateReservations:
         assert response.status_code == 201
         assert response.json()["reservation"]["id"] == "1"
 
+        mock_allocate_id.assert_called_once_with("reservations")
         mock_load_reservation_data.assert_called_once()
-        mock_save_reservation_data.assert_called_once()
-        mock_save_parking_lot_data.assert_called_once()
+        mock_save_new_reservation.assert_called_once()
+        mock_reserve_space.assert_called_once()
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
@@ -432,7 +448,7 @@ class TestCreateReservations:
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_end_time_before_start_time_create(self,mock_load_parking_data, mock_load_reservation_data, mock_get_session):
         mock_get_session.return_value = MOCK_USER
         mock_load_reservation_data.return_value = []
@@ -451,14 +467,14 @@ class TestCreateReservations:
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("endpoints.reservations.save_new_reservation_to_db")
+    @patch("endpoints.reservations.reserve_space")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_create_reservation_parking_lot_full_but_time_available(
         self,
         mock_load_parking_data,
-        mock_save_parking_data,
-        mock_save_reservation_data,
+        mock_reserve_space,
+        mock_save_new_reservation,
         load_reservation_data,
         mock_get_session,
     ):
@@ -469,15 +485,15 @@ class TestCreateReservations:
         mock_get_session.return_value = MOCK_USER
         mock_load_parking_data.return_value = copy.deepcopy(MOCK_PARKING_LOT_FULL)
 
-        mock_save_parking_data.return_value = []
-        load_reservation_data.return_value = [MOCK_RESERVATION]
+        mock_reserve_space.return_value = True
+        load_reservation_data.return_value = [MOCK_UPCOMING_RESERVATION]
     
         new_reservation = [
             {
                 "user_id": "testuser",
                 "vehicle_id": "7abb4afe-cfb3-4b8a-bda3-3723a33ab144",
-                "start_time": "2025-12-07T13:00",
-                "end_time": "2025-12-07T14:00",
+                "start_time": "2099-12-07T13:00",
+                "end_time": "2099-12-07T14:00",
                 "parking_lot_id": "1",
                 "id": "2",
             }
@@ -492,10 +508,7 @@ class TestCreateReservations:
         response_data = response.json()
         assert response_data["status"] == "Success"
 
-        saved_parking_lots = mock_save_parking_data.call_args[0][0]
-        updated_lot = next((lot for lot in saved_parking_lots if lot["id"] == "1"), None)
-        assert updated_lot is not None
-        assert updated_lot["reserved"] == 101
+        mock_reserve_space.assert_called_once_with("1", enforce_capacity=False)
 
         reservation = response_data["reservation"]
         assert "id" in reservation
@@ -504,19 +517,19 @@ class TestCreateReservations:
         assert "end_time" in reservation
         assert "parking_lot_id" in reservation
         assert "created_at" in reservation
-        mock_save_reservation_data.assert_called_once()
+        mock_save_new_reservation.assert_called_once()
         mock_load_parking_data.assert_called_once()
     
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("endpoints.reservations.save_new_reservation_to_db")
+    @patch("endpoints.reservations.reserve_space")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_create_reservation_fetch_correct_time_available(
         self,
         mock_load_parking_data,
-        mock_save_parking_data,
-        mock_save_reservation_data,
+        mock_reserve_space,
+        mock_save_new_reservation,
         load_reservation_data,
         mock_get_session,
     ):
@@ -526,16 +539,16 @@ class TestCreateReservations:
         mock_get_session.return_value = MOCK_USER
         mock_load_parking_data.return_value = copy.deepcopy(MOCK_PARKING_LOT_FULL)
 
-        mock_save_parking_data.return_value = []
+        mock_reserve_space.return_value = True
         load_reservation_data.return_value = [
-            MOCK_RESERVATION,      
+            MOCK_UPCOMING_RESERVATION,      
         {
             "user_id": "testuser",
             "vehicle_id": "7abb4afe-cfb3-4b8a-bda3-3723a33ab144",
-            "start_time": "2025-12-06T10:00",
-            "end_time": "2025-12-07T14:00",
+            "start_time": "2099-12-06T10:00",
+            "end_time": "2099-12-07T14:00",
             "parking_lot_id": "1",
-            "id": "1",
+            "id": "2",
             "status": "confirmed",
         }
         ]
@@ -543,8 +556,8 @@ class TestCreateReservations:
         {
             "user_id": "testuser",
             "vehicle_id": "7abb4afe-cfb3-4b8a-bda3-3723a33ab144",
-            "start_time": "2025-12-06T10:00",
-            "end_time": "2025-12-07T14:00",
+            "start_time": "2099-12-06T10:00",
+            "end_time": "2099-12-07T14:00",
             "parking_lot_id": "1",
             "id": "1",
             "status": "confirmed",
@@ -554,8 +567,8 @@ class TestCreateReservations:
             {
                 "user_id": "testuser",
                 "vehicle_id": "7abb4afe-cfb3-4b8a-bda3-3723a33ab144",
-                "start_time": "2025-12-07T14:30",
-                "end_time": "2025-12-07T15:00",
+                "start_time": "2099-12-07T14:30",
+                "end_time": "2099-12-07T15:00",
                 "parking_lot_id": "1",
                 "id": "2",
             }
@@ -570,10 +583,7 @@ class TestCreateReservations:
         response_data = response.json()
         assert response_data["status"] == "Success"
 
-        saved_parking_lots = mock_save_parking_data.call_args[0][0]
-        updated_lot = next((lot for lot in saved_parking_lots if lot["id"] == "1"), None)
-        assert updated_lot is not None
-        assert updated_lot["reserved"] == 101
+        mock_reserve_space.assert_called_once_with("1", enforce_capacity=False)
 
         reservation = response_data["reservation"]
         assert "id" in reservation
@@ -582,16 +592,16 @@ class TestCreateReservations:
         assert "end_time" in reservation
         assert "parking_lot_id" in reservation
         assert "created_at" in reservation
-        mock_save_reservation_data.assert_called_once()
+        mock_save_new_reservation.assert_called_once()
         mock_load_parking_data.assert_called_once()
     
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.reservations.reserve_space")
     def test_create_reservation_parking_lot_full_and_time_unavailable(
         self,
-        mock_save_parking_data, 
+        mock_reserve_space, 
         mock_load_parking_data,
         load_reservation_data,
         mock_get_session,
@@ -602,15 +612,14 @@ class TestCreateReservations:
         mock_get_session.return_value = MOCK_USER
         mock_load_parking_data.return_value = copy.deepcopy(MOCK_PARKING_LOT_FULL)
 
-        mock_save_parking_data.return_value = []
-        load_reservation_data.return_value = [MOCK_RESERVATION]
+        load_reservation_data.return_value = [MOCK_UPCOMING_RESERVATION]
     
         new_reservation = [
             {
                 "user_id": "testuser",
                 "vehicle_id": "7abb4afe-cfb3-4b8a-bda3-3723a33ab144",
-                "start_time": "2024-01-07T13:00",
-                "end_time": "2024-01-07T14:00",
+                "start_time": "2099-12-07T11:00",
+                "end_time": "2099-12-07T13:00",
                 "parking_lot_id": "1",
                 "id": "2",
             }
@@ -622,7 +631,7 @@ class TestCreateReservations:
             headers={"Authorization": "valid_token"},
         )
         assert response.status_code == 409
-        assert response.json()["detail"] == f"Parking lot is full. Earliest available time is {MOCK_RESERVATION['end_time']}"
+        assert response.json()["detail"] == f"Parking lot is full. Earliest available time is {MOCK_UPCOMING_RESERVATION['end_time']}"
    
         mock_load_parking_data.assert_called_once()
 
@@ -728,7 +737,7 @@ class TestGetReservations:
 class TestUpdateReservations:
 
     @patch("endpoints.reservations.get_session")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_missing_auth_update(self, mock_load_parking_data, mock_get_session):
 
         #authorization is missing
@@ -743,7 +752,7 @@ class TestUpdateReservations:
         assert response.json()["detail"] == "Missing Authorization header"
 
     @patch("endpoints.reservations.get_session")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_invalid_token_update(self, mock_load_parking_data, mock_get_session):
         #Invalid session token
         mock_get_session.return_value = None
@@ -758,12 +767,16 @@ class TestUpdateReservations:
         assert response.json()["detail"] == "Invalid or expired session token"
 
     @patch("endpoints.reservations.get_session")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    def test_unable_to_load_parking_lot_data_update(self, mock_load_parking_data, mock_get_session):
+    @patch("endpoints.reservations.load_reservation_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    def test_unable_to_load_parking_lot_data_update(
+        self, mock_load_parking_data, mock_load_reservation_data, mock_get_session
+    ):
         """
-        Test if there is an error when the parking lot data is None
+        Test if the parking lot is reported missing when the parking lot data is None
         """
         mock_get_session.return_value = MOCK_USER
+        mock_load_reservation_data.return_value = [copy.deepcopy(MOCK_RESERVATION)]
         mock_load_parking_data.return_value = None
 
         updated_data = {
@@ -777,9 +790,9 @@ class TestUpdateReservations:
             json=updated_data,
             headers={"Authorization": "valid_token"},
         )
-        assert response.status_code == 500
+        assert response.status_code == 404
         response_data = response.json()
-        assert response_data["detail"] == "Error loading data"
+        assert response_data["detail"] == "New parking lot not found"
     
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
@@ -854,7 +867,7 @@ class TestUpdateReservations:
         mock_load_reservation_data.assert_called_once()
 
     @patch("endpoints.reservations.get_session")
-    @patch("endpoints.reservations.load_parking_lot_data")
+    @patch("utils.storage_utils.load_parking_lot_data")
     def test_load_parking_lot_data_exception_update(
         self, mock_load_parking_lot_data, mock_get_session
     ):
@@ -879,22 +892,21 @@ class TestUpdateReservations:
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
+    @patch("endpoints.reservations.update_existing_reservation_in_db")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.reservations.reserve_space")
     def test_update_reservation_success(
         self,
-        mock_save_parking_lot_data,
+        mock_reserve_space,
         mock_load_parking_data,
-        mock_save_reservation_data,
+        mock_update_reservation,
         mock_load_reservation_data,
         mock_get_session,
     ):
         mock_get_session.return_value = MOCK_USER
         mock_load_reservation_data.return_value = [MOCK_RESERVATION]
         mock_load_parking_data.return_value = MOCK_PARKING_LOT
-        mock_save_reservation_data.return_value = None
-        mock_save_parking_lot_data.return_value = None
+        mock_update_reservation.return_value = None
 
         updated_data = {
             "vehicle_id": "7abb4afe-cfb3-4b8a-bda3-3723a33ab144",
@@ -916,19 +928,20 @@ class TestUpdateReservations:
         reservation = data["reservation"]
         assert reservation["start_time"] == updated_data["start_time"]
 
-        mock_save_reservation_data.assert_called_once()
+        mock_update_reservation.assert_called_once()
         mock_load_reservation_data.assert_called_once()
+        mock_reserve_space.assert_not_called()
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
+    @patch("endpoints.reservations.update_existing_reservation_in_db")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.reservations.reserve_space")
     def test_update_reservation_success_admin(
         self,
-        mock_save_parking_lot_data,
+        mock_reserve_space,
         mock_load_parking_data,
-        mock_save_reservation_data,
+        mock_update_reservation,
         mock_load_reservation_data,
         mock_get_session
     ):
@@ -960,8 +973,9 @@ class TestUpdateReservations:
         assert reservation["start_time"] == updated_data["start_time"]
         assert reservation["end_time"] == updated_data["end_time"]
 
-        mock_save_reservation_data.assert_called_once()
+        mock_update_reservation.assert_called_once()
         mock_load_reservation_data.assert_called_once()
+        mock_reserve_space.assert_not_called()
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
@@ -1114,18 +1128,21 @@ class TestUpdateReservations:
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
+    @patch("endpoints.reservations.update_existing_reservation_in_db")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.reservations.release_space")
+    @patch("endpoints.reservations.reserve_space")
     def test_update_parking_lot(
         self,
-        mock_save_parking_lot_data,
+        mock_reserve_space,
+        mock_release_space,
         mock_load_parking_lot_data,
-        mock_save_reservation_data,
+        mock_update_reservation,
         mock_load_reservation_data,
         mock_get_session
     ):
         mock_get_session.return_value = MOCK_USER
+        mock_reserve_space.return_value = True
         mock_load_reservation_data.return_value = [MOCK_RESERVATION]
     
         mock_load_parking_lot_data.return_value = [
@@ -1160,15 +1177,10 @@ class TestUpdateReservations:
         data = response.json()
         assert data["status"] == "Updated"
 
-        saved_parking_lots = mock_save_parking_lot_data.call_args[0][0]
-        updated_lot = next((lot for lot in saved_parking_lots if lot["id"] == "1"), None)
-        assert updated_lot is not None
-        assert updated_lot["reserved"] == 99
-        updated_lot_2 = next((lot for lot in saved_parking_lots if lot["id"] == "2"), None)
-        assert updated_lot_2 is not None
-        assert updated_lot_2["reserved"] == 110
+        mock_reserve_space.assert_called_once_with("2", enforce_capacity=False)
+        mock_release_space.assert_called_once_with("1")
 
-        mock_save_reservation_data.assert_called_once()
+        mock_update_reservation.assert_called_once()
     
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
@@ -1195,20 +1207,21 @@ class TestUpdateReservations:
 class TestDeleteReservations:
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
+    @patch("endpoints.reservations.delete_reservation_from_db")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.reservations.release_space")
     def test_delete_reservation_success(
         self,
-        mock_save_parking_lot_data,
+        mock_release_space,
         mock_load_parking_lot_data,
-        mock_save_reservation_data,
+        mock_delete_reservation,
         mock_load_reservation_data,
         mock_get_session,
     ):
         mock_get_session.return_value = MOCK_USER
         mock_reservation = copy.deepcopy(MOCK_RESERVATION)
         mock_load_reservation_data.return_value = [mock_reservation]
+        mock_delete_reservation.return_value = mock_reservation
         mock_load_parking_lot_data.return_value = copy.deepcopy(MOCK_PARKING_LOT)
 
         response = client.delete(
@@ -1220,32 +1233,29 @@ class TestDeleteReservations:
         data = response.json()
         assert data["status"] == "Deleted"
 
-        saved_parking_lot_data = mock_save_parking_lot_data.call_args[0][0]
-        updated_lot = next((lot for lot in saved_parking_lot_data if lot["id"] == "1"), None)
-        assert updated_lot is not None
-        assert updated_lot["reserved"] == 108
 
         assert data["id"] == MOCK_RESERVATION["id"]
 
-        mock_save_reservation_data.assert_called_once()
-        mock_save_parking_lot_data.assert_called_once()
+        mock_delete_reservation.assert_called_once()
+        mock_release_space.assert_called_once_with("1")
 
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
-    @patch("endpoints.reservations.load_parking_lot_data")
-    @patch("endpoints.reservations.save_parking_lot_data")
+    @patch("endpoints.reservations.delete_reservation_from_db")
+    @patch("utils.storage_utils.load_parking_lot_data")
+    @patch("endpoints.reservations.release_space")
     def test_delete_reservation_success_admin(
         self,
-        mock_save_parking_lot_data,
+        mock_release_space,
         mock_load_parking_lot_data,
-        mock_save_reservation_data,
+        mock_delete_reservation,
         mock_load_reservation_data,
         mock_get_session,
     ):
         mock_get_session.return_value = MOCK_ADMIN
         mock_reservation = copy.deepcopy(MOCK_RESERVATION)
         mock_load_reservation_data.return_value = [mock_reservation]
+        mock_delete_reservation.return_value = mock_reservation
         mock_load_parking_lot_data.return_value = copy.deepcopy(MOCK_PARKING_LOT)
 
         response = client.delete(
@@ -1258,19 +1268,14 @@ class TestDeleteReservations:
         assert data["status"] == "Deleted"
         assert data["id"] == mock_reservation["id"]
       
-        args, _ = mock_save_parking_lot_data.call_args
-        saved_parking_data = args[0]
-        updated_lot = next((lot for lot in saved_parking_data if lot["id"] == "1"), None)
-        assert updated_lot is not None
-        assert updated_lot["reserved"] == 108
         
 
-        mock_save_reservation_data.assert_called_once()
-        mock_save_parking_lot_data.assert_called_once()
+        mock_delete_reservation.assert_called_once()
+        mock_release_space.assert_called_once_with("1")
     
     @patch("endpoints.reservations.get_session")
     @patch("endpoints.reservations.load_reservation_data")
-    @patch("endpoints.reservations.save_reservation_data")
+    @patch("endpoints.reservations.delete_reservation_from_db")
     def test_delete_reservation_not_found(
         self,
         mock_load_parking_lot_data,
@@ -0,0 +1,102 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from utils import storage_utils
+from utils.storage_utils import VersionConflictError
+
+client = TestClient(app)
+
+MOCK_ADMIN = {"username": "adminuser", "role": "ADMIN"}
+
+
+@pytest.fixture
+def versioned_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "versions.db"
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    storage_utils.insert_single_json_to_db(
+        "payments", {"transaction": "txn_1", "amount": 10.0, "initiator": "testuser", "t_data": {"method": "ideal"}}
+    )
+    yield db_path
+
+
+def test_new_rows_start_at_version_1(versioned_db):
+    assert storage_utils.get_payment_data_by_id("txn_1")["version"] == 1
+
+
+def test_update_with_current_version_bumps_it(versioned_db):
+    new_version = storage_utils.update_existing_payment_in_db("txn_1", {"amount": 20.0}, expected_version=1)
+
+    payment = storage_utils.get_payment_data_by_id("txn_1")
+    assert new_version == 2
+    assert payment["version"] == 2
+    assert payment["amount"] == 20.0
+
+
+def test_update_only_writes_given_columns(versioned_db):
+    storage_utils.update_existing_payment_in_db("txn_1", {"amount": 20.0})
+
+    payment = storage_utils.get_payment_data_by_id("txn_1")
+    assert payment["initiator"] == "testuser"
+    assert payment["t_data"]["method"] == "ideal"
+
+
+def test_stale_version_is_a_conflict(versioned_db):
+    storage_utils.update_existing_payment_in_db("txn_1", {"amount": 20.0}, expected_version=1)
+
+    with pytest.raises(VersionConflictError) as exc_info:
+        storage_utils.update_existing_payment_in_db("txn_1", {"amount": 30.0}, expected_version=1)
+
+    assert exc_info.value.current_version == 2
+    assert storage_utils.get_payment_data_by_id("txn_1")["amount"] == 20.0
+
+
+def test_missing_row_is_not_a_conflict(versioned_db):
+    with pytest.raises(ValueError) as exc_info:
+        storage_utils.update_existing_payment_in_db("missing", {"amount": 30.0}, expected_version=1)
+
+    assert not isinstance(exc_info.value, VersionConflictError)
+
+
+def test_migration_adds_version_to_old_database(tmp_path, monkeypatch):
+    db_path = tmp_path / "old.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE payments (\"transaction\" TEXT PRIMARY KEY, amount REAL)")
+        conn.execute("INSERT INTO payments VALUES ('txn_1', 10.0)")
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+
+    storage_utils.init_db()
+
+    assert storage_utils.get_payment_data_by_id("txn_1")["version"] == 1
+
+
+def test_mock_data_conflict(tmp_path, monkeypatch):
+    mock_file = tmp_path / "payments.json"
+    monkeypatch.setattr(storage_utils, "use_mock_data", True)
+    monkeypatch.setattr(storage_utils, "MOCK_PAYMENTS", mock_file)
+    storage_utils.save_data(mock_file, [{"transaction": "txn_1", "amount": 10.0}])
+
+    assert storage_utils.update_existing_payment_in_db("txn_1", {"amount": 20.0}, expected_version=1) == 2
+    with pytest.raises(VersionConflictError):
+        storage_utils.update_existing_payment_in_db("txn_1", {"amount": 30.0}, expected_version=1)
+    assert storage_utils.load_data(mock_file)[0]["amount"] == 20.0
+
+
+@patch("endpoints.payments_endpoint.get_session")
+@patch("endpoints.payments_endpoint.get_payment_data_by_id")
+@patch("endpoints.payments_endpoint.update_existing_payment_in_db")
+def test_conflicting_payment_update_returns_409(mock_update, mock_get_payment, mock_session):
+    mock_session.return_value = MOCK_ADMIN
+    mock_get_payment.return_value = {"transaction": "txn_1", "amount": 10.0, "version": 1}
+    mock_update.side_effect = VersionConflictError("payments", "txn_1", 1, 2)
+
+    response = client.put("/payments/txn_1", json={"amount": 20.0}, headers={"Authorization": "valid-token"})
+
+    assert response.status_code == 409
+    mock_update.assert_called_once_with("txn_1", {"amount": 20.0}, 1)
@@ -0,0 +1,110 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from utils import billing_utils, storage_utils
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest.fixture
+def archive_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "live.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    monkeypatch.setenv("SESSION_ARCHIVE_DIR", str(tmp_path / "archive"))
+    storage_utils.init_db()
+    storage_utils.save_json_to_db(
+        "parking_lots", [{"id": "1", "name": "Centrum", "address": "Markt 1", "capacity": 10, "reserved": 0}]
+    )
+    sessions = [
+        session("1", "2024-11-03T10:00:00"),
+        session("2", "2024-11-20T10:00:00"),
+        session("3", "2025-01-10T10:00:00"),
+        session("4", "2025-06-01T10:00:00", user="other"),
+        session("5", "2026-03-01T10:00:00"),
+        session("6", None),
+    ]
+    storage_utils.save_json_to_db("parking_sessions", sessions)
+    yield tmp_path
+
+
+def session(session_id, stopped, user="driver"):
+    return {
+        "id": session_id,
+        "parking_lot_id": "1",
+        "licenseplate": "AB-12-CD",
+        "started": "2024-01-01T08:00",
+        "stopped": stopped,
+        "user": user,
+    }
+
+
+def live_ids():
+    with storage_utils.get_db_connection() as conn:
+        return sorted(row[0] for row in conn.execute("SELECT id FROM parking_sessions"))
+
+
+def test_archives_whole_months_before_the_cutoff(archive_db):
+    moved = storage_utils.archive_parking_sessions(months=12, batch_size=1, today=TODAY)
+
+    assert moved == {"2024-11": 2, "2025-01": 1}
+    assert live_ids() == ["4", "5", "6"]
+    assert (archive_db / "archive" / "parking_sessions_2024-11.db").exists()
+    with storage_utils.get_db_connection() as conn:
+        assert conn.execute("SELECT month, sessions FROM session_archives ORDER BY month").fetchall() == [
+            ("2024-11", 2),
+            ("2025-01", 1),
+        ]
+    # Nothing left to move
+    assert storage_utils.archive_parking_sessions(months=12, today=TODAY) == {}
+
+
+def test_history_reads_archives_only_when_the_page_needs_them(archive_db, monkeypatch):
+    storage_utils.archive_parking_sessions(months=12, today=TODAY)
+    attached = []
+    attach = storage_utils._attached_archive
+
+    def record_attach(conn, file):
+        attached.append(file)
+        return attach(conn, file)
+
+    monkeypatch.setattr(storage_utils, "_attached_archive", record_attach)
+
+    first_page = storage_utils.get_vehicle_history_by_plate("ab12cd", limit=2)
+    assert [s["id"] for s in first_page] == ["5", "4"]
+    assert attached == []
+
+    second_page = storage_utils.get_vehicle_history_by_plate("ab12cd", limit=2, before=first_page[-1]["stopped"])
+    assert [s["id"] for s in second_page] == ["3", "2"]
+    assert second_page[0]["parking_lot_name"] == "Centrum"
+    # The page was full after January, November had to be read for its second session
+    assert attached == ["parking_sessions_2025-01.db", "parking_sessions_2024-11.db"]
+
+    assert [s["id"] for s in storage_utils.get_vehicle_history_by_plate("AB-12-CD")] == ["5", "4", "3", "2", "1"]
+
+
+def test_billing_includes_archived_sessions(archive_db):
+    storage_utils.archive_parking_sessions(months=12, today=TODAY)
+
+    sessions = billing_utils.get_user_session_by_username("driver")
+
+    assert [s["id"] for s in sessions] == ["6", "5", "3", "2", "1"]
+
+
+def test_interrupted_batch_is_finished_by_the_next_run(archive_db):
+    storage_utils.archive_parking_sessions(months=12, today=TODAY)
+    # A batch that was copied to the archive but not yet removed from the live table
+    with storage_utils.get_db_connection() as conn:
+        conn.execute(
+            "INSERT INTO parking_sessions (id, parking_lot_id, licenseplate, stopped, user, plate_norm) "
+            "VALUES ('1', '1', 'AB-12-CD', '2024-11-03T10:00:00', 'driver', 'AB12CD')"
+        )
+        conn.commit()
+    assert [s["id"] for s in storage_utils.get_parking_sessions_by_user("driver")] == ["6", "5", "3", "2", "1"]
+
+    assert storage_utils.archive_parking_sessions(months=12, today=TODAY) == {"2024-11": 1}
+    assert live_ids() == ["4", "5", "6"]
+    archive = sqlite3.connect(archive_db / "archive" / "parking_sessions_2024-11.db")
+    assert archive.execute("SELECT COUNT(*) FROM parking_sessions").fetchone()[0] == 2
+    archive.close()
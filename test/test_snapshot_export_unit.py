@@ -0,0 +1,99 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from utils import snapshot_utils, storage_utils
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def snapshot_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "live.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    monkeypatch.setenv("SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    storage_utils.init_db()
+    storage_utils.save_json_to_db(
+        "payments",
+        [
+            {
+                "transaction": f"t{i}",
+                "amount": 10.0 + i,
+                "initiator": "driver",
+                "created_at": "06-01-2026 21:10:191767730219",
+                "t_data": {"amount": 10.0 + i, "date": "2026-01-06 21:10:19", "method": "ideal"},
+            }
+            for i in range(5)
+        ],
+    )
+    yield tmp_path
+
+
+def read(files):
+    return pd.concat([pd.read_pickle(file, compression="gzip") for file in files], ignore_index=True)
+
+
+def test_first_snapshot_exports_typed_columns(snapshot_db):
+    manifest = snapshot_utils.export_snapshot(["payments"], fmt="pickle", chunk_rows=2)
+
+    assert manifest["payments"]["rows"] == 5
+    assert len(manifest["payments"]["files"]) == 3
+    frame = read(manifest["payments"]["files"])
+    assert "t_data_amount" in frame.columns and "t_data.amount" not in frame.columns
+    assert str(frame["t_data_amount"].dtype) == "Float64"
+    assert str(frame["version"].dtype) == "Int64"
+    assert frame["created_at"].iloc[0] == pd.Timestamp(1767730219, unit="s", tz="UTC")
+    assert frame["t_data_date"].notna().all()
+
+
+def test_later_snapshots_only_hold_changes(snapshot_db):
+    snapshot_utils.export_snapshot(["payments"], fmt="pickle")
+    storage_utils.update_existing_payment_in_db("t1", {"amount": 99.0})
+    with storage_utils.get_db_connection() as conn:
+        conn.execute("DELETE FROM payments WHERE \"transaction\" = 't4'")
+        conn.commit()
+
+    manifest = snapshot_utils.export_snapshot(["payments"], fmt="pickle")
+
+    changed = pd.read_pickle(manifest["payments"]["files"][0], compression="gzip")
+    assert changed["transaction"].tolist() == ["t1"]
+    assert changed["amount"].tolist() == [99.0]
+    deleted = pd.read_pickle(manifest["payments"]["files"][1], compression="gzip")
+    assert Path(manifest["payments"]["files"][1]).name.endswith("deleted.pkl.gz")
+    assert deleted["transaction"].tolist() == ["t4"]
+    assert snapshot_utils.export_snapshot(["payments"], fmt="pickle")["payments"] == {
+        "rows": 0,
+        "deleted": 0,
+        "files": [],
+    }
+
+
+def test_all_tables_without_bookkeeping(snapshot_db):
+    manifest = snapshot_utils.export_snapshot(fmt="pickle")
+
+    assert "payments" in manifest and "parking_sessions" in manifest
+    assert "counters" not in manifest and "table_versions" not in manifest
+
+
+def test_unknown_table_or_format(snapshot_db):
+    with pytest.raises(ValueError):
+        snapshot_utils.export_snapshot(["nope"], fmt="pickle")
+    with pytest.raises(ValueError):
+        snapshot_utils.export_snapshot(fmt="csv")
+
+
+@patch("services.auth_services.get_session")
+def test_endpoint(mock_session, snapshot_db):
+    mock_session.return_value = {"username": "analyst", "role": "ADMIN"}
+
+    response = client.post("/analytics/snapshots?format=pickle", headers={"Authorization": "valid-token"})
+
+    assert response.status_code == 200
+    assert response.json()["payments"]["rows"] == 5
+
+    mock_session.return_value = {"username": "driver", "role": "USER"}
+    assert client.post("/analytics/snapshots", headers={"Authorization": "valid-token"}).status_code == 403
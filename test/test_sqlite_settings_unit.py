@@ -0,0 +1,87 @@
+import threading
+from contextlib import closing
+
+import pytest
+
+from utils import storage_utils, wal_checkpoint
+
+
+@pytest.fixture
+def wal_db(tmp_path, monkeypatch):
+    """Temporary database initialised the way the app does it."""
+    db_path = tmp_path / "wal.db"
+    monkeypatch.setattr(storage_utils, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+    storage_utils.init_db()
+    yield db_path
+
+
+def test_connection_pragmas(wal_db):
+    with closing(storage_utils.get_db_connection()) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == storage_utils.SQLITE_BUSY_TIMEOUT_MS
+        # 1 is NORMAL, 2 is MEMORY
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == storage_utils.SQLITE_CACHE_SIZE
+
+
+def test_settings_are_read_from_the_module(wal_db, monkeypatch):
+    monkeypatch.setattr(storage_utils, "SQLITE_SYNCHRONOUS", "FULL")
+    monkeypatch.setattr(storage_utils, "SQLITE_BUSY_TIMEOUT_MS", 1234)
+
+    with closing(storage_utils.get_db_connection()) as conn:
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+
+
+def test_concurrent_writers_wait_instead_of_failing(wal_db):
+    def write(prefix):
+        for i in range(50):
+            storage_utils.insert_single_json_to_db(
+                "payments", {"transaction": f"{prefix}-{i}", "amount": 1.0, "initiator": prefix}
+            )
+
+    writers = [threading.Thread(target=write, args=(f"w{n}",)) for n in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    with closing(storage_utils.get_db_connection()) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM payments").fetchone()[0] == 200
+
+
+def test_checkpoint_truncates_large_wal(wal_db):
+    storage_utils.save_json_to_db(
+        "payments", [{"transaction": str(i), "amount": 1.0, "initiator": "testuser"} for i in range(500)]
+    )
+    assert wal_checkpoint.wal_size() > 0
+
+    mode, busy, _, _ = wal_checkpoint.checkpoint(truncate_bytes=1)
+
+    assert (mode, busy) == ("TRUNCATE", 0)
+    assert wal_checkpoint.wal_size() == 0
+
+
+def test_small_wal_gets_a_passive_checkpoint(wal_db):
+    storage_utils.insert_single_json_to_db("payments", {"transaction": "1", "amount": 1.0})
+
+    assert wal_checkpoint.checkpoint()[0] == "PASSIVE"
+
+
+def test_checkpoint_outside_wal_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "DB_PATH", tmp_path / "rollback.db")
+    monkeypatch.setattr(storage_utils, "use_mock_data", False)
+
+    assert wal_checkpoint.checkpoint() is None
+
+
+def test_manager_checkpoints_on_stop(wal_db):
+    storage_utils.insert_single_json_to_db("payments", {"transaction": "1", "amount": 1.0})
+    manager = wal_checkpoint.CheckpointManager(interval=60)
+
+    manager.start()
+    manager.stop()
+
+    assert wal_checkpoint.wal_size() == 0
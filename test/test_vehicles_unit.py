@@ -3,7 +3,7 @@ from fastapi.testclient import TestClient
 from unittest.mock import patch
 import uuid
 from main import app
-from endpoints.vehicles_endpoint import normalize_plate
+from utils.storage_utils import normalize_plate
 
 
 client = TestClient(app)
@@ -37,12 +37,12 @@ MOCK_VEHICLE_2 = {
 
 class TestCreateVehicle:
     @patch("endpoints.vehicles_endpoint.get_session")
-    @patch("endpoints.vehicles_endpoint.load_vehicle_data_from_db")
+    @patch("endpoints.vehicles_endpoint.get_vehicle_by_plate")
     @patch("endpoints.vehicles_endpoint.save_vehicle_data_to_db")
     @patch("uuid.uuid4")
     def test_create_vehicle_success(self, mock_uuid, mock_save, mock_load, mock_session):
         mock_session.return_value = MOCK_USER
-        mock_load.return_value = []
+        mock_load.return_value = None
         mock_uuid.return_value = uuid.UUID("123e4567-e89b-12d3-a456-426614174000")
         vehicle_data = {
             "user_id": "testuser",
@@ -77,10 +77,10 @@ class TestCreateVehicle:
         assert "Unauthorized" in response.text
 
     @patch("endpoints.vehicles_endpoint.get_session")
-    @patch("endpoints.vehicles_endpoint.load_vehicle_data_from_db")
+    @patch("endpoints.vehicles_endpoint.get_vehicle_by_plate")
     def test_create_vehicle_duplicate(self, mock_load, mock_session):
         mock_session.return_value = MOCK_USER
-        mock_load.return_value = [MOCK_VEHICLE]
+        mock_load.return_value = MOCK_VEHICLE
         vehicle_data = {
             "user_id": "testuser",
             "license_plate": "AB-12-CD",
@@ -231,10 +231,10 @@ class TestUpdateVehicle:
         mock_update.assert_called_once()
 
     @patch("endpoints.vehicles_endpoint.get_session")
-    @patch("endpoints.vehicles_endpoint.load_vehicle_data_from_db")
+    @patch("endpoints.vehicles_endpoint.get_vehicle_by_plate")
     def test_update_nonexistent_vehicle(self, mock_load, mock_session):
         mock_session.return_value = MOCK_USER
-        mock_load.return_value = []
+        mock_load.return_value = None
         update_data = {
             "user_id": "testuser",
             "license_plate": "AB-12-CD",
@@ -290,10 +290,10 @@ class TestDeleteVehicle:
         mock_delete.assert_called_once()
 
     @patch("endpoints.vehicles_endpoint.get_session")
-    @patch("endpoints.vehicles_endpoint.load_vehicle_data_from_db")
+    @patch("endpoints.vehicles_endpoint.get_vehicle_by_plate")
     def test_delete_nonexistent_vehicle(self, mock_load, mock_session):
         mock_session.return_value = MOCK_USER
-        mock_load.return_value = []
+        mock_load.return_value = None
         response = client.delete("/vehicles/ZZ99ZZ", headers={"Authorization": "user-token"})
         assert response.status_code == 404
         assert "Vehicle not found" in response.text
@@ -311,6 +311,20 @@ class TestGetVehicleReservation:
         assert "reservations" in data
         assert isinstance(data["reservations"], list)
 
+    @patch("endpoints.vehicles_endpoint.get_session")
+    @patch("endpoints.vehicles_endpoint.find_vehicle_by_license_plate")
+    @patch("endpoints.vehicles_endpoint.get_reservations_by_vehicle")
+    def test_get_vehicle_reservations_page(self, mock_load_reservations, mock_find, mock_session):
+        mock_session.return_value = MOCK_USER
+        mock_find.return_value = MOCK_VEHICLE.copy()
+        mock_load_reservations.return_value = [{"id": "1", "start_time": "2024-01-01T10:00"}]
+        response = client.get(
+            "/vehicles/AB12CD/reservations", params={"limit": 1}, headers={"Authorization": "valid-token"}
+        )
+        assert response.status_code == 200
+        assert response.json()["next_before"] == "2024-01-01T10:00"
+        mock_load_reservations.assert_called_once_with(MOCK_VEHICLE["id"], 1, None)
+
     @patch("endpoints.vehicles_endpoint.get_session")
     def test_get_vehicle_reservations_unauthorized(self, mock_session):
         mock_session.return_value = None
@@ -328,10 +342,10 @@ class TestGetVehicleReservation:
         assert "Forbidden" in response.text
 
     @patch("endpoints.vehicles_endpoint.get_session")
-    @patch("endpoints.vehicles_endpoint.load_vehicle_data_from_db")
+    @patch("endpoints.vehicles_endpoint.get_vehicle_by_plate")
     def test_get_reservations_nonexistent_vehicle(self, mock_load, mock_session):
         mock_session.return_value = MOCK_USER
-        mock_load.return_value = []
+        mock_load.return_value = None
         response = client.get("/vehicles/ZZ99ZZ/reservations", headers={"Authorization": "user-token"})
         assert response.status_code == 404
         assert "Vehicle not found" in response.text
@@ -340,15 +354,16 @@ class TestGetVehicleReservation:
 class TestGetVehicleHistory:
     @patch("endpoints.vehicles_endpoint.get_session")
     @patch("endpoints.vehicles_endpoint.find_vehicle_by_license_plate")
-    @patch("utils.storage_utils.load_parking_lot_data")
-    @patch("endpoints.vehicles_endpoint.load_parking_sessions_data_from_db")
-    def test_get_own_vehicle_history(self, mock_load_sessions, mock_load_lots, mock_find, mock_session):
+    @patch("endpoints.vehicles_endpoint.get_vehicle_history_by_plate")
+    def test_get_own_vehicle_history(self, mock_load_history, mock_find, mock_session):
         mock_session.return_value = MOCK_USER
         mock_find.return_value = MOCK_VEHICLE.copy()
-        mock_load_lots.return_value = [{"id": "1", "name": "Test Parking Lot", "address": "123 Test St"}]
-        mock_load_sessions.return_value = [
+        mock_load_history.return_value = [
             {
                 "id": "1",
+                "parking_lot_id": "1",
+                "parking_lot_name": "Test Parking Lot",
+                "parking_lot_address": "123 Test St",
                 "licenseplate": "AB-12-CD",
                 "started": "2024-01-01T10:00:00",
                 "stopped": "2024-01-01T12:00:00",
@@ -363,6 +378,39 @@ class TestGetVehicleHistory:
         data = response.json()
         assert "history" in data
         assert isinstance(data["history"], list)
+        assert data["history"][0]["session_id"] == "1"
+        assert data["history"][0]["parking_lot_name"] == "Test Parking Lot"
+        assert data["next_before"] is None
+        mock_load_history.assert_called_once_with("AB12CD", None, None)
+
+    @patch("endpoints.vehicles_endpoint.get_session")
+    @patch("endpoints.vehicles_endpoint.find_vehicle_by_license_plate")
+    @patch("endpoints.vehicles_endpoint.get_vehicle_history_by_plate")
+    def test_get_vehicle_history_page(self, mock_load_history, mock_find, mock_session):
+        mock_session.return_value = MOCK_USER
+        mock_find.return_value = MOCK_VEHICLE.copy()
+        mock_load_history.return_value = [
+            {"id": "2", "licenseplate": "AB-12-CD", "stopped": "2024-01-02T12:00:00"},
+            {"id": "1", "licenseplate": "AB-12-CD", "stopped": "2024-01-01T12:00:00"},
+        ]
+        response = client.get(
+            "/vehicles/AB12CD/history",
+            params={"limit": 2, "before": "2024-02-01T00:00:00"},
+            headers={"Authorization": "valid-token"},
+        )
+        assert response.status_code == 200
+        assert response.json()["next_before"] == "2024-01-01T12:00:00"
+        mock_load_history.assert_called_once_with("AB12CD", 2, "2024-02-01T00:00:00")
+
+    @patch("endpoints.vehicles_endpoint.get_session")
+    @patch("endpoints.vehicles_endpoint.find_vehicle_by_license_plate")
+    def test_get_vehicle_history_invalid_cursor(self, mock_find, mock_session):
+        mock_session.return_value = MOCK_USER
+        mock_find.return_value = MOCK_VEHICLE.copy()
+        response = client.get(
+            "/vehicles/AB12CD/history", params={"before": "yesterday"}, headers={"Authorization": "valid-token"}
+        )
+        assert response.status_code == 422
 
     @patch("endpoints.vehicles_endpoint.get_session")
     def test_get_vehicle_history_unauthorized(self, mock_session):
@@ -381,25 +429,21 @@ class TestGetVehicleHistory:
         assert "Forbidden" in response.text
 
     @patch("endpoints.vehicles_endpoint.get_session")
-    @patch("endpoints.vehicles_endpoint.load_vehicle_data_from_db")
+    @patch("endpoints.vehicles_endpoint.get_vehicle_by_plate")
     def test_get_history_nonexistent_vehicle(self, mock_load, mock_session):
         mock_session.return_value = MOCK_USER
-        mock_load.return_value = []
+        mock_load.return_value = None
         response = client.get("/vehicles/ZZ99ZZ/history", headers={"Authorization": "user-token"})
         assert response.status_code == 404
         assert "Vehicle not found" in response.text
 
     @patch("endpoints.vehicles_endpoint.get_session")
     @patch("endpoints.vehicles_endpoint.find_vehicle_by_license_plate")
-    @patch("utils.storage_utils.load_parking_lot_data")
-    @patch("endpoints.vehicles_endpoint.load_parking_sessions_data_from_db")
-    def test_get_vehicle_history_admin_access(
-        self, mock_load_sessions, mock_load_lots, mock_find, mock_session
-    ):
+    @patch("endpoints.vehicles_endpoint.get_vehicle_history_by_plate")
+    def test_get_vehicle_history_admin_access(self, mock_load_history, mock_find, mock_session):
         mock_session.return_value = MOCK_ADMIN
         mock_find.return_value = MOCK_VEHICLE.copy()
-        mock_load_lots.return_value = {}
-        mock_load_sessions.return_value = {}
+        mock_load_history.return_value = []
         response = client.get("/vehicles/AB12CD/history", headers={"Authorization": "admin-token"})
         assert response.status_code == 200
         data = response.json()
@@ -0,0 +1,51 @@
+import asyncio
+import functools
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from utils import storage_utils
+
+# SQLite calls block, so async handlers hand them to this pool instead of running them on the
+# event loop. The pool is separate from FastAPI's threadpool, a burst of slow queries then
+# can't starve the sync handlers, and the number of open connections stays at STORAGE_WORKERS.
+STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "8"))
+# Calls allowed to be running or queued for the pool. Beyond that callers wait on the event
+# loop, where a waiting request costs a coroutine rather than a queued closure plus its data.
+STORAGE_QUEUE_SIZE = int(os.getenv("STORAGE_QUEUE_SIZE", "256"))
+
+_executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+# asyncio.Semaphore belongs to the loop it is first used on, so there is one per loop
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _slots_for(loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+    slots = _slots.get(loop)
+    if slots is None:
+        slots = _slots[loop] = asyncio.Semaphore(STORAGE_QUEUE_SIZE)
+    return slots
+
+
+async def run(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a blocking storage call on the storage pool and waits for it without blocking the loop.
+    Takes the function itself rather than its name, so whatever the caller imported (or a test
+    patched in) is what runs.
+    """
+    loop = asyncio.get_running_loop()
+    async with _slots_for(loop):
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def __getattr__(name: str) -> Callable:
+    """Every storage_utils function as a coroutine function, e.g. await async_storage_utils.load_payment_data()."""
+    fn = getattr(storage_utils, name)
+    if not callable(fn):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    @functools.wraps(fn)
+    async def call(*args: Any, **kwargs: Any) -> Any:
+        return await run(fn, *args, **kwargs)
+
+    return call
@@ -1,29 +1,23 @@
 from typing import List, Dict
 
+from services import lot_cache_services
 from utils.storage_utils import (
-    load_parking_lot_data,
-    load_parking_sessions_data_from_db,
+    get_parking_sessions_by_user,
     load_payment_data_from_db
 )
 from utils.session_calculator import generate_payment_hash
 
 def get_user_session_by_username(username: str) -> List[Dict]:
-    all_sessions = load_parking_sessions_data_from_db() or []
-    
-    sessions = [s for s in all_sessions if s.get("user") == username]
-    return sessions
+    # Billing covers every session ever parked, archived months included
+    return get_parking_sessions_by_user(username)
 
 def format_billing_record(sessions: List[Dict]) -> List[Dict]:
     billing_data = []
 
-    parking_lots = load_parking_lot_data() or []
     payments = load_payment_data_from_db() or []
 
-    lots_iterable = parking_lots.values() if isinstance(parking_lots, dict) else parking_lots
-    parking_lot_index = {str(lot.get("id")): lot for lot in lots_iterable}
-
     for session in sessions:
-        parking_lot = parking_lot_index.get(str(session.get("parking_lot_id")))
+        parking_lot = lot_cache_services.get_lot(str(session.get("parking_lot_id")))
         if not parking_lot:
             continue
 
@@ -0,0 +1,135 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Work = Callable[[Any], Any]
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread that runs the writes of concurrent requests in shared transactions.
+    Every write is a function of a connection. The thread takes the first waiting write, then
+    collects more until max_batch writes are in or max_delay seconds have passed since the
+    first one arrived. It runs them all in one transaction, so the batch pays for one commit
+    (and one fsync) instead of one each.
+
+    Each write runs inside its own savepoint. A write that raises is rolled back on its own
+    and its future gets the exception, while the rest of the batch still commits. If the
+    commit itself fails, every future in the batch gets that error.
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_delay: float = 0.005, max_batch: int = 200):
+        self.connect = connect
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Tuple[Work, Future]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._failed = 0
+        self._last_flush_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, work: Work) -> Future:
+        """Queues a write, the future resolves to its return value once the batch has committed."""
+        future: Future = Future()
+        self._queue.put((work, future))
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            operations = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "batches": batches,
+                "operations": operations,
+                "failed_operations": self._failed,
+                "mean_batch_size": operations / batches if batches else 0.0,
+                "largest_batch": max(self._batch_sizes, default=0),
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "last_flush_ms": self._last_flush_seconds * 1000,
+            }
+
+    def _collect(self) -> List[Tuple[Work, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            results = self._flush(batch)
+            elapsed = time.perf_counter() - start
+
+            failed = 0
+            for (_, future), (ok, value) in zip(batch, results):
+                if ok:
+                    future.set_result(value)
+                else:
+                    failed += 1
+                    future.set_exception(value)
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._failed += failed
+                self._last_flush_seconds = elapsed
+
+    def _flush(self, batch: List[Tuple[Work, Future]]) -> List[Tuple[bool, Any]]:
+        try:
+            conn = self.connect()
+        except Exception as e:
+            return [(False, e)] * len(batch)
+
+        results: List[Tuple[bool, Any]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for work, _ in batch:
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((True, work(conn)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    results.append((False, e))
+                conn.execute("RELEASE write")
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} writes failed: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return [(False, e)] * len(batch)
+        finally:
+            conn.close()
+        return results
+
+
+_writer: Optional[GroupCommitWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer(connect: Callable[[], Any], max_delay: float, max_batch: int) -> GroupCommitWriter:
+    """The process-wide writer, started on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter(connect, max_delay, max_batch)
+    return _writer
+
+
+def stats() -> Optional[Dict[str, Any]]:
+    """Batch metrics of the writer, None if group commit was never used."""
+    return _writer.stats() if _writer is not None else None
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from utils import storage_utils
+
+try:
+    import pyarrow  # noqa: F401
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Parquet and Feather are written by pyarrow. Without it the snapshot falls back to gzipped
+# pickles, they keep the column types as well and read back with pandas.read_pickle().
+FORMATS = {"parquet": ".parquet", "feather": ".feather", "pickle": ".pkl.gz"}
+DEFAULT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "parquet" if PYARROW_AVAILABLE else "pickle")
+SNAPSHOT_CHUNK_ROWS = int(os.getenv("SNAPSHOT_CHUNK_ROWS", "50000"))
+# Keys looked up in the state per query, below SQLite's limit on bound parameters
+STATE_LOOKUP_SIZE = 10_000
+
+# Bookkeeping of the storage layer itself, of no use to analysts
+SKIPPED_TABLES = {"table_versions", "counters", "session_archives", "import_progress", "leases"}
+
+# Stored as text in several formats (legacy, ISO, epoch), exported as UTC timestamps
+TIMESTAMP_COLUMNS = {
+    "created_at",
+    "created_ts",
+    "completed",
+    "started",
+    "stopped",
+    "start_time",
+    "end_time",
+    "expires_at",
+    "check_in_date",
+    "check_out_date",
+    "t_data.date",
+}
+SQL_TYPES = {"INTEGER": "Int64", "REAL": "Float64", "TEXT": "string"}
+
+STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS row_hashes (
+        table_name TEXT NOT NULL,
+        row_key TEXT NOT NULL,
+        hash BLOB NOT NULL,
+        seen INTEGER NOT NULL,
+        PRIMARY KEY (table_name, row_key)
+    ) WITHOUT ROWID
+"""
+
+
+def snapshot_dir() -> Path:
+    configured = os.getenv("SNAPSHOT_DIR")
+    return Path(configured) if configured else Path(storage_utils.DB_PATH).parent / "snapshots"
+
+
+def _exported_tables(conn) -> List[str]:
+    return [
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")
+        if not row[0].startswith("sqlite_") and row[0] not in SKIPPED_TABLES
+    ]
+
+
+def _table_layout(conn, table_name: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """(column, declared type) pairs and the primary key columns, the rowid for tables without one."""
+    info = conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+    columns = [(row[1], (row[2] or "").upper()) for row in info]
+    key = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+    return columns, key
+
+
+def _typed_series(values: List, declared: str) -> pd.Series:
+    dtype = SQL_TYPES.get(declared, "object")
+    if dtype != "string":
+        try:
+            return pd.Series(values, dtype=dtype)
+        except (TypeError, ValueError):
+            # SQLite lets any column hold any type, a column that does gets exported as text
+            pass
+    return pd.Series([None if value is None else str(value) for value in values], dtype="string")
+
+
+def _typed_frame(rows: List[Tuple], columns: List[Tuple[str, str]], snapshot_at: datetime) -> pd.DataFrame:
+    """
+    One chunk of rows as a DataFrame with real column types: integers, floats and strings by
+    the declared SQLite type, timestamps parsed whatever format they were stored in. Dotted
+    column names of nested fields ("t_data.amount") become plain ones ("t_data_amount").
+    """
+    data = {}
+    for index, (name, declared) in enumerate(columns):
+        values = [row[index] for row in rows]
+        if name in TIMESTAMP_COLUMNS:
+            series = pd.to_datetime(
+                pd.Series([storage_utils.parse_created_at(value) for value in values], dtype="Int64"),
+                unit="s",
+                utc=True,
+            )
+        else:
+            series = _typed_series(values, declared)
+        data[name.replace(".", "_")] = series
+    frame = pd.DataFrame(data)
+    frame["_snapshot_at"] = pd.Timestamp(snapshot_at)
+    return frame
+
+
+def _write_frame(frame: pd.DataFrame, path: Path, fmt: str):
+    if fmt == "parquet":
+        frame.to_parquet(path, compression="zstd", index=False)
+    elif fmt == "feather":
+        frame.to_feather(path, compression="zstd")
+    else:
+        frame.to_pickle(path, compression="gzip")
+
+
+def _row_hash(row: Tuple) -> bytes:
+    return hashlib.blake2b(repr(row).encode(), digest_size=8).digest()
+
+
+def _changed_rows(state, table_name: str, run: int, rows: List[Tuple], key_indexes: List[int]) -> List[Tuple]:
+    """The rows of a chunk that are new or differ from the last snapshot, marking all of them as seen in this run."""
+    keyed = {json.dumps([row[i] for i in key_indexes]): row for row in rows}
+    keys = list(keyed)
+    previous = {}
+    for start in range(0, len(keys), STATE_LOOKUP_SIZE):
+        lookup = keys[start : start + STATE_LOOKUP_SIZE]
+        placeholders = ", ".join("?" * len(lookup))
+        previous.update(
+            state.execute(
+                f"SELECT row_key, hash FROM row_hashes WHERE table_name = ? AND row_key IN ({placeholders})",
+                (table_name, *lookup),
+            )
+        )
+    hashes = {row_key: _row_hash(row) for row_key, row in keyed.items()}
+    state.executemany(
+        "INSERT INTO row_hashes (table_name, row_key, hash, seen) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (table_name, row_key) DO UPDATE SET hash = excluded.hash, seen = excluded.seen",
+        [(table_name, row_key, row_hash, run) for row_key, row_hash in hashes.items()],
+    )
+    return [row for row_key, row in keyed.items() if previous.get(row_key) != hashes[row_key]]
+
+
+def export_snapshot(
+    tables: Optional[Iterable[str]] = None,
+    fmt: str = DEFAULT_FORMAT,
+    out_dir: Optional[Path] = None,
+    chunk_rows: int = SNAPSHOT_CHUNK_ROWS,
+) -> Dict[str, Dict]:
+    """
+    Writes the rows that changed since the last snapshot, per table, to
+    <out_dir>/<table>/<YYYY-MM-DD>/run-<run>-part-<n>.<ext>, one file per chunk_rows rows.
+    Keys of rows deleted since then go to run-<run>-deleted.<ext> next to them. Every table is
+    read in chunks inside one read transaction, so the files of a run agree with each other
+    while the server keeps writing. A hash of every row kept in <out_dir>/snapshot_state.db
+    tells which rows changed; the first run exports everything.
+    Returns {"rows", "deleted", "files"} per table. The mock data is never exported.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown snapshot format '{fmt}', use one of {', '.join(FORMATS)}")
+    if fmt != "pickle" and not PYARROW_AVAILABLE:
+        raise ValueError(f"Writing {fmt} needs pyarrow, which is not installed")
+    if storage_utils.use_mock_data:
+        return {}
+
+    out_dir = Path(out_dir) if out_dir is not None else snapshot_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    snapshot_at = datetime.now(timezone.utc).replace(microsecond=0)
+    day = snapshot_at.strftime("%Y-%m-%d")
+    extension = FORMATS[fmt]
+    manifest: Dict[str, Dict] = {}
+
+    with closing(sqlite3.connect(out_dir / "snapshot_state.db")) as state, closing(
+        storage_utils.get_db_connection()
+    ) as conn:
+        state.execute(STATE_DDL)
+        # Rows not seen by this run were deleted since the last one
+        run = (state.execute("SELECT MAX(seen) FROM row_hashes").fetchone()[0] or 0) + 1
+        # The first read of the transaction pins the WAL snapshot every later read sees
+        conn.execute("BEGIN")
+        try:
+            available = _exported_tables(conn)
+            unknown = [table_name for table_name in tables or [] if table_name not in available]
+            if unknown:
+                raise ValueError(f"Unknown table(s): {', '.join(unknown)}")
+            for table_name in tables or available:
+                columns, key = _table_layout(conn, table_name)
+                select = ", ".join(f'"{name}"' for name, _ in columns)
+                if not key:
+                    select, columns, key = "rowid, " + select, [("rowid", "INTEGER"), *columns], ["rowid"]
+                names = [name for name, _ in columns]
+                key_indexes = [names.index(name) for name in key]
+                table_dir = out_dir / table_name / day
+                files, exported, part = [], 0, 0
+
+                cursor = conn.execute(f'SELECT {select} FROM "{table_name}"')
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    changed = _changed_rows(state, table_name, run, rows, key_indexes)
+                    if not changed:
+                        continue
+                    table_dir.mkdir(parents=True, exist_ok=True)
+                    path = table_dir / f"run-{run:06d}-part-{part:05d}{extension}"
+                    _write_frame(_typed_frame(changed, columns, snapshot_at), path, fmt)
+                    files.append(str(path))
+                    exported += len(changed)
+                    part += 1
+
+                deleted = [
+                    json.loads(row[0])
+                    for row in state.execute(
+                        "SELECT row_key FROM row_hashes WHERE table_name = ? AND seen != ?", (table_name, run)
+                    )
+                ]
+                if deleted:
+                    table_dir.mkdir(parents=True, exist_ok=True)
+                    path = table_dir / f"run-{run:06d}-deleted{extension}"
+                    frame = pd.DataFrame(deleted, columns=[name.replace(".", "_") for name in key])
+                    frame["_snapshot_at"] = pd.Timestamp(snapshot_at)
+                    _write_frame(frame, path, fmt)
+                    files.append(str(path))
+                    state.execute("DELETE FROM row_hashes WHERE table_name = ? AND seen != ?", (table_name, run))
+                # Only remembered once the table's files are written, a failed run exports the rows again
+                state.commit()
+                manifest[table_name] = {"rows": exported, "deleted": len(deleted), "files": files}
+        finally:
+            conn.rollback()
+    return manifest
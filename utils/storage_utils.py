@@ -2,11 +2,18 @@ import csv
 import json
 import os
 import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from dotenv import load_dotenv
 
+from utils import group_commit
+
 try:
     from pysqlcipher3 import dbapi2 as sqlite3_encrypted
 
@@ -37,6 +44,33 @@ else:
     DB_PATH = Path(__file__).parent / "../data/mobypark.db"
 
 
+# --- Connection Settings ---
+
+# WAL lets readers run while a write is in progress, and a commit only appends to the WAL
+# instead of rewriting pages, so synchronous=NORMAL is safe there (a power cut can lose the
+# last commits but never corrupts the file).
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# How long a connection waits for a lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative values are KiB rather than pages, -65536 is 64 MiB per connection
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+
+
+def configure_connection(conn, encrypted: bool = False):
+    """Applies the per-connection pragmas. journal_mode is stored in the file, init_db() sets it."""
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA temp_store = {SQLITE_TEMP_STORE}")
+    conn.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+    # SQLCipher decrypts every page it reads, a memory map of the encrypted file is of no use
+    if not encrypted:
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    return conn
+
+
 def get_db_connection():
     """Get a database connection, encrypted if available and enabled,
     standard SQLite if encryption is not available"""
@@ -47,16 +81,309 @@ def get_db_connection():
         db_password = os.environ.get("DB_PASSWORD")
         if not db_password:
             raise ValueError("DB_PASSWORD environment variable not set but encryption is enabled")
-        conn = sqlite3_encrypted.connect(str(DB_PATH))
+        conn = sqlite3_encrypted.connect(str(DB_PATH), timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        # The key has to come before anything else touches the file
         conn.execute(f"PRAGMA key='{db_password}'")
         try:
             conn.execute("SELECT count(*) FROM sqlite_master")
         except Exception as e:
             conn.close()
             raise ValueError(f"Failed to decrypt database. check DB_PASSWORD: {e}")
-        return conn
+        return configure_connection(conn, encrypted=True)
     else:
-        return sqlite3.connect(DB_PATH)
+        return configure_connection(sqlite3.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000))
+
+
+def normalize_plate(plate: Optional[str]) -> str:
+    """Normalize a license plate by removing dashes, converting to uppercase and stripping whitespaces."""
+    if not plate:
+        return ""
+    return plate.replace("-", "").upper().strip()
+
+
+# Tables with a persisted plate_norm column, and the column it is derived from
+PLATE_COLUMNS = {"vehicles": "license_plate", "parking_sessions": "licenseplate"}
+
+
+def _with_plate_norm(table_name: str, item: Dict) -> Dict:
+    """Returns the row with plate_norm filled in, for tables that keep one."""
+    plate_column = PLATE_COLUMNS.get(table_name)
+    if plate_column is None or plate_column not in item:
+        return item
+    return {**item, "plate_norm": normalize_plate(item[plate_column]) or None}
+
+
+def _migrate_plate_norm(conn):
+    """
+    Adds plate_norm to databases created before it existed and fills it in for old rows.
+    Vehicles get a unique index, so the duplicate check is enforced by the database itself.
+    """
+    conn.create_function("normalize_plate", 1, normalize_plate)
+    cursor = conn.cursor()
+    for table_name, plate_column in PLATE_COLUMNS.items():
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        if "plate_norm" not in [info[1] for info in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN plate_norm TEXT")
+        cursor.execute(
+            f"UPDATE {table_name} SET plate_norm = NULLIF(normalize_plate({plate_column}), '') "
+            f"WHERE plate_norm IS NULL AND {plate_column} IS NOT NULL"
+        )
+
+    try:
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_vehicles_plate_norm ON vehicles (plate_norm)")
+    except sqlite3.IntegrityError:
+        # Older data may hold the same plate twice, keep lookups indexed until that is cleaned up
+        print("Warning: duplicate license plates in vehicles, plate_norm index is not unique")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_plate_norm_dup ON vehicles (plate_norm)")
+    # plate_norm first serves plate lookups, stopped second serves the newest-first history
+    cursor.execute("DROP INDEX IF EXISTS idx_parking_sessions_plate_norm")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_parking_sessions_plate_norm_stopped ON parking_sessions (plate_norm, stopped)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reservations_vehicle_start ON reservations (vehicle_id, start_time)"
+    )
+
+
+# --- Row Versions ---
+
+# Tables whose rows the endpoints update in place. Every update of a row bumps its version,
+# and an update given expected_version only applies while the row is still at that version,
+# so two requests editing the same row can't silently overwrite each other.
+VERSIONED_TABLES = ("users", "reservations", "payments", "discounts", "refunds", "vehicles")
+
+# Values for columns a row in a bulk save does not have, where NULL is not allowed
+COLUMN_DEFAULTS = {"version": 1}
+
+
+class VersionConflictError(Exception):
+    """The row was updated by another request after the caller read it."""
+
+    def __init__(self, table_name: str, key_val: str, expected_version: int, current_version: int):
+        super().__init__(
+            f"{table_name} {key_val} was modified concurrently "
+            f"(expected version {expected_version}, found {current_version})"
+        )
+        self.table_name = table_name
+        self.key_val = key_val
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+def _migrate_row_versions(conn):
+    """Adds the version column to databases created before it existed, existing rows start at 1."""
+    for table_name in VERSIONED_TABLES:
+        if not _has_column(conn, table_name, "version"):
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _has_column(conn, table_name: str, column: str) -> bool:
+    return column in [info[1] for info in conn.execute(f"PRAGMA table_info({table_name})").fetchall()]
+
+
+# --- Creation Timestamps ---
+
+# created_at keeps the format the API has always returned, "%d-%m-%Y %H:%M:%S" followed by the
+# epoch seconds (e.g. "06-01-2026 21:10:191767730219"). That can't be ordered or compared in SQL,
+# so these tables also store created_ts, the same moment as epoch seconds, for date filters.
+TIMESTAMP_TABLES = ("payments", "refunds", "discounts")
+LEGACY_TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M:%S"
+
+
+def parse_created_at(value) -> Optional[int]:
+    """
+    Epoch seconds of a created_at value. Takes the legacy format (with or without the trailing
+    epoch), bare epoch seconds and ISO 8601. Times without a zone are local, like the legacy
+    values. Returns None for anything else.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text)
+    legacy_date, epoch = text[:19], text[19:]
+    if epoch.isdigit():
+        return int(epoch)
+    try:
+        return int(datetime.strptime(legacy_date, LEGACY_TIMESTAMP_FORMAT).timestamp())
+    except ValueError:
+        pass
+    try:
+        return int(datetime.fromisoformat(text).timestamp())
+    except ValueError:
+        return None
+
+
+def _with_created_ts(table_name: str, item: Dict) -> Dict:
+    """Returns the row with created_ts filled in from created_at, for tables that keep one."""
+    if table_name not in TIMESTAMP_TABLES or "created_at" not in item:
+        return item
+    return {**item, "created_ts": parse_created_at(item["created_at"])}
+
+
+def _without_missing_created_ts(conn, table_name: str, row: Dict) -> Dict:
+    # Databases that were not created by init_db() may not have the column
+    if "created_ts" in row and not _has_column(conn, table_name, "created_ts"):
+        return {col: val for col, val in row.items() if col != "created_ts"}
+    return row
+
+
+def _migrate_created_ts(conn):
+    """Adds created_ts to databases created before it existed, fills it in for old rows and indexes it."""
+    conn.create_function("parse_created_at", 1, parse_created_at)
+    for table_name in TIMESTAMP_TABLES:
+        if not _has_column(conn, table_name, "created_ts"):
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN created_ts INTEGER")
+        if _has_column(conn, table_name, "created_at"):
+            conn.execute(
+                f"UPDATE {table_name} SET created_ts = parse_created_at(created_at) "
+                "WHERE created_ts IS NULL AND created_at IS NOT NULL"
+            )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_created_ts ON {table_name} (created_ts)")
+    # A user's own payments in a date range
+    if _has_column(conn, "payments", "initiator"):
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_initiator_created_ts ON payments (initiator, created_ts)")
+
+
+def _created_between_sql(column: str, since: Optional[int], until: Optional[int]):
+    """WHERE conditions and parameters for since <= column <= until, either bound may be left out."""
+    conditions, params = [], []
+    if since is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append(f"{column} <= ?")
+        params.append(until)
+    return conditions, params
+
+
+def _created_between(rows: List[Dict], since: Optional[int], until: Optional[int]) -> List[Dict]:
+    """The mock data counterpart of filtering and ordering on created_ts."""
+    selected = []
+    for row in rows:
+        created = parse_created_at(row.get("created_at"))
+        if created is None:
+            continue
+        if (since is None or created >= since) and (until is None or created <= until):
+            selected.append((created, row))
+    selected.sort(key=lambda pair: pair[0])
+    return [row for _, row in selected]
+
+
+# --- Hotel Discount Codes ---
+
+# Columns the hotel manager flow writes, missing from databases created before it existed
+HOTEL_DISCOUNT_COLUMNS = {
+    "check_in_date": "TEXT",
+    "check_out_date": "TEXT",
+    "parking_lot_id": "TEXT",
+    "created_by": "TEXT",
+    "guest_name": "TEXT",
+    "notes": "TEXT",
+    "is_hotel_code": "INTEGER DEFAULT 0",
+}
+# Codes checked per query when saving a batch, below SQLite's limit on bound parameters
+DISCOUNT_CODE_LOOKUP_SIZE = 500
+
+
+def _migrate_hotel_discounts(conn):
+    """
+    Adds the hotel code columns to the discounts table and indexes the two listings: codes by
+    creator and codes by lot, each ordered by code so a page is a range scan.
+    """
+    for column, column_type in HOTEL_DISCOUNT_COLUMNS.items():
+        if not _has_column(conn, "discounts", column):
+            conn.execute(f"ALTER TABLE discounts ADD COLUMN {column} {column_type}")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_discounts_created_by_hotel_code ON discounts (created_by, is_hotel_code, code)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_discounts_lot_hotel_code ON discounts (parking_lot_id, is_hotel_code, code)"
+    )
+
+
+# --- Reservation Lifecycle ---
+
+# Reservations in these states hold a space, a missing status counts as pending
+ACTIVE_RESERVATION_SQL = "(status IS NULL OR status IN ('pending', 'confirmed'))"
+
+
+def _migrate_lifecycle(conn):
+    """
+    Adds parking_sessions.stale_at, set when a session has been open too long and its space
+    was given back, the partial indexes the lifecycle sweeps walk in due order and the index
+    of the sessions still parked per lot.
+    """
+    if not _has_column(conn, "parking_sessions", "stale_at"):
+        conn.execute("ALTER TABLE parking_sessions ADD COLUMN stale_at TEXT")
+    # Tables from older databases may lack the indexed columns, the sweeps then scan
+    if _has_column(conn, "reservations", "end_time") and _has_column(conn, "reservations", "status"):
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_reservations_active_end ON reservations (end_time) "
+            f"WHERE {ACTIVE_RESERVATION_SQL}"
+        )
+    if _has_column(conn, "parking_sessions", "started"):
+        # The leading columns make it win over idx_parking_sessions_stopped for the same NULL tests
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_parking_sessions_open_started "
+            "ON parking_sessions (stopped, stale_at, started) WHERE stopped IS NULL AND stale_at IS NULL"
+        )
+    if _has_column(conn, "parking_sessions", "parking_lot_id"):
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_parking_sessions_lot_stopped ON parking_sessions (parking_lot_id, stopped)"
+        )
+
+
+TABLE_VERSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS table_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+COUNTERS_DDL = """
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+"""
+
+
+# Background jobs that must run in one worker at a time, see acquire_lease()
+LEASES_DDL = """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+"""
+
+# Which months of parking sessions were moved to an archive file, see archive_parking_sessions()
+SESSION_ARCHIVES_DDL = """
+    CREATE TABLE IF NOT EXISTS session_archives (
+        month TEXT PRIMARY KEY,
+        file TEXT NOT NULL,
+        sessions INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+# Per-lot totals per hour and per day, see the Lot Rollups section. The period is the start of the
+# local ISO time, "2026-03-01T09" for an hour and "2026-03-01" for a day.
+ROLLUP_TABLES = {"hour": ("lot_rollups_hourly", 13), "day": ("lot_rollups_daily", 10)}
+ROLLUP_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        parking_lot_id TEXT NOT NULL,
+        period TEXT NOT NULL,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        duration_minutes INTEGER NOT NULL DEFAULT 0,
+        payments REAL NOT NULL DEFAULT 0,
+        refunds REAL NOT NULL DEFAULT 0,
+        peak_occupancy INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (parking_lot_id, period)
+    ) WITHOUT ROWID
+"""
 
 
 def init_db():
@@ -67,6 +394,8 @@ def init_db():
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
     with get_db_connection() as conn:
+        # Persistent, set once per file. Returns the mode in effect, e.g. "memory" for :memory:
+        conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
         cursor = conn.cursor()
         # Create users table
         cursor.execute(
@@ -84,7 +413,8 @@ def init_db():
                 active INTEGER DEFAULT 1,
                 last_login TEXT,
                 hash_type TEXT,
-                managed_parking_lot_id TEXT
+                managed_parking_lot_id TEXT,
+                version INTEGER NOT NULL DEFAULT 1
             )
         """
         )
@@ -121,6 +451,7 @@ def init_db():
             duration_minutes INTEGER,
             cost REAL,
             payment_status TEXT,
+            plate_norm TEXT,
             FOREIGN KEY (parking_lot_id) REFERENCES parking_lots (id)
 
             ) """
@@ -138,7 +469,8 @@ def init_db():
                 end_time TEXT,
                 cost REAL,
                 status TEXT,
-                created_at TEXT
+                created_at TEXT,
+                version INTEGER NOT NULL DEFAULT 1
             )
         """
         )
@@ -162,7 +494,9 @@ def init_db():
                 "t_data.date" TEXT,
                 "t_data.method" TEXT,
                 "t_data.issuer" TEXT,
-                "t_data.bank" TEXT
+                "t_data.bank" TEXT,
+                created_ts INTEGER,
+                version INTEGER NOT NULL DEFAULT 1
             )
         """
         )
@@ -178,7 +512,16 @@ def init_db():
                 current_uses INTEGER,
                 active INTEGER,
                 created_at TEXT,
-                expires_at TEXT
+                expires_at TEXT,
+                check_in_date TEXT,
+                check_out_date TEXT,
+                parking_lot_id TEXT,
+                created_by TEXT,
+                guest_name TEXT,
+                notes TEXT,
+                is_hotel_code INTEGER DEFAULT 0,
+                created_ts INTEGER,
+                version INTEGER NOT NULL DEFAULT 1
             )
         """
         )
@@ -194,7 +537,9 @@ def init_db():
                 status TEXT,
                 created_at TEXT,
                 processed_by TEXT,
-                refund_hash TEXT
+                refund_hash TEXT,
+                created_ts INTEGER,
+                version INTEGER NOT NULL DEFAULT 1
             )
         """
         )
@@ -212,11 +557,31 @@ def init_db():
             year INTEGER,
             is_default INTEGER DEFAULT 0,
             created_at TEXT,
+            plate_norm TEXT,
+            version INTEGER NOT NULL DEFAULT 1,
             FOREIGN KEY (user_id) REFERENCES users (username)
         )
     """
         )
 
+        # One row per table, bumped by every write made through the generic helpers below
+        cursor.execute(TABLE_VERSIONS_DDL)
+        # Last id handed out per table, see allocate_id()
+        cursor.execute(COUNTERS_DDL)
+        cursor.execute(SESSION_ARCHIVES_DDL)
+        cursor.execute(LEASES_DDL)
+        for rollup_table, _ in ROLLUP_TABLES.values():
+            cursor.execute(ROLLUP_DDL.format(table=rollup_table))
+        # Archiving picks sessions by the time they stopped, billing by user
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_parking_sessions_stopped ON parking_sessions (stopped)")
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_parking_sessions_user ON parking_sessions ("user")')
+
+        _migrate_plate_norm(conn)
+        _migrate_row_versions(conn)
+        _migrate_created_ts(conn)
+        _migrate_hotel_discounts(conn)
+        _migrate_lifecycle(conn)
+
         conn.commit()
         print("Database Created")
 
@@ -317,6 +682,152 @@ def get_table_columns(table_name: str) -> List[str]:
         return []
 
 
+# --- Table Versions ---
+
+# Counts the reserved counter updates of parking_lots apart from the rest of the table, caches of
+# lot metadata watch "parking_lots" only while anything serving the counters watches both
+OCCUPANCY_VERSION_KEY = "parking_lot_occupancy"
+# Likewise for the usage counters of discounts, so using a code does not empty the discount cache
+DISCOUNT_USES_VERSION_KEY = "discount_uses"
+
+# The JSON file behind each table in mock mode, its modification time stands in for the version
+MOCK_TABLE_FILES = {
+    "parking_lots": MOCK_PARKING_LOTS,
+    "parking_sessions": MOCK_PARKING_SESSIONS,
+    "users": MOCK_USERS,
+    "reservations": MOCK_RESERVATIONS,
+    "payments": MOCK_PAYMENTS,
+    "discounts": MOCK_DISCOUNTS,
+    "refunds": MOCK_REFUNDS,
+    "vehicles": MOCK_VEHICLES,
+}
+
+
+def _bump_table_version(conn, table_name: str) -> int:
+    """
+    Counts a write to a table, on the caller's connection so it commits together with the write.
+    Returns the version the write gives the table.
+    """
+    sql_bump = (
+        "INSERT INTO table_versions (table_name, version) VALUES (?, 1) "
+        "ON CONFLICT(table_name) DO UPDATE SET version = version + 1 RETURNING version"
+    )
+    try:
+        return conn.execute(sql_bump, (table_name,)).fetchone()[0]
+    except sqlite3.OperationalError:
+        # Databases that were not created by init_db() may not have the table yet
+        conn.execute(TABLE_VERSIONS_DDL)
+        return conn.execute(sql_bump, (table_name,)).fetchone()[0]
+
+
+def get_table_version(table_name: str) -> int:
+    """
+    A number that changes whenever the table is written, shared by every process using the database.
+    Reading it is a single primary key lookup, so caches can check it before trusting their copy.
+    """
+    if use_mock_data:
+        filename = MOCK_TABLE_FILES.get(table_name)
+        if filename is None:
+            return 0
+        try:
+            modified = os.stat(filename).st_mtime_ns
+        except OSError:
+            return 0
+        # The write count catches writes by this process that land within the same mtime tick
+        return modified + _mock_write_counts.get(str(filename), 0)
+    try:
+        with get_db_connection() as conn:
+            row = conn.execute("SELECT version FROM table_versions WHERE table_name = ?", (table_name,)).fetchone()
+    except sqlite3.OperationalError as e:
+        print(f"Error loading version of table '{table_name}': {e}")
+        return 0
+    return row[0] if row else 0
+
+
+# --- ID Sequences ---
+
+# Tables whose rows get numeric string ids ("1", "2", ...) from allocate_id()
+SEQUENCE_TABLES = ("parking_lots", "parking_sessions", "reservations")
+# Ids a process takes from the counter at once. Larger blocks mean fewer writes to the counter
+# row, ids left in a block when the process exits are never used.
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "16"))
+
+# (database, table) -> [next id, last id] of the block this process is handing out
+_id_blocks: Dict[Tuple[str, str], List[int]] = {}
+_id_lock = threading.Lock()
+_mock_counters: Dict[str, int] = {}
+
+
+def _highest_id_sql(table_name: str) -> str:
+    # Only ids made of digits count, other string ids can coexist with the sequence
+    return (
+        f"SELECT COALESCE(MAX(CAST(id AS INTEGER)), 0) FROM {table_name} "
+        "WHERE id <> '' AND id NOT GLOB '*[^0-9]*'"
+    )
+
+
+def _reserve_id_block(table_name: str, size: int) -> int:
+    """Moves the counter of a table on by size and returns the first id of the block."""
+    if use_mock_data:
+        if table_name not in _mock_counters:
+            ids = [str(row.get("id", "")) for row in load_data(MOCK_TABLE_FILES[table_name])]
+            _mock_counters[table_name] = max((int(i) for i in ids if i.isdigit()), default=0)
+        _mock_counters[table_name] += size
+        return _mock_counters[table_name] - size + 1
+
+    sql_take = "UPDATE counters SET value = value + ? WHERE name = ? RETURNING value"
+    with get_db_connection() as conn:
+        try:
+            rows = conn.execute(sql_take, (size, table_name)).fetchall()
+        except sqlite3.OperationalError:
+            # Databases that were not created by init_db() may not have the table yet
+            conn.execute(COUNTERS_DDL)
+            rows = []
+        if not rows:
+            # First use, the counter starts at the highest id already in the table
+            conn.execute(
+                f"INSERT OR IGNORE INTO counters (name, value) SELECT ?, ({_highest_id_sql(table_name)})",
+                (table_name,),
+            )
+            rows = conn.execute(sql_take, (size, table_name)).fetchall()
+        conn.commit()
+    return rows[0][0] - size + 1
+
+
+def allocate_id(table_name: str) -> str:
+    """
+    Returns a new id for a row of table_name, a string like the existing ids. Each process
+    reserves ID_BLOCK_SIZE ids with one counter update and hands them out from memory, so
+    concurrent inserts in any number of workers never get the same id and no table is scanned.
+    Ids increase within a process but are not gap free.
+    """
+    key = ("mock" if use_mock_data else str(DB_PATH), table_name)
+    with _id_lock:
+        block = _id_blocks.get(key)
+        if block is None or block[0] > block[1]:
+            first = _reserve_id_block(table_name, ID_BLOCK_SIZE)
+            block = _id_blocks[key] = [first, first + ID_BLOCK_SIZE - 1]
+        new_id = block[0]
+        block[0] += 1
+    return str(new_id)
+
+
+def _sync_sequence(conn, table_name: str):
+    """
+    Moves the counter past the ids written by a bulk save, so new blocks start after them.
+    Runs in the save's transaction. The block of this process is dropped without taking
+    _id_lock, which allocate_id() holds while it waits for the database.
+    """
+    try:
+        conn.execute(
+            f"UPDATE counters SET value = MAX(value, ({_highest_id_sql(table_name)})) WHERE name = ?",
+            (table_name,),
+        )
+    except sqlite3.OperationalError:
+        return
+    _id_blocks.pop((str(DB_PATH), table_name), None)
+
+
 # --- Database I/O Functions (OPTIMIZED FOR TARGETED QUERIES) ---
 
 
@@ -366,65 +877,134 @@ def load_single_json_from_db(table_name: str, key_col: str, key_val: str) -> Opt
     return None
 
 
-def insert_single_json_to_db(table_name: str, item: Dict):
+# --- Group Commit ---
+
+# Off by default. When on, single-row inserts and updates from all threads are handed to
+# one writer thread that commits them in batches, see utils/group_commit.py. A write
+# waits at most GROUP_COMMIT_MAX_DELAY_MS for others to join its batch.
+use_group_commit = os.getenv("STORAGE_GROUP_COMMIT", "false") == "true"
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "5"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "200"))
+
+
+def _run_write(work):
+    """Runs work(conn) and commits it, through the group commit writer when that is enabled."""
+    if use_group_commit:
+        writer = group_commit.get_writer(get_db_connection, GROUP_COMMIT_MAX_DELAY_MS / 1000, GROUP_COMMIT_MAX_BATCH)
+        return writer.submit(work).result()
+    with get_db_connection() as conn:
+        result = work(conn)
+        conn.commit()
+        return result
+
+
+def get_group_commit_stats() -> Optional[Dict]:
+    """Batch size metrics of the group commit writer, None while it has not been used."""
+    return group_commit.stats()
+
+
+def insert_single_json_to_db(table_name: str, item: Dict, on_insert=None) -> int:
     """
-    Inserts a single dictionary/row into the table.
+    Inserts a single dictionary/row into the table and returns the new version of the table.
+    on_insert(conn, row) runs after the INSERT inside the same transaction, for bookkeeping
+    that has to stay in step with the row.
     """
     # 1. Normalize the data (single item)
-    normalized_data = normalize_data([item])[0]
+    normalized_data = normalize_data([_with_created_ts(table_name, _with_plate_norm(table_name, item))])[0]
+
+    def insert(conn):
+        row = _without_missing_created_ts(conn, table_name, normalized_data)
+
+        # 2. Determine columns and values
+        insert_columns = list(row.keys())
+        values_to_insert = tuple(row.values())
 
-    # 2. Determine columns and values
-    insert_columns = list(normalized_data.keys())
-    values_to_insert = tuple(normalized_data.values())
+        # 3. Construct SQL statement
+        column_names_sql = ", ".join([f'"{col}"' for col in insert_columns])
+        placeholders_sql = ", ".join(["?"] * len(insert_columns))
+        sql_insert = f"INSERT INTO {table_name} ({column_names_sql}) VALUES ({placeholders_sql})"
 
-    # 3. Construct SQL statement
-    column_names_sql = ", ".join([f'"{col}"' for col in insert_columns])
-    placeholders_sql = ", ".join(["?"] * len(insert_columns))
-    sql_insert = f"INSERT INTO {table_name} ({column_names_sql}) VALUES ({placeholders_sql})"
+        conn.execute(sql_insert, values_to_insert)
+        if on_insert is not None:
+            on_insert(conn, row)
+        return _bump_table_version(conn, table_name)
 
     try:
-        with get_db_connection() as conn:
-            conn.execute(sql_insert, values_to_insert)
-            conn.commit()
+        return _run_write(insert)
     except sqlite3.OperationalError as e:
         print(f"Error inserting data to table '{table_name}': {e}")
         raise
 
 
-def update_single_json_in_db(table_name: str, key_col: str, key_val: str, update_item: Dict):
+def update_single_json_in_db(
+    table_name: str,
+    key_col: str,
+    key_val: str,
+    update_item: Dict,
+    expected_version: Optional[int] = None,
+    on_table_version: Optional[Callable[[int], None]] = None,
+) -> Optional[int]:
     """
     Updates a single existing row in the table based on a key column.
-    The update_item must contain the complete, final state of the object.
-    """
-    # 1. Normalize the complete, final data (single item)
-    normalized_data = normalize_data([update_item])[0]
-
-    # 2. Determine columns and values for the SET clause
-    set_clauses = []
-    values_to_update = []
-    for col, val in normalized_data.items():
-        set_clauses.append(f'"{col}" = ?')
-        values_to_update.append(val)
+    Only the columns present in update_item are written, so callers can pass just what changed
+    (nested dicts may be partial too, only their given keys are written).
 
-    values_to_update.append(key_val)  # Add the WHERE clause value last
-
-    # 3. Construct SQL statement
-    set_sql = ", ".join(set_clauses)
-    sql_update = f'UPDATE "{table_name}" SET {set_sql} WHERE "{key_col}" = ?'
+    Rows of VERSIONED_TABLES get their version bumped. With expected_version the update is a
+    compare-and-swap: it raises VersionConflictError instead when the row is no longer at that
+    version. Returns the new version, or None for tables without one.
+    on_table_version gets the version the update gave the table, once it is committed.
+    """
+    # 1. Normalize the changed fields (single item), the version is managed here
+    changes = {col: val for col, val in update_item.items() if col != "version"}
+    normalized_data = normalize_data([_with_created_ts(table_name, _with_plate_norm(table_name, changes))])[0]
+
+    def update(conn):
+        # 2. Determine columns and values for the SET clause
+        set_clauses = []
+        values_to_update = []
+        for col, val in _without_missing_created_ts(conn, table_name, normalized_data).items():
+            set_clauses.append(f'"{col}" = ?')
+            values_to_update.append(val)
+
+        versioned = table_name in VERSIONED_TABLES and _has_column(conn, table_name, "version")
+
+        # 3. Construct SQL statement
+        clauses = set_clauses + (["version = version + 1"] if versioned else [])
+        if not clauses:
+            clauses = [f'"{key_col}" = "{key_col}"']
+        sql_update = f'UPDATE "{table_name}" SET {", ".join(clauses)} WHERE "{key_col}" = ?'
+        params = values_to_update + [key_val]
+        check_version = versioned and expected_version is not None
+        if check_version:
+            sql_update += " AND version = ?"
+            params.append(expected_version)
+
+        if versioned:
+            returned = conn.execute(sql_update + " RETURNING version", tuple(params)).fetchall()
+            new_version = returned[0][0] if returned else None
+            updated = bool(returned)
+        else:
+            new_version = None
+            updated = conn.execute(sql_update, tuple(params)).rowcount > 0
+
+        if not updated:
+            if check_version:
+                row = conn.execute(f'SELECT version FROM "{table_name}" WHERE "{key_col}" = ?', (key_val,)).fetchone()
+                if row is not None:
+                    raise VersionConflictError(table_name, key_val, expected_version, row[0])
+            # Note: This raises an error if no row was found to update, which helps the endpoint return a 404/error.
+            raise ValueError(f"No row found with {key_col}={key_val} to update.")
+
+        return new_version, _bump_table_version(conn, table_name)
 
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql_update, tuple(values_to_update))
-
-            if cursor.rowcount == 0:
-                # Note: This raises an error if no row was found to update, which helps the endpoint return a 404/error.
-                raise ValueError(f"No row found with {key_col}={key_val} to update.")
-
-            conn.commit()
-    except (sqlite3.OperationalError, ValueError) as e:
+        new_version, table_version = _run_write(update)
+    except (sqlite3.OperationalError, ValueError, VersionConflictError) as e:
         print(f"Error updating data in table '{table_name}': {e}")
         raise
+    if on_table_version is not None:
+        on_table_version(table_version)
+    return new_version
 
 
 def save_json_to_db(table_name, data):
@@ -435,48 +1015,116 @@ def save_json_to_db(table_name, data):
     """
 
     # 1. Normalize the data
-    normalized_data = normalize_data(data)
+    normalized_data = normalize_data(
+        [_with_created_ts(table_name, _with_plate_norm(table_name, item)) for item in data]
+    )
 
     # If no data, just delete and exit
     if not normalized_data:
         try:
             with get_db_connection() as conn:
                 conn.execute(f"DELETE FROM {table_name}")
+                _bump_table_version(conn, table_name)
                 conn.commit()
             return
         except sqlite3.OperationalError as e:
             print(f"Error deleting data from table '{table_name}': {e}")
             return
 
-    # 2. Determine columns for insertion
-    insert_columns = list(normalized_data[0].keys())
-
-    # 3. Prepare data for bulk insert
-    values_to_insert = []
-    for item in normalized_data:
-        values_to_insert.append(tuple(item.get(col, None) for col in insert_columns))
-
-    # 4. Construct SQL statement
-    column_names_sql = ", ".join([f'"{col}"' for col in insert_columns])
-    placeholders_sql = ", ".join(["?"] * len(insert_columns))
-
-    sql_insert = f"INSERT INTO {table_name} ({column_names_sql}) VALUES ({placeholders_sql})"
     sql_delete = f"DELETE FROM {table_name}"
 
     try:
         with get_db_connection() as conn:
+            # 2. Determine columns for insertion
+            insert_columns = list(_without_missing_created_ts(conn, table_name, normalized_data[0]).keys())
+
+            # 3. Prepare data for bulk insert
+            values_to_insert = []
+            for item in normalized_data:
+                values_to_insert.append(tuple(item.get(col, COLUMN_DEFAULTS.get(col)) for col in insert_columns))
+
+            # 4. Construct SQL statement
+            column_names_sql = ", ".join([f'"{col}"' for col in insert_columns])
+            placeholders_sql = ", ".join(["?"] * len(insert_columns))
+            sql_insert = f"INSERT INTO {table_name} ({column_names_sql}) VALUES ({placeholders_sql})"
+
             cursor = conn.cursor()
             cursor.execute(sql_delete)
             cursor.executemany(sql_insert, values_to_insert)
+            _bump_table_version(conn, table_name)
+            if table_name in SEQUENCE_TABLES:
+                _sync_sequence(conn, table_name)
     except sqlite3.OperationalError as e:
         print(f"Error saving data to table '{table_name}': {e}")
 
 
+def insert_json_batch(conn, table_name: str, items: List[Dict]) -> int:
+    """
+    Inserts a batch of rows on the caller's connection and inside its transaction, for bulk
+    imports. Rows are normalized like every other write and sent with one executemany per
+    set of columns. Keys that are not columns of the table are left out, and rows whose
+    primary key is already taken are skipped (INSERT OR IGNORE), so running a batch again
+    after a crash does no harm. Returns the number of rows inserted.
+    """
+    table_columns = {info[1] for info in conn.execute(f"PRAGMA table_info({table_name})").fetchall()}
+    rows_by_columns: Dict[Tuple[str, ...], List[Tuple]] = {}
+    for item in normalize_data([_with_created_ts(table_name, _with_plate_norm(table_name, item)) for item in items]):
+        columns = tuple(col for col in item if col in table_columns)
+        rows_by_columns.setdefault(columns, []).append(tuple(item[col] for col in columns))
+
+    changes_before = conn.total_changes
+    for columns, rows in rows_by_columns.items():
+        column_names_sql = ", ".join(f'"{col}"' for col in columns)
+        placeholders_sql = ", ".join(["?"] * len(columns))
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {table_name} ({column_names_sql}) VALUES ({placeholders_sql})", rows
+        )
+    return conn.total_changes - changes_before
+
+
+def finish_bulk_import(table_name: str):
+    """Counts a bulk import as a write of the table and moves its id counter past the imported ids."""
+    with get_db_connection() as conn:
+        _bump_table_version(conn, table_name)
+        if table_name in SEQUENCE_TABLES:
+            _sync_sequence(conn, table_name)
+        conn.commit()
+
+
 # -----------------------------------------------------------------
 ## 🗄️ Specific Application Database I/O Functions (MIGRATED TO TARGETED)
 # -----------------------------------------------------------------
 
 
+_mock_update_lock = threading.Lock()
+
+
+def _merge_changes(row: Dict, changes: Dict) -> None:
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(row.get(key), dict):
+            _merge_changes(row[key], value)
+        else:
+            row[key] = value
+
+
+def _update_mock_row(
+    filename, key_col: str, key_val: str, changes: Dict, expected_version: Optional[int], not_found: str
+) -> int:
+    """update_single_json_in_db() for the JSON files, with the same partial update and version check."""
+    with _mock_update_lock:
+        rows = load_data(filename)
+        for row in rows:
+            if row.get(key_col) == key_val:
+                current_version = row.get("version", 1)
+                if expected_version is not None and current_version != expected_version:
+                    raise VersionConflictError(Path(filename).stem, key_val, expected_version, current_version)
+                _merge_changes(row, {col: val for col, val in changes.items() if col != "version"})
+                row["version"] = current_version + 1
+                save_data(filename, rows)
+                return row["version"]
+    raise ValueError(not_found)
+
+
 # --- Users ---
 def load_user_data_from_db():
     if use_mock_data:
@@ -504,17 +1152,11 @@ def get_user_data_by_username(username: str) -> Optional[Dict]:
     return load_single_json_from_db("users", key_col="username", key_val=username)
 
 
-def update_existing_user_in_db(username: str, user_data: Dict):
+def update_existing_user_in_db(username: str, user_data: Dict, expected_version: Optional[int] = None):
     if use_mock_data:
-        users = load_data(MOCK_USERS)
-        for user in users:
-            if user.get("username") == username:
-                user.update(user_data)
-                save_data(MOCK_USERS, users)
-                return
-        raise ValueError("User not found")
+        return _update_mock_row(MOCK_USERS, "username", username, user_data, expected_version, "User not found")
 
-    update_single_json_in_db("users", key_col="username", key_val=username, update_item=user_data)
+    return update_single_json_in_db("users", key_col="username", key_val=username, update_item=user_data, expected_version=expected_version)
 
 
 # --- Parking Lots ---
@@ -524,6 +1166,15 @@ def load_parking_lot_data_from_db():
     return load_json_from_db("parking_lots")
 
 
+def get_parking_lot_by_id(parking_lot_id: str) -> Optional[Dict]:
+    if use_mock_data:
+        for lot in load_data(MOCK_PARKING_LOTS):
+            if lot.get("id") == parking_lot_id:
+                return lot
+        return None
+    return load_single_json_from_db("parking_lots", key_col="id", key_val=parking_lot_id)
+
+
 def save_parking_lot_data_to_db(data):
     if use_mock_data:
         parking_lots = load_data(MOCK_PARKING_LOTS)
@@ -534,6 +1185,149 @@ def save_parking_lot_data_to_db(data):
     save_json_to_db("parking_lots", data)
 
 
+# --- Parking Lot Occupancy (atomic counters) ---
+# The mock JSON file has no transactions, so a process-wide lock stands in for one.
+_mock_occupancy_lock = threading.Lock()
+
+
+# Single row writes for the lot admin endpoints. None of them write reserved of an existing lot,
+# that counter belongs to the claim/release functions below and a value read earlier is stale.
+def save_new_parking_lot_to_db(parking_lot: Dict):
+    if use_mock_data:
+        with _mock_occupancy_lock:
+            parking_lots = load_data(MOCK_PARKING_LOTS)
+            parking_lots.append(parking_lot)
+            save_data(MOCK_PARKING_LOTS, parking_lots)
+        return
+    insert_single_json_to_db("parking_lots", parking_lot)
+
+
+def update_existing_parking_lot_in_db(parking_lot_id: str, changes: Dict):
+    """Writes the given fields of the lot, raises ValueError when it does not exist."""
+    changes = {col: val for col, val in changes.items() if col != "reserved"}
+    if use_mock_data:
+        with _mock_occupancy_lock:
+            parking_lots = load_data(MOCK_PARKING_LOTS)
+            for lot in parking_lots:
+                if lot.get("id") == parking_lot_id:
+                    _merge_changes(lot, changes)
+                    save_data(MOCK_PARKING_LOTS, parking_lots)
+                    return
+        raise ValueError("Parking lot not found")
+    update_single_json_in_db("parking_lots", "id", parking_lot_id, changes)
+
+
+def delete_parking_lot_from_db(parking_lot_id: str) -> bool:
+    """Deletes the lot, False when it did not exist."""
+    if use_mock_data:
+        with _mock_occupancy_lock:
+            parking_lots = load_data(MOCK_PARKING_LOTS)
+            remaining = [lot for lot in parking_lots if lot.get("id") != parking_lot_id]
+            if len(remaining) == len(parking_lots):
+                return False
+            save_data(MOCK_PARKING_LOTS, remaining)
+            return True
+
+    def delete(conn):
+        if conn.execute("DELETE FROM parking_lots WHERE id = ?", (parking_lot_id,)).rowcount == 0:
+            return False
+        _bump_table_version(conn, "parking_lots")
+        return True
+
+    return _run_write(delete)
+
+
+def _adjust_mock_parking_lot_reserved(parking_lot_id: str, delta: int, enforce_capacity: bool) -> Optional[Dict]:
+    with _mock_occupancy_lock:
+        parking_lots = load_data(MOCK_PARKING_LOTS)
+        for lot in parking_lots:
+            if lot.get("id") != parking_lot_id:
+                continue
+            reserved = lot.get("reserved") or 0
+            if delta > 0 and enforce_capacity and reserved >= (lot.get("capacity") or 0):
+                return None
+            if delta < 0 and reserved <= 0:
+                return None
+            lot["reserved"] = reserved + delta
+            save_data(MOCK_PARKING_LOTS, parking_lots)
+            return {"capacity": lot.get("capacity"), "reserved": lot["reserved"]}
+        return None
+
+
+SQL_CLAIM_SPACE = "UPDATE parking_lots SET reserved = COALESCE(reserved, 0) + 1 WHERE id = ?"
+SQL_CLAIM_SPACE_WITHIN_CAPACITY = SQL_CLAIM_SPACE + " AND COALESCE(reserved, 0) < capacity"
+SQL_RELEASE_SPACE = "UPDATE parking_lots SET reserved = reserved - 1 WHERE id = ? AND reserved > 0"
+
+
+def _adjust_reserved(conn, sql_update: str, parking_lot_id: str) -> Optional[Dict]:
+    """Runs a conditional UPDATE on one parking lot row on the caller's connection and reads the new counters back."""
+    cursor = conn.cursor()
+    cursor.execute(sql_update, (parking_lot_id,))
+    if cursor.rowcount == 0:
+        return None
+    cursor.execute("SELECT capacity, reserved FROM parking_lots WHERE id = ?", (parking_lot_id,))
+    capacity, reserved = cursor.fetchone()
+    _bump_table_version(conn, OCCUPANCY_VERSION_KEY)
+    return {"capacity": capacity, "reserved": reserved}
+
+
+def _adjust_parking_lot_reserved_in_db(sql_update: str, parking_lot_id: str) -> Optional[Dict]:
+    """
+    Runs a conditional UPDATE on one parking lot row and reads the new counters back
+    inside the same transaction. Returns None when the condition did not match.
+    """
+    try:
+        return _run_write(lambda conn: _adjust_reserved(conn, sql_update, parking_lot_id))
+    except sqlite3.OperationalError as e:
+        print(f"Error updating occupancy of parking lot '{parking_lot_id}': {e}")
+        raise
+
+
+def increment_parking_lot_reserved(parking_lot_id: str, enforce_capacity: bool = True) -> Optional[Dict]:
+    """
+    Atomically claims one space in a parking lot. With enforce_capacity the update
+    only applies while reserved < capacity. Returns the new counters, or None if
+    the lot does not exist or is full.
+    """
+    if use_mock_data:
+        return _adjust_mock_parking_lot_reserved(parking_lot_id, 1, enforce_capacity)
+
+    sql_update = SQL_CLAIM_SPACE_WITHIN_CAPACITY if enforce_capacity else SQL_CLAIM_SPACE
+    return _adjust_parking_lot_reserved_in_db(sql_update, parking_lot_id)
+
+
+def decrement_parking_lot_reserved(parking_lot_id: str) -> Optional[Dict]:
+    """
+    Atomically releases one space in a parking lot, never going below zero.
+    Returns the new counters, or None if the lot does not exist or was already empty.
+    """
+    if use_mock_data:
+        return _adjust_mock_parking_lot_reserved(parking_lot_id, -1, False)
+
+    return _adjust_parking_lot_reserved_in_db(SQL_RELEASE_SPACE, parking_lot_id)
+
+
+def get_parking_lot_occupancy(parking_lot_id: str) -> Optional[Dict]:
+    """Loads only the capacity and reserved counters of a single parking lot."""
+    if use_mock_data:
+        for lot in load_data(MOCK_PARKING_LOTS):
+            if lot.get("id") == parking_lot_id:
+                return {"capacity": lot.get("capacity"), "reserved": lot.get("reserved") or 0}
+        return None
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT capacity, reserved FROM parking_lots WHERE id = ?", (parking_lot_id,))
+            row = cursor.fetchone()
+    except sqlite3.OperationalError as e:
+        print(f"Error loading occupancy of parking lot '{parking_lot_id}': {e}")
+        return None
+    if row is None:
+        return None
+    return {"capacity": row[0], "reserved": row[1] or 0}
+
+
 # --- Reservations ---
 def load_reservation_data_from_db():
     if use_mock_data:
@@ -541,6 +1335,48 @@ def load_reservation_data_from_db():
     return load_json_from_db("reservations")
 
 
+def get_reservations_by_vehicle(
+    vehicle_id: str, limit: Optional[int] = None, before: Optional[str] = None
+) -> List[Dict]:
+    """
+    Loads the reservations of one vehicle, newest start_time first.
+    With before, only reservations starting earlier than it, so pages can be walked
+    by passing the start_time of the last row of the previous page.
+    """
+    if use_mock_data:
+        reservations = [
+            r
+            for r in load_data(MOCK_RESERVATIONS)
+            if r.get("vehicle_id") == vehicle_id and (before is None or (r.get("start_time") or "") < before)
+        ]
+        reservations.sort(key=lambda r: r.get("start_time") or "", reverse=True)
+        return reservations[:limit] if limit is not None else reservations
+
+    sql = "SELECT * FROM reservations WHERE vehicle_id = ?"
+    params = [vehicle_id]
+    if before is not None:
+        sql += " AND start_time < ?"
+        params.append(before)
+    sql += " ORDER BY start_time DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    normalized_data = []
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            for row in cursor:
+                normalized_data.append(dict(row))
+    except sqlite3.OperationalError as e:
+        print(f"Error loading reservations for vehicle '{vehicle_id}': {e}")
+        raise
+
+    return unnormalize_data(normalized_data)
+
+
 def save_reservation_data_to_db(data):
     if use_mock_data:
         reservations = load_data(MOCK_RESERVATIONS)
@@ -624,68 +1460,245 @@ def get_refunds_for_user(username: str) -> List[Dict]:
     return unnormalize_data(normalized_data)
 
 
-def save_new_payment_to_db(payment_data: Dict):
+def get_payments_created_between(
+    since: Optional[int] = None, until: Optional[int] = None, initiator: Optional[str] = None
+) -> List[Dict]:
+    """
+    Payments created from since to until (epoch seconds, both inclusive, either may be None),
+    oldest first. Optionally only those of one initiator. A range scan of a created_ts index.
+    """
     if use_mock_data:
         payments = load_data(MOCK_PAYMENTS)
-        payments.append(payment_data)
-        save_data(MOCK_PAYMENTS, payments)
-        return
-    insert_single_json_to_db("payments", payment_data)
+        if initiator is not None:
+            payments = [p for p in payments if p.get("initiator") == initiator]
+        return _created_between(payments, since, until)
 
+    conditions, params = _created_between_sql("created_ts", since, until)
+    if initiator is not None:
+        conditions.insert(0, '"initiator" = ?')
+        params.insert(0, initiator)
+    # IS NOT NULL lets a range without bounds use the index for the ordering too
+    conditions.append("created_ts IS NOT NULL")
 
-def update_existing_payment_in_db(payment_id: str, payment_data: Dict):
-    if use_mock_data:
-        payments = load_data(MOCK_PAYMENTS)
-        for payment in payments:
-            if payment.get("transaction") == payment_id:
-                payment.update(payment_data)
-                save_data(MOCK_PAYMENTS, payments)
-                return
-        raise ValueError("Payment not found")
-    update_single_json_in_db("payments", key_col="transaction", key_val=payment_id, update_item=payment_data)
-
+    normalized_data = []
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT * FROM payments WHERE {' AND '.join(conditions)} ORDER BY created_ts", tuple(params)
+            )
+            for row in cursor:
+                normalized_data.append(dict(row))
+    except sqlite3.OperationalError as e:
+        print(f"Error loading payments created between {since} and {until}: {e}")
+        return []
 
-# DEPRECATED/REMOVED: save_payment_data_to_db (Use save_new_payment_to_db or update_existing_payment_in_db)
-# The original save_payment_data_to_db is effectively replaced by the full save_json_to_db('payments', data) if a full rewrite is needed.
-# For API calls, the targeted functions above are used.
+    return unnormalize_data(normalized_data)
 
 
-# --- Discounts ---
-def load_discounts_data_from_db():
+def get_refunds_created_between(
+    since: Optional[int] = None, until: Optional[int] = None, username: Optional[str] = None
+) -> List[Dict]:
+    """
+    Refunds created from since to until (epoch seconds, both inclusive, either may be None),
+    oldest first. With username only the refunds of that user's payments.
+    """
     if use_mock_data:
-        return load_data(MOCK_DISCOUNTS)
-    return load_json_from_db("discounts")
+        refunds = load_data(MOCK_REFUNDS) if username is None else get_refunds_for_user(username)
+        return _created_between(refunds, since, until)
 
+    conditions, params = _created_between_sql("r.created_ts", since, until)
+    conditions.append("r.created_ts IS NOT NULL")
+    sql = "SELECT r.* FROM refunds r"
+    if username is not None:
+        sql += ' JOIN payments p ON r.original_transaction_id = p."transaction"'
+        conditions.insert(0, "p.initiator = ?")
+        params.insert(0, username)
 
-def get_discount_by_code(discount_code: str) -> Optional[Dict]:
-    if use_mock_data:
-        discounts = load_data(MOCK_DISCOUNTS)
-        for discount in discounts:
+    normalized_data = []
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(f"{sql} WHERE {' AND '.join(conditions)} ORDER BY r.created_ts", tuple(params))
+            for row in cursor:
+                normalized_data.append(dict(row))
+    except sqlite3.OperationalError as e:
+        print(f"Error loading refunds created between {since} and {until}: {e}")
+        return []
+
+    return unnormalize_data(normalized_data)
+
+
+def save_new_payment_to_db(payment_data: Dict):
+    if use_mock_data:
+        payments = load_data(MOCK_PAYMENTS)
+        payments.append(payment_data)
+        save_data(MOCK_PAYMENTS, payments)
+        return
+    insert_single_json_to_db("payments", payment_data, on_insert=_roll_up_payment)
+
+
+def update_existing_payment_in_db(payment_id: str, payment_data: Dict, expected_version: Optional[int] = None):
+    if use_mock_data:
+        return _update_mock_row(
+            MOCK_PAYMENTS, "transaction", payment_id, payment_data, expected_version, "Payment not found"
+        )
+    return update_single_json_in_db(
+        "payments", key_col="transaction", key_val=payment_id, update_item=payment_data, expected_version=expected_version
+    )
+
+
+# DEPRECATED/REMOVED: save_payment_data_to_db (Use save_new_payment_to_db or update_existing_payment_in_db)
+# The original save_payment_data_to_db is effectively replaced by the full save_json_to_db('payments', data) if a full rewrite is needed.
+# For API calls, the targeted functions above are used.
+
+
+# --- Discounts ---
+def load_discounts_data_from_db():
+    if use_mock_data:
+        return load_data(MOCK_DISCOUNTS)
+    return load_json_from_db("discounts")
+
+
+def get_discount_by_code(discount_code: str) -> Optional[Dict]:
+    if use_mock_data:
+        discounts = load_data(MOCK_DISCOUNTS)
+        for discount in discounts:
             if discount.get("code") == discount_code:
                 return discount
         return None
     return load_single_json_from_db("discounts", key_col="code", key_val=discount_code)
 
 
+def _discounts_by(
+    column: str, value: str, hotel_only: bool, after: Optional[str], limit: Optional[int]
+) -> List[Dict]:
+    """
+    One page of the discount codes with column = value, ordered by code. after is the last
+    code of the previous page, so a page costs the same however many codes exist.
+    """
+    if use_mock_data:
+        codes = sorted(
+            (
+                d
+                for d in load_data(MOCK_DISCOUNTS)
+                if d.get(column) == value
+                and (not hotel_only or d.get("is_hotel_code"))
+                and (after is None or d.get("code") > after)
+            ),
+            key=lambda d: d.get("code"),
+        )
+        return codes[:limit] if limit is not None else codes
+
+    sql, params = f"SELECT * FROM discounts WHERE {column} = ?", [value]
+    if hotel_only:
+        sql += " AND is_hotel_code = 1"
+    if after is not None:
+        sql += " AND code > ?"
+        params.append(after)
+    sql += " ORDER BY code"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    normalized_data = []
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            for row in cursor:
+                normalized_data.append(dict(row))
+    except sqlite3.OperationalError as e:
+        print(f"Error loading discount codes by {column} '{value}': {e}")
+        raise
+
+    return unnormalize_data(normalized_data)
+
+
+def get_discounts_by_creator(
+    username: str, hotel_only: bool = True, after: Optional[str] = None, limit: Optional[int] = None
+) -> List[Dict]:
+    """Discount codes created by a user, hotel codes only by default, through the (created_by, is_hotel_code, code) index."""
+    return _discounts_by("created_by", username, hotel_only, after, limit)
+
+
+def get_discounts_by_lot(
+    parking_lot_id: str, hotel_only: bool = True, after: Optional[str] = None, limit: Optional[int] = None
+) -> List[Dict]:
+    """Discount codes valid for a parking lot, hotel codes only by default, through the (parking_lot_id, is_hotel_code, code) index."""
+    return _discounts_by("parking_lot_id", parking_lot_id, hotel_only, after, limit)
+
+
 def save_new_discount_to_db(discount_data: Dict):
     if use_mock_data:
         discounts = load_data(MOCK_DISCOUNTS)
         discounts.append(discount_data)
         save_data(MOCK_DISCOUNTS, discounts)
-        return
-    insert_single_json_to_db("discounts", discount_data)
+    else:
+        insert_single_json_to_db("discounts", discount_data)
+    _forget_discounts([discount_data.get("code")])
 
 
-def update_existing_discount_in_db(discount_code: str, discount_data: Dict):
+def _taken_discount_codes(conn, codes: List[str]) -> Set[str]:
+    taken = set()
+    for start in range(0, len(codes), DISCOUNT_CODE_LOOKUP_SIZE):
+        lookup = codes[start : start + DISCOUNT_CODE_LOOKUP_SIZE]
+        placeholders = ", ".join("?" * len(lookup))
+        taken.update(row[0] for row in conn.execute(f"SELECT code FROM discounts WHERE code IN ({placeholders})", lookup))
+    return taken
+
+
+def save_new_discounts_to_db(discounts: List[Dict]) -> Set[str]:
+    """
+    Saves a batch of discount codes in one transaction, all of them or none. The codes are
+    checked with one IN query first; when any is taken nothing is saved and the taken codes
+    are returned, so the caller can replace them and try again. Returns an empty set once saved.
+    """
+    codes = [discount["code"] for discount in discounts]
     if use_mock_data:
-        discounts = load_data(MOCK_DISCOUNTS)
-        for discount in discounts:
-            if discount.get("code") == discount_code:
-                discount.update(discount_data)
-                save_data(MOCK_DISCOUNTS, discounts)
-                return
-        raise ValueError("Discount not found")
-    update_single_json_in_db("discounts", key_col="code", key_val=discount_code, update_item=discount_data)
+        with _mock_update_lock:
+            existing = load_data(MOCK_DISCOUNTS)
+            taken = {d.get("code") for d in existing} & set(codes)
+            if not taken:
+                save_data(MOCK_DISCOUNTS, existing + discounts)
+        if not taken:
+            _forget_discounts(codes)
+        return taken
+
+    def insert(conn):
+        taken = _taken_discount_codes(conn, codes)
+        if taken:
+            return taken
+        if insert_json_batch(conn, "discounts", discounts) != len(discounts):
+            # Taken by another writer after the check, the transaction is rolled back
+            raise sqlite3.IntegrityError("Discount code taken while saving the batch")
+        _bump_table_version(conn, "discounts")
+        return set()
+
+    try:
+        taken = _run_write(insert)
+    except sqlite3.OperationalError as e:
+        print(f"Error saving discount codes batch: {e}")
+        raise
+    if not taken:
+        _forget_discounts(codes)
+    return taken
+
+
+def update_existing_discount_in_db(discount_code: str, discount_data: Dict, expected_version: Optional[int] = None):
+    try:
+        if use_mock_data:
+            return _update_mock_row(
+                MOCK_DISCOUNTS, "code", discount_code, discount_data, expected_version, "Discount not found"
+            )
+        return update_single_json_in_db(
+            "discounts", key_col="code", key_val=discount_code, update_item=discount_data, expected_version=expected_version
+        )
+    finally:
+        _forget_discounts([discount_code])
 
 
 def save_discounts_data_to_db(data):
@@ -693,8 +1706,181 @@ def save_discounts_data_to_db(data):
         discounts = load_data(MOCK_DISCOUNTS)
         discounts.append(data)
         save_data(MOCK_DISCOUNTS, discounts)
+    else:
+        save_json_to_db("discounts", data)
+    invalidate_discount_cache()
+
+
+def claim_discount_use(discount_code: str) -> Optional[int]:
+    """
+    Counts one use of a discount code, unless it has reached max_uses. The check and the
+    increment are one conditional UPDATE, so concurrent checkouts can never use a code more
+    often than allowed. Returns the new number of uses, None when the code is used up or does not exist.
+    """
+    if use_mock_data:
+        with _mock_update_lock:
+            discounts = load_data(MOCK_DISCOUNTS)
+            for discount in discounts:
+                if discount.get("code") != discount_code:
+                    continue
+                current_uses = discount.get("current_uses") or 0
+                if discount.get("max_uses") is not None and current_uses >= discount["max_uses"]:
+                    return None
+                discount["current_uses"] = current_uses + 1
+                discount["version"] = discount.get("version", 1) + 1
+                save_data(MOCK_DISCOUNTS, discounts)
+                return discount["current_uses"]
+            return None
+
+    def claim(conn):
+        versioned = _has_column(conn, "discounts", "version")
+        row = conn.execute(
+            "UPDATE discounts SET current_uses = COALESCE(current_uses, 0) + 1"
+            + (", version = version + 1" if versioned else "")
+            + " WHERE code = ? AND (max_uses IS NULL OR COALESCE(current_uses, 0) < max_uses)"
+            " RETURNING current_uses",
+            (discount_code,),
+        ).fetchone()
+        if row is None:
+            return None
+        _bump_table_version(conn, DISCOUNT_USES_VERSION_KEY)
+        return row[0]
+
+    try:
+        return _run_write(claim)
+    except sqlite3.OperationalError as e:
+        print(f"Error claiming a use of discount code '{discount_code}': {e}")
+        raise
+
+
+def release_discount_use(discount_code: str) -> Optional[int]:
+    """
+    Gives back a use claim_discount_use() counted, for a checkout that failed after claiming it.
+    Returns the new number of uses, None when there was nothing to give back.
+    """
+    if use_mock_data:
+        with _mock_update_lock:
+            discounts = load_data(MOCK_DISCOUNTS)
+            for discount in discounts:
+                if discount.get("code") != discount_code:
+                    continue
+                current_uses = discount.get("current_uses") or 0
+                if current_uses <= 0:
+                    return None
+                discount["current_uses"] = current_uses - 1
+                discount["version"] = discount.get("version", 1) + 1
+                save_data(MOCK_DISCOUNTS, discounts)
+                return discount["current_uses"]
+            return None
+
+    def release(conn):
+        versioned = _has_column(conn, "discounts", "version")
+        row = conn.execute(
+            "UPDATE discounts SET current_uses = current_uses - 1"
+            + (", version = version + 1" if versioned else "")
+            + " WHERE code = ? AND current_uses > 0 RETURNING current_uses",
+            (discount_code,),
+        ).fetchone()
+        if row is None:
+            return None
+        _bump_table_version(conn, DISCOUNT_USES_VERSION_KEY)
+        return row[0]
+
+    try:
+        return _run_write(release)
+    except sqlite3.OperationalError as e:
+        print(f"Error releasing a use of discount code '{discount_code}': {e}")
+        raise
+
+
+# --- Discount Cache ---
+
+# Checkout looks up the code of every discounted payment. The metadata of recently used codes and
+# the codes recently found missing are kept in process, so a flood of made-up codes is turned away
+# without any SQL. Usage counters are left out, claim_discount_use() counts them in the database.
+# Writes through this module drop the code right away, writes by other workers show up in the
+# table version, checked at most every DISCOUNT_CACHE_VERSION_CHECK_SECONDS.
+DISCOUNT_CACHE_TTL_SECONDS = float(os.getenv("DISCOUNT_CACHE_TTL_SECONDS", "60"))
+DISCOUNT_CACHE_SIZE = int(os.getenv("DISCOUNT_CACHE_SIZE", "10000"))
+MISSING_DISCOUNT_CACHE_SIZE = int(os.getenv("MISSING_DISCOUNT_CACHE_SIZE", "100000"))
+DISCOUNT_CACHE_VERSION_CHECK_SECONDS = 1.0
+UNCACHED_DISCOUNT_FIELDS = ("current_uses", "version")
+
+# code -> (loaded at, metadata), least recently used first
+_cached_discounts: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+_missing_discounts: "OrderedDict[str, Tuple[float, None]]" = OrderedDict()
+_discount_cache_lock = threading.Lock()
+_discount_cache_version: Optional[int] = None
+_discount_cache_checked_at = 0.0
+# Bumped by every write, a lookup that raced with one does not store what it loaded
+_discount_cache_generation = 0
+
+
+def _check_discount_cache_version(now: float):
+    global _discount_cache_version, _discount_cache_checked_at
+    if _discount_cache_version is not None and now - _discount_cache_checked_at < DISCOUNT_CACHE_VERSION_CHECK_SECONDS:
         return
-    save_json_to_db("discounts", data)
+    version = get_table_version("discounts")
+    if version != _discount_cache_version:
+        _cached_discounts.clear()
+        _missing_discounts.clear()
+        _discount_cache_version = version
+    _discount_cache_checked_at = now
+
+
+def _remember_discount(cache: OrderedDict, code: str, value: Optional[Dict], size: int, now: float):
+    cache[code] = (now, value)
+    cache.move_to_end(code)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+
+def get_cached_discount(discount_code: str) -> Optional[Dict]:
+    """
+    get_discount_by_code() for checkout: the code's metadata without its usage counter, or None
+    when it does not exist, both answered from memory for DISCOUNT_CACHE_TTL_SECONDS.
+    """
+    now = time.monotonic()
+    with _discount_cache_lock:
+        _check_discount_cache_version(now)
+        for cache in (_cached_discounts, _missing_discounts):
+            entry = cache.get(discount_code)
+            if entry is not None and now - entry[0] < DISCOUNT_CACHE_TTL_SECONDS:
+                cache.move_to_end(discount_code)
+                return dict(entry[1]) if entry[1] is not None else None
+        generation = _discount_cache_generation
+
+    discount = get_discount_by_code(discount_code)
+    metadata = None
+    if discount is not None:
+        metadata = {key: value for key, value in discount.items() if key not in UNCACHED_DISCOUNT_FIELDS}
+
+    with _discount_cache_lock:
+        if generation == _discount_cache_generation:
+            if metadata is None:
+                _remember_discount(_missing_discounts, discount_code, None, MISSING_DISCOUNT_CACHE_SIZE, now)
+            else:
+                _remember_discount(_cached_discounts, discount_code, metadata, DISCOUNT_CACHE_SIZE, now)
+    return dict(metadata) if metadata is not None else None
+
+
+def _forget_discounts(codes: List[str]):
+    global _discount_cache_generation
+    with _discount_cache_lock:
+        for code in codes:
+            _cached_discounts.pop(code, None)
+            _missing_discounts.pop(code, None)
+        _discount_cache_generation += 1
+
+
+def invalidate_discount_cache():
+    """Drops every cached discount code, the next lookups load them again."""
+    global _discount_cache_version, _discount_cache_generation
+    with _discount_cache_lock:
+        _cached_discounts.clear()
+        _missing_discounts.clear()
+        _discount_cache_version = None
+        _discount_cache_generation += 1
 
 
 # --- Refunds ---
@@ -720,19 +1906,15 @@ def save_new_refund_to_db(refund_data: Dict):
         refunds.append(refund_data)
         save_data(MOCK_REFUNDS, refunds)
         return
-    insert_single_json_to_db("refunds", refund_data)
+    insert_single_json_to_db("refunds", refund_data, on_insert=_roll_up_refund)
 
 
-def update_existing_refund_in_db(refund_id: str, refund_data: Dict):
+def update_existing_refund_in_db(refund_id: str, refund_data: Dict, expected_version: Optional[int] = None):
     if use_mock_data:
-        refunds = load_data(MOCK_REFUNDS)
-        for refund in refunds:
-            if refund.get("refund_id") == refund_id:
-                refund.update(refund_data)
-                save_data(MOCK_REFUNDS, refunds)
-                return
-        raise ValueError("Refund not found")
-    update_single_json_in_db("refunds", key_col="refund_id", key_val=refund_id, update_item=refund_data)
+        return _update_mock_row(MOCK_REFUNDS, "refund_id", refund_id, refund_data, expected_version, "Refund not found")
+    return update_single_json_in_db(
+        "refunds", key_col="refund_id", key_val=refund_id, update_item=refund_data, expected_version=expected_version
+    )
 
 
 def get_refunds_by_transaction_id(transaction_id: str) -> List[Dict]:
@@ -811,6 +1993,10 @@ def write_text(filename, data):
 # --- General File Save/Load Functions (Existing) ---
 
 
+# Writes per mock file made by this process, see get_table_version()
+_mock_write_counts: Dict[str, int] = {}
+
+
 def save_data(filename, data):
     if str(filename).endswith(".json"):
         write_json(filename, data)
@@ -820,6 +2006,8 @@ def save_data(filename, data):
         write_text(filename, data)
     else:
         raise ValueError("Unsupported file format")
+    # Counted once the data is on disk, a version read before that must not match the new content
+    _mock_write_counts[str(filename)] = _mock_write_counts.get(str(filename), 0) + 1
 
 
 def load_data(filename):
@@ -881,6 +2069,15 @@ def load_reservation_data():
     return load_reservation_data_from_db()
 
 
+def get_reservation_by_id(reservation_id: str) -> Optional[Dict]:
+    if use_mock_data:
+        for reservation in load_data(MOCK_RESERVATIONS):
+            if reservation.get("id") == reservation_id:
+                return reservation
+        return None
+    return load_single_json_from_db("reservations", "id", reservation_id)
+
+
 def save_reservation_data(data):
     if use_mock_data:
         save_data(MOCK_RESERVATIONS, data)
@@ -888,6 +2085,85 @@ def save_reservation_data(data):
     return save_reservation_data_to_db(data)
 
 
+# The reservation writers below pass the version their write gave the reservations table to
+# on_table_version once it is committed, so the reservation index can tell its own writes from
+# those of other workers. Mock data has no such version, the callback gets None there.
+
+
+def update_existing_reservation_in_db(
+    reservation_id: str,
+    reservation_data: Dict,
+    expected_version: Optional[int] = None,
+    on_table_version: Optional[Callable[[Optional[int]], None]] = None,
+):
+    if use_mock_data:
+        new_version = _update_mock_row(
+            MOCK_RESERVATIONS, "id", reservation_id, reservation_data, expected_version, "Reservation not found"
+        )
+        if on_table_version is not None:
+            on_table_version(None)
+        return new_version
+    return update_single_json_in_db(
+        "reservations", "id", reservation_id, reservation_data, expected_version, on_table_version
+    )
+
+
+def save_new_reservation_to_db(
+    reservation: Dict, on_table_version: Optional[Callable[[Optional[int]], None]] = None
+):
+    """Inserts one reservation, leaving the other rows and their versions alone."""
+    if use_mock_data:
+        with _mock_update_lock:
+            reservations = load_data(MOCK_RESERVATIONS)
+            reservations.append(reservation)
+            save_data(MOCK_RESERVATIONS, reservations)
+        table_version = None
+    else:
+        table_version = insert_single_json_to_db("reservations", reservation)
+    if on_table_version is not None:
+        on_table_version(table_version)
+
+
+def delete_reservation_from_db(
+    reservation_id: str, on_table_version: Optional[Callable[[Optional[int]], None]] = None
+) -> Optional[Dict]:
+    """
+    Deletes one reservation and returns the row as it was deleted, None when it was already
+    gone. Callers decide on giving its space back from that row rather than from an earlier
+    read, the lifecycle scheduler may have expired it in between.
+    """
+    if use_mock_data:
+        with _mock_update_lock:
+            reservations = load_data(MOCK_RESERVATIONS)
+            for index, reservation in enumerate(reservations):
+                if reservation.get("id") == reservation_id:
+                    del reservations[index]
+                    save_data(MOCK_RESERVATIONS, reservations)
+                    break
+            else:
+                return None
+        if on_table_version is not None:
+            on_table_version(None)
+        return reservation
+
+    def delete(conn):
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("DELETE FROM reservations WHERE id = ? RETURNING *", (reservation_id,)).fetchall()
+        conn.row_factory = None
+        if not rows:
+            return None, None
+        return unnormalize_data([dict(rows[0])])[0], _bump_table_version(conn, "reservations")
+
+    try:
+        deleted, table_version = _run_write(delete)
+    except sqlite3.OperationalError as e:
+        print(f"Error deleting reservation '{reservation_id}': {e}")
+        raise
+    if deleted is not None and on_table_version is not None:
+        on_table_version(table_version)
+    return deleted
+
+
 def load_payment_data():
     if use_mock_data:
         return load_data(MOCK_PAYMENTS)
@@ -961,15 +2237,28 @@ def save_vehicle_data(data):
 
 def get_vehicle_data_by_id(vehicle_id: str):
     """Return a single vehicle by its id (license or internal)."""
-    vehicles = load_vehicle_data()
-    for vehicle in vehicles:
-        # allow lookup by 'id' or 'license_plate' key
-        if (
-            vehicle.get("id") == vehicle_id
-            or vehicle.get("license_plate", "").replace("-", "").upper() == vehicle_id.upper()
-        ):
-            return vehicle
-    return None
+    if use_mock_data:
+        for vehicle in load_vehicle_data():
+            if vehicle.get("id") == vehicle_id:
+                return vehicle
+        return get_vehicle_by_plate(vehicle_id)
+    return load_single_json_from_db("vehicles", "id", vehicle_id) or get_vehicle_by_plate(vehicle_id)
+
+
+def get_vehicle_by_plate(license_plate: str) -> Optional[Dict]:
+    """
+    Return the vehicle registered under a license plate, however it is written.
+    Uses the unique plate_norm index instead of normalizing every vehicle.
+    """
+    plate_norm = normalize_plate(license_plate)
+    if not plate_norm:
+        return None
+    if use_mock_data:
+        for vehicle in load_vehicle_data():
+            if normalize_plate(vehicle.get("license_plate")) == plate_norm:
+                return vehicle
+        return None
+    return load_single_json_from_db("vehicles", "plate_norm", plate_norm)
 
 
 def get_vehicle_data_by_user(user_id: str):
@@ -987,33 +2276,26 @@ def save_new_vehicle_to_db(vehicle_data: Dict):
     Append a new vehicle to vehicles.json.
     Maintains consistency with other *_data_to_db functions.
     """
-    vehicles = load_vehicle_data()
-
     # Prevent duplicate license plates
-    if any(
-        v.get("license_plate", "").replace("-", "").upper()
-        == vehicle_data.get("license_plate", "").replace("-", "").upper()
-        for v in vehicles
-    ):
+    if get_vehicle_by_plate(vehicle_data.get("license_plate", "")) is not None:
         raise ValueError("Vehicle already exists")
 
-    vehicles.append(vehicle_data)
     if use_mock_data:
+        vehicles = load_vehicle_data()
+        vehicles.append(vehicle_data)
         save_data(MOCK_VEHICLES, vehicles)
         return
-    save_vehicle_data(vehicles)
+    try:
+        insert_single_json_to_db("vehicles", vehicle_data)
+    except sqlite3.IntegrityError:
+        # Lost a race with another insert of the same plate, the unique index caught it
+        raise ValueError("Vehicle already exists")
 
 
-def update_existing_vehicle_in_db(vehicle_id: str, vehicle_data: Dict):
+def update_existing_vehicle_in_db(vehicle_id: str, vehicle_data: Dict, expected_version: Optional[int] = None):
     if use_mock_data:
-        vehicles = load_vehicle_data()
-        for vehicle in vehicles:
-            if vehicle.get("id") == vehicle_id:
-                vehicle.update(vehicle_data)
-                save_data(MOCK_VEHICLES, vehicles)
-                return
-        raise ValueError("Vehicle not found")
-    update_single_json_in_db("vehicles", "id", vehicle_id, vehicle_data)
+        return _update_mock_row(MOCK_VEHICLES, "id", vehicle_id, vehicle_data, expected_version, "Vehicle not found")
+    return update_single_json_in_db("vehicles", "id", vehicle_id, vehicle_data, expected_version)
 
 
 def delete_vehicle_from_db(vehicle_id: str):
@@ -1067,6 +2349,113 @@ def load_parking_sessions_data_from_db():
     return load_json_from_db("parking_sessions")
 
 
+def get_parking_sessions_by_plate(license_plate: str) -> List[Dict]:
+    """Loads every parking session of a license plate through the plate_norm index."""
+    plate_norm = normalize_plate(license_plate)
+    if not plate_norm:
+        return []
+    if use_mock_data:
+        sessions = load_data(MOCK_PARKING_SESSIONS)
+        return [s for s in sessions if normalize_plate(s.get("licenseplate")) == plate_norm]
+
+    normalized_data = []
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM parking_sessions WHERE plate_norm = ?", (plate_norm,))
+            for row in cursor:
+                normalized_data.append(dict(row))
+    except sqlite3.OperationalError as e:
+        print(f"Error loading parking sessions for plate '{license_plate}': {e}")
+        return []
+
+    return unnormalize_data(normalized_data)
+
+
+def get_open_sessions_by_lot(parking_lot_id: str) -> List[Dict]:
+    """
+    Loads the sessions still parked in a lot through the (parking_lot_id, stopped) index.
+    Sessions flagged stale gave their space back and are left out.
+    """
+    if use_mock_data:
+        return [
+            s
+            for s in load_data(MOCK_PARKING_SESSIONS)
+            if s.get("parking_lot_id") == str(parking_lot_id) and not s.get("stopped") and not s.get("stale_at")
+        ]
+
+    normalized_data = []
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM parking_sessions WHERE parking_lot_id = ? AND stopped IS NULL AND stale_at IS NULL",
+                (str(parking_lot_id),),
+            )
+            for row in cursor:
+                normalized_data.append(dict(row))
+    except sqlite3.OperationalError as e:
+        print(f"Error loading open parking sessions of parking lot '{parking_lot_id}': {e}")
+        return []
+
+    return unnormalize_data(normalized_data)
+
+
+def get_vehicle_history_by_plate(
+    license_plate: str, limit: Optional[int] = None, before: Optional[str] = None
+) -> List[Dict]:
+    """
+    Loads the completed parking sessions of a license plate, most recently stopped first,
+    with the name and address of their parking lot joined in.
+    With before, only sessions stopped earlier than it, for paging through long histories.
+    Pages that reach back past the archive cutoff continue into the archived months.
+    """
+    plate_norm = normalize_plate(license_plate)
+    if not plate_norm:
+        return []
+    if use_mock_data:
+        lots = {lot.get("id"): lot for lot in load_data(MOCK_PARKING_LOTS)}
+        history = []
+        for session in get_parking_sessions_by_plate(license_plate):
+            stopped = session.get("stopped")
+            if stopped is None or (before is not None and stopped >= before):
+                continue
+            lot = lots.get(session.get("parking_lot_id"), {})
+            history.append(
+                {**session, "parking_lot_name": lot.get("name"), "parking_lot_address": lot.get("address")}
+            )
+        history.sort(key=lambda s: s["stopped"], reverse=True)
+        return history[:limit] if limit is not None else history
+
+    sql = """
+        SELECT s.*, l.name AS parking_lot_name, l.address AS parking_lot_address
+        FROM {sessions} s
+        LEFT JOIN parking_lots l ON l.id = s.parking_lot_id
+        WHERE s.plate_norm = ? AND s.stopped IS NOT NULL
+    """
+    params = [plate_norm]
+    if before is not None:
+        sql += " AND s.stopped < ?"
+        params.append(before)
+    sql += " ORDER BY s.stopped DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    try:
+        # Archived months are only read when the live sessions don't fill the page
+        normalized_data = _select_sessions(sql, params, until=before, limit=limit)
+    except sqlite3.OperationalError as e:
+        print(f"Error loading history for plate '{license_plate}': {e}")
+        raise
+    for session in normalized_data:
+        session.pop("plate_norm", None)
+
+    return unnormalize_data(normalized_data)
+
+
 # Get all parking sessions for a specific parking lot ID
 def get_sessions_data_by_id(parking_lot_id: str) -> Dict[str, Dict]:
     try:
@@ -1150,16 +2539,129 @@ def save_parking_session_data_to_db(data):
     save_json_to_db("parking_sessions", data)
 
 
-def delete_parking_session_from_db(session_id: str):
+def save_new_parking_session_to_db(session: Dict):
+    """
+    Inserts one session, leaving the other rows alone. save_parking_session_data() rewrites the
+    whole table and would drop sessions apply_gate_events() inserted in the meantime.
+    """
+    if use_mock_data:
+        with _mock_occupancy_lock:
+            parking_sessions = load_data(MOCK_PARKING_SESSIONS)
+            parking_sessions.append(session)
+            save_data(MOCK_PARKING_SESSIONS, parking_sessions)
+        return
+    insert_single_json_to_db("parking_sessions", session, on_insert=_roll_up_started_session)
+
+
+def stop_open_parking_session(session_id: str, changes: Dict) -> bool:
+    """
+    Writes changes (stopped, cost, ...) to the session only while it is still open, and counts
+    it in the rollups of its lot in the same transaction. Returns False when it was stopped in
+    the meantime, by a gate exit or another request, so exactly one caller sees the session go
+    from open to stopped.
+    """
+    if use_mock_data:
+        with _mock_occupancy_lock:
+            parking_sessions = load_data(MOCK_PARKING_SESSIONS)
+            for session in parking_sessions:
+                if session.get("id") == session_id and session.get("stopped") is None:
+                    session.update(changes)
+                    save_data(MOCK_PARKING_SESSIONS, parking_sessions)
+                    return True
+        return False
+
+    assignments = ", ".join(f'"{col}" = ?' for col in changes)
+
+    def stop(conn):
+        cursor = conn.execute(
+            f"UPDATE parking_sessions SET {assignments} WHERE id = ? AND stopped IS NULL",
+            (*changes.values(), session_id),
+        )
+        if cursor.rowcount == 0:
+            return False
+        conn.row_factory = sqlite3.Row
+        session = dict(conn.execute("SELECT * FROM parking_sessions WHERE id = ?", (session_id,)).fetchone())
+        conn.row_factory = None
+        _roll_up_stopped_session(conn, session)
+        _bump_table_version(conn, "parking_sessions")
+        return True
+
+    return _run_write(stop)
+
+
+def update_existing_parking_session_in_db(session_id: str, changes: Dict):
+    """Writes the given fields of one session, raises ValueError when it does not exist."""
+    if use_mock_data:
+        with _mock_occupancy_lock:
+            parking_sessions = load_data(MOCK_PARKING_SESSIONS)
+            for session in parking_sessions:
+                if session.get("id") == session_id:
+                    _merge_changes(session, changes)
+                    save_data(MOCK_PARKING_SESSIONS, parking_sessions)
+                    return
+        raise ValueError("Parking session not found")
+    update_single_json_in_db("parking_sessions", "id", session_id, changes)
+
+
+def delete_parking_session_from_db(session_id: str) -> bool:
+    """Deletes one session, False when it did not exist."""
+    if use_mock_data:
+        with _mock_occupancy_lock:
+            parking_sessions = load_data(MOCK_PARKING_SESSIONS)
+            remaining = [session for session in parking_sessions if session.get("id") != session_id]
+            if len(remaining) == len(parking_sessions):
+                return False
+            save_data(MOCK_PARKING_SESSIONS, remaining)
+            return True
+
+    def delete(conn):
+        if conn.execute("DELETE FROM parking_sessions WHERE id = ?", (session_id,)).rowcount == 0:
+            return False
+        _bump_table_version(conn, "parking_sessions")
+        return True
+
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM parking_sessions WHERE id == ?", (session_id,))
-            conn.commit()
-            return cursor.rowcount > 0
+        return _run_write(delete)
     except sqlite3.OperationalError as e:
         print(f"Error deleting session: {e}")
-        return False
+        raise
+
+
+def get_open_session_by_plate(license_plate: str, parking_lot_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    The session of a license plate that is still parked, only one in parking_lot_id when given.
+    Served by the (plate_norm, stopped) index, so it does not load the sessions table.
+    """
+    plate_norm = normalize_plate(license_plate)
+    if not plate_norm:
+        return None
+    if use_mock_data:
+        for session in load_data(MOCK_PARKING_SESSIONS):
+            if (
+                session.get("stopped") is None
+                and normalize_plate(session.get("licenseplate")) == plate_norm
+                and (parking_lot_id is None or str(session.get("parking_lot_id")) == str(parking_lot_id))
+            ):
+                return session
+        return None
+
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            # The lot is checked here rather than in SQL, which could make the planner pick the
+            # (parking_lot_id, stopped) index and scan every car parked in the lot
+            rows = conn.execute(
+                "SELECT * FROM parking_sessions WHERE plate_norm = ? AND stopped IS NULL", (plate_norm,)
+            ).fetchall()
+    except sqlite3.OperationalError as e:
+        print(f"Error loading open parking session for plate '{license_plate}': {e}")
+        raise
+    for row in rows:
+        if parking_lot_id is None or str(row["parking_lot_id"]) == str(parking_lot_id):
+            session = dict(row)
+            session.pop("plate_norm", None)
+            return unnormalize_data([session])[0]
+    return None
 
 
 
@@ -1181,3 +2683,790 @@ def find_parking_session_id_by_plate(parking_lot_id: str, licenseplate: str = "T
             return session.get("id")
 
     return None
+
+
+# --- Session Archive ---
+
+# Completed sessions move to the archive once they stopped before the first day of the month
+# this many months back, so parking_sessions only holds recent and active sessions
+SESSION_ARCHIVE_AFTER_MONTHS = int(os.getenv("SESSION_ARCHIVE_AFTER_MONTHS", "12"))
+SESSION_ARCHIVE_BATCH_SIZE = int(os.getenv("SESSION_ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_ALIAS = "session_archive"
+
+
+def session_archive_dir() -> Path:
+    """One database file per month, next to the database unless SESSION_ARCHIVE_DIR says otherwise."""
+    configured = os.getenv("SESSION_ARCHIVE_DIR")
+    return Path(configured) if configured else Path(DB_PATH).parent / "archive"
+
+
+def _archive_cutoff(months: int, today: Optional[date] = None) -> str:
+    """The first day of the month `months` before today, sessions stopped before it are archived."""
+    today = today or date.today()
+    month_index = today.year * 12 + today.month - 1 - months
+    return f"{month_index // 12:04d}-{month_index % 12 + 1:02d}-01"
+
+
+def _next_month(month: str) -> str:
+    year, month_number = int(month[:4]), int(month[5:7])
+    return f"{year + month_number // 12:04d}-{month_number % 12 + 1:02d}"
+
+
+@contextmanager
+def _attached_archive(conn, file: str):
+    """
+    Attaches a month's archive file to the connection. SQLCipher opens an attached file with the
+    key of the main database, so the archive is encrypted just like it. Only one archive is
+    attached at a time, SQLite allows no more than ten.
+    """
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS}", (str(session_archive_dir() / file),))
+    try:
+        yield
+    finally:
+        conn.execute(f"DETACH DATABASE {ARCHIVE_ALIAS}")
+
+
+def _ensure_archive_table(conn) -> List[str]:
+    """Creates the sessions table of the attached archive, or adds the columns the live table gained since."""
+    live_columns = [(info[1], info[2]) for info in conn.execute("PRAGMA main.table_info(parking_sessions)")]
+    archived = {info[1] for info in conn.execute(f"PRAGMA {ARCHIVE_ALIAS}.table_info(parking_sessions)")}
+    if not archived:
+        columns_sql = ", ".join(
+            f'"{name}" {col_type}' + (" PRIMARY KEY" if name == "id" else "") for name, col_type in live_columns
+        )
+        conn.execute(f"CREATE TABLE {ARCHIVE_ALIAS}.parking_sessions ({columns_sql})")
+        conn.execute(
+            f"CREATE INDEX {ARCHIVE_ALIAS}.idx_parking_sessions_plate_norm_stopped ON parking_sessions (plate_norm, stopped)"
+        )
+        conn.execute(f'CREATE INDEX {ARCHIVE_ALIAS}.idx_parking_sessions_user ON parking_sessions ("user")')
+    else:
+        for name, col_type in live_columns:
+            if name not in archived:
+                conn.execute(f'ALTER TABLE {ARCHIVE_ALIAS}.parking_sessions ADD COLUMN "{name}" {col_type}')
+    return [name for name, _ in live_columns]
+
+
+def archive_parking_sessions(
+    months: int = SESSION_ARCHIVE_AFTER_MONTHS,
+    batch_size: int = SESSION_ARCHIVE_BATCH_SIZE,
+    today: Optional[date] = None,
+) -> Dict[str, int]:
+    """
+    Moves the sessions that stopped before the cutoff of _archive_cutoff() out of parking_sessions
+    into one archive database file per month (parking_sessions_YYYY-MM.db), batch_size sessions
+    per transaction so the live table is never locked for long. Open sessions always stay.
+    Returns the number of sessions moved per month. The mock data is never archived.
+    """
+    if use_mock_data:
+        return {}
+    cutoff = _archive_cutoff(months, today)
+    session_archive_dir().mkdir(parents=True, exist_ok=True)
+    moved: Dict[str, int] = {}
+    with get_db_connection() as conn:
+        months_to_archive = [
+            row[0]
+            for row in conn.execute(
+                "SELECT DISTINCT substr(stopped, 1, 7) FROM parking_sessions "
+                "WHERE stopped IS NOT NULL AND stopped < ? ORDER BY 1",
+                (cutoff,),
+            )
+        ]
+        for month in months_to_archive:
+            file = f"parking_sessions_{month}.db"
+            with _attached_archive(conn, file):
+                columns_sql = ", ".join(f'"{col}"' for col in _ensure_archive_table(conn))
+                conn.commit()
+                moved[month] = 0
+                while True:
+                    conn.execute("BEGIN IMMEDIATE")
+                    ids = [
+                        row[0]
+                        for row in conn.execute(
+                            "SELECT id FROM main.parking_sessions WHERE stopped >= ? AND stopped < ? AND stopped < ? LIMIT ?",
+                            (month, _next_month(month), cutoff, batch_size),
+                        )
+                    ]
+                    if not ids:
+                        conn.commit()
+                        break
+                    placeholders = ", ".join("?" * len(ids))
+                    # Commits across attached WAL databases are atomic per file only. A batch that reached
+                    # the archive but is still live after a crash is copied again (OR REPLACE) and removed
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {ARCHIVE_ALIAS}.parking_sessions ({columns_sql}) "
+                        f"SELECT {columns_sql} FROM main.parking_sessions WHERE id IN ({placeholders})",
+                        ids,
+                    )
+                    conn.execute(f"DELETE FROM main.parking_sessions WHERE id IN ({placeholders})", ids)
+                    conn.execute("INSERT OR IGNORE INTO session_archives (month, file) VALUES (?, ?)", (month, file))
+                    _bump_table_version(conn, "parking_sessions")
+                    conn.commit()
+                    moved[month] += len(ids)
+                conn.execute(
+                    f"UPDATE session_archives SET sessions = (SELECT COUNT(*) FROM {ARCHIVE_ALIAS}.parking_sessions) "
+                    "WHERE month = ?",
+                    (month,),
+                )
+                conn.commit()
+    return moved
+
+
+def _archived_months(conn, since: Optional[str], until: Optional[str]) -> List[Tuple[str, str]]:
+    """(month, file) of the archives holding sessions stopped between since and until, newest first."""
+    sql, conditions, params = "SELECT month, file FROM session_archives", [], []
+    if since is not None:
+        conditions.append("month >= ?")
+        params.append(since[:7])
+    if until is not None:
+        conditions.append("month <= ?")
+        params.append(until[:7])
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    try:
+        return conn.execute(sql + " ORDER BY month DESC", params).fetchall()
+    except sqlite3.OperationalError:
+        # A database created before the archive existed
+        return []
+
+
+def _newest_first(session: Dict) -> str:
+    # Open sessions count as the newest
+    return session.get("stopped") or "\uffff"
+
+
+def _select_sessions(
+    sql: str, params: List, since: Optional[str] = None, until: Optional[str] = None, limit: Optional[int] = None
+) -> List[Dict]:
+    """
+    Runs a SELECT written against {sessions} on the live parking sessions, then on the archive
+    of every month between since and until, one attached file at a time. A range that does not
+    reach back past the archive cutoff never opens an archive. Sessions come newest first by
+    stop time. With limit, only the newest `limit` are returned and older months are not read
+    once they can't make the cut. A session found live and in the archive, after an interrupted archive run, is
+    taken from the live table.
+    """
+    sessions: Dict[str, Dict] = {}
+    with get_db_connection() as conn:
+        conn.row_factory = sqlite3.Row
+        for row in conn.execute(sql.format(sessions="main.parking_sessions"), params):
+            sessions[row["id"]] = dict(row)
+        for month, file in _archived_months(conn, since, until):
+            if limit is not None and len(sessions) >= limit:
+                oldest_kept = sorted(sessions.values(), key=_newest_first, reverse=True)[limit - 1]
+                if _newest_first(oldest_kept)[:7] > month:
+                    break
+            if not (session_archive_dir() / file).exists():
+                print(f"Warning: archive {file} of {month} is missing")
+                continue
+            with _attached_archive(conn, file):
+                for row in conn.execute(sql.format(sessions=f"{ARCHIVE_ALIAS}.parking_sessions"), params):
+                    sessions.setdefault(row["id"], dict(row))
+
+    result = sorted(sessions.values(), key=_newest_first, reverse=True)
+    return result[:limit] if limit is not None else result
+
+
+def get_parking_sessions_by_user(username: str) -> List[Dict]:
+    """Every parking session of a user, archived ones included, through the user indexes."""
+    if use_mock_data:
+        return [s for s in load_data(MOCK_PARKING_SESSIONS) if s.get("user") == username]
+    try:
+        sessions = _select_sessions('SELECT * FROM {sessions} WHERE "user" = ?', [username])
+    except sqlite3.OperationalError as e:
+        print(f"Error loading parking sessions for user '{username}': {e}")
+        return []
+    for session in sessions:
+        session.pop("plate_norm", None)
+    return unnormalize_data(sessions)
+
+
+# --- Lot Rollups ---
+
+ROLLUP_SUMS = ("sessions", "duration_minutes", "payments", "refunds")
+
+
+def _local_datetime(value) -> Optional[datetime]:
+    """A session time as a naive local datetime, None when it is missing or unreadable."""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return moment.astimezone().replace(tzinfo=None) if moment.tzinfo is not None else moment
+
+
+def _created_datetime(row: Dict) -> Optional[datetime]:
+    created = row.get("created_ts") or parse_created_at(row.get("created_at"))
+    return datetime.fromtimestamp(created) if created is not None else None
+
+
+def _roll_up(conn, parking_lot_id, at: Optional[datetime], peak_occupancy: int = 0, **sums):
+    """Adds to the hourly and daily totals of a lot on the caller's connection, peak_occupancy only ever goes up."""
+    if parking_lot_id is None or at is None:
+        return
+    columns = [*sums, "peak_occupancy"]
+    updates = [f"{col} = {col} + excluded.{col}" for col in sums]
+    updates.append("peak_occupancy = MAX(peak_occupancy, excluded.peak_occupancy)")
+    placeholders = ", ".join("?" * (len(columns) + 2))
+    for table, width in ROLLUP_TABLES.values():
+        conn.execute(
+            f"INSERT INTO {table} (parking_lot_id, period, {', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT (parking_lot_id, period) DO UPDATE SET {', '.join(updates)}",
+            (str(parking_lot_id), at.isoformat()[:width], *sums.values(), peak_occupancy),
+        )
+
+
+def _roll_up_stopped_session(conn, session: Dict):
+    _roll_up(
+        conn,
+        session.get("parking_lot_id"),
+        _local_datetime(session.get("stopped")),
+        sessions=1,
+        duration_minutes=session.get("duration_minutes") or 0,
+    )
+
+
+def _roll_up_started_session(conn, session: Dict):
+    """
+    Raises the peak of the lot to the sessions open in it once this one started. Counted from the
+    sessions rather than the reserved counter, which holds booked reservations as well, so the
+    peak is the cars parked at once, the same as rebuild_lot_rollups() replays.
+    """
+    parking_lot_id = session.get("parking_lot_id")
+    if parking_lot_id is None:
+        return
+    (occupied,) = conn.execute(
+        "SELECT COUNT(*) FROM parking_sessions WHERE parking_lot_id = ? AND stopped IS NULL", (parking_lot_id,)
+    ).fetchone()
+    _roll_up(conn, parking_lot_id, _local_datetime(session.get("started")), peak_occupancy=occupied)
+
+
+def _roll_up_payment(conn, payment: Dict):
+    _roll_up(conn, payment.get("parking_lot_id"), _created_datetime(payment), payments=payment.get("amount") or 0)
+
+
+def _roll_up_refund(conn, refund: Dict):
+    # Refunds only know their payment, the lot comes from there
+    row = conn.execute(
+        'SELECT parking_lot_id FROM payments WHERE "transaction" = ?', (refund.get("original_transaction_id"),)
+    ).fetchone()
+    if row is not None:
+        _roll_up(conn, row[0], _created_datetime(refund), refunds=refund.get("amount") or 0)
+
+
+def _periods_after(start: datetime, end: datetime, width: int):
+    """The starts of the hours or days after the one start falls in, up to end."""
+    if width == ROLLUP_TABLES["hour"][1]:
+        period, step = start.replace(minute=0, second=0, microsecond=0), timedelta(hours=1)
+    else:
+        period, step = start.replace(hour=0, minute=0, second=0, microsecond=0), timedelta(days=1)
+    period += step
+    while period < end:
+        yield period
+        period += step
+
+
+def _compute_lot_rollups(
+    sessions: List[Dict], payments: List[Dict], refunds: List[Tuple[str, Dict]], width: int
+) -> Dict[Tuple[str, str], Dict]:
+    """
+    The rollups of one bucket size computed from scratch, keyed by (parking_lot_id, period).
+    refunds are (parking_lot_id, refund) pairs. Peak occupancy is replayed from the start and
+    stop times of the sessions, since the live counters keep no history.
+    """
+    rollups: Dict[Tuple[str, str], Dict] = {}
+
+    def bucket(parking_lot_id, at: datetime) -> Dict:
+        key = (str(parking_lot_id), at.isoformat()[:width])
+        if key not in rollups:
+            rollups[key] = {"sessions": 0, "duration_minutes": 0, "payments": 0.0, "refunds": 0.0, "peak_occupancy": 0}
+        return rollups[key]
+
+    movements: Dict[str, List[Tuple[datetime, int]]] = {}
+    for session in sessions:
+        parking_lot_id = session.get("parking_lot_id")
+        started = _local_datetime(session.get("started"))
+        stopped = _local_datetime(session.get("stopped"))
+        if parking_lot_id is None or started is None:
+            continue
+        movements.setdefault(str(parking_lot_id), []).append((started, 1))
+        if stopped is not None:
+            movements[str(parking_lot_id)].append((stopped, -1))
+            totals = bucket(parking_lot_id, stopped)
+            totals["sessions"] += 1
+            totals["duration_minutes"] += session.get("duration_minutes") or 0
+
+    for parking_lot_id, moves in movements.items():
+        # Departures (-1) before arrivals at the same moment
+        moves.sort()
+        occupied, previous = 0, None
+        for at, delta in moves:
+            if previous is not None and occupied > 0:
+                # Hours or days without any movement still had the cars parked
+                for period in _periods_after(previous, at, width):
+                    peak = bucket(parking_lot_id, period)
+                    peak["peak_occupancy"] = max(peak["peak_occupancy"], occupied)
+            occupied = max(occupied + delta, 0)
+            peak = bucket(parking_lot_id, at)
+            peak["peak_occupancy"] = max(peak["peak_occupancy"], occupied)
+            previous = at
+
+    for payment in payments:
+        created = _created_datetime(payment)
+        if payment.get("parking_lot_id") is not None and created is not None:
+            bucket(payment["parking_lot_id"], created)["payments"] += payment.get("amount") or 0
+    for parking_lot_id, refund in refunds:
+        created = _created_datetime(refund)
+        if parking_lot_id is not None and created is not None:
+            bucket(parking_lot_id, created)["refunds"] += refund.get("amount") or 0
+    return rollups
+
+
+def _mock_lot_rollups(width: int) -> Dict[Tuple[str, str], Dict]:
+    payments = load_data(MOCK_PAYMENTS)
+    lot_of_payment = {payment.get("transaction"): payment.get("parking_lot_id") for payment in payments}
+    refunds = [(lot_of_payment.get(r.get("original_transaction_id")), r) for r in load_data(MOCK_REFUNDS)]
+    return _compute_lot_rollups(load_data(MOCK_PARKING_SESSIONS), payments, refunds, width)
+
+
+def rebuild_lot_rollups() -> Dict[str, int]:
+    """
+    Backfill: recomputes both rollup tables from every session (archived months included),
+    payment and refund, and replaces them in one transaction. Returns the rows written per
+    bucket. The incremental updates keep them current from then on.
+    """
+    if use_mock_data:
+        return {}
+    sessions = _select_sessions("SELECT parking_lot_id, started, stopped, duration_minutes, id FROM {sessions}", [])
+    with get_db_connection() as conn:
+        conn.row_factory = sqlite3.Row
+        payments = [dict(row) for row in conn.execute("SELECT parking_lot_id, amount, created_at, created_ts FROM payments")]
+        refunds = [
+            (row["parking_lot_id"], dict(row))
+            for row in conn.execute(
+                "SELECT p.parking_lot_id, r.amount, r.created_at, r.created_ts FROM refunds r "
+                'JOIN payments p ON p."transaction" = r.original_transaction_id'
+            )
+        ]
+
+        written = {}
+        conn.execute("BEGIN IMMEDIATE")
+        for bucket_name, (table, width) in ROLLUP_TABLES.items():
+            rollups = _compute_lot_rollups(sessions, payments, refunds, width)
+            conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                f"INSERT INTO {table} (parking_lot_id, period, {', '.join(ROLLUP_SUMS)}, peak_occupancy) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (parking_lot_id, period, *(totals[col] for col in ROLLUP_SUMS), totals["peak_occupancy"])
+                    for (parking_lot_id, period), totals in rollups.items()
+                ],
+            )
+            written[bucket_name] = len(rollups)
+        conn.commit()
+    return written
+
+
+def get_lot_rollups(
+    parking_lot_id: str, since: Optional[datetime] = None, until: Optional[datetime] = None, bucket: str = "day"
+) -> List[Dict]:
+    """
+    The rollups of one lot from the hour or day since falls in up to the one until falls in,
+    oldest first. A range scan on the (parking_lot_id, period) primary key, so a year of
+    days or hours is read without touching a single session or payment.
+    """
+    table, width = ROLLUP_TABLES[bucket]
+    first = since.isoformat()[:width] if since is not None else None
+    last = until.isoformat()[:width] if until is not None else None
+
+    if use_mock_data:
+        rows = [
+            {"period": period, **totals}
+            for (lot_id, period), totals in _mock_lot_rollups(width).items()
+            if lot_id == str(parking_lot_id)
+            and (first is None or period >= first)
+            and (last is None or period <= last)
+        ]
+        return sorted(rows, key=lambda row: row["period"])
+
+    sql = f"SELECT period, {', '.join(ROLLUP_SUMS)}, peak_occupancy FROM {table} WHERE parking_lot_id = ?"
+    params = [str(parking_lot_id)]
+    if first is not None:
+        sql += " AND period >= ?"
+        params.append(first)
+    if last is not None:
+        sql += " AND period <= ?"
+        params.append(last)
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql + " ORDER BY period", params)]
+    except sqlite3.OperationalError as e:
+        print(f"Error loading rollups of parking lot '{parking_lot_id}': {e}")
+        raise
+
+
+# --- Leases and Lifecycle Sweeps ---
+
+
+def acquire_lease(name: str, holder: str, seconds: float) -> bool:
+    """
+    Takes or renews the named lease for holder, valid for the next seconds. It is granted when
+    nobody holds it, holder already does, or the last holder let it run out, decided in one
+    upsert, so two workers can never both hold it. Mock data means a single process, always granted.
+    """
+    if use_mock_data:
+        return True
+    now = time.time()
+
+    def take(conn):
+        row = conn.execute(
+            "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE leases.holder = excluded.holder OR leases.expires_at < ? RETURNING holder",
+            (name, holder, now + seconds, now),
+        ).fetchone()
+        return row is not None
+
+    try:
+        return _run_write(take)
+    except sqlite3.OperationalError as e:
+        print(f"Error acquiring lease '{name}': {e}")
+        return False
+
+
+def release_lease(name: str, holder: str):
+    """Gives the lease up if holder still has it, so another worker can take over right away."""
+    if use_mock_data:
+        return
+    try:
+        with get_db_connection() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+            conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"Error releasing lease '{name}': {e}")
+
+
+def _release_spaces(conn, released: List[Dict]):
+    """Gives back one space per released row, one UPDATE per parking lot."""
+    per_lot = Counter(row["parking_lot_id"] for row in released if row["parking_lot_id"] is not None)
+    if not per_lot:
+        return
+    conn.executemany(
+        "UPDATE parking_lots SET reserved = MAX(0, COALESCE(reserved, 0) - ?) WHERE id = ?",
+        [(count, parking_lot_id) for parking_lot_id, count in per_lot.items()],
+    )
+    _bump_table_version(conn, OCCUPANCY_VERSION_KEY)
+
+
+def _release_mock_spaces(released: List[Dict]):
+    for row in released:
+        if row["parking_lot_id"] is not None:
+            _adjust_mock_parking_lot_reserved(row["parking_lot_id"], -1, False)
+
+
+def expire_reservations(now: datetime, limit: int) -> List[Dict]:
+    """
+    Marks up to limit active reservations whose end_time has passed as "expired" and gives
+    their spaces back, in one transaction. Picked oldest first through the partial
+    (end_time) index of active reservations. Returns {"id", "parking_lot_id", "end_time"} per
+    expired reservation, fewer than limit once none are left.
+    """
+    cutoff = now.isoformat(timespec="minutes")
+    if use_mock_data:
+        with _mock_update_lock:
+            reservations = load_data(MOCK_RESERVATIONS)
+            due = sorted(
+                (
+                    r
+                    for r in reservations
+                    if (r.get("status") or "pending") in ("pending", "confirmed")
+                    # Like end_time <= ? in SQL, a reservation without an end_time is never due
+                    and r.get("end_time")
+                    and r["end_time"] <= cutoff
+                ),
+                key=lambda r: r.get("end_time") or "",
+            )[:limit]
+            for reservation in due:
+                reservation["status"] = "expired"
+                reservation["version"] = reservation.get("version", 1) + 1
+            if due:
+                save_data(MOCK_RESERVATIONS, reservations)
+        expired = [{"id": r.get("id"), "parking_lot_id": r.get("parking_lot_id"), "end_time": r.get("end_time")} for r in due]
+        _release_mock_spaces(expired)
+        return expired
+
+    def expire(conn):
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            "UPDATE reservations SET status = 'expired', version = version + 1 WHERE id IN ("
+            f"SELECT id FROM reservations WHERE {ACTIVE_RESERVATION_SQL} AND end_time <= ? ORDER BY end_time LIMIT ?"
+            ") RETURNING id, parking_lot_id, end_time",
+            (cutoff, limit),
+        ).fetchall()
+        conn.row_factory = None
+        expired = [dict(row) for row in rows]
+        if expired:
+            _release_spaces(conn, expired)
+            _bump_table_version(conn, "reservations")
+        return expired
+
+    try:
+        return _run_write(expire)
+    except sqlite3.OperationalError as e:
+        print(f"Error expiring reservations: {e}")
+        raise
+
+
+def flag_stale_sessions(started_before: datetime, limit: int, now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Sets stale_at on up to limit sessions that are still open but started before started_before,
+    and gives their spaces back, in one transaction. A flagged session can still be stopped, it
+    just does not release a space a second time. Returns {"id", "parking_lot_id", "started"} per
+    flagged session, fewer than limit once none are left.
+    """
+    cutoff = started_before.isoformat(timespec="minutes")
+    stale_at = (now or datetime.now()).isoformat(timespec="seconds")
+    if use_mock_data:
+        with _mock_update_lock:
+            sessions = load_data(MOCK_PARKING_SESSIONS)
+            due = sorted(
+                (
+                    session
+                    for session in sessions
+                    if not session.get("stopped") and not session.get("stale_at") and (session.get("started") or "") <= cutoff
+                ),
+                key=lambda session: session.get("started") or "",
+            )[:limit]
+            for session in due:
+                session["stale_at"] = stale_at
+            if due:
+                save_data(MOCK_PARKING_SESSIONS, sessions)
+        flagged = [{"id": s.get("id"), "parking_lot_id": s.get("parking_lot_id"), "started": s.get("started")} for s in due]
+        _release_mock_spaces(flagged)
+        return flagged
+
+    def flag(conn):
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            "UPDATE parking_sessions SET stale_at = ? WHERE id IN ("
+            "SELECT id FROM parking_sessions WHERE stopped IS NULL AND stale_at IS NULL AND started <= ? "
+            "ORDER BY started LIMIT ?"
+            ") RETURNING id, parking_lot_id, started",
+            (stale_at, cutoff, limit),
+        ).fetchall()
+        conn.row_factory = None
+        flagged = [dict(row) for row in rows]
+        if flagged:
+            _release_spaces(conn, flagged)
+            _bump_table_version(conn, "parking_sessions")
+        return flagged
+
+    try:
+        return _run_write(flag)
+    except sqlite3.OperationalError as e:
+        print(f"Error flagging stale parking sessions: {e}")
+        raise
+
+
+def get_upcoming_reservation_ends(after: datetime, limit: int) -> List[str]:
+    """The next limit end_times of active reservations after the given moment, soonest first."""
+    cutoff = after.isoformat(timespec="minutes")
+    if use_mock_data:
+        return sorted(
+            r["end_time"]
+            for r in load_data(MOCK_RESERVATIONS)
+            if (r.get("status") or "pending") in ("pending", "confirmed") and (r.get("end_time") or "") > cutoff
+        )[:limit]
+    try:
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                f"SELECT end_time FROM reservations WHERE {ACTIVE_RESERVATION_SQL} AND end_time > ? "
+                "ORDER BY end_time LIMIT ?",
+                (cutoff, limit),
+            ).fetchall()
+    except sqlite3.OperationalError as e:
+        print(f"Error loading upcoming reservation ends: {e}")
+        return []
+    return [row[0] for row in rows]
+
+
+# --- Gate Events ---
+
+# Why a gate event was not applied, reported per event
+GATE_ALREADY_PARKED = "already_parked"
+GATE_LOT_FULL = "lot_full"
+GATE_NO_OPEN_SESSION = "no_open_session"
+
+
+class _DbGateStore:
+    """Session and counter operations of apply_gate_events() on one connection, inside its transaction."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def open_session(self, plate_norm: str) -> Optional[Dict]:
+        # Served by the (plate_norm, stopped) index
+        self.conn.row_factory = sqlite3.Row
+        row = self.conn.execute(
+            "SELECT * FROM parking_sessions WHERE plate_norm = ? AND stopped IS NULL LIMIT 1", (plate_norm,)
+        ).fetchone()
+        self.conn.row_factory = None
+        return dict(row) if row else None
+
+    def claim_space(self, parking_lot_id: str) -> Optional[Dict]:
+        return _adjust_reserved(self.conn, SQL_CLAIM_SPACE_WITHIN_CAPACITY, parking_lot_id)
+
+    def release_space(self, parking_lot_id: str) -> Optional[Dict]:
+        return _adjust_reserved(self.conn, SQL_RELEASE_SPACE, parking_lot_id)
+
+    def insert_session(self, session: Dict):
+        row = _with_plate_norm("parking_sessions", session)
+        columns = ", ".join(f'"{col}"' for col in row)
+        placeholders = ", ".join("?" * len(row))
+        self.conn.execute(f"INSERT INTO parking_sessions ({columns}) VALUES ({placeholders})", tuple(row.values()))
+        _roll_up_started_session(self.conn, row)
+
+    def stop_session(self, session: Dict, changes: Dict):
+        assignments = ", ".join(f'"{col}" = ?' for col in changes)
+        self.conn.execute(
+            f"UPDATE parking_sessions SET {assignments} WHERE id = ?", (*changes.values(), session["id"])
+        )
+        _roll_up_stopped_session(self.conn, {**session, **changes})
+
+    def run_event(self, apply):
+        # A savepoint per event, an event that fails leaves nothing behind and the batch goes on
+        self.conn.execute("SAVEPOINT gate_event")
+        try:
+            return apply()
+        except Exception:
+            self.conn.execute("ROLLBACK TO gate_event")
+            raise
+        finally:
+            self.conn.execute("RELEASE gate_event")
+
+
+class _MockGateStore:
+    """The mock data counterpart, works on the loaded JSON and is saved once at the end."""
+
+    def __init__(self, sessions: List[Dict], parking_lots: List[Dict]):
+        self.sessions = sessions
+        self.lots = {lot.get("id"): lot for lot in parking_lots}
+        self.open_by_plate = {}
+        for session in sessions:
+            if not session.get("stopped"):
+                self.open_by_plate[normalize_plate(session.get("licenseplate"))] = session
+
+    def open_session(self, plate_norm: str) -> Optional[Dict]:
+        return self.open_by_plate.get(plate_norm)
+
+    def _adjust(self, parking_lot_id: str, delta: int) -> Optional[Dict]:
+        lot = self.lots.get(parking_lot_id)
+        if lot is None:
+            return None
+        reserved = lot.get("reserved") or 0
+        if (delta > 0 and reserved >= (lot.get("capacity") or 0)) or (delta < 0 and reserved <= 0):
+            return None
+        lot["reserved"] = reserved + delta
+        return {"capacity": lot.get("capacity"), "reserved": lot["reserved"]}
+
+    def claim_space(self, parking_lot_id: str) -> Optional[Dict]:
+        return self._adjust(parking_lot_id, 1)
+
+    def release_space(self, parking_lot_id: str) -> Optional[Dict]:
+        return self._adjust(parking_lot_id, -1)
+
+    def insert_session(self, session: Dict):
+        self.sessions.append(session)
+        self.open_by_plate[normalize_plate(session["licenseplate"])] = session
+
+    def stop_session(self, session: Dict, changes: Dict):
+        session.update(changes)
+        self.open_by_plate.pop(normalize_plate(session.get("licenseplate")), None)
+
+    def run_event(self, apply):
+        return apply()
+
+
+def _apply_gate_event(store, event: Dict, price) -> Dict:
+    plate_norm = normalize_plate(event["licenseplate"])
+    parking_lot_id = event["parking_lot_id"]
+    open_session = store.open_session(plate_norm)
+
+    if event["event"] == "entry":
+        if open_session is not None:
+            return {"status": "rejected", "reason": GATE_ALREADY_PARKED, "session_id": open_session.get("id")}
+        occupancy = store.claim_space(parking_lot_id)
+        if occupancy is None:
+            return {"status": "rejected", "reason": GATE_LOT_FULL}
+        session = {
+            "id": event["session_id"],
+            "licenseplate": event["licenseplate"],
+            "started": event["time"].isoformat(timespec="minutes"),
+            "stopped": None,
+            "user": event["user"],
+            "parking_lot_id": parking_lot_id,
+        }
+        store.insert_session(session)
+        return {"status": "started", "session": session, "occupancy": occupancy}
+
+    if open_session is None or open_session.get("parking_lot_id") != parking_lot_id:
+        return {"status": "rejected", "reason": GATE_NO_OPEN_SESSION}
+    started = datetime.fromisoformat(open_session["started"])
+    # Events from a camera with a skewed clock can never make a session end before it started
+    stopped = max(event["time"], started)
+    changes = {
+        "stopped": stopped.isoformat(),
+        "duration_minutes": int((stopped - started).total_seconds() / 60),
+        "payment_status": "Pending",
+    }
+    changes["cost"] = price(parking_lot_id, open_session["id"], {**open_session, **changes})
+    store.stop_session(open_session, changes)
+    # A counter that is already at zero stays there, the session is stopped either way. A session
+    # flagged stale gave its space back already.
+    occupancy = None if open_session.get("stale_at") else store.release_space(parking_lot_id)
+    return {"status": "stopped", "session": {**open_session, **changes}, "occupancy": occupancy}
+
+
+def apply_gate_events(events: List[Dict], price) -> List[Dict]:
+    """
+    Applies an ordered batch of gate entries and exits in one transaction. Each event is a dict
+    with "event" ("entry" or "exit"), "parking_lot_id", "licenseplate", "time" (a naive local
+    datetime), "user", and for entries the "session_id" to use, allocated beforehand since
+    allocate_id() can't run inside the transaction. price(parking_lot_id, session_id, session)
+    returns the cost of a stopped session.
+
+    Returns one result per event, in order: {"status": "started" | "stopped", "session",
+    "occupancy"} or {"status": "rejected", "reason"}. A rejected or failed event changes
+    nothing, the others are still applied. Plates are looked up through the plate_norm
+    index, so the cost per event does not grow with the number of sessions.
+    """
+    def apply_all(store) -> List[Dict]:
+        results = []
+        for event in events:
+            try:
+                results.append(store.run_event(lambda: _apply_gate_event(store, event, price)))
+            except Exception as e:
+                results.append({"status": "rejected", "reason": "error", "detail": str(e)})
+        return results
+
+    if use_mock_data:
+        with _mock_occupancy_lock:
+            parking_lots = load_data(MOCK_PARKING_LOTS)
+            sessions = load_data(MOCK_PARKING_SESSIONS)
+            results = apply_all(_MockGateStore(sessions, parking_lots))
+            save_data(MOCK_PARKING_SESSIONS, sessions)
+            save_data(MOCK_PARKING_LOTS, parking_lots)
+        return results
+
+    def work(conn):
+        # The savepoints nest in this transaction. Without one open, as outside the group commit
+        # writer, each RELEASE would commit its event on its own.
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        results = apply_all(_DbGateStore(conn))
+        _bump_table_version(conn, "parking_sessions")
+        return results
+
+    return _run_write(work)
@@ -0,0 +1,77 @@
+import logging
+import os
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Optional, Tuple
+
+from utils import storage_utils
+
+logger = logging.getLogger(__name__)
+
+# SQLite's own autocheckpoint runs PASSIVE checkpoints, which stop at the first page a reader
+# still needs. Under a steady stream of reads and writes the WAL then never gets reset and
+# keeps growing. This runs a checkpoint on a timer, and once the file passes
+# SQLITE_WAL_TRUNCATE_BYTES, it runs a TRUNCATE checkpoint. That one waits (up to
+# busy_timeout) for the readers and shrinks the file back to zero.
+SQLITE_CHECKPOINT_SECONDS = float(os.getenv("SQLITE_CHECKPOINT_SECONDS", "30"))
+SQLITE_WAL_TRUNCATE_BYTES = int(os.getenv("SQLITE_WAL_TRUNCATE_BYTES", str(64 * 1024 * 1024)))
+
+
+def wal_path() -> Path:
+    return Path(f"{storage_utils.DB_PATH}-wal")
+
+
+def wal_size() -> int:
+    try:
+        return wal_path().stat().st_size
+    except OSError:
+        return 0
+
+
+def checkpoint(truncate_bytes: int = SQLITE_WAL_TRUNCATE_BYTES) -> Optional[Tuple[str, int, int, int]]:
+    """
+    Runs one checkpoint. Returns (mode, busy, wal pages, pages checkpointed) as reported by
+    SQLite, or None if the database is not in WAL mode or could not be opened.
+    """
+    mode = "TRUNCATE" if wal_size() >= truncate_bytes else "PASSIVE"
+    try:
+        with closing(storage_utils.get_db_connection()) as conn:
+            busy, log, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    except Exception as e:
+        logger.warning(f"WAL checkpoint failed: {e}")
+        return None
+    if log == -1:
+        return None
+    if busy:
+        logger.info(f"WAL checkpoint ({mode}) could not finish, {checkpointed}/{log} pages written back")
+    return mode, busy, log, checkpointed
+
+
+class CheckpointManager:
+    """Background thread that calls checkpoint() every interval seconds until stopped."""
+
+    def __init__(self, interval: float = SQLITE_CHECKPOINT_SECONDS, truncate_bytes: int = SQLITE_WAL_TRUNCATE_BYTES):
+        self.interval = interval
+        self.truncate_bytes = truncate_bytes
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="wal-checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the thread after one last checkpoint, so a clean shutdown leaves a small WAL."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            checkpoint(self.truncate_bytes)
+        checkpoint(0)